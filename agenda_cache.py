@@ -0,0 +1,178 @@
+# agenda_cache.py
+# Caché en memoria de la agenda (audiencias + vencimientos de tareas) por período.
+import bisect
+import datetime
+import threading
+
+
+def _rango_mes(anio, mes):
+    """ Devuelve (primer_dia, ultimo_dia) del mes como datetime.date. """
+    primer_dia = datetime.date(anio, mes, 1)
+    siguiente = datetime.date(anio + (mes == 12), mes % 12 + 1, 1)
+    return primer_dia, siguiente - datetime.timedelta(days=1)
+
+
+def _meses_entre(desde, hasta):
+    """ Lista de (anio, mes) que cubren el intervalo [desde, hasta] (datetime.date). """
+    meses = []
+    anio, mes = desde.year, desde.month
+    while (anio, mes) <= (hasta.year, hasta.month):
+        meses.append((anio, mes))
+        mes += 1
+        if mes > 12:
+            mes = 1
+            anio += 1
+    return meses
+
+
+class IndiceAgenda:
+    """
+    Índice de intervalos ordenado de los eventos de un período.
+    Los eventos se ordenan por (fecha, hora) y las consultas por rango de fechas
+    se resuelven con bisect en O(log n + k), sin volver a la BD.
+    """
+
+    def __init__(self, eventos):
+        self.eventos = sorted(eventos, key=self._clave_orden)
+        self._fechas = [ev.get('fecha') or '' for ev in self.eventos]
+
+    @staticmethod
+    def _clave_orden(evento):
+        # Las tareas (sin hora) van al final del día; las audiencias por hora
+        return (evento.get('fecha') or '', evento.get('hora') or '99:99', evento.get('tipo') or '', evento.get('id') or 0)
+
+    def en_rango(self, fecha_desde, fecha_hasta):
+        """ Eventos con fecha en [fecha_desde, fecha_hasta] (cadenas YYYY-MM-DD). """
+        inicio = bisect.bisect_left(self._fechas, fecha_desde)
+        fin = bisect.bisect_right(self._fechas, fecha_hasta)
+        return self.eventos[inicio:fin]
+
+    def __len__(self):
+        return len(self.eventos)
+
+
+class CacheAgenda:
+    """
+    Caché de la agenda por mes. Cada mes se carga con una única consulta de rango
+    (get_agenda_en_rango) y queda indexado en un IndiceAgenda. Las vistas semanal y
+    mensual leen de aquí; las escrituras invalidan solo los meses afectados a través
+    de los oyentes de cambios de crm_database.
+    """
+
+    def __init__(self, db_module, max_meses=24):
+        self.db = db_module
+        self.max_meses = max_meses
+        self._indices_por_mes = {}  # {(anio, mes): IndiceAgenda}
+        self._orden_uso = []  # Para descartar los meses menos usados
+        self._generacion = 0  # Sube con cada invalidación: una carga que se cruzó con una escritura no se guarda
+        self._lock = threading.Lock()
+        self._oyentes = []
+        self.db.registrar_oyente_cambios(self._on_cambio_db)
+
+    def cerrar(self):
+        self.db.quitar_oyente_cambios(self._on_cambio_db)
+
+    # --- Consultas ---
+    def obtener_rango(self, fecha_desde, fecha_hasta):
+        """ Eventos entre dos datetime.date (inclusive), consultando la BD solo por los meses que falten. """
+        meses = _meses_entre(fecha_desde, fecha_hasta)
+        cargados = self._cargar_meses(meses)
+        desde_str, hasta_str = fecha_desde.strftime("%Y-%m-%d"), fecha_hasta.strftime("%Y-%m-%d")
+        eventos = []
+        with self._lock:
+            for am in meses:
+                indice = self._indices_por_mes.get(am) or cargados.get(am)
+                if indice is not None:
+                    eventos.extend(indice.en_rango(desde_str, hasta_str))
+                    self._marcar_uso(am)
+        return eventos
+
+    def precargar(self, fecha_desde, fecha_hasta):
+        """ Carga en caché los meses de un rango sin devolver nada (p.ej. el período siguiente). """
+        self._cargar_meses(_meses_entre(fecha_desde, fecha_hasta))
+
+    def esta_en_cache(self, fecha_desde, fecha_hasta):
+        with self._lock:
+            return all(am in self._indices_por_mes for am in _meses_entre(fecha_desde, fecha_hasta))
+
+    def _cargar_meses(self, meses):
+        """
+        Consulta los meses que falten y devuelve {(anio, mes): IndiceAgenda} con lo leído. Si mientras
+        tanto hubo una invalidación, lo leído puede ser anterior a esa escritura: se devuelve para esta
+        consulta (el oyente de la invalidación ya pidió refrescar) pero no queda en caché.
+        """
+        with self._lock:
+            faltantes = [am for am in meses if am not in self._indices_por_mes]
+            generacion = self._generacion
+        if not faltantes:
+            return {}
+        # Una sola consulta de rango que cubre todos los meses faltantes
+        desde, _ = _rango_mes(*faltantes[0])
+        _, hasta = _rango_mes(*faltantes[-1])
+        filas = self.db.get_agenda_en_rango(desde.strftime("%Y-%m-%d"), hasta.strftime("%Y-%m-%d"))
+        por_mes = {am: [] for am in faltantes}
+        for fila in filas:
+            fecha = fila.get('fecha') or ''
+            try:
+                am = (int(fecha[0:4]), int(fecha[5:7]))
+            except ValueError:
+                continue
+            if am in por_mes:
+                por_mes[am].append(fila)
+        indices = {am: IndiceAgenda(eventos) for am, eventos in por_mes.items()}
+        with self._lock:
+            if self._generacion != generacion:
+                return indices
+            for am, indice in indices.items():
+                self._indices_por_mes[am] = indice
+                self._marcar_uso(am)
+            while len(self._orden_uso) > self.max_meses:
+                self._indices_por_mes.pop(self._orden_uso.pop(0), None)
+        return indices
+
+    def _marcar_uso(self, am):
+        if am in self._orden_uso:
+            self._orden_uso.remove(am)
+        self._orden_uso.append(am)
+
+    # --- Invalidación ---
+    def invalidar_fechas(self, fechas):
+        """ Descarta los meses que contienen alguna de las fechas (YYYY-MM-DD). """
+        with self._lock:
+            self._generacion += 1
+            for fecha in fechas:
+                try:
+                    am = (int(fecha[0:4]), int(fecha[5:7]))
+                except (ValueError, TypeError):
+                    continue
+                self._indices_por_mes.pop(am, None)
+                if am in self._orden_uso:
+                    self._orden_uso.remove(am)
+
+    def invalidar_todo(self):
+        with self._lock:
+            self._generacion += 1
+            self._indices_por_mes.clear()
+            self._orden_uso.clear()
+
+    def agregar_oyente(self, callback):
+        """ callback() se llama (desde el hilo que escribió) cada vez que se invalida algo. """
+        if callback not in self._oyentes:
+            self._oyentes.append(callback)
+
+    def quitar_oyente(self, callback):
+        if callback in self._oyentes:
+            self._oyentes.remove(callback)
+
+    def _on_cambio_db(self, entidad, entidad_id, caso_id, fechas):
+        if entidad not in ('audiencia', 'tarea', 'caso', 'cliente'):
+            return
+        if fechas is None:
+            self.invalidar_todo()
+        else:
+            self.invalidar_fechas(fechas)
+        for callback in list(self._oyentes):
+            try:
+                callback()
+            except Exception as e:
+                print(f"[CacheAgenda] Error en oyente: {e}")
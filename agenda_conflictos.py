@@ -0,0 +1,116 @@
+# agenda_conflictos.py
+# Detección de superposiciones y audiencias consecutivas en juzgados distintos.
+import bisect
+import datetime
+import heapq
+
+DURACION_POR_DEFECTO_MINUTOS = 60
+# Tiempo mínimo entre dos audiencias en juzgados distintos (traslado)
+MARGEN_TRASLADO_MINUTOS = 30
+
+TIPO_SUPERPOSICION = 'superposición'
+TIPO_TRASLADO = 'sin tiempo de traslado'
+
+
+def intervalo_de(audiencia):
+    """ (inicio, fin) como datetime para una audiencia con fecha, hora y duracion_minutos. None si no tiene hora. """
+    fecha, hora = audiencia.get('fecha'), audiencia.get('hora')
+    if not fecha or not hora:
+        return None
+    try:
+        inicio = datetime.datetime.strptime(f"{fecha} {hora}", "%Y-%m-%d %H:%M")
+    except ValueError:
+        return None
+    duracion = audiencia.get('duracion_minutos') or DURACION_POR_DEFECTO_MINUTOS
+    return inicio, inicio + datetime.timedelta(minutes=int(duracion))
+
+
+def _normalizar_juzgado(juzgado):
+    return ' '.join((juzgado or '').lower().split())
+
+
+def clasificar_conflicto(a, intervalo_a, b, intervalo_b, margen_traslado=MARGEN_TRASLADO_MINUTOS):
+    """
+    Devuelve el tipo de conflicto entre dos audiencias o None.
+    Superposición: los intervalos se pisan. Traslado: juzgados distintos (y conocidos)
+    con menos de margen_traslado minutos entre una y otra.
+    """
+    (ini_a, fin_a), (ini_b, fin_b) = intervalo_a, intervalo_b
+    if ini_a < fin_b and ini_b < fin_a:
+        return TIPO_SUPERPOSICION
+    juzgado_a, juzgado_b = _normalizar_juzgado(a.get('juzgado')), _normalizar_juzgado(b.get('juzgado'))
+    if juzgado_a and juzgado_b and juzgado_a != juzgado_b:
+        hueco = (ini_b - fin_a) if ini_b >= fin_a else (ini_a - fin_b)
+        if hueco < datetime.timedelta(minutes=margen_traslado):
+            return TIPO_TRASLADO
+    return None
+
+
+class IndiceIntervalos:
+    """
+    Índice de audiencias ordenado por hora de inicio.
+    Como se conoce la duración máxima, los únicos candidatos a chocar con [inicio, fin)
+    son los que empiezan en [inicio - duracion_max - margen, fin + margen): dos bisect
+    alcanzan para acotarlos, O(log n + k).
+    """
+
+    def __init__(self, audiencias, margen_traslado=MARGEN_TRASLADO_MINUTOS):
+        self.margen = datetime.timedelta(minutes=margen_traslado)
+        self.margen_minutos = margen_traslado
+        items = []
+        for aud in audiencias:
+            intervalo = intervalo_de(aud)
+            if intervalo:
+                items.append((intervalo[0], intervalo[1], aud))
+        items.sort(key=lambda it: (it[0], it[2].get('id') or 0))
+        self._inicios = [it[0] for it in items]
+        self._items = items
+        self._duracion_max = max((fin - ini for ini, fin, _ in items), default=datetime.timedelta(0))
+
+    def __len__(self):
+        return len(self._items)
+
+    def conflictos_para(self, audiencia, excluir_id=None):
+        """ Lista de (otra_audiencia, tipo_conflicto) para una audiencia nueva o editada. """
+        intervalo = intervalo_de(audiencia)
+        if not intervalo:
+            return []
+        inicio, fin = intervalo
+        desde = bisect.bisect_left(self._inicios, inicio - self._duracion_max - self.margen)
+        hasta = bisect.bisect_left(self._inicios, fin + self.margen)
+        conflictos = []
+        for ini_otra, fin_otra, otra in self._items[desde:hasta]:
+            if excluir_id is not None and otra.get('id') == excluir_id:
+                continue
+            tipo = clasificar_conflicto(audiencia, intervalo, otra, (ini_otra, fin_otra), self.margen_minutos)
+            if tipo:
+                conflictos.append((otra, tipo))
+        return conflictos
+
+
+def reporte_conflictos(audiencias, margen_traslado=MARGEN_TRASLADO_MINUTOS):
+    """
+    Barrido ordenado sobre todo el calendario. Devuelve una lista de (a, b, tipo) con cada
+    par en conflicto una sola vez. Las audiencias activas se guardan en un heap por fin + margen,
+    así cada una se compara solo con las que todavía pueden chocar con ella.
+    """
+    margen = datetime.timedelta(minutes=margen_traslado)
+    items = []
+    for aud in audiencias:
+        intervalo = intervalo_de(aud)
+        if intervalo:
+            items.append((intervalo, aud))
+    items.sort(key=lambda it: (it[0][0], it[1].get('id') or 0))
+
+    conflictos = []
+    activas = []  # heap de (fin + margen, orden, intervalo, audiencia)
+    for orden, (intervalo, aud) in enumerate(items):
+        inicio = intervalo[0]
+        while activas and activas[0][0] <= inicio:
+            heapq.heappop(activas)
+        for _, _, intervalo_otra, otra in activas:
+            tipo = clasificar_conflicto(otra, intervalo_otra, aud, intervalo, margen_traslado)
+            if tipo:
+                conflictos.append((otra, aud, tipo))
+        heapq.heappush(activas, (intervalo[1] + margen, orden, intervalo, aud))
+    return conflictos
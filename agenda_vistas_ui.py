@@ -0,0 +1,184 @@
+# agenda_vistas_ui.py
+# Vistas semanal y mensual de la agenda (audiencias + vencimientos de tareas).
+import tkinter as tk
+from tkinter import ttk
+import datetime
+
+NOMBRES_DIAS = ['Lunes', 'Martes', 'Miércoles', 'Jueves', 'Viernes', 'Sábado', 'Domingo']
+NOMBRES_MESES = ['Enero', 'Febrero', 'Marzo', 'Abril', 'Mayo', 'Junio', 'Julio',
+                 'Agosto', 'Septiembre', 'Octubre', 'Noviembre', 'Diciembre']
+
+
+class AgendaVistasWindow(tk.Toplevel):
+    def __init__(self, parent, app_controller, *args, **kwargs):
+        super().__init__(parent, *args, **kwargs)
+        self.app_controller = app_controller
+        self.agenda_cache = app_controller.agenda_cache # Caché compartida (agenda_cache.CacheAgenda)
+        self.modo_var = tk.StringVar(value='semana')
+        self.fecha_referencia = datetime.date.today()
+        self._render_pendiente = False
+
+        self.title("Agenda - Vista Semanal / Mensual")
+        self.geometry("820x560")
+        self.minsize(600, 400)
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
+
+        self._create_widgets()
+        self.agenda_cache.agregar_oyente(self._on_cache_invalidada)
+        self._render()
+
+    def _create_widgets(self):
+        self.columnconfigure(0, weight=1)
+        self.rowconfigure(1, weight=1)
+
+        barra = ttk.Frame(self, padding=(10, 10, 10, 5))
+        barra.grid(row=0, column=0, sticky='ew')
+        ttk.Radiobutton(barra, text="Semana", value='semana', variable=self.modo_var, command=self._render).pack(side=tk.LEFT)
+        ttk.Radiobutton(barra, text="Mes", value='mes', variable=self.modo_var, command=self._render).pack(side=tk.LEFT, padx=(5, 15))
+        ttk.Button(barra, text="◀", width=3, command=lambda: self._mover(-1)).pack(side=tk.LEFT)
+        ttk.Button(barra, text="Hoy", command=self._ir_a_hoy).pack(side=tk.LEFT, padx=3)
+        ttk.Button(barra, text="▶", width=3, command=lambda: self._mover(1)).pack(side=tk.LEFT)
+        self.periodo_label = ttk.Label(barra, text="", font=('TkDefaultFont', 10, 'bold'))
+        self.periodo_label.pack(side=tk.LEFT, padx=15)
+        self.resumen_label = ttk.Label(barra, text="")
+        self.resumen_label.pack(side=tk.RIGHT)
+
+        tree_frame = ttk.Frame(self, padding=(10, 0, 10, 10))
+        tree_frame.grid(row=1, column=0, sticky='nsew')
+        tree_frame.columnconfigure(0, weight=1)
+        tree_frame.rowconfigure(0, weight=1)
+
+        cols = ('Hora', 'Tipo', 'Descripción', 'Caso', 'Estado')
+        self.agenda_tree = ttk.Treeview(tree_frame, columns=cols, show='tree headings', selectmode='browse')
+        self.agenda_tree.heading('#0', text='Día')
+        self.agenda_tree.column('#0', width=170, stretch=tk.NO)
+        self.agenda_tree.heading('Hora', text='Hora')
+        self.agenda_tree.column('Hora', width=55, stretch=tk.NO, anchor=tk.CENTER)
+        self.agenda_tree.heading('Tipo', text='Tipo')
+        self.agenda_tree.column('Tipo', width=80, stretch=tk.NO)
+        self.agenda_tree.heading('Descripción', text='Descripción')
+        self.agenda_tree.column('Descripción', width=260)
+        self.agenda_tree.heading('Caso', text='Caso')
+        self.agenda_tree.column('Caso', width=180)
+        self.agenda_tree.heading('Estado', text='Estado')
+        self.agenda_tree.column('Estado', width=90, stretch=tk.NO)
+        self.agenda_tree.tag_configure('dia', background='#EEF3FA')
+        self.agenda_tree.tag_configure('hoy', background='#FFF4C2')
+        self.agenda_tree.tag_configure('plazo', foreground='#B00020')
+
+        scroll_y = ttk.Scrollbar(tree_frame, orient=tk.VERTICAL, command=self.agenda_tree.yview)
+        self.agenda_tree.configure(yscrollcommand=scroll_y.set)
+        self.agenda_tree.grid(row=0, column=0, sticky='nsew')
+        scroll_y.grid(row=0, column=1, sticky='ns')
+        self.agenda_tree.bind("<Double-1>", self._on_double_click)
+
+    # --- Período ---
+    def _rango_periodo(self, fecha_ref=None):
+        """ (desde, hasta) como datetime.date para el modo actual. La semana empieza el lunes. """
+        fecha_ref = fecha_ref or self.fecha_referencia
+        if self.modo_var.get() == 'semana':
+            desde = fecha_ref - datetime.timedelta(days=fecha_ref.weekday())
+            return desde, desde + datetime.timedelta(days=6)
+        desde = fecha_ref.replace(day=1)
+        siguiente = datetime.date(desde.year + (desde.month == 12), desde.month % 12 + 1, 1)
+        return desde, siguiente - datetime.timedelta(days=1)
+
+    def _desplazar(self, fecha_ref, pasos):
+        if self.modo_var.get() == 'semana':
+            return fecha_ref + datetime.timedelta(weeks=pasos)
+        mes = fecha_ref.month - 1 + pasos
+        return datetime.date(fecha_ref.year + mes // 12, mes % 12 + 1, 1)
+
+    def _mover(self, pasos):
+        self.fecha_referencia = self._desplazar(self.fecha_referencia, pasos)
+        self._render()
+
+    def _ir_a_hoy(self):
+        self.fecha_referencia = datetime.date.today()
+        self._render()
+
+    # --- Renderizado ---
+    def _render(self):
+        self._render_pendiente = False
+        desde, hasta = self._rango_periodo()
+        eventos = self.agenda_cache.obtener_rango(desde, hasta)
+
+        if self.modo_var.get() == 'semana':
+            self.periodo_label.config(text=f"Semana del {desde.strftime('%d/%m/%Y')} al {hasta.strftime('%d/%m/%Y')}")
+        else:
+            self.periodo_label.config(text=f"{NOMBRES_MESES[desde.month - 1]} {desde.year}")
+        n_aud = sum(1 for ev in eventos if ev.get('tipo') == 'audiencia')
+        self.resumen_label.config(text=f"{n_aud} audiencias, {len(eventos) - n_aud} vencimientos")
+
+        self.agenda_tree.delete(*self.agenda_tree.get_children())
+        eventos_por_fecha = {}
+        for ev in eventos:
+            eventos_por_fecha.setdefault(ev.get('fecha'), []).append(ev)
+
+        hoy = datetime.date.today()
+        dia = desde
+        while dia <= hasta:
+            fecha_str = dia.strftime("%Y-%m-%d")
+            eventos_dia = eventos_por_fecha.get(fecha_str, [])
+            # En la vista mensual se omiten los días sin eventos para que la lista sea legible
+            if eventos_dia or self.modo_var.get() == 'semana':
+                tags = ('hoy',) if dia == hoy else ('dia',)
+                texto_dia = f"{NOMBRES_DIAS[dia.weekday()]} {dia.strftime('%d/%m')}"
+                nodo_dia = self.agenda_tree.insert('', tk.END, iid=f"dia_{fecha_str}", text=texto_dia, open=True, tags=tags)
+                for ev in eventos_dia:
+                    self._insertar_evento(nodo_dia, ev)
+            dia += datetime.timedelta(days=1)
+
+        # Precargar el período siguiente y el anterior para que la navegación no consulte la BD
+        self.after_idle(self._precargar_adyacentes)
+
+    def _insertar_evento(self, nodo_dia, ev):
+        desc_full = ev.get('descripcion') or ''
+        desc_corta = desc_full.split('\n')[0][:70] + ('...' if len(desc_full) > 70 else '')
+        caso_full = ev.get('caso_caratula') or 'Sin caso'
+        caso_corto = caso_full[:40] + ('...' if len(caso_full) > 40 else '')
+        if ev.get('tipo') == 'audiencia':
+            valores = (ev.get('hora') or '--:--', 'Audiencia', desc_corta, caso_corto, '')
+            tags = ()
+        else:
+            tipo = 'Plazo' if ev.get('es_plazo_procesal') else 'Tarea'
+            valores = ('', tipo, desc_corta, caso_corto, ev.get('estado') or '')
+            tags = ('plazo',) if ev.get('es_plazo_procesal') else ()
+        self.agenda_tree.insert(nodo_dia, tk.END, iid=f"{ev.get('tipo')}_{ev.get('id')}", values=valores, tags=tags)
+
+    def _precargar_adyacentes(self):
+        if not self.winfo_exists():
+            return
+        for pasos in (1, -1):
+            self.agenda_cache.precargar(*self._rango_periodo(self._desplazar(self.fecha_referencia, pasos)))
+
+    def _on_cache_invalidada(self):
+        # Puede llegar varias veces seguidas (p.ej. al editar una tarea): se agrupa en un solo redibujado
+        if self._render_pendiente:
+            return
+        self._render_pendiente = True
+        try:
+            self.after(50, self._render)
+        except tk.TclError:
+            pass
+
+    # --- Acciones ---
+    def _on_double_click(self, event):
+        iid = self.agenda_tree.focus()
+        if not iid or iid.startswith('dia_'):
+            return
+        tipo, _, id_str = iid.partition('_')
+        try:
+            entidad_id = int(id_str)
+        except ValueError:
+            return
+        if tipo == 'audiencia':
+            self.app_controller.abrir_dialogo_audiencia(entidad_id)
+        elif tipo == 'tarea':
+            tarea = self.app_controller.db_crm.get_tarea_by_id(entidad_id)
+            if tarea:
+                self.app_controller.open_tarea_dialog(tarea_id=entidad_id, caso_id=tarea.get('caso_id'))
+
+    def on_close(self):
+        self.agenda_cache.quitar_oyente(self._on_cache_invalidada)
+        self.destroy()
@@ -0,0 +1,119 @@
+# bench_cliente_ia.py
+# Prueba de carga del cliente del Asistente IA: N pedidos con C hilos concurrentes sobre una misma
+# ClienteIA (como la aplicación), y reporte de latencias (p50/p90/p95/p99), primer fragmento en modo
+# stream, rendimiento y cómo terminó cada pedido (ok, 503, timeout, disyuntor abierto...).
+# Uso:
+#   python bench_cliente_ia.py -n 200 -c 8                    # contra servidor_ia_simulado en un hilo
+#   python bench_cliente_ia.py -n 200 -c 8 --stream --tasa-error 0.1 --paralelo 2 --max-cola 4
+#   python bench_cliente_ia.py -n 50 -c 2 --url http://localhost:5000   # contra un servidor real
+# Las opciones del simulador (latencia, errores, capacidad) se ignoran con --url.
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+DIRECTORIO_BASE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, DIRECTORIO_BASE)
+
+from cliente_ia import ClienteIA, Disyuntor, ErrorIA, IAErrorHTTP
+from servidor_ia_simulado import ServidorEnHilo, argumentos_configuracion, configuracion_desde
+
+TEXTO_HECHOS = ("El día 3 de marzo el actor fue notificado de su despido por WhatsApp, sin expresión de causa. "
+                "Reclamó las sumas adeudadas por telegrama y la empresa no contestó. ") * 3
+
+
+def percentil(valores_ordenados, p):
+    """ Percentil por rango más cercano (p entre 0 y 100) de una lista ya ordenada. """
+    if not valores_ordenados:
+        return 0.0
+    indice = max(0, min(len(valores_ordenados) - 1, int(round(p / 100 * len(valores_ordenados) + 0.5)) - 1))
+    return valores_ordenados[indice]
+
+
+def _resultado_de(error):
+    if error is None:
+        return "ok"
+    if isinstance(error, IAErrorHTTP):
+        return f"HTTP {error.estado}"
+    return type(error).__name__
+
+
+def _un_pedido(cliente, stream):
+    inicio = time.perf_counter()
+    ttft, error = None, None
+    try:
+        if stream:
+            ttft = cliente.reformular_hechos_stream(TEXTO_HECHOS, lambda _fragmento: None)['ttft_s']
+        else:
+            respuesta = cliente.reformular_hechos(TEXTO_HECHOS)
+            if 'hechos_reformulados' not in respuesta:
+                raise ErrorIA(respuesta.get('error', 'respuesta sin contenido'))
+    except Exception as e: # Cualquier otra excepción (no solo ErrorIA) también es un pedido fallido
+        error = e
+    return time.perf_counter() - inicio, ttft, _resultado_de(error)
+
+
+def _linea_latencias(nombre, segundos):
+    ms = sorted(s * 1000 for s in segundos)
+    if not ms:
+        return f"  {nombre:<20} (sin datos)"
+    return (f"  {nombre:<20} p50 {percentil(ms, 50):>8.1f}  p90 {percentil(ms, 90):>8.1f}  p95 {percentil(ms, 95):>8.1f}  "
+            f"p99 {percentil(ms, 99):>8.1f}  máx {ms[-1]:>8.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prueba de carga del cliente del Asistente IA.")
+    parser.add_argument('-n', '--pedidos', type=int, default=100)
+    parser.add_argument('-c', '--concurrencia', type=int, default=4)
+    parser.add_argument('--stream', action='store_true', help="usar reformular_hechos_stream")
+    parser.add_argument('--url', default=None, help="servidor existente; sin esto se levanta el simulado")
+    parser.add_argument('--timeout-lectura', type=float, default=None)
+    parser.add_argument('--reintentos', type=int, default=None)
+    parser.add_argument('--sin-disyuntor', action='store_true', help="no cortar tras fallos de conexión seguidos")
+    argumentos_configuracion(parser)
+    args = parser.parse_args()
+
+    servidor = None
+    url = args.url
+    if url is None:
+        servidor = ServidorEnHilo(configuracion_desde(args)).iniciar()
+        url = servidor.url
+        print(f"Servidor simulado en {url} (paralelo {args.paralelo}, cola {args.max_cola}, latencia {args.latencia_ms:.0f}±{args.jitter_ms:.0f} ms, "
+              f"errores {args.tasa_error:.0%}, colgados {args.tasa_colgado:.0%}, cortes {args.tasa_corte:.0%})")
+    opciones = {}
+    if args.timeout_lectura is not None: opciones['timeout_lectura'] = args.timeout_lectura
+    if args.reintentos is not None: opciones['max_reintentos'] = args.reintentos
+    if args.sin_disyuntor: opciones['disyuntor'] = Disyuntor(umbral_fallos=10 ** 9)
+    cliente = ClienteIA(url, **opciones)
+
+    print(f"{args.pedidos} pedidos {'en stream ' if args.stream else ''}con {args.concurrencia} hilos...")
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrencia) as pool:
+        resultados = list(pool.map(lambda _i: _un_pedido(cliente, args.stream), range(args.pedidos)))
+    total = time.perf_counter() - inicio
+
+    conteo = {}
+    for _segundos, _ttft, resultado in resultados:
+        conteo[resultado] = conteo.get(resultado, 0) + 1
+    exitosos = conteo.get("ok", 0)
+    print(f"\nTiempo total {total:.2f} s; {args.pedidos / total:.1f} pedidos/s, {exitosos / total:.1f} exitosos/s")
+    print("Resultados: " + ", ".join(f"{nombre} {n} ({n / args.pedidos:.0%})" for nombre, n in sorted(conteo.items(), key=lambda x: -x[1])))
+    print("\nLatencias (incluye esperas de reintentos):")
+    print(_linea_latencias("exitosos", [s for s, _t, r in resultados if r == "ok"]))
+    print(_linea_latencias("fallidos", [s for s, _t, r in resultados if r != "ok"]))
+    if args.stream:
+        print(_linea_latencias("primer fragmento", [t for _s, t, r in resultados if r == "ok" and t is not None]))
+    print(f"\nDisyuntor: {cliente.disyuntor.estado}")
+    print("Métricas del cliente (por intento HTTP, últimos 200):")
+    for endpoint, datos in cliente.resumen_metricas()['endpoints'].items():
+        print(f"  {endpoint:<44} {datos['pedidos']:>5} pedidos  {datos['fallos']:>4} fallos  p50 {datos['p50_ms']:>8.1f}  p95 {datos['p95_ms']:>8.1f} ms")
+    if servidor is not None:
+        stats = servidor.estadisticas
+        print("Servidor: " + ", ".join(f"{clave} {valor}" for clave, valor in stats.items() if clave not in ('en_curso', 'en_cola')))
+        servidor.detener()
+    cliente.cerrar()
+
+
+if __name__ == "__main__":
+    main()
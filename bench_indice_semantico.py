@@ -0,0 +1,64 @@
+# bench_indice_semantico.py
+# Mide la búsqueda del índice semántico sobre muchos vectores (por defecto 1.000.000 de 256 dimensiones,
+# ~1 GB): llena un archivo de vectores aleatorios normalizados en un directorio temporal y toma el tiempo
+# de buscar los 50 más parecidos en todo el índice y dentro de un caso. No necesita el Asistente IA.
+# Uso: python bench_indice_semantico.py [cantidad] [dimension]
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+DIRECTORIO_BASE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, DIRECTORIO_BASE)
+
+from indice_semantico import AlmacenVectores
+
+TAM_BLOQUE = 100_000
+CASOS = 5000
+REPETICIONES = 10
+
+
+def _poblar(almacen, cantidad, generador):
+    for inicio in range(0, cantidad, TAM_BLOQUE):
+        n = min(TAM_BLOQUE, cantidad - inicio)
+        vectores = generador.standard_normal((n, almacen.dimension), dtype=np.float32)
+        vectores /= np.linalg.norm(vectores, axis=1, keepdims=True)
+        almacen.escribir(almacen.reservar(n), vectores, generador.integers(1, CASOS + 1, n))
+    almacen.sincronizar()
+
+
+def _medir(nombre, funcion):
+    tiempos = []
+    for _ in range(REPETICIONES):
+        inicio = time.perf_counter()
+        resultado = funcion()
+        tiempos.append(time.perf_counter() - inicio)
+    tiempos.sort()
+    print(f"  {nombre:<32} mejor {tiempos[0] * 1000:>8.1f} ms  mediana {tiempos[len(tiempos) // 2] * 1000:>8.1f} ms  ({len(resultado)} resultados)")
+
+
+def main():
+    cantidad = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    dimension = int(sys.argv[2]) if len(sys.argv) > 2 else 256
+    generador = np.random.default_rng(42)
+    with tempfile.TemporaryDirectory() as directorio:
+        almacen = AlmacenVectores(os.path.join(directorio, 'bench.vectores.f32'), dimension)
+        inicio = time.perf_counter()
+        _poblar(almacen, cantidad, generador)
+        print(f"{cantidad} vectores de {dimension} dimensiones ({almacen.capacidad * dimension * 4 / 1024 ** 2:.0f} MB en disco), "
+              f"cargados en {time.perf_counter() - inicio:.1f} s")
+        esperada = cantidad // 2 + 1 # No está entre las filas que se liberan abajo
+        consulta = almacen.matriz[esperada] + np.float32(0.1) * generador.standard_normal(dimension, dtype=np.float32)
+        consulta /= np.linalg.norm(consulta)
+        almacen.liberar(range(0, cantidad, 10)) # Un 10% de filas libres, como tras ediciones y borrados
+        _medir("50 mejores en todo el índice", lambda: almacen.buscar(consulta, 50))
+        _medir("50 mejores dentro de un caso", lambda: almacen.buscar(consulta, 50, caso_id=1))
+        mejor = almacen.buscar(consulta, 1)[0]
+        print(f"El más parecido es la fila {mejor[0]} (esperada {esperada}), similitud {mejor[1]:.3f}")
+        almacen.matriz = None # Suelta el mapeo antes de borrar el directorio
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+# bench_registros.py
+# Compara memoria y tiempo de las consultas de listas con dict(row) contra registros compactos.
+# Uso: python bench_registros.py [cantidad_clientes] [cantidad_actividades]
+# Trabaja sobre una base temporal; no toca crm_legal.db.
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+DIRECTORIO_BASE = os.path.dirname(os.path.abspath(__file__))
+
+
+def _poblar(db, n_clientes, n_actividades):
+    conn = db.connect_db()
+    cursor = conn.cursor()
+    ahora = int(time.time())
+    cursor.executemany(
+        "INSERT INTO clientes (nombre, direccion, email, whatsapp, created_at) VALUES (?, ?, ?, ?, ?)",
+        ((f"Cliente {i:06d}", f"Calle {i} 123, CABA", f"cliente{i}@mail.com", f"+54911{i:08d}", ahora) for i in range(n_clientes)))
+    cursor.execute("INSERT INTO casos (cliente_id, caratula, created_at) VALUES (1, 'Caso de prueba c/ Otro s/ Daños', ?)", (ahora,))
+    caso_id = cursor.lastrowid
+    descripcion = "Se presentó escrito solicitando se provea la prueba ofrecida. " * 8
+    cursor.executemany(
+        "INSERT INTO actividades_caso (caso_id, fecha_hora, tipo_actividad, descripcion, creado_por) VALUES (?, ?, ?, ?, ?)",
+        ((caso_id, f"2024-{(i % 12) + 1:02d}-{(i % 28) + 1:02d} {i % 24:02d}:{i % 60:02d}:00", "Escrito Presentado", descripcion, "bench")
+         for i in range(n_actividades)))
+    conn.commit()
+    conn.close()
+    return caso_id
+
+
+def _medir(nombre, funcion, repeticiones=5):
+    # Tiempo: mejor de N corridas. Memoria: pico de tracemalloc en una corrida con el resultado vivo.
+    mejor = float('inf')
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        resultado = funcion()
+        mejor = min(mejor, time.perf_counter() - inicio)
+        del resultado
+    tracemalloc.start()
+    resultado = funcion()
+    retenido, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    filas = len(resultado)
+    del resultado
+    print(f"  {nombre:<42} {filas:>7} filas  {mejor * 1000:>9.1f} ms  retenido {retenido / 1024 / 1024:>7.2f} MiB  pico {pico / 1024 / 1024:>7.2f} MiB")
+
+
+def main():
+    n_clientes = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    n_actividades = int(sys.argv[2]) if len(sys.argv) > 2 else 50000
+
+    directorio_tmp = tempfile.mkdtemp(prefix="bench_crm_")
+    os.chdir(directorio_tmp) # crm_database crea su archivo en el directorio actual al importarse
+    sys.path.insert(0, DIRECTORIO_BASE)
+    import crm_database as db
+
+    print(f"Poblando base temporal en {directorio_tmp} ({n_clientes} clientes, {n_actividades} actividades)...")
+    caso_id = _poblar(db, n_clientes, n_actividades)
+
+    print("\nget_clients:")
+    _medir("dict(row) (actual)", lambda: db.get_clients())
+    _medir("compacto", lambda: db.get_clients(compacto=True))
+    _medir("compacto + columnas (id, nombre)", lambda: db.get_clients(compacto=True, columnas=('id', 'nombre')))
+
+    print("\nget_actividades_by_caso_id:")
+    _medir("dict(row) (actual)", lambda: db.get_actividades_by_caso_id(caso_id))
+    _medir("compacto", lambda: db.get_actividades_by_caso_id(caso_id, compacto=True))
+    _medir("compacto + columnas de la lista", lambda: db.get_actividades_by_caso_id(
+        caso_id, compacto=True, columnas=('id', 'fecha_hora', 'tipo_actividad', 'descripcion_corta')))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+# bench_treeview_sync.py
+# Compara recargar un ttk.Treeview completo (borrar todo y volver a insertar) contra
+# sincronizarlo con SincronizadorTreeview después de cambios chicos, y mide también los casos
+# grandes: la carga inicial y un reordenamiento completo (p.ej. ordenar por otra columna).
+# Uso: python bench_treeview_sync.py [cantidad_filas]   (necesita entorno gráfico)
+import random
+import sys
+import time
+import tkinter as tk
+from tkinter import ttk
+
+from treeview_sync import SincronizadorTreeview
+
+
+def _modelo(n):
+    return [(f"cli_{i}", (i, f"Cliente {i:06d}", f"cliente{i}@mail.com")) for i in range(n)]
+
+
+def _recarga_completa(tree, filas):
+    hijos = tree.get_children()
+    if hijos:
+        tree.delete(*hijos)
+    for iid, values in filas:
+        tree.insert('', tk.END, iid=iid, values=values)
+
+
+def _medir(root, nombre, funcion, repeticiones=3):
+    mejor = float('inf')
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion()
+        root.update_idletasks() # Incluye el redibujado que dispara cada cambio
+        mejor = min(mejor, time.perf_counter() - inicio)
+    print(f"  {nombre:<48} {mejor * 1000:>9.1f} ms")
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    try:
+        root = tk.Tk()
+    except tk.TclError as e:
+        print(f"No se pudo abrir una ventana de Tk ({e}). Este benchmark necesita entorno gráfico.")
+        return
+    root.geometry("600x400")
+    tree = ttk.Treeview(root, columns=('ID', 'Nombre', 'Email'), show='headings')
+    tree.pack(fill=tk.BOTH, expand=True)
+    root.update()
+
+    base = _modelo(n)
+    sincronizador = SincronizadorTreeview(tree)
+    print(f"Treeview con {n} filas:")
+
+    def carga_inicial():
+        sincronizador.limpiar()
+        sincronizador.sincronizar(base)
+    _medir(root, "recarga completa (sin cambios)", lambda: _recarga_completa(tree, base))
+    _medir(root, "sincronizar (carga inicial, Treeview vacío)", carga_inicial)
+    sincronizador.limpiar()
+    sincronizador.sincronizar(base)
+    _medir(root, "sincronizar (sin cambios)", lambda: sincronizador.sincronizar(base))
+
+    una_editada = list(base)
+    una_editada[n // 2] = (una_editada[n // 2][0], (n // 2, "Cliente renombrado", "nuevo@mail.com"))
+    _medir(root, "recarga completa (1 fila editada)", lambda: _recarga_completa(tree, una_editada))
+    sincronizador.limpiar()
+    sincronizador.sincronizar(base)
+    _medir(root, "sincronizar (1 fila editada)", lambda: (sincronizador.sincronizar(base), sincronizador.sincronizar(una_editada)), repeticiones=1)
+    _medir(root, "actualizar_fila (1 fila editada)", lambda: sincronizador.actualizar_fila(*una_editada[n // 2]))
+
+    alta = base[:n // 3] + [("cli_nuevo", (n, "Cliente nuevo", ""))] + base[n // 3:]
+    sincronizador.limpiar()
+    sincronizador.sincronizar(base)
+    _medir(root, "recarga completa (1 alta en el medio)", lambda: _recarga_completa(tree, alta))
+    sincronizador.limpiar()
+    sincronizador.sincronizar(base)
+    _medir(root, "sincronizar (1 alta en el medio)", lambda: sincronizador.sincronizar(alta), repeticiones=1)
+
+    random.seed(1)
+    uno_por_ciento = list(base)
+    for i in random.sample(range(n), max(1, n // 100)):
+        uno_por_ciento[i] = (uno_por_ciento[i][0], (i, f"Editado {i}", ""))
+    sincronizador.limpiar()
+    sincronizador.sincronizar(base)
+    _medir(root, "recarga completa (1% editado)", lambda: _recarga_completa(tree, uno_por_ciento))
+    sincronizador.limpiar()
+    sincronizador.sincronizar(base)
+    _medir(root, "sincronizar (1% editado)", lambda: sincronizador.sincronizar(uno_por_ciento), repeticiones=1)
+
+    # Reordenamiento completo: por nombre descendente (todo invertido) y un orden al azar
+    invertido = base[::-1]
+    mezclado = list(base)
+    random.shuffle(mezclado)
+    for nombre, orden in (("invertido", invertido), ("al azar", mezclado)):
+        sincronizador.limpiar()
+        sincronizador.sincronizar(base)
+        _medir(root, f"recarga completa (reordenado {nombre})", lambda: _recarga_completa(tree, orden))
+        sincronizador.limpiar()
+        sincronizador.sincronizar(base)
+        _medir(root, f"sincronizar (reordenado {nombre})", lambda: sincronizador.sincronizar(orden), repeticiones=1)
+
+    root.destroy()
+
+
+if __name__ == "__main__":
+    main()
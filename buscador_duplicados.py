@@ -0,0 +1,152 @@
+# buscador_duplicados.py
+# Documentos duplicados entre las carpetas de todos los casos, con la estrategia de fdupes:
+#   1. Tamaño: solo son candidatos los archivos cuyo tamaño se repite (sale del índice, sin tocar el disco).
+#   2. Hash parcial: primeros BYTES_PARCIAL de cada candidato; descarta la mayoría sin leer archivos enteros.
+#   3. Hash completo: solo de los que siguen coincidiendo, con lecturas grandes en un buffer reutilizado.
+# Los hashes completos se guardan en documentos.hash (el índice los borra si cambian tamaño o mtime),
+# así una segunda búsqueda solo lee los archivos nuevos o modificados.
+import hashlib
+import os
+import time
+from collections import defaultdict
+
+TAMANO_MINIMO = 1024 # Archivos más chicos no valen la pena (y suelen ser accesos directos, etc.)
+BYTES_PARCIAL = 64 * 1024
+TAMANO_BUFFER = 1024 * 1024
+
+
+def _hasher():
+    return hashlib.blake2b(digest_size=20) # Más rápido que sha256 en CPython y sin colisiones prácticas
+
+
+def hash_parcial(ruta):
+    """ Hash del comienzo del archivo; si es más chico que BYTES_PARCIAL es también su hash completo. """
+    with open(ruta, 'rb', buffering=0) as f:
+        datos = f.read(BYTES_PARCIAL)
+    h = _hasher(); h.update(datos)
+    return h.hexdigest()
+
+
+def hash_completo(ruta, token=None, buffer=None):
+    """ Hash de todo el contenido, leyendo en bloques de TAMANO_BUFFER sobre un buffer reutilizable. """
+    buffer = buffer or bytearray(TAMANO_BUFFER)
+    vista = memoryview(buffer)
+    h = _hasher()
+    with open(ruta, 'rb', buffering=0) as f:
+        while True:
+            if token is not None: token.verificar()
+            leidos = f.readinto(buffer)
+            if not leidos: break
+            h.update(vista[:leidos])
+    return h.hexdigest()
+
+
+class BuscadorDuplicados:
+    """
+    buscar(token=None, al_progreso=None) -> lista de grupos, de mayor a menor espacio recuperable:
+      {'hash', 'tamano', 'recuperable', 'archivos': [{'id', 'caso_id', 'caratula', 'ruta'}]}
+    Pensado para correr en un hilo del cargador asíncrono; al_progreso(texto) recibe avisos de avance.
+    """
+
+    def __init__(self, db, indice, tamano_minimo=TAMANO_MINIMO):
+        self.db = db
+        self.indice = indice
+        self.tamano_minimo = tamano_minimo
+        self.stats = {}
+
+    def buscar(self, token=None, al_progreso=None):
+        avisar = al_progreso or (lambda texto: None)
+        inicio = time.perf_counter()
+        self.stats = {'candidatos': 0, 'hash_parcial': 0, 'hash_completo': 0, 'hash_en_cache': 0, 'bytes_leidos': 0}
+
+        # El índice tiene tamaño/mtime de cada archivo: primero se lo pone al día caso por caso
+        casos = self.db.get_casos_con_carpeta()
+        caratulas = {caso_id: caratula for caso_id, caratula, _raiz in casos}
+        for n, (caso_id, caratula, raiz) in enumerate(casos, 1):
+            if token is not None: token.verificar()
+            avisar(f"Actualizando índice de carpetas ({n}/{len(casos)}): {caratula[:50]}")
+            futuro = self.indice.actualizar_caso_en_segundo_plano(caso_id, raiz)
+            if futuro is not None: futuro.result()
+
+        # 1. Por tamaño
+        por_tamano = defaultdict(list)
+        for doc_id, caso_id, ruta, tamano, mtime, hash_guardado in self.db.get_documentos_mismo_tamano(self.tamano_minimo):
+            por_tamano[tamano].append((doc_id, caso_id, ruta, mtime, hash_guardado))
+        self.stats['candidatos'] = sum(len(g) for g in por_tamano.values())
+
+        grupos, hashes_nuevos = [], []
+        buffer = bytearray(TAMANO_BUFFER)
+        for n, (tamano, archivos) in enumerate(por_tamano.items(), 1):
+            if token is not None: token.verificar()
+            if n % 20 == 0: avisar(f"Comparando contenido: grupo {n}/{len(por_tamano)} por tamaño...")
+            archivos = self._vigentes(archivos, tamano)
+            if len(archivos) < 2: continue
+            # 2. Hash parcial (se salta si todos ya tienen hash completo guardado)
+            if all(a[4] for a in archivos):
+                subgrupos = [archivos]
+            else:
+                por_parcial = defaultdict(list)
+                for archivo in archivos:
+                    try:
+                        por_parcial[hash_parcial(archivo[2])].append(archivo)
+                    except OSError as e:
+                        print(f"[Duplicados] No se pudo leer {archivo[2]}: {e}")
+                        continue
+                    self.stats['hash_parcial'] += 1; self.stats['bytes_leidos'] += min(tamano, BYTES_PARCIAL)
+                subgrupos = [g for g in por_parcial.values() if len(g) > 1]
+            # 3. Hash completo
+            for subgrupo in subgrupos:
+                por_hash = defaultdict(list)
+                for doc_id, caso_id, ruta, mtime, hash_guardado in subgrupo:
+                    if hash_guardado:
+                        self.stats['hash_en_cache'] += 1
+                        valor = hash_guardado
+                    else:
+                        try:
+                            valor = hash_parcial(ruta) if tamano <= BYTES_PARCIAL else hash_completo(ruta, token, buffer)
+                        except OSError as e:
+                            print(f"[Duplicados] No se pudo leer {ruta}: {e}")
+                            continue
+                        self.stats['hash_completo'] += 1; self.stats['bytes_leidos'] += tamano
+                        hashes_nuevos.append((doc_id, tamano, mtime, valor))
+                    por_hash[valor].append({'id': doc_id, 'caso_id': caso_id, 'caratula': caratulas.get(caso_id, ''), 'ruta': ruta})
+                for valor, iguales in por_hash.items():
+                    if len(iguales) > 1:
+                        grupos.append({'hash': valor, 'tamano': tamano, 'archivos': iguales,
+                                       'recuperable': tamano * (len(iguales) - 1)})
+            if len(hashes_nuevos) >= 200:
+                self._guardar_hashes(hashes_nuevos); hashes_nuevos = []
+        self._guardar_hashes(hashes_nuevos)
+
+        grupos.sort(key=lambda g: g['recuperable'], reverse=True)
+        self.stats['grupos'] = len(grupos)
+        self.stats['recuperable'] = sum(g['recuperable'] for g in grupos)
+        print(f"[Duplicados] {self.stats} ({(time.perf_counter() - inicio):.1f} s)")
+        return grupos
+
+    @staticmethod
+    def _vigentes(archivos, tamano):
+        """
+        Descarta los que ya no coinciden con el disco (el índice puede estar atrasado) y deja uno solo
+        por inodo: los enlaces duros ya comparten el espacio, borrar uno no recupera nada.
+        """
+        vigentes, inodos = [], set()
+        for archivo in archivos:
+            try:
+                st = os.stat(archivo[2])
+            except OSError:
+                continue
+            if st.st_size != tamano: continue
+            if st.st_mtime != archivo[3]: # Modificado con el mismo tamaño: el hash guardado ya no sirve
+                archivo = archivo[:3] + (st.st_mtime, None)
+            if st.st_ino:
+                clave = (st.st_dev, st.st_ino)
+                if clave in inodos: continue
+                inodos.add(clave)
+            vigentes.append(archivo)
+        return vigentes
+
+    def _guardar_hashes(self, hashes):
+        if not hashes: return
+        futuro = self.indice.encolar_escritura(self.db.guardar_hashes_documentos, list(hashes))
+        if futuro is not None: futuro.result()
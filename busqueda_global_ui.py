@@ -0,0 +1,173 @@
+# busqueda_global_ui.py
+# Búsqueda global: clientes, casos y contenido de documentos (tabla FTS5 documentos_texto que llena
+# indexador_texto). Las consultas corren en el cargador asíncrono; mientras se escribe solo se
+# aplica la última.
+# "Por significado" busca en cambio en el índice semántico (actividades, notas y documentos por
+# similitud de embeddings), para encontrar lo mismo dicho con otras palabras.
+import tkinter as tk
+from tkinter import ttk
+
+import crm_database as db
+
+DEMORA_BUSQUEDA_MS = 250
+DEMORA_BUSQUEDA_SEMANTICA_MS = 600 # Cada búsqueda por significado es un pedido al Asistente IA
+LIMITE_POR_GRUPO = 100
+LIMITE_SEMANTICO = 50
+ORIGENES_SEMANTICOS = {'actividad': "Actividad", 'nota': "Notas", 'documento': "Documento"}
+
+
+def _buscar(texto):
+    return {
+        'clientes': db.buscar_clientes_por_texto(texto, limite=LIMITE_POR_GRUPO),
+        'casos': db.buscar_casos_por_texto(texto, limite=LIMITE_POR_GRUPO),
+        'documentos': db.buscar_texto_documentos(texto, limite=LIMITE_POR_GRUPO),
+    }
+
+
+class BusquedaGlobalWindow(tk.Toplevel):
+    def __init__(self, parent, app_controller, *args, **kwargs):
+        super().__init__(parent, *args, **kwargs)
+        self.app_controller = app_controller
+        self.texto_var = tk.StringVar()
+        self._after_busqueda = None
+        self._resultados = {} # {iid: ('cliente'|'caso'|'documento'|'semantico', dict)}
+        self.semantica_var = tk.BooleanVar(value=False)
+
+        self.title("Búsqueda Global")
+        self.geometry("860x560")
+        self.minsize(560, 360)
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
+
+        self._create_widgets()
+        self.entrada.focus_set()
+
+    def _create_widgets(self):
+        self.columnconfigure(0, weight=1)
+        self.rowconfigure(1, weight=1)
+
+        barra = ttk.Frame(self, padding=(10, 10, 10, 5))
+        barra.grid(row=0, column=0, sticky='ew')
+        barra.columnconfigure(1, weight=1)
+        ttk.Label(barra, text="Buscar:").grid(row=0, column=0, padx=(0, 5))
+        self.entrada = ttk.Entry(barra, textvariable=self.texto_var)
+        self.entrada.grid(row=0, column=1, sticky='ew')
+        self.entrada.bind('<Return>', lambda e: self._buscar_ahora())
+        self.texto_var.trace_add('write', self._on_texto)
+        ttk.Checkbutton(barra, text="Por significado", variable=self.semantica_var, command=self._buscar_ahora).grid(row=0, column=2, padx=(8, 0))
+        self.resumen_label = ttk.Label(barra, text="Clientes, casos y contenido de documentos (.docx, .txt, .rtf, .pdf)", foreground="gray")
+        self.resumen_label.grid(row=1, column=0, columnspan=3, sticky=tk.W, pady=(4, 0))
+
+        tree_frame = ttk.Frame(self, padding=(10, 0, 10, 10))
+        tree_frame.grid(row=1, column=0, sticky='nsew')
+        tree_frame.columnconfigure(0, weight=1)
+        tree_frame.rowconfigure(0, weight=1)
+
+        cols = ('Detalle',)
+        self.resultados_tree = ttk.Treeview(tree_frame, columns=cols, show='tree headings', selectmode='browse')
+        self.resultados_tree.heading('#0', text='Resultado')
+        self.resultados_tree.column('#0', width=300)
+        self.resultados_tree.heading('Detalle', text='Detalle')
+        self.resultados_tree.column('Detalle', width=520)
+        scroll_y = ttk.Scrollbar(tree_frame, orient=tk.VERTICAL, command=self.resultados_tree.yview)
+        self.resultados_tree.configure(yscrollcommand=scroll_y.set)
+        self.resultados_tree.grid(row=0, column=0, sticky='nsew')
+        scroll_y.grid(row=0, column=1, sticky='ns')
+        self.resultados_tree.bind('<Double-1>', self._on_doble_click)
+        self.resultados_tree.bind('<Return>', self._on_doble_click)
+
+        ttk.Label(self, text="Doble clic: cliente -> seleccionarlo, caso, actividad o notas -> abrir detalle del caso, documento -> abrir archivo.",
+                  foreground="gray", padding=(10, 0, 10, 8)).grid(row=2, column=0, sticky=tk.W)
+
+    def _on_texto(self, *_args):
+        if self._after_busqueda:
+            self.after_cancel(self._after_busqueda)
+        demora = DEMORA_BUSQUEDA_SEMANTICA_MS if self.semantica_var.get() else DEMORA_BUSQUEDA_MS
+        self._after_busqueda = self.after(demora, self._buscar_ahora)
+
+    def _buscar_ahora(self):
+        if self._after_busqueda:
+            self.after_cancel(self._after_busqueda)
+        self._after_busqueda = None
+        texto = self.texto_var.get().strip()
+        if len(texto) < 2:
+            self.app_controller.cargador_async.cancelar('busqueda')
+            self._mostrar({}, texto)
+            return
+        if self.semantica_var.get():
+            indice = self.app_controller.indice_semantico
+            self.resumen_label.config(text="Buscando por significado...")
+            self.app_controller.cargador_async.enviar('busqueda', lambda token: {'semantico': indice.buscar(texto, limite=LIMITE_SEMANTICO)},
+                                                      lambda resultados: self._mostrar(resultados, texto),
+                                                      al_error=self._on_error)
+            return
+        self.resumen_label.config(text="Buscando...")
+        self.app_controller.cargador_async.enviar('busqueda', lambda token: _buscar(texto),
+                                                  lambda resultados: self._mostrar(resultados, texto),
+                                                  al_error=self._on_error)
+
+    def _on_error(self, error):
+        if self.winfo_exists():
+            self.resumen_label.config(text=f"Error en la búsqueda: {error}")
+
+    def _mostrar(self, resultados, texto):
+        if not self.winfo_exists(): return
+        tree = self.resultados_tree
+        tree.delete(*tree.get_children())
+        self._resultados.clear()
+        clientes, casos, documentos = resultados.get('clientes', []), resultados.get('casos', []), resultados.get('documentos', [])
+        semanticos = resultados.get('semantico', [])
+        for fila in semanticos: # iid único por fuente (los IDs de actividades, casos y documentos se superponen)
+            fila['id'] = f"{fila['origen']}:{fila['origen_id']}"
+        grupos = (
+            ('clientes', f"Clientes ({len(clientes)})", 'cliente', clientes,
+             lambda c: (c['nombre'], " · ".join(x for x in (c.get('email'), c.get('whatsapp')) if x))),
+            ('casos', f"Casos ({len(casos)})", 'caso', casos,
+             lambda c: (c['caratula'], f"Expte. {c.get('numero_expediente') or '-'}/{c.get('anio_caratula') or '-'} · {c.get('cliente_nombre', '')}")),
+            ('documentos', f"Documentos ({len(documentos)})", 'documento', documentos,
+             lambda d: (d['nombre'], f"{d['caratula'][:40]} · {' '.join((d.get('fragmento') or '').split())}")),
+            ('semantico', f"Historial de casos por significado ({len(semanticos)})", 'semantico', semanticos,
+             lambda r: (f"{ORIGENES_SEMANTICOS.get(r['origen'], r['origen'])}: {r['titulo']}",
+                        f"{r['similitud']:.2f} · {r['caratula'][:40]}{' · ' + r['fecha'][:10] if r['fecha'] else ''} · {r['fragmento'][:200]}")),
+        )
+        for clave, titulo, tipo, filas, formato in grupos:
+            if not filas: continue
+            padre = tree.insert('', tk.END, iid=clave, text=titulo, open=True)
+            for fila in filas:
+                texto_fila, detalle = formato(fila)
+                iid = f"{tipo}:{fila['id']}"
+                tree.insert(padre, tk.END, iid=iid, text=texto_fila, values=(detalle,))
+                self._resultados[iid] = (tipo, fila)
+        if texto and self.semantica_var.get() and not semanticos:
+            estado = self.app_controller.indice_semantico.estadisticas()
+            pendientes = f" ({estado['pendientes']} pendientes de indexar)" if estado['pendientes'] else ""
+            self.resumen_label.config(text=f"Sin resultados para '{texto}'; hay {estado['vectores']} fragmentos indexados{pendientes}.")
+        elif texto:
+            total = len(clientes) + len(casos) + len(documentos) + len(semanticos)
+            self.resumen_label.config(text=f"{total} resultados para '{texto}'." if total else f"Sin resultados para '{texto}'.")
+        else:
+            self.resumen_label.config(text="Escriba al menos 2 caracteres.")
+
+    def _on_doble_click(self, event=None):
+        seleccion = self.resultados_tree.selection()
+        if not seleccion or seleccion[0] not in self._resultados: return
+        tipo, fila = self._resultados[seleccion[0]]
+        app = self.app_controller
+        if tipo == 'cliente':
+            if not app.client_tree.seleccionar_id(fila['id']):
+                self.resumen_label.config(text="El cliente no está en la lista actual (revise el filtro de clientes).")
+                return
+            app.root.lift()
+        elif tipo == 'caso':
+            app.open_case_detail_window(case_id=fila['id'])
+        elif tipo == 'documento':
+            app._abrir_en_sistema(fila['ruta'])
+        elif tipo == 'semantico':
+            if fila['origen'] == 'documento' and fila['ruta']: app._abrir_en_sistema(fila['ruta'])
+            else: app.open_case_detail_window(case_id=fila['caso_id'])
+
+    def on_close(self):
+        if self._after_busqueda:
+            self.after_cancel(self._after_busqueda)
+        self.app_controller.cargador_async.cancelar('busqueda')
+        self.app_controller.busqueda_global_window = None
+        self.destroy()
@@ -0,0 +1,68 @@
+# cache_ia.py
+# Caché persistente (tabla cache_ia) de respuestas del Asistente IA. La clave es un hash de
+# endpoint + parámetros del modelo + la entrada normalizada (Unicode NFKC, espacios y saltos de
+# línea colapsados), así que reenviar el mismo texto con otro formato no vuelve a ocupar al modelo.
+# Vencen a los TTL días y, por tamaño, se desalojan las usadas hace más tiempo.
+import hashlib
+import json
+import re
+import threading
+import time
+import unicodedata
+
+TTL_DIAS = 30
+MAX_ENTRADAS = 2000
+MAX_BYTES = 20 * 1024 * 1024
+
+
+def normalizar_entrada(texto):
+    texto = unicodedata.normalize('NFKC', texto or '')
+    return re.sub(r'\s+', ' ', texto).strip()
+
+
+class CacheRespuestasIA:
+    def __init__(self, db, ttl_dias=TTL_DIAS, max_entradas=MAX_ENTRADAS, max_bytes=MAX_BYTES):
+        self.db = db
+        self.ttl_s = ttl_dias * 86400
+        self.max_entradas = max_entradas
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self.aciertos = 0 # De esta sesión
+        self.fallos = 0
+
+    @staticmethod
+    def clave(endpoint, texto, parametros=None):
+        material = json.dumps([endpoint, parametros or {}, normalizar_entrada(texto)], sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+    def _vigente_desde(self):
+        return int(time.time()) - self.ttl_s
+
+    def obtener(self, clave):
+        """ {'respuesta', 'creado_at'} o None (no está o venció). """
+        encontrada = self.db.get_cache_ia(clave, creado_desde=self._vigente_desde())
+        with self._lock:
+            if encontrada: self.aciertos += 1
+            else: self.fallos += 1
+        return encontrada
+
+    def guardar(self, clave, endpoint, respuesta):
+        if not respuesta or not respuesta.strip():
+            return
+        desalojadas = self.db.guardar_cache_ia(clave, endpoint, respuesta, creado_desde=self._vigente_desde(),
+                                               max_entradas=self.max_entradas, max_bytes=self.max_bytes)
+        if desalojadas:
+            print(f"[Caché IA] {desalojadas} respuestas desalojadas (vencidas o por tamaño).")
+
+    def vaciar(self):
+        with self._lock:
+            self.aciertos = self.fallos = 0
+        return self.db.borrar_cache_ia()
+
+    def estadisticas(self):
+        stats = self.db.get_estadisticas_cache_ia()
+        with self._lock:
+            consultas = self.aciertos + self.fallos
+            stats.update(aciertos_sesion=self.aciertos, fallos_sesion=self.fallos,
+                         tasa_aciertos_sesion=self.aciertos / consultas if consultas else 0.0)
+        return stats
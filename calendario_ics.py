@@ -0,0 +1,426 @@
+# calendario_ics.py
+# Exportación/importación iCalendar (RFC 5545) de audiencias y vencimientos de tareas.
+import datetime
+import hashlib
+import json
+import os
+import re
+import tempfile
+
+PRODID = "-//Legal-IT-Ø//CRM Legal//ES"
+DOMINIO_UID = "crm-legal"
+NOMBRE_FEED_POR_DEFECTO = "agenda_crm_legal.ics"
+DURACION_POR_DEFECTO_MINUTOS = 60
+
+_RE_UID_PROPIO = re.compile(r"^(audiencia|tarea)-(\d+)@" + re.escape(DOMINIO_UID) + "$")
+
+
+# --- Escritura ---
+
+def escapar_texto(texto):
+    """ Escapa un valor TEXT según RFC 5545 (barra invertida, ';', ',' y saltos de línea). """
+    texto = (texto or "").replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,")
+    return texto.replace("\r\n", "\\n").replace("\n", "\\n").replace("\r", "\\n")
+
+
+def plegar_linea(linea):
+    """ Pliega una línea de contenido a 75 octetos (sin cortar caracteres UTF-8) y la devuelve en bytes con CRLF. """
+    datos = linea.encode("utf-8")
+    if len(datos) <= 75:
+        return datos + b"\r\n"
+    partes = []
+    inicio = 0
+    limite = 75
+    while inicio < len(datos):
+        fin = min(inicio + limite, len(datos))
+        # Retroceder si el corte cae en medio de un carácter multibyte (bytes 10xxxxxx)
+        while fin < len(datos) and (datos[fin] & 0xC0) == 0x80:
+            fin -= 1
+        partes.append(datos[inicio:fin])
+        inicio = fin
+        limite = 74  # Las líneas de continuación empiezan con un espacio
+    return b"\r\n ".join(partes) + b"\r\n"
+
+
+def _fecha_ics(fecha_str):
+    return fecha_str.replace("-", "")
+
+
+def _dtstamp(timestamp):
+    try:
+        momento = datetime.datetime.fromtimestamp(int(timestamp), tz=datetime.timezone.utc)
+    except (TypeError, ValueError, OverflowError, OSError):
+        momento = datetime.datetime(2000, 1, 1, tzinfo=datetime.timezone.utc)
+    return momento.strftime("%Y%m%dT%H%M%SZ")
+
+
+def uid_audiencia(audiencia_id):
+    return f"audiencia-{audiencia_id}@{DOMINIO_UID}"
+
+
+def uid_tarea(tarea_id):
+    return f"tarea-{tarea_id}@{DOMINIO_UID}"
+
+
+def lineas_vevent_audiencia(aud):
+    """ Líneas (sin plegar) del VEVENT de una audiencia, con los campos de get_audiencia_by_id. """
+    fecha = aud.get("fecha") or ""
+    hora = aud.get("hora") or ""
+    desc_full = aud.get("descripcion") or ""
+    resumen = desc_full.split("\n")[0][:120] or "Audiencia"
+    lineas = ["BEGIN:VEVENT", f"UID:{uid_audiencia(aud['id'])}", f"DTSTAMP:{_dtstamp(aud.get('created_at'))}"]
+    try:
+        if hora:
+            inicio = datetime.datetime.strptime(f"{fecha} {hora}", "%Y-%m-%d %H:%M")
+            fin = inicio + datetime.timedelta(minutes=int(aud.get("duracion_minutos") or DURACION_POR_DEFECTO_MINUTOS))
+            # Hora local "flotante": el calendario la muestra tal cual en la zona del usuario
+            lineas.append(f"DTSTART:{inicio.strftime('%Y%m%dT%H%M%S')}")
+            lineas.append(f"DTEND:{fin.strftime('%Y%m%dT%H%M%S')}")
+        else:
+            dia = datetime.datetime.strptime(fecha, "%Y-%m-%d").date()
+            lineas.append(f"DTSTART;VALUE=DATE:{dia.strftime('%Y%m%d')}")
+            lineas.append(f"DTEND;VALUE=DATE:{(dia + datetime.timedelta(days=1)).strftime('%Y%m%d')}")
+    except ValueError:
+        return []
+    lineas.append(f"SUMMARY:{escapar_texto('Audiencia: ' + resumen)}")
+    detalle = desc_full
+    if aud.get("caso_caratula"):
+        detalle += f"\n\nCaso: {aud['caso_caratula']}"
+    if aud.get("cliente_nombre"):
+        detalle += f"\nCliente: {aud['cliente_nombre']}"
+    if aud.get("link"):
+        detalle += f"\nLink: {aud['link']}"
+    lineas.append(f"DESCRIPTION:{escapar_texto(detalle)}")
+    if aud.get("caso_juzgado"):
+        lineas.append(f"LOCATION:{escapar_texto(aud['caso_juzgado'])}")
+    link = (aud.get("link") or "").strip()
+    if link.startswith(("http://", "https://")):
+        lineas.append(f"URL:{link}")
+    lineas.append("CATEGORIES:Audiencia")
+    if aud.get("recordatorio_activo"):
+        lineas += ["BEGIN:VALARM", "ACTION:DISPLAY", f"TRIGGER:-PT{int(aud.get('recordatorio_minutos') or 15)}M",
+                   f"DESCRIPTION:{escapar_texto(resumen)}", "END:VALARM"]
+    lineas.append("END:VEVENT")
+    return lineas
+
+
+def lineas_vevent_tarea(tarea):
+    """ Líneas del VEVENT (todo el día) para el vencimiento de una tarea. """
+    try:
+        dia = datetime.datetime.strptime(tarea.get("fecha_vencimiento") or "", "%Y-%m-%d").date()
+    except ValueError:
+        return []
+    desc_full = tarea.get("descripcion") or ""
+    prefijo = "Plazo procesal" if tarea.get("es_plazo_procesal") else "Vence"
+    estado = tarea.get("estado") or ""
+    resumen = f"{prefijo}: {desc_full.split(chr(10))[0][:120]}"
+    if estado == "Completada":
+        resumen = "[Completada] " + resumen
+    try:
+        creada = datetime.datetime.strptime(tarea.get("fecha_creacion") or "", "%Y-%m-%d %H:%M:%S").timestamp()
+    except ValueError:
+        creada = None
+    lineas = ["BEGIN:VEVENT", f"UID:{uid_tarea(tarea['id'])}", f"DTSTAMP:{_dtstamp(creada)}",
+              f"DTSTART;VALUE=DATE:{dia.strftime('%Y%m%d')}",
+              f"DTEND;VALUE=DATE:{(dia + datetime.timedelta(days=1)).strftime('%Y%m%d')}",
+              f"SUMMARY:{escapar_texto(resumen)}"]
+    detalle = desc_full
+    if tarea.get("caso_caratula"):
+        detalle += f"\n\nCaso: {tarea['caso_caratula']}"
+    detalle += f"\nPrioridad: {tarea.get('prioridad') or '-'} | Estado: {estado or '-'}"
+    if tarea.get("notas"):
+        detalle += f"\nNotas: {tarea['notas']}"
+    lineas.append(f"DESCRIPTION:{escapar_texto(detalle)}")
+    lineas.append("CATEGORIES:" + ("Plazo procesal" if tarea.get("es_plazo_procesal") else "Tarea"))
+    if estado == "Cancelada":
+        lineas.append("STATUS:CANCELLED")
+    lineas.append("TRANSP:TRANSPARENT")
+    lineas.append("END:VEVENT")
+    return lineas
+
+
+def _bloque(lineas):
+    return b"".join(plegar_linea(linea) for linea in lineas)
+
+
+def _cabecera():
+    return _bloque(["BEGIN:VCALENDAR", "VERSION:2.0", f"PRODID:{PRODID}", "CALSCALE:GREGORIAN",
+                    "METHOD:PUBLISH", "X-WR-CALNAME:CRM Legal - Agenda"])
+
+
+def _pie():
+    return _bloque(["END:VCALENDAR"])
+
+
+def _huella(registro):
+    """ Hash estable del contenido de un registro: si no cambia, su VEVENT tampoco. """
+    return hashlib.sha1(json.dumps(registro, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def _iterar_entidades(db_module):
+    """ Genera (uid, registro, funcion_render) recorriendo audiencias y tareas en streaming. """
+    for aud in db_module.iter_audiencias_para_ics():
+        yield uid_audiencia(aud["id"]), aud, lineas_vevent_audiencia
+    for tarea in db_module.iter_tareas_para_ics():
+        yield uid_tarea(tarea["id"]), tarea, lineas_vevent_tarea
+
+
+def _reemplazar_atomicamente(ruta_destino, escribir):
+    """ Escribe en un temporal del mismo directorio y lo mueve encima del destino. """
+    directorio = os.path.dirname(os.path.abspath(ruta_destino))
+    fd, ruta_tmp = tempfile.mkstemp(prefix=".ics_", suffix=".tmp", dir=directorio)
+    try:
+        with os.fdopen(fd, "wb") as salida:
+            resultado = escribir(salida)
+        os.replace(ruta_tmp, ruta_destino)
+        return resultado
+    except BaseException:
+        if os.path.exists(ruta_tmp):
+            os.remove(ruta_tmp)
+        raise
+
+
+def exportar_ics(ruta_destino, db_module):
+    """ Exportación completa a un archivo .ics, escribiendo evento por evento. Devuelve la cantidad de eventos. """
+    def escribir(salida):
+        cantidad = 0
+        salida.write(_cabecera())
+        for _, registro, render in _iterar_entidades(db_module):
+            lineas = render(registro)
+            if lineas:
+                salida.write(_bloque(lineas))
+                cantidad += 1
+        salida.write(_pie())
+        return cantidad
+    return _reemplazar_atomicamente(ruta_destino, escribir)
+
+
+class FeedICS:
+    """
+    Archivo .ics "vivo" al que un calendario de escritorio puede suscribirse por ruta local.
+    Junto al feed se guarda un estado (<feed>.estado.json) con la huella y la posición en bytes
+    de cada VEVENT. Al regenerar, los eventos sin cambios se copian tal cual del archivo anterior
+    y solo se renderizan los que cambiaron; si nada cambió, el archivo no se toca.
+    """
+
+    def __init__(self, ruta_feed, db_module):
+        self.ruta_feed = ruta_feed
+        self.ruta_estado = ruta_feed + ".estado.json"
+        self.db = db_module
+
+    def _cargar_estado(self):
+        try:
+            with open(self.ruta_estado, "r", encoding="utf-8") as f:
+                estado = json.load(f)
+            st = os.stat(self.ruta_feed)
+            # Si el feed fue modificado por fuera, las posiciones guardadas ya no sirven
+            if estado.get("tamano") != st.st_size or estado.get("mtime_ns") != st.st_mtime_ns:
+                return {}
+            return estado.get("eventos", {})
+        except (OSError, ValueError):
+            return {}
+
+    def regenerar(self):
+        """ Regenera el feed de forma incremental. Devuelve un dict con contadores (renderizados, copiados, eliminados). """
+        anteriores = self._cargar_estado()
+        stats = {"renderizados": 0, "copiados": 0, "eliminados": 0, "reescrito": False}
+        nuevos = {}
+
+        def escribir(salida):
+            origen = open(self.ruta_feed, "rb") if anteriores else None
+            try:
+                salida.write(_cabecera())
+                for uid, registro, render in _iterar_entidades(self.db):
+                    huella = _huella(registro)
+                    previo = anteriores.get(uid)
+                    offset = salida.tell()
+                    if previo and previo[0] == huella and origen is not None:
+                        origen.seek(previo[1])
+                        datos = origen.read(previo[2])
+                        stats["copiados"] += 1
+                    else:
+                        lineas = render(registro)
+                        if not lineas:
+                            continue
+                        datos = _bloque(lineas)
+                        stats["renderizados"] += 1
+                    salida.write(datos)
+                    nuevos[uid] = [huella, offset, len(datos)]
+                salida.write(_pie())
+            finally:
+                if origen is not None:
+                    origen.close()
+
+        # Primero se compara contra el estado sin escribir nada: el caso común (sin cambios) no toca el disco
+        if anteriores and os.path.exists(self.ruta_feed) and not self._hay_cambios(anteriores):
+            stats["copiados"] = len(anteriores)
+            return stats
+
+        _reemplazar_atomicamente(self.ruta_feed, escribir)
+        stats["eliminados"] = len(set(anteriores) - set(nuevos))
+        stats["reescrito"] = True
+        st = os.stat(self.ruta_feed)
+        with open(self.ruta_estado, "w", encoding="utf-8") as f:
+            json.dump({"version": 1, "tamano": st.st_size, "mtime_ns": st.st_mtime_ns, "eventos": nuevos}, f)
+        return stats
+
+    def _hay_cambios(self, anteriores):
+        vistos = 0
+        for uid, registro, _ in _iterar_entidades(self.db):
+            previo = anteriores.get(uid)
+            if not previo or previo[0] != _huella(registro):
+                return True
+            vistos += 1
+        return vistos != len(anteriores)
+
+
+# --- Lectura ---
+
+def _lineas_desplegadas(archivo):
+    """ Devuelve las líneas lógicas de un .ics, uniendo las continuaciones (líneas que empiezan con espacio o tab). """
+    actual = None
+    for cruda in archivo:
+        linea = cruda.rstrip("\r\n")
+        if linea[:1] in (" ", "\t") and actual is not None:
+            actual += linea[1:]
+            continue
+        if actual is not None:
+            yield actual
+        actual = linea
+    if actual:
+        yield actual
+
+
+def _separar_propiedad(linea):
+    """ 'DTSTART;TZID=X:2024...' -> ('DTSTART', {'TZID': 'X'}, '2024...'). Respeta ':' dentro de comillas. """
+    en_comillas = False
+    for i, c in enumerate(linea):
+        if c == '"':
+            en_comillas = not en_comillas
+        elif c == ":" and not en_comillas:
+            cabeza, valor = linea[:i], linea[i + 1:]
+            break
+    else:
+        return None, {}, ""
+    partes = cabeza.split(";")
+    params = {}
+    for p in partes[1:]:
+        clave, _, val = p.partition("=")
+        params[clave.upper()] = val.strip('"')
+    return partes[0].upper(), params, valor
+
+
+def desescapar_texto(texto):
+    resultado = []
+    i = 0
+    while i < len(texto):
+        c = texto[i]
+        if c == "\\" and i + 1 < len(texto):
+            siguiente = texto[i + 1]
+            resultado.append("\n" if siguiente in "nN" else siguiente)
+            i += 2
+            continue
+        resultado.append(c)
+        i += 1
+    return "".join(resultado)
+
+
+def parsear_fecha_ics(valor, params=None):
+    """ Devuelve (datetime.date, 'HH:MM' o None). Las horas en UTC ('Z') se pasan a hora local. """
+    valor = (valor or "").strip()
+    params = params or {}
+    try:
+        if params.get("VALUE") == "DATE" or len(valor) == 8:
+            return datetime.datetime.strptime(valor[:8], "%Y%m%d").date(), None
+        if valor.endswith("Z"):
+            momento = datetime.datetime.strptime(valor[:15], "%Y%m%dT%H%M%S").replace(tzinfo=datetime.timezone.utc).astimezone()
+        else:
+            # Hora flotante o con TZID: se interpreta como hora local
+            momento = datetime.datetime.strptime(valor[:15], "%Y%m%dT%H%M%S")
+        return momento.date(), momento.strftime("%H:%M")
+    except ValueError:
+        return None, None
+
+
+def iterar_eventos_ics(ruta):
+    """ Lector en streaming: genera un dict por VEVENT sin cargar el archivo completo. """
+    with open(ruta, "r", encoding="utf-8", errors="replace", newline="") as archivo:
+        evento = None
+        profundidad_alarma = 0
+        for linea in _lineas_desplegadas(archivo):
+            nombre, params, valor = _separar_propiedad(linea)
+            if nombre == "BEGIN" and valor.upper() == "VEVENT":
+                evento = {}
+            elif nombre == "BEGIN" and evento is not None:
+                profundidad_alarma += 1  # VALARM u otros componentes anidados
+            elif nombre == "END" and valor.upper() == "VEVENT" and evento is not None:
+                yield evento
+                evento = None
+                profundidad_alarma = 0
+            elif nombre == "END" and evento is not None:
+                profundidad_alarma = max(0, profundidad_alarma - 1)
+            elif evento is not None and profundidad_alarma == 0 and nombre:
+                evento[nombre] = (params, valor)
+
+
+def importar_ics(ruta, caso_id, db_module):
+    """
+    Importa los VEVENT de un .ics como audiencias del caso indicado, deduplicando por UID:
+    eventos exportados por este mismo CRM se omiten, y un UID ya importado actualiza su audiencia
+    en vez de duplicarla. Devuelve un dict con contadores.
+    """
+    stats = {"nuevas": 0, "actualizadas": 0, "duplicadas": 0, "omitidas": 0}
+    vistos = set()
+    for evento in iterar_eventos_ics(ruta):
+        uid = evento.get("UID", ({}, ""))[1].strip()
+        if not uid or uid in vistos:
+            stats["duplicadas" if uid else "omitidas"] += 1
+            continue
+        vistos.add(uid)
+
+        propio = _RE_UID_PROPIO.match(uid)
+        if propio:
+            # Evento generado por este CRM (p.ej. el propio feed reimportado): ya existe en la BD
+            stats["duplicadas"] += 1
+            continue
+
+        if "DTSTART" not in evento:
+            stats["omitidas"] += 1
+            continue
+        fecha, hora = parsear_fecha_ics(evento["DTSTART"][1], evento["DTSTART"][0])
+        if fecha is None:
+            stats["omitidas"] += 1
+            continue
+        duracion = DURACION_POR_DEFECTO_MINUTOS
+        if hora and "DTEND" in evento:
+            fecha_fin, hora_fin = parsear_fecha_ics(evento["DTEND"][1], evento["DTEND"][0])
+            if fecha_fin and hora_fin:
+                inicio = datetime.datetime.combine(fecha, datetime.datetime.strptime(hora, "%H:%M").time())
+                fin = datetime.datetime.combine(fecha_fin, datetime.datetime.strptime(hora_fin, "%H:%M").time())
+                minutos = int((fin - inicio).total_seconds() // 60)
+                if minutos > 0:
+                    duracion = minutos
+
+        resumen = desescapar_texto(evento.get("SUMMARY", ({}, ""))[1]).strip()
+        detalle = desescapar_texto(evento.get("DESCRIPTION", ({}, ""))[1]).strip()
+        descripcion = "\n\n".join(p for p in (resumen, detalle) if p) or "Evento importado"
+        link = evento.get("URL", ({}, ""))[1].strip()
+        fecha_str = fecha.strftime("%Y-%m-%d")
+
+        existente_id = db_module.get_audiencia_id_por_uid_ics(uid)
+        existente = db_module.get_audiencia_by_id(existente_id) if existente_id else None
+        if existente:
+            if (existente.get("fecha"), existente.get("hora"), existente.get("descripcion"), existente.get("duracion_minutos")) == (fecha_str, hora, descripcion, duracion):
+                stats["duplicadas"] += 1
+                continue
+            db_module.update_audiencia(existente_id, fecha_str, hora, descripcion, link or existente.get("link") or "",
+                                       existente.get("recordatorio_activo", 0), existente.get("recordatorio_minutos", 15), duracion)
+            stats["actualizadas"] += 1
+        else:
+            nuevo_id = db_module.add_audiencia(caso_id, fecha_str, hora, descripcion, link, 0, 15, duracion)
+            if nuevo_id:
+                db_module.registrar_uid_ics_importado(uid, nuevo_id)
+                stats["nuevas"] += 1
+            else:
+                stats["omitidas"] += 1
+    return stats
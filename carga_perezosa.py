@@ -0,0 +1,107 @@
+# carga_perezosa.py
+# Carga perezosa de las pestañas de un ttk.Notebook: cada pestaña carga sus datos
+# la primera vez que se muestra y los conserva hasta que se invalida o cambia el caso.
+import tkinter as tk
+
+
+class CargadorPestanas:
+    def __init__(self, notebook):
+        self.notebook = notebook
+        self.contexto = None # Normalmente el dict del caso seleccionado
+        self.generacion = 0 # Cambia con cada contexto; las cargas de una generación vieja se descartan
+        self._cargadores = {} # {nombre_widget_pestana: funcion(contexto)}
+        self._limpiadores = {} # {nombre_widget_pestana: funcion()} para vaciar datos del contexto anterior
+        self._cargadas = set()
+        self._pendiente = None # (after_id, pestana)
+        self.notebook.bind('<<NotebookTabChanged>>', self._on_tab_changed, add='+')
+
+    def registrar(self, pestana, cargar, limpiar=None):
+        """
+        Asocia a una pestaña (widget agregado al notebook) la función que carga sus datos y,
+        opcionalmente, la que la vacía al cambiar de contexto (para no mostrar datos del caso anterior).
+        """
+        self._cargadores[str(pestana)] = cargar
+        if limpiar:
+            self._limpiadores[str(pestana)] = limpiar
+
+    def set_contexto(self, contexto):
+        """
+        Cambia el contexto (p.ej. otro caso): lo cargado deja de valer y se cancela cualquier
+        carga pendiente del contexto anterior. Solo se carga la pestaña visible.
+        """
+        self.generacion += 1
+        self.contexto = contexto
+        self._cancelar_pendiente()
+        # Solo se vacían las pestañas que llegaron a cargarse; las demás no tienen datos viejos
+        for pestana in list(self._cargadas):
+            limpiar = self._limpiadores.get(pestana)
+            if limpiar:
+                try:
+                    limpiar()
+                except Exception as e:
+                    print(f"[CargadorPestanas] Error limpiando pestaña {pestana}: {e}")
+        self._cargadas.clear()
+        if contexto is not None:
+            self.cargar_visible()
+
+    def invalidar(self, pestana=None, contexto=None):
+        """
+        Marca una pestaña (o todas) para recargar; si está visible se recarga enseguida. contexto reemplaza
+        los datos del mismo caso (p.ej. tras editarlo) sin vaciar las pestañas como set_contexto.
+        """
+        if contexto is not None:
+            self.contexto = contexto
+        if pestana is None:
+            self._cargadas.clear()
+        else:
+            self._cargadas.discard(str(pestana))
+        self.cargar_visible()
+
+    def marcar_cargada(self, pestana):
+        """ Para cuando otra ruta de código ya cargó la pestaña con datos del contexto actual. """
+        self._cargadas.add(str(pestana))
+
+    def esta_cargada(self, pestana):
+        return str(pestana) in self._cargadas
+
+    def cargar_visible(self):
+        try:
+            pestana = self.notebook.select()
+        except tk.TclError:
+            return
+        if not pestana or self.contexto is None or pestana in self._cargadas or pestana not in self._cargadores:
+            return
+        if self._pendiente and self._pendiente[1] == pestana:
+            return
+        self._cancelar_pendiente()
+        generacion = self.generacion
+        # Se difiere al siguiente ciclo ocioso: si el usuario ya pasó a otro caso o pestaña, no se carga
+        after_id = self.notebook.after_idle(lambda: self._ejecutar_carga(pestana, generacion))
+        self._pendiente = (after_id, pestana)
+
+    def _ejecutar_carga(self, pestana, generacion):
+        self._pendiente = None
+        if generacion != self.generacion or pestana in self._cargadas:
+            return
+        try:
+            if self.notebook.select() != pestana:
+                return
+        except tk.TclError:
+            return
+        self._cargadas.add(pestana)
+        try:
+            self._cargadores[pestana](self.contexto)
+        except Exception as e:
+            self._cargadas.discard(pestana)
+            print(f"[CargadorPestanas] Error cargando pestaña {pestana}: {e}")
+
+    def _cancelar_pendiente(self):
+        if self._pendiente:
+            try:
+                self.notebook.after_cancel(self._pendiente[0])
+            except tk.TclError:
+                pass
+            self._pendiente = None
+
+    def _on_tab_changed(self, event=None):
+        self.cargar_visible()
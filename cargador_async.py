@@ -0,0 +1,145 @@
+# cargador_async.py
+# Cargas de datos fuera del hilo de Tk. Los handlers de la interfaz envían un trabajo a un pool
+# de hilos con un token de generación por canal ('cliente', 'caso', 'agenda', ...). El resultado
+# vuelve por una cola que se lee con root.after y solo se aplica si sigue siendo el último
+# pedido de su canal: si el usuario ya eligió otro cliente, la respuesta vieja se descarta.
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import tkinter as tk
+
+INTERVALO_SONDEO_MS = 30
+
+
+class CargaCancelada(Exception):
+    """ La puede lanzar un trabajo al ver token.cancelado para cortar temprano. """
+
+
+class TokenCarga:
+    def __init__(self, cargador, canal, generacion, al_parcial=None):
+        self._cargador = cargador
+        self.canal = canal
+        self.generacion = generacion
+        self._al_parcial = al_parcial
+
+    @property
+    def cancelado(self):
+        return self._cargador._generaciones.get(self.canal) != self.generacion
+
+    def verificar(self):
+        """ Para trabajos largos (recorridos de carpetas, lotes): corta si ya no es el pedido vigente. """
+        if self.cancelado:
+            raise CargaCancelada(self.canal)
+
+    def publicar(self, parcial):
+        """ Entrega un resultado parcial (p.ej. un lote de filas) a al_parcial, en el hilo de Tk. """
+        if self._al_parcial and not self.cancelado:
+            self._cargador._cola.put((self, self._al_parcial, None, parcial, None, True))
+
+
+class CargadorAsync:
+    """
+    enviar(canal, trabajo, al_terminar, al_error=None, al_parcial=None)
+      trabajo(token) corre en el pool; no debe tocar widgets.
+      al_terminar(resultado) y al_error(excepcion) corren en el hilo de Tk, solo si el token sigue vigente.
+      al_parcial(dato) recibe lo que el trabajo entregue con token.publicar(dato) antes de terminar.
+    indicador(canales_activos) se llama en el hilo de Tk cada vez que cambia el conjunto de canales
+    con una carga en curso (para mostrar "Cargando...").
+    """
+
+    def __init__(self, root, max_hilos=4, indicador=None):
+        self.root = root
+        self.indicador = indicador
+        self._pool = ThreadPoolExecutor(max_workers=max_hilos, thread_name_prefix="carga_ui")
+        self._cola = queue.Queue()
+        self._generaciones = {} # {canal: generación vigente}; se escribe solo desde el hilo de Tk
+        self._lock = threading.Lock()
+        self._en_curso = {} # {canal: generación pendiente de aplicar}
+        self._sondeo_id = None
+        self._cerrado = False
+
+    def enviar(self, canal, trabajo, al_terminar, al_error=None, al_parcial=None):
+        if self._cerrado:
+            return None
+        with self._lock:
+            generacion = self._generaciones.get(canal, 0) + 1
+            self._generaciones[canal] = generacion
+        token = TokenCarga(self, canal, generacion, al_parcial)
+        self._en_curso[canal] = generacion
+        self._avisar_indicador()
+        self._pool.submit(self._ejecutar, token, trabajo, al_terminar, al_error)
+        self._programar_sondeo()
+        return token
+
+    def cancelar(self, canal):
+        """ Invalida el pedido en curso del canal (p.ej. al deseleccionar). """
+        with self._lock:
+            self._generaciones[canal] = self._generaciones.get(canal, 0) + 1
+        if self._en_curso.pop(canal, None) is not None:
+            self._avisar_indicador()
+
+    def esta_cargando(self, canal):
+        return canal in self._en_curso
+
+    def cerrar(self):
+        self._cerrado = True
+        with self._lock:
+            for canal in list(self._generaciones):
+                self._generaciones[canal] += 1
+        self._en_curso.clear()
+        if self._sondeo_id is not None:
+            try:
+                self.root.after_cancel(self._sondeo_id)
+            except tk.TclError:
+                pass
+            self._sondeo_id = None
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    # --- Internos ---
+    def _ejecutar(self, token, trabajo, al_terminar, al_error):
+        # Corre en un hilo del pool
+        if token.cancelado:
+            self._cola.put((token, None, None, None, CargaCancelada(token.canal), False))
+            return
+        try:
+            resultado = trabajo(token)
+            self._cola.put((token, al_terminar, al_error, resultado, None, False))
+        except CargaCancelada as e:
+            self._cola.put((token, None, None, None, e, False))
+        except Exception as e:
+            print(f"[CargadorAsync] Error en carga '{token.canal}': {e}")
+            self._cola.put((token, al_terminar, al_error, None, e, False))
+
+    def _programar_sondeo(self):
+        if self._sondeo_id is None and not self._cerrado:
+            self._sondeo_id = self.root.after(INTERVALO_SONDEO_MS, self._sondear)
+
+    def _sondear(self):
+        self._sondeo_id = None
+        while True:
+            try:
+                token, al_terminar, al_error, resultado, error, parcial = self._cola.get_nowait()
+            except queue.Empty:
+                break
+            if token.cancelado:
+                continue # Respuesta de un pedido viejo: se descarta
+            if not parcial and self._en_curso.get(token.canal) == token.generacion:
+                del self._en_curso[token.canal]
+                self._avisar_indicador()
+            try:
+                if error is None:
+                    al_terminar(resultado)
+                elif al_error and not isinstance(error, CargaCancelada):
+                    al_error(error)
+            except Exception as e:
+                print(f"[CargadorAsync] Error aplicando carga '{token.canal}': {e}")
+        if self._en_curso:
+            self._programar_sondeo()
+
+    def _avisar_indicador(self):
+        if self.indicador:
+            try:
+                self.indicador(tuple(self._en_curso))
+            except tk.TclError:
+                pass
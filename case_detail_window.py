@@ -7,6 +7,7 @@ from documentos_tab_ui import DocumentosTab
 from tareas_ui import TareasTab
 from partes_ui import PartesTab
 from seguimiento_ui import SeguimientoTab
+from carga_perezosa import CargadorPestanas
 
 class CaseDetailWindow(tk.Toplevel):
     def __init__(self, parent, app_controller, case_id):
@@ -40,25 +41,39 @@ class CaseDetailWindow(tk.Toplevel):
         self.detalles_tab.load_details(self.case_data)
 
         # Pestaña 1: Documentación
-        self.documentos_tab = DocumentosTab(self.notebook, self.app_controller, self.case_data)
+        self.documentos_tab = DocumentosTab(self.notebook, self.app_controller, self.case_data, cargar_inicial=False)
         self.notebook.add(self.documentos_tab, text="Documentación")
 
         # Pestaña 2: Tareas/Plazos
         self.tareas_tab = TareasTab(self.notebook, self.app_controller)
         self.notebook.add(self.tareas_tab, text="Tareas/Plazos")
-        self.tareas_tab.load_tareas(self.case_id)
-        self.tareas_tab.set_add_button_state()
 
         # Pestaña 3: Partes
         self.partes_tab = PartesTab(self.notebook, self.app_controller)
         self.notebook.add(self.partes_tab, text="Partes")
-        self.partes_tab.load_partes(self.case_id)
-        self.partes_tab.set_add_button_state(None)
 
         # Pestaña 4: Seguimiento
         self.seguimiento_tab = SeguimientoTab(self.notebook, self.app_controller)
         self.notebook.add(self.seguimiento_tab, text="Seguimiento")
-        self.seguimiento_tab.load_actividades(self.case_id)
+
+        # Las pestañas 1 a 4 cargan sus datos la primera vez que se muestran
+        self.cargador_pestanas = CargadorPestanas(self.notebook)
+        self.cargador_pestanas.registrar(self.documentos_tab, lambda caso: self.documentos_tab.load_case_documents(caso.get('ruta_carpeta', '')))
+        self.cargador_pestanas.registrar(self.tareas_tab, self._cargar_tareas)
+        self.cargador_pestanas.registrar(self.partes_tab, self._cargar_partes)
+        self.cargador_pestanas.registrar(self.seguimiento_tab, self._cargar_seguimiento)
+        self.cargador_pestanas.set_contexto(self.case_data)
+
+    def _cargar_tareas(self, caso):
+        self.tareas_tab.load_tareas(caso['id'])
+        self.tareas_tab.set_add_button_state()
+
+    def _cargar_partes(self, caso):
+        self.partes_tab.load_partes(caso['id'])
+        self.partes_tab.set_add_button_state(None)
+
+    def _cargar_seguimiento(self, caso):
+        self.seguimiento_tab.load_actividades(caso['id'])
         self.seguimiento_tab.set_add_button_state(None)
 
     # -*-*-*-*-*-*-*-*-*-*-*-*-*-*-*-*-*-*-*-*-*-*-*-*-*-*-*-*-
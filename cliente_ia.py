@@ -0,0 +1,436 @@
+# cliente_ia.py
+# Cliente HTTP del Asistente IA local (mcp_server.py sobre Ollama/LM Studio).
+# - Una sola requests.Session con pool de conexiones keep-alive (no se abre un socket por pedido).
+# - Timeouts separados: conectar (corto: si el servidor no está, se sabe enseguida) y leer (largo: el
+#   modelo puede tardar en generar).
+# - Reintentos con backoff exponencial y jitter completo, solo donde es seguro: timeouts al conectar
+#   (el pedido no llegó a enviarse) y, en llamadas idempotentes, cualquier error de conexión y 502/503/504.
+# - Disyuntor (circuit breaker): tras varios fallos seguidos de conexión deja de intentar por un rato y
+#   falla en milisegundos; pasado el enfriamiento deja pasar un pedido de prueba.
+# - Métricas de latencia y tasa de fallos por endpoint.
+# La URL base se configura con la variable de entorno CRM_IA_URL (por defecto http://localhost:5000).
+import json
+import os
+import random
+import threading
+import time
+from collections import deque
+
+import requests
+from requests.adapters import HTTPAdapter
+
+VARIABLE_URL = 'CRM_IA_URL'
+VARIABLE_MODELO = 'CRM_IA_MODELO' # Solo identifica el modelo que sirve el servidor (p.ej. para la caché de respuestas)
+URL_POR_DEFECTO = 'http://localhost:5000'
+TIMEOUT_CONEXION_S = 3.05
+TIMEOUT_LECTURA_S = 90
+MAX_REINTENTOS = 2
+BACKOFF_BASE_S = 0.25
+BACKOFF_MAXIMO_S = 4.0
+UMBRAL_FALLOS_DISYUNTOR = 3
+ENFRIAMIENTO_DISYUNTOR_S = 15.0
+ESTADOS_REINTENTABLES = (502, 503, 504)
+
+
+class ErrorIA(Exception):
+    """ Base de los errores del cliente; str(e) es un mensaje apto para mostrar al usuario. """
+
+
+class IANoDisponible(ErrorIA):
+    """ No se pudo conectar con el servidor (o el disyuntor está abierto). """
+
+
+class IATimeout(ErrorIA):
+    pass
+
+
+class IAErrorHTTP(ErrorIA):
+    def __init__(self, estado, cuerpo):
+        super().__init__(f"Error HTTP {estado} del servidor del Asistente IA: {cuerpo[:500]}")
+        self.estado = estado
+        self.cuerpo = cuerpo
+
+
+class IARespuestaInvalida(ErrorIA):
+    pass
+
+
+class IACancelada(ErrorIA):
+    pass
+
+
+class ControlStream:
+    """ Permite cortar desde otro hilo (p.ej. el botón Cancelar) una respuesta que se está recibiendo. """
+
+    def __init__(self):
+        self._cancelado = threading.Event()
+        self._respuesta = None
+        self._lock = threading.Lock()
+
+    @property
+    def cancelado(self):
+        return self._cancelado.is_set()
+
+    def cancelar(self):
+        self._cancelado.set()
+        with self._lock:
+            respuesta = self._respuesta
+        if respuesta is not None:
+            try:
+                respuesta.close() # Cierra el socket: la lectura bloqueada en el otro hilo termina enseguida
+            except Exception:
+                pass
+
+    def _asociar(self, respuesta):
+        with self._lock:
+            self._respuesta = respuesta
+        if self.cancelado: respuesta.close()
+
+
+class Disyuntor:
+    """ cerrado -> (umbral fallos seguidos) -> abierto -> (enfriamiento) -> semiabierto -> 1 prueba. """
+
+    def __init__(self, umbral_fallos=UMBRAL_FALLOS_DISYUNTOR, enfriamiento_s=ENFRIAMIENTO_DISYUNTOR_S):
+        self.umbral_fallos = umbral_fallos
+        self.enfriamiento = enfriamiento_s
+        self._lock = threading.Lock()
+        self._fallos_seguidos = 0
+        self._abierto_hasta = 0.0
+        self._prueba_en_curso = None # Hilo que hace el pedido de prueba en semiabierto
+
+    @property
+    def estado(self):
+        with self._lock:
+            if self._fallos_seguidos < self.umbral_fallos: return 'cerrado'
+            return 'abierto' if time.monotonic() < self._abierto_hasta else 'semiabierto'
+
+    def permitir(self):
+        with self._lock:
+            if self._fallos_seguidos < self.umbral_fallos:
+                return True
+            if time.monotonic() < self._abierto_hasta or self._prueba_en_curso is not None:
+                return False
+            self._prueba_en_curso = threading.get_ident() # Semiabierto: pasa un solo pedido de prueba
+            return True
+
+    def segundos_para_reintentar(self):
+        with self._lock:
+            return max(0.0, self._abierto_hasta - time.monotonic())
+
+    def registrar_exito(self):
+        with self._lock:
+            self._fallos_seguidos = 0; self._prueba_en_curso = None
+
+    def soltar_prueba(self):
+        """ Si este hilo tenía la prueba y no registró resultado (salió por una excepción), la libera. """
+        with self._lock:
+            if self._prueba_en_curso == threading.get_ident():
+                self._prueba_en_curso = None
+
+    def registrar_fallo(self):
+        with self._lock:
+            self._fallos_seguidos += 1; self._prueba_en_curso = None
+            if self._fallos_seguidos >= self.umbral_fallos:
+                self._abierto_hasta = time.monotonic() + self.enfriamiento
+
+
+class MetricasIA:
+    """ Por endpoint: pedidos, fallos y latencias de los últimos N pedidos (para percentiles). """
+
+    def __init__(self, ventana=200):
+        self.ventana = ventana
+        self._lock = threading.Lock()
+        self._datos = {}
+
+    def registrar(self, endpoint, segundos, ok):
+        with self._lock:
+            datos = self._datos.setdefault(endpoint, {'pedidos': 0, 'fallos': 0, 'latencias': deque(maxlen=self.ventana)})
+            datos['pedidos'] += 1
+            if not ok: datos['fallos'] += 1
+            datos['latencias'].append(segundos)
+
+    def resumen(self):
+        """ {endpoint: {'pedidos', 'fallos', 'tasa_fallos', 'p50_ms', 'p95_ms', 'max_ms'}} """
+        with self._lock:
+            resumen = {}
+            for endpoint, datos in self._datos.items():
+                latencias = sorted(datos['latencias'])
+                def percentil(p):
+                    return latencias[min(len(latencias) - 1, int(p * len(latencias)))] * 1000 if latencias else 0.0
+                resumen[endpoint] = {'pedidos': datos['pedidos'], 'fallos': datos['fallos'],
+                                     'tasa_fallos': datos['fallos'] / datos['pedidos'] if datos['pedidos'] else 0.0,
+                                     'p50_ms': percentil(0.50), 'p95_ms': percentil(0.95), 'max_ms': (latencias[-1] * 1000 if latencias else 0.0)}
+            return resumen
+
+
+class ClienteIA:
+    def __init__(self, url_base=None, timeout_conexion=TIMEOUT_CONEXION_S, timeout_lectura=TIMEOUT_LECTURA_S,
+                 max_reintentos=MAX_REINTENTOS, disyuntor=None):
+        self.url_base = (url_base or os.environ.get(VARIABLE_URL) or URL_POR_DEFECTO).rstrip('/')
+        self.timeout_conexion = timeout_conexion
+        self.timeout_lectura = timeout_lectura
+        self.max_reintentos = max_reintentos
+        self.disyuntor = disyuntor or Disyuntor()
+        self.metricas = MetricasIA()
+        self.session = requests.Session()
+        adaptador = HTTPAdapter(pool_connections=2, pool_maxsize=8, max_retries=0) # Los reintentos los maneja _pedir
+        self.session.mount('http://', adaptador)
+        self.session.mount('https://', adaptador)
+        self.session.headers.update({'Accept': 'application/json'})
+
+    def parametros_modelo(self):
+        """ Lo que, además de la entrada, determina la respuesta: cambiarlo invalida lo cacheado. """
+        return {'servidor': self.url_base, 'modelo': os.environ.get(VARIABLE_MODELO, '')}
+
+    def url(self, ruta):
+        return f"{self.url_base}/{ruta.lstrip('/')}"
+
+    def _espera_reintento(self, intento):
+        # Jitter completo: evita que varios pedidos reintenten todos a la vez contra el mismo servidor
+        return random.uniform(0, min(BACKOFF_MAXIMO_S, BACKOFF_BASE_S * (2 ** intento)))
+
+    def _pedir(self, metodo, ruta, idempotente=False, timeout_lectura=None, **kwargs):
+        """ requests.Response con estado 2xx, o lanza una subclase de ErrorIA. """
+        url = self.url(ruta)
+        timeout = (self.timeout_conexion, timeout_lectura or self.timeout_lectura)
+        intento = 0
+        try:
+            while True:
+                if not self.disyuntor.permitir():
+                    raise IANoDisponible(f"El Asistente IA en {self.url_base} no responde; se reintentará en {self.disyuntor.segundos_para_reintentar():.0f} s.")
+                inicio = time.perf_counter()
+                try:
+                    respuesta = self.session.request(metodo, url, timeout=timeout, **kwargs)
+                except requests.exceptions.ReadTimeout:
+                    # El servidor está vivo pero el modelo tardó demasiado: no es falla de conexión ni se reintenta
+                    self.disyuntor.registrar_exito()
+                    self.metricas.registrar(ruta, time.perf_counter() - inicio, ok=False)
+                    raise IATimeout(f"La solicitud al Asistente IA en {url} tardó demasiado en responder ({timeout[1]:.0f}s).\n\n"
+                                    f"Verifique el modelo LLM y la carga de su sistema.")
+                except requests.exceptions.ConnectionError as e: # Incluye ConnectTimeout
+                    # Sin conectar el pedido seguro no se envió; otros cortes (p.ej. a mitad de respuesta) solo si es idempotente
+                    error, reintentable = IANoDisponible(self._mensaje_conexion(url)), idempotente or isinstance(e, requests.exceptions.ConnectTimeout)
+                except requests.exceptions.RequestException as e: # ChunkedEncodingError, ContentDecodingError, etc.
+                    error, reintentable = IANoDisponible(f"Falló la comunicación con el Asistente IA en {url}: {e}"), idempotente
+                else:
+                    self.disyuntor.registrar_exito() # Respondió: el servidor está arriba aunque devuelva error
+                    ok = respuesta.ok
+                    self.metricas.registrar(ruta, time.perf_counter() - inicio, ok=ok)
+                    if ok:
+                        return respuesta
+                    error = IAErrorHTTP(respuesta.status_code, respuesta.text)
+                    reintentable = idempotente and respuesta.status_code in ESTADOS_REINTENTABLES
+                    if not reintentable or intento >= self.max_reintentos:
+                        raise error
+                    respuesta.close()
+                    intento += 1
+                    time.sleep(self._espera_reintento(intento))
+                    continue
+                # Error de conexión o de transporte
+                self.disyuntor.registrar_fallo()
+                self.metricas.registrar(ruta, time.perf_counter() - inicio, ok=False)
+                if not reintentable or intento >= self.max_reintentos:
+                    raise error
+                intento += 1
+                time.sleep(self._espera_reintento(intento))
+        finally:
+            # Si era la prueba del semiabierto y salió por algo no previsto, el disyuntor no queda esperándola para siempre
+            self.disyuntor.soltar_prueba()
+
+    def _mensaje_conexion(self, url):
+        return (f"Error de Conexión: No se pudo conectar con el servidor del Asistente IA local en {url}.\n\n"
+                f"Verifique que:\n1. 'mcp_server.py' esté ejecutándose.\n"
+                f"2. Ollama/LM Studio esté activo y sirviendo el modelo correcto.\n"
+                f"3. No haya un firewall bloqueando la conexión a localhost en ese puerto.\n"
+                f"(La dirección se configura con la variable de entorno {VARIABLE_URL}.)")
+
+    def post_json(self, ruta, payload, idempotente=False, timeout_lectura=None):
+        respuesta = self._pedir('POST', ruta, idempotente=idempotente, timeout_lectura=timeout_lectura, json=payload)
+        try:
+            return respuesta.json()
+        except ValueError:
+            raise IARespuestaInvalida("El servidor del Asistente IA no devolvió una respuesta JSON válida.")
+
+    # --- Endpoints del asistente ---
+    @staticmethod
+    def _payload_hechos(texto_hechos, contexto_caso, **extra):
+        payload = {"texto_hechos": texto_hechos, **extra}
+        if contexto_caso: payload["contexto_caso"] = contexto_caso # Material del caso (contexto_ia); texto_hechos sigue siendo lo que se reformula
+        return payload
+
+    def reformular_hechos(self, texto_hechos, contexto_caso=None):
+        """ dict del servidor: {'hechos_reformulados': ...} o {'error': ...}. Sin efectos laterales: idempotente. """
+        return self.post_json('/api/reformular_hechos', self._payload_hechos(texto_hechos, contexto_caso), idempotente=True)
+
+    def resumir_actividades(self, texto_actividades, caratula=None):
+        """ dict del servidor: {'resumen': ...} o {'error': ...}. Idempotente, igual que reformular_hechos. """
+        return self.post_json('/api/resumir_actividades', {"texto_actividades": texto_actividades, "caratula": caratula}, idempotente=True)
+
+    def embeddings(self, textos):
+        """
+        Vectores de los textos, en el mismo orden: {'embeddings': [[float, ...], ...], 'modelo': ...}. Idempotente.
+        Lanza IARespuestaInvalida si el servidor no devolvió un vector por texto.
+        """
+        respuesta = self.post_json('/api/embeddings', {"textos": list(textos)}, idempotente=True)
+        vectores = respuesta.get('embeddings') if isinstance(respuesta, dict) else None
+        if not isinstance(vectores, list) or len(vectores) != len(textos):
+            detalle = respuesta.get('error') if isinstance(respuesta, dict) else None
+            raise IARespuestaInvalida(f"El servidor del Asistente IA no devolvió los vectores pedidos{f': {detalle}' if detalle else '.'}")
+        return respuesta
+
+    def reformular_hechos_stream(self, texto_hechos, al_fragmento, control=None, contexto_caso=None):
+        """
+        Versión progresiva: al_fragmento(texto) se llama (en este hilo) con cada trozo a medida que llega.
+        Devuelve {'texto', 'ttft_s', 'total_s', 'fragmentos'}. Lanza IACancelada si se canceló con control.
+        """
+        return self.post_stream('/api/reformular_hechos', self._payload_hechos(texto_hechos, contexto_caso, stream=True),
+                                al_fragmento, control=control, campo_completo='hechos_reformulados')
+
+    def post_stream(self, ruta, payload, al_fragmento, control=None, campo_completo=None):
+        """
+        Acepta del servidor server-sent events (text/event-stream), NDJSON (una línea JSON por trozo, como
+        Ollama) o texto plano chunked. Si el servidor no soporta streaming y contesta JSON común, se
+        entrega la respuesta completa (campo_completo) como un único fragmento.
+        Un stream cortado lanza IANoDisponible. 'completo' del resultado es True solo si el fin se confirmó
+        (evento final, chunk final o Content-Length); NDJSON sin campo 'done' no permite confirmarlo.
+        """
+        control = control or ControlStream()
+        inicio = time.perf_counter()
+        try:
+            respuesta = self._pedir('POST', ruta, idempotente=True, json=payload, stream=True,
+                                    headers={'Accept': 'text/event-stream, application/x-ndjson, application/json'})
+        except ErrorIA:
+            if control.cancelado: raise IACancelada("Solicitud cancelada.")
+            raise
+        control._asociar(respuesta)
+        partes, stats = [], {'ttft_s': None, 'fragmentos': 0}
+        def entregar(texto):
+            if not texto: return
+            if stats['ttft_s'] is None:
+                stats['ttft_s'] = time.perf_counter() - inicio
+                self.metricas.registrar(f"{ruta} (primer fragmento)", stats['ttft_s'], ok=True)
+            stats['fragmentos'] += 1
+            partes.append(texto)
+            al_fragmento(texto)
+        tipo = respuesta.headers.get('Content-Type', '').split(';')[0].strip().lower()
+        completo = False
+        try:
+            if tipo == 'text/event-stream':
+                completo = self._leer_sse(respuesta, entregar, control)
+            elif tipo in ('application/x-ndjson', 'application/jsonl'):
+                completo = self._leer_ndjson(respuesta, entregar, control)
+            elif tipo == 'application/json':
+                try:
+                    datos = respuesta.json()
+                except ValueError:
+                    raise IARespuestaInvalida("El servidor del Asistente IA no devolvió una respuesta JSON válida.")
+                if 'error' in datos: raise ErrorIA(f"Error devuelto por el Asistente IA: {datos['error']}")
+                entregar(datos.get(campo_completo, '') if campo_completo else '')
+                completo = True
+            else:
+                completo = self._leer_texto(respuesta, entregar, control)
+        except (requests.exceptions.RequestException, AttributeError, ValueError) as e:
+            # Cerrar la respuesta desde otro hilo hace fallar la lectura en curso con errores variados
+            if not control.cancelado:
+                self._registrar_fallo_stream(ruta, inicio)
+                raise IANoDisponible(f"Se cortó la conexión con el Asistente IA mientras respondía: {e}")
+        except ErrorIA: # Stream cortado o error informado por el servidor
+            if not control.cancelado:
+                self._registrar_fallo_stream(ruta, inicio)
+                raise
+        finally:
+            respuesta.close()
+        if control.cancelado:
+            raise IACancelada("Solicitud cancelada.")
+        total = time.perf_counter() - inicio
+        self.metricas.registrar(ruta + " (stream)", total, ok=True)
+        return {'texto': ''.join(partes), 'ttft_s': stats['ttft_s'], 'total_s': total, 'fragmentos': stats['fragmentos'],
+                'completo': completo}
+
+    def _registrar_fallo_stream(self, ruta, inicio):
+        self.metricas.registrar(ruta + " (stream)", time.perf_counter() - inicio, ok=False)
+        self.disyuntor.registrar_fallo()
+
+    @staticmethod
+    def _texto_de_evento(datos):
+        """ Trozo de texto de un evento JSON: acepta los nombres de campo más comunes. """
+        if isinstance(datos, str): return datos
+        if 'error' in datos and datos['error']: raise ErrorIA(f"Error devuelto por el Asistente IA: {datos['error']}")
+        for campo in ('delta', 'token', 'texto', 'response', 'content'):
+            if isinstance(datos.get(campo), str): return datos[campo]
+        mensaje = datos.get('message') # Formato /api/chat de Ollama
+        if isinstance(mensaje, dict) and isinstance(mensaje.get('content'), str): return mensaje['content']
+        opciones = datos.get('choices') # Formato OpenAI / LM Studio
+        if opciones and isinstance(opciones[0].get('delta'), dict): return opciones[0]['delta'].get('content') or ''
+        return ''
+
+    def _leer_texto(self, respuesta, entregar, control):
+        # Texto plano: el fin se confirma con el chunk final (urllib3 lanza si la conexión se cierra antes)
+        # o con Content-Length; sin ninguno de los dos un corte no se distingue del final
+        respuesta.encoding = respuesta.encoding or 'utf-8'
+        for trozo in respuesta.iter_content(chunk_size=None, decode_unicode=True):
+            if control.cancelado: return False
+            entregar(trozo)
+        largo = respuesta.headers.get('Content-Length')
+        if largo is not None:
+            if respuesta.raw.tell() != int(largo):
+                raise IANoDisponible("Se cortó la conexión con el Asistente IA antes de que terminara la respuesta.")
+        elif 'chunked' not in respuesta.headers.get('Transfer-Encoding', '').lower():
+            raise IANoDisponible("El Asistente IA respondió texto sin largo ni chunks: no se puede saber si llegó completo.")
+        return True
+
+    def _leer_sse(self, respuesta, entregar, control):
+        # El fin normal llega como 'data: [DONE]' o un evento done/fin: si el flujo se cierra sin él, quedó cortado
+        evento, datos = 'message', []
+        for linea in respuesta.iter_lines(decode_unicode=True):
+            if control.cancelado: return False
+            if linea is None: continue
+            if linea == '': # Fin de evento
+                if datos:
+                    contenido = '\n'.join(datos)
+                    if contenido.strip() == '[DONE]': return True
+                    if evento == 'error': raise ErrorIA(f"Error devuelto por el Asistente IA: {contenido}")
+                    if evento in ('done', 'fin'): return True
+                    try:
+                        evento_json = json.loads(contenido)
+                    except ValueError:
+                        entregar(contenido) # data: texto plano
+                    else:
+                        entregar(self._texto_de_evento(evento_json))
+                        if isinstance(evento_json, dict) and evento_json.get('done') is True: return True # Estilo Ollama
+                evento, datos = 'message', []
+            elif linea.startswith(':'):
+                continue # Comentario / keep-alive
+            else:
+                campo, _, valor = linea.partition(':')
+                valor = valor[1:] if valor.startswith(' ') else valor
+                if campo == 'data': datos.append(valor)
+                elif campo == 'event': evento = valor
+        if datos and ('\n'.join(datos).strip() == '[DONE]' or evento in ('done', 'fin')):
+            return True # Terminador sin la línea en blanco final
+        if not control.cancelado:
+            raise IANoDisponible("Se cortó la conexión con el Asistente IA antes de que terminara la respuesta.")
+        return False
+
+    def _leer_ndjson(self, respuesta, entregar, control):
+        usa_done = False # Ollama marca cada línea con 'done': si nunca llega done=true, la respuesta quedó cortada
+        for linea in respuesta.iter_lines(decode_unicode=True):
+            if control.cancelado: return False
+            if not linea or not linea.strip(): continue
+            try:
+                datos = json.loads(linea)
+            except ValueError:
+                raise IARespuestaInvalida(f"Línea inválida en la respuesta del Asistente IA: {linea[:200]}")
+            entregar(self._texto_de_evento(datos))
+            if isinstance(datos, dict) and 'done' in datos:
+                if datos['done']: return True
+                usa_done = True
+        if usa_done and not control.cancelado:
+            raise IANoDisponible("Se cortó la conexión con el Asistente IA antes de que terminara la respuesta.")
+        return False # Sin 'done' no hay cómo saber si llegó todo
+
+    def resumen_metricas(self):
+        return {'url': self.url_base, 'disyuntor': self.disyuntor.estado, 'endpoints': self.metricas.resumen()}
+
+    def cerrar(self):
+        self.session.close()
@@ -0,0 +1,244 @@
+# cola_ia.py
+# Cola persistente (tabla trabajos_ia) para aplicar operaciones del Asistente IA a muchos casos de una vez:
+# reformular los hechos (notas del caso) o resumir las actividades del último mes.
+# - Unos pocos hilos trabajadores (CRM_IA_CONCURRENCIA, 2 por defecto) toman de a un trabajo por vez de la
+#   BD, así el servidor local del modelo nunca recibe más pedidos simultáneos que ese límite.
+# - Las fallas transitorias (servidor caído, timeout, 5xx) vuelven a la cola con espera creciente hasta
+#   MAX_INTENTOS; lo que quedó en curso al cerrar la aplicación se retoma al iniciar.
+# - Cada resultado se guarda como interacción IA del caso (tabla interacciones_ia, con una actividad que
+#   la referencia), igual que las consultas desde el diálogo, en cuanto termina el trabajo; los que
+#   terminan a la vez se guardan juntos en una sola transacción.
+import datetime
+import os
+import threading
+import time
+
+from cliente_ia import ErrorIA, IAErrorHTTP, IANoDisponible, IATimeout
+from contexto_ia import estimar_tokens
+
+VARIABLE_CONCURRENCIA = 'CRM_IA_CONCURRENCIA'
+CONCURRENCIA_POR_DEFECTO = 2
+CONCURRENCIA_MAXIMA = 8 # El pool de conexiones de ClienteIA
+MAX_INTENTOS = 4
+ESPERA_REINTENTO_BASE_S = 30
+ESPERA_REINTENTO_MAXIMA_S = 600
+ESPERA_SIN_TRABAJO_S = 30 # Sin reintentos pendientes, revisa la BD cada tanto igual
+DIAS_RESUMEN_ACTIVIDADES = 30
+
+OPERACIONES = {
+    'reformular_hechos': "Reformulación de Hechos",
+    'resumir_actividades': "Resumen de Actividades del Último Mes",
+}
+
+
+class TrabajoOmitido(Exception):
+    """ El caso no tiene material para la operación (no es un error ni se reintenta). """
+
+
+def _concurrencia_por_defecto():
+    try:
+        valor = int(os.environ.get(VARIABLE_CONCURRENCIA, CONCURRENCIA_POR_DEFECTO))
+    except ValueError:
+        valor = CONCURRENCIA_POR_DEFECTO
+    return max(1, min(CONCURRENCIA_MAXIMA, valor))
+
+
+def _es_transitorio(error):
+    return isinstance(error, (IANoDisponible, IATimeout)) or (isinstance(error, IAErrorHTTP) and error.estado >= 500)
+
+
+class ColaTrabajosIA:
+    """
+    iniciar() retoma lo pendiente y arranca los trabajadores; encolar() crea un lote; detener() los corta
+    (lo que esté en curso se retoma la próxima vez). al_cambio() se llama desde un hilo de la cola tras
+    cada escritura en la BD (envolver con root.after).
+    """
+
+    def __init__(self, db, cliente_ia, cache_ia=None, contexto_ia=None, max_concurrentes=None, max_intentos=MAX_INTENTOS,
+                 al_cambio=None):
+        self.db = db
+        self.cliente_ia = cliente_ia
+        self.cache_ia = cache_ia # CacheRespuestasIA: comparte las respuestas con el diálogo de reformulación
+        self.contexto_ia = contexto_ia # ConstructorContextoIA: material del caso que acompaña la reformulación
+        self.max_concurrentes = max_concurrentes or _concurrencia_por_defecto()
+        self.max_intentos = max_intentos
+        self.al_cambio = al_cambio
+        self._despertar = threading.Event()
+        self._detenido = threading.Event()
+        self._pausada = False
+        self._lock_toma = threading.Lock() # Las reservas en la BD de a una
+        self._lock_resultados = threading.Lock()
+        self._resultados = [] # Terminados todavía sin guardar
+        self._ocupados = 0
+        self._hilos = []
+
+    # --- API para la interfaz ---
+    def iniciar(self):
+        if self._hilos: return
+        reanudados = self.db.reanudar_trabajos_ia()
+        if reanudados:
+            print(f"[Cola IA] {reanudados} trabajos interrumpidos vuelven a la cola.")
+        for n in range(self.max_concurrentes):
+            hilo = threading.Thread(target=self._bucle, daemon=True, name=f"cola_ia_{n}")
+            hilo.start(); self._hilos.append(hilo)
+
+    def encolar(self, operacion, caso_ids):
+        """ (lote, creados). creados es None si falló la BD. """
+        if operacion not in OPERACIONES:
+            raise ValueError(f"Operación IA desconocida: {operacion}")
+        lote = f"{datetime.datetime.now():%Y-%m-%d %H:%M:%S} - {OPERACIONES[operacion]}"
+        creados = self.db.crear_trabajos_ia(lote, operacion, caso_ids)
+        if creados:
+            self._despertar.set()
+        return lote, creados
+
+    @property
+    def pausada(self):
+        return self._pausada
+
+    def pausar(self):
+        self._pausada = True # Los trabajos en curso terminan; no se toman nuevos
+
+    def reanudar(self):
+        self._pausada = False
+        self._despertar.set()
+
+    def despertar(self):
+        self._despertar.set()
+
+    @property
+    def ocupados(self):
+        return self._ocupados
+
+    def detener(self):
+        self._detenido.set(); self._despertar.set()
+        self._guardar_resultados() # Lo terminado no se pierde; lo que sigue en curso queda 'en_curso' en la BD
+
+    # --- Hilos trabajadores ---
+    def _bucle(self):
+        while not self._detenido.is_set():
+            try:
+                trabajo = None
+                if not self._pausada:
+                    with self._lock_toma:
+                        trabajo = self.db.tomar_trabajo_ia()
+                if trabajo is None:
+                    if self._ocupados == 0:
+                        self._guardar_resultados() # Sin nada más en curso: que no espere el lote
+                    self._despertar.wait(self._espera_sin_trabajo())
+                    self._despertar.clear()
+                    continue
+                self._avisar_cambio() # Pasó a 'en_curso'
+                with self._lock_resultados: self._ocupados += 1
+                try:
+                    resultado = self._ejecutar(trabajo)
+                finally:
+                    with self._lock_resultados: self._ocupados -= 1
+                if self._detenido.is_set(): break # El trabajo queda 'en_curso' y se rehace al próximo inicio
+                self._agregar_resultado(resultado)
+            except Exception as e:
+                print(f"[Cola IA] Error en el bucle de trabajos: {e}")
+                self._detenido.wait(10)
+
+    def _espera_sin_trabajo(self):
+        """ Hasta que venza el reintento pendiente más próximo (o ESPERA_SIN_TRABAJO_S si no hay). """
+        proximo = self.db.proximo_reintento_trabajo_ia()
+        if proximo is None:
+            return ESPERA_SIN_TRABAJO_S
+        return min(ESPERA_SIN_TRABAJO_S, max(0.1, proximo - time.time()))
+
+    def _ejecutar(self, trabajo):
+        resultado = {'id': trabajo['id'], 'estado': 'hecho', 'error': None, 'interaccion': None}
+        inicio = time.perf_counter()
+        try:
+            tipo_consulta, consulta, contexto, respuesta = self._consultar(trabajo)
+        except TrabajoOmitido as e:
+            resultado.update(estado='omitido', error=str(e))
+        except ErrorIA as e:
+            intentos = trabajo['intentos'] + 1
+            if _es_transitorio(e) and intentos < self.max_intentos:
+                espera = min(ESPERA_REINTENTO_MAXIMA_S, ESPERA_REINTENTO_BASE_S * 2 ** (intentos - 1))
+                resultado.update(estado='pendiente', error=str(e), proximo_intento_at=int(time.time() + espera))
+                print(f"[Cola IA] Trabajo {trabajo['id']} (caso {trabajo['caso_id']}) falló, se reintenta en {espera} s: {type(e).__name__}")
+            else:
+                resultado.update(estado='error', error=str(e))
+        except Exception as e:
+            resultado.update(estado='error', error=f"{type(e).__name__}: {e}")
+        else:
+            segundos = time.perf_counter() - inicio
+            resultado['interaccion'] = {
+                'caso_id': trabajo['caso_id'], 'fecha_hora': datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                'tipo_consulta': tipo_consulta, 'consulta': consulta, 'respuesta': respuesta, 'contexto': contexto,
+                'modelo': self.cliente_ia.parametros_modelo()['modelo'] or None, 'latencia_ms': segundos * 1000,
+                'tokens_consulta': estimar_tokens(consulta + (contexto or '')), 'tokens_respuesta': estimar_tokens(respuesta)}
+            print(f"[Cola IA] Trabajo {trabajo['id']} (caso {trabajo['caso_id']}) listo en {segundos:.1f} s")
+        return resultado
+
+    def _consultar(self, trabajo):
+        """ (tipo_consulta, consulta, contexto, respuesta) o lanza TrabajoOmitido / ErrorIA. """
+        caso_id, operacion = trabajo['caso_id'], trabajo['operacion']
+        caso = self.db.get_case_by_id(caso_id)
+        if not caso:
+            raise TrabajoOmitido("El caso ya no existe.")
+        contexto = None
+        if operacion == 'reformular_hechos':
+            consulta = (caso['notas'] or '').strip()
+            if not consulta:
+                raise TrabajoOmitido("El caso no tiene notas con los hechos.")
+            contexto = self.contexto_ia.construir(caso_id) if self.contexto_ia is not None else None
+            respuesta = self._pedir('/api/reformular_hechos', consulta, 'hechos_reformulados',
+                                    lambda: self.cliente_ia.reformular_hechos(consulta, contexto_caso=contexto), contexto=contexto)
+        elif operacion == 'resumir_actividades':
+            desde = (datetime.date.today() - datetime.timedelta(days=DIAS_RESUMEN_ACTIVIDADES)).isoformat()
+            # Sin las consultas a la IA anteriores: no se resumen resúmenes
+            actividades = self.db.get_actividades_caso_desde(caso_id, desde, excluir_tipo_prefijo=self.db.PREFIJO_ACTIVIDAD_IA)
+            if not actividades:
+                raise TrabajoOmitido(f"Sin actividades en los últimos {DIAS_RESUMEN_ACTIVIDADES} días.")
+            consulta = '\n'.join(f"{fecha} - {tipo}: {descripcion}" for fecha, tipo, descripcion in actividades)
+            respuesta = self._pedir('/api/resumir_actividades', consulta, 'resumen',
+                                    lambda: self.cliente_ia.resumir_actividades(consulta, caso['caratula']))
+        else:
+            raise TrabajoOmitido(f"Operación desconocida: {operacion}")
+        return OPERACIONES[operacion], consulta, contexto, respuesta
+
+    def _pedir(self, endpoint, consulta, campo, pedir, contexto=None):
+        clave = None
+        if self.cache_ia is not None:
+            clave = self.cache_ia.clave(endpoint, consulta, dict(self.cliente_ia.parametros_modelo(), contexto=contexto))
+            en_cache = self.cache_ia.obtener(clave)
+            if en_cache:
+                return en_cache['respuesta']
+        respuesta_json = pedir()
+        if campo not in respuesta_json:
+            raise ErrorIA(f"Error devuelto por el Asistente IA: {respuesta_json.get('error', 'respuesta sin contenido')}")
+        respuesta = respuesta_json[campo]
+        if clave is not None:
+            self.cache_ia.guardar(clave, endpoint, respuesta)
+        return respuesta
+
+    # --- Escrituras ---
+    def _agregar_resultado(self, resultado):
+        # Se guarda ya: mientras otro trabajador sigue con un pedido largo, lo terminado no debe quedar
+        # 'en_curso' en la BD. Si otros terminaron a la vez, el primero en guardar se lleva todos.
+        with self._lock_resultados:
+            self._resultados.append(resultado)
+        self._guardar_resultados()
+
+    def _guardar_resultados(self):
+        with self._lock_resultados:
+            resultados, self._resultados = self._resultados, []
+        if not resultados: return
+        if self.db.finalizar_trabajos_ia(resultados):
+            if any(r['estado'] == 'pendiente' for r in resultados):
+                self._despertar.set() # Los que esperan recalculan hasta cuándo con el nuevo reintento
+            self._avisar_cambio()
+        else:
+            # Quedan 'en_curso' en la BD: se reintentan al próximo inicio en vez de perderse en silencio
+            print(f"[Cola IA] No se pudieron guardar {len(resultados)} resultados.")
+
+    def _avisar_cambio(self):
+        if self.al_cambio:
+            try:
+                self.al_cambio()
+            except Exception as e:
+                print(f"[Cola IA] Error informando cambios: {e}")
@@ -0,0 +1,209 @@
+# contexto_ia.py
+# Contexto del caso para las consultas al Asistente IA: carátula y datos del expediente, próximas
+# audiencias, tareas pendientes, partes, actividades recientes y notas, ajustado a un presupuesto de
+# tokens (CRM_IA_TOKENS_CONTEXTO, 1500 por defecto).
+# - Cada sección tiene una cuota del presupuesto y una prioridad; lo que sobra de una sección pasa a las
+#   siguientes por orden de prioridad. Los ítems largos se recortan y los que no entran se resumen en
+#   una línea ("+12 actividades anteriores: 5 Escrito Presentado, 4 Llamada...").
+# - Los contextos armados se guardan por caso y se descartan cuando la BD avisa una escritura sobre ese
+#   caso (registrar_oyente_cambios); además vencen al cambiar el día (audiencias "próximas").
+import datetime
+import os
+import threading
+from collections import OrderedDict
+
+VARIABLE_PRESUPUESTO = 'CRM_IA_TOKENS_CONTEXTO'
+PRESUPUESTO_POR_DEFECTO = 1500
+CARACTERES_POR_TOKEN = 4 # Aproximación para español sin cargar un tokenizador
+MAX_CARACTERES_ITEM = 320
+DIAS_ACTIVIDADES = 90
+DIAS_AUDIENCIAS = 60
+MAX_CASOS_EN_CACHE = 64
+MIN_TOKENS_RECORTE = 40 # Con menos lugar que esto no vale la pena recortar un ítem para que entre
+
+# (clave, título, cuota del presupuesto) en orden de prioridad: lo primero es lo último en recortarse
+SECCIONES = (
+    ('audiencias', "Próximas audiencias", 0.12),
+    ('tareas', "Tareas pendientes", 0.18),
+    ('partes', "Partes intervinientes", 0.10),
+    ('actividades', "Actividades recientes (más nuevas primero)", 0.40),
+    ('notas', "Notas del caso", 0.20),
+)
+
+
+def estimar_tokens(texto):
+    return (len(texto) + CARACTERES_POR_TOKEN - 1) // CARACTERES_POR_TOKEN
+
+
+def _recortar(texto, max_caracteres=MAX_CARACTERES_ITEM):
+    texto = ' '.join((texto or '').split())
+    return texto if len(texto) <= max_caracteres else texto[:max_caracteres - 1].rstrip() + "…"
+
+
+def _presupuesto_por_defecto():
+    try:
+        return max(200, int(os.environ.get(VARIABLE_PRESUPUESTO, PRESUPUESTO_POR_DEFECTO)))
+    except ValueError:
+        return PRESUPUESTO_POR_DEFECTO
+
+
+# --- Armado ---
+def _cabecera(caso):
+    lineas = [f"Carátula: {caso['caratula']}"]
+    expediente = ' / '.join(str(v) for v in (caso.get('numero_expediente'), caso.get('anio_caratula')) if v)
+    if expediente: lineas.append(f"Expediente: {expediente}")
+    for campo, nombre in (('juzgado', "Juzgado"), ('jurisdiccion', "Jurisdicción"), ('etapa_procesal', "Etapa procesal")):
+        if caso.get(campo): lineas.append(f"{nombre}: {_recortar(caso[campo], 160)}")
+    return lineas
+
+
+def _items(material):
+    """ {clave de sección: [líneas en orden de importancia]} """
+    tareas = []
+    for t in material['tareas']:
+        vence = f"vence {t['fecha_vencimiento']}" if t['fecha_vencimiento'] else "sin vencimiento"
+        plazo = " (PLAZO PROCESAL)" if t['es_plazo_procesal'] else ""
+        tareas.append(f"- [{t['prioridad'] or 'Media'}] {vence}{plazo}: {_recortar(t['descripcion'])}")
+    partes = [f"- {p['nombre']}" + (f" ({p['tipo']})" if p['tipo'] else "") + (f": {_recortar(p['notas'], 120)}" if p['notas'] else "")
+              for p in material['partes']]
+    notas = [_recortar(parrafo, MAX_CARACTERES_ITEM * 2) for parrafo in (material['caso'].get('notas') or '').split('\n') if parrafo.strip()]
+    return {
+        'audiencias': [f"- {a['fecha']} {a['hora'] or ''}: {_recortar(a['descripcion'])}".replace("  ", " ") for a in material['audiencias']],
+        'tareas': tareas,
+        'partes': partes,
+        'actividades': [f"- {a['fecha_hora'][:10]} {a['tipo_actividad']}: {_recortar(a['descripcion'])}" for a in material['actividades']],
+        'notas': notas,
+    }
+
+
+def _resumen_omitidos(clave, omitidos, material):
+    if clave == 'actividades':
+        por_tipo = {}
+        for a in material['actividades'][-len(omitidos):]:
+            por_tipo[a['tipo_actividad']] = por_tipo.get(a['tipo_actividad'], 0) + 1
+        detalle = ', '.join(f"{n} {tipo}" for tipo, n in sorted(por_tipo.items(), key=lambda x: -x[1])[:4])
+        return f"(+{len(omitidos)} actividades anteriores: {detalle})"
+    if clave == 'notas':
+        return f"(+{len(omitidos)} párrafos de notas omitidos)"
+    return f"(+{len(omitidos)} más)"
+
+
+def ajustar_a_presupuesto(material, presupuesto_tokens):
+    """
+    Texto del contexto. La cabecera siempre entra; las secciones, según cuota y prioridad. A cada sección
+    se le carga todo lo que ocupa en el texto: línea en blanco, título, ítems y la línea de resumen de los
+    omitidos; una sección que no entra ni con título y resumen no aparece.
+    """
+    cabecera = _cabecera(material['caso'])
+    restante = presupuesto_tokens - sum(estimar_tokens(l) + 1 for l in cabecera)
+    items = _items(material)
+    incluidos = {clave: [] for clave, _titulo, _cuota in SECCIONES}
+    gastado = {clave: 0 for clave, _titulo, _cuota in SECCIONES} # 0 = la sección no aparece
+    resumen = {clave: 0 for clave, _titulo, _cuota in SECCIONES} # Parte de gastado que es la línea de resumen
+
+    def costo_resumen(clave, omitidos):
+        return estimar_tokens(_resumen_omitidos(clave, omitidos, material)) + 1 if omitidos else 0
+
+    def costo_titulo(titulo):
+        return 1 + estimar_tokens(f"{titulo}:") + 1 # Línea en blanco y título
+
+    def tomar(clave, titulo, limite):
+        nonlocal restante
+        pendientes = items[clave][len(incluidos[clave]):]
+        for n, linea in enumerate(pendientes):
+            base = gastado[clave] - resumen[clave] if gastado[clave] else costo_titulo(titulo)
+            costo_nuevo_resumen = costo_resumen(clave, pendientes[n + 1:])
+            disponible = min(limite - gastado[clave], restante)
+            nuevo = base + estimar_tokens(linea) + 1 + costo_nuevo_resumen
+            if nuevo - gastado[clave] > disponible:
+                # Un ítem largo entra recortado si queda lugar razonable; los siguientes van al resumen
+                caracteres = (gastado[clave] + disponible - base - costo_nuevo_resumen - 1) * CARACTERES_POR_TOKEN
+                if caracteres < MIN_TOKENS_RECORTE * CARACTERES_POR_TOKEN: break
+                linea = _recortar(linea, caracteres)
+                nuevo = base + estimar_tokens(linea) + 1 + costo_nuevo_resumen
+            incluidos[clave].append(linea)
+            restante -= nuevo - gastado[clave]
+            gastado[clave], resumen[clave] = nuevo, costo_nuevo_resumen
+
+    # 1) Cada sección hasta su cuota; 2) lo que sobró, por orden de prioridad
+    for clave, titulo, cuota in SECCIONES:
+        tomar(clave, titulo, int(presupuesto_tokens * cuota))
+    for clave, titulo, _cuota in SECCIONES:
+        tomar(clave, titulo, gastado[clave] + restante)
+    # 3) Secciones sin ningún ítem: solo título y resumen, si todavía entran
+    for clave, titulo, _cuota in SECCIONES:
+        if items[clave] and not gastado[clave]:
+            costo = costo_titulo(titulo) + costo_resumen(clave, items[clave])
+            if costo <= restante:
+                gastado[clave] = costo; restante -= costo
+
+    lineas = list(cabecera)
+    for clave, titulo, _cuota in SECCIONES:
+        if not gastado[clave]: continue
+        omitidos = items[clave][len(incluidos[clave]):]
+        lineas.append(""); lineas.append(f"{titulo}:")
+        lineas.extend(incluidos[clave])
+        if omitidos: lineas.append(_resumen_omitidos(clave, omitidos, material))
+    return '\n'.join(lineas)
+
+
+# --- Caché ---
+class ConstructorContextoIA:
+    """
+    construir(caso_id) -> texto del contexto (o None si el caso no existe). Se puede llamar desde
+    cualquier hilo; la caché se invalida sola con los avisos de escritura de la BD.
+    """
+
+    def __init__(self, db, presupuesto_tokens=None, max_casos=MAX_CASOS_EN_CACHE):
+        self.db = db
+        self.presupuesto_tokens = presupuesto_tokens or _presupuesto_por_defecto()
+        self.max_casos = max_casos
+        self._lock = threading.Lock()
+        self._cache = OrderedDict() # {(caso_id, presupuesto): (fecha, texto)}, LRU
+        self._generaciones = {} # {caso_id: escrituras vistas}: descarta armados que se cruzaron con una escritura
+        self._generacion_global = 0
+        self.aciertos = 0
+        self.armados = 0
+        db.registrar_oyente_cambios(self._on_cambio_db)
+
+    def construir(self, caso_id, presupuesto_tokens=None):
+        presupuesto = presupuesto_tokens or self.presupuesto_tokens
+        clave, hoy = (caso_id, presupuesto), datetime.date.today()
+        with self._lock:
+            en_cache = self._cache.get(clave)
+            if en_cache and en_cache[0] == hoy:
+                self._cache.move_to_end(clave); self.aciertos += 1
+                return en_cache[1]
+            generacion = self._generacion(caso_id)
+        material = self.db.get_material_contexto_caso(
+            caso_id, (hoy - datetime.timedelta(days=DIAS_ACTIVIDADES)).isoformat(),
+            hoy.isoformat(), (hoy + datetime.timedelta(days=DIAS_AUDIENCIAS)).isoformat())
+        if material is None:
+            return None
+        texto = ajustar_a_presupuesto(material, presupuesto)
+        with self._lock:
+            self.armados += 1
+            # Si hubo una escritura del caso mientras se armaba, no se guarda (podría estar desactualizado)
+            if self._generacion(caso_id) == generacion:
+                self._cache[clave] = (hoy, texto); self._cache.move_to_end(clave)
+                while len(self._cache) > self.max_casos:
+                    self._cache.popitem(last=False)
+        return texto
+
+    def _generacion(self, caso_id):
+        return self._generaciones.get(caso_id, 0) + self._generacion_global
+
+    def invalidar(self, caso_id=None):
+        with self._lock:
+            if caso_id is None:
+                self._cache.clear(); self._generacion_global += 1
+            else:
+                for clave in [c for c in self._cache if c[0] == caso_id]:
+                    del self._cache[clave]
+                self._generaciones[caso_id] = self._generaciones.get(caso_id, 0) + 1
+
+    def _on_cambio_db(self, entidad, entidad_id, caso_id, fechas):
+        if entidad in ('caso', 'actividad', 'parte', 'tarea', 'audiencia') and caso_id is not None:
+            self.invalidar(caso_id)
+        elif entidad in ('cliente', 'caso'):
+            self.invalidar() # Borrado en cascada sin caso conocido: todo
@@ -2,10 +2,46 @@ import sqlite3
 import os
 import time # Para timestamps
 import datetime # Para fechas de audiencias
+import socket # Para identificar la estación en el registro de recordatorios
+import re # Consultas FTS5 seguras a partir de lo que escribe el usuario
+import zlib # Consultas y respuestas del Asistente IA guardadas comprimidas
+import registros # Filas compactas (alternativa a dict(row))
 
 # Nombre del archivo de la base de datos
 DATABASE_FILE = 'crm_legal.db'
 
+# Columnas que las vistas pueden pedir en las consultas de listas (proyecciones)
+COLUMNAS_CLIENTES = ('id', 'nombre', 'direccion', 'email', 'whatsapp', 'created_at')
+COLUMNAS_CASOS = ('id', 'cliente_id', 'numero_expediente', 'anio_caratula', 'caratula', 'juzgado', 'jurisdiccion',
+                  'etapa_procesal', 'notas', 'ruta_carpeta', 'inactivity_threshold_days', 'inactivity_enabled',
+                  'created_at', 'last_activity_timestamp')
+COLUMNAS_ACTIVIDADES = ('id', 'caso_id', 'fecha_hora', 'tipo_actividad', 'descripcion', 'creado_por', 'referencia_documento')
+# Columnas calculadas: la lista de seguimiento solo muestra el comienzo de la descripción
+COLUMNAS_CALCULADAS_ACTIVIDADES = {'descripcion_corta': 'substr(descripcion, 1, 120)'}
+# Actividades que registran una consulta al Asistente IA (el texto completo va en interacciones_ia)
+PREFIJO_ACTIVIDAD_IA = "Asistencia IA"
+# Índice de documentos: orden permitido en las consultas de listado (columna SQL por clave de la vista)
+ORDENES_DOCUMENTOS = {'nombre': 'nombre COLLATE NOCASE', 'tamano': 'tamano', 'mtime': 'mtime', 'extension': 'extension'}
+# Tabla documentos; {tabla} permite crearla con otro nombre al reconstruirla en una migración
+DEFINICION_DOCUMENTOS = '''
+    CREATE TABLE IF NOT EXISTS {tabla} (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        caso_id INTEGER NOT NULL,
+        ruta TEXT NOT NULL,
+        ruta_relativa TEXT NOT NULL,
+        carpeta TEXT NOT NULL,
+        nombre TEXT NOT NULL,
+        es_carpeta INTEGER NOT NULL DEFAULT 0,
+        extension TEXT,
+        tamano INTEGER,
+        mtime REAL,
+        hash TEXT,
+        indexado_at INTEGER,
+        UNIQUE (caso_id, ruta),
+        FOREIGN KEY (caso_id) REFERENCES casos(id) ON DELETE CASCADE
+    );
+'''
+
 def connect_db():
     """ Establece una conexión con la base de datos SQLite. Crea el archivo si no existe. """
     try:
@@ -17,11 +53,80 @@ def connect_db():
         print(f"Error al conectar a la base de datos: {e}")
         return None
 
+def _proyeccion_columnas(columnas, permitidas, prefijo='', calculadas=None):
+    """ Arma la lista SELECT para una proyección, aceptando solo columnas conocidas. """
+    partes = []
+    for columna in columnas:
+        if columna in permitidas:
+            partes.append(f"{prefijo}{columna}")
+        elif calculadas and columna in calculadas:
+            partes.append(f"{calculadas[columna]} AS {columna}")
+        else:
+            print(f"Advertencia: columna '{columna}' no permitida en la proyección, se ignora.")
+    return ", ".join(partes)
+
 def close_db(conn):
     """ Cierra la conexión con la base de datos. """
     if conn:
         conn.close()
 
+# --- Notificación de cambios (para invalidar cachés de la interfaz) ---
+_oyentes_cambios = []
+
+def registrar_oyente_cambios(callback):
+    """
+    Registra callback(entidad, entidad_id, caso_id, fechas) que se invoca tras cada escritura
+    que afecta la agenda. 'fechas' es una tupla de fechas YYYY-MM-DD afectadas, o None si no se
+    conocen (p.ej. borrados en cascada) y hay que invalidar todo.
+    """
+    if callback not in _oyentes_cambios:
+        _oyentes_cambios.append(callback)
+
+def quitar_oyente_cambios(callback):
+    if callback in _oyentes_cambios:
+        _oyentes_cambios.remove(callback)
+
+def _notificar_cambio(entidad, entidad_id=None, caso_id=None, fechas=None):
+    if fechas is not None:
+        fechas = tuple(f for f in fechas if f)
+    for callback in list(_oyentes_cambios):
+        try:
+            callback(entidad, entidad_id, caso_id, fechas)
+        except Exception as e:
+            print(f"Error en oyente de cambios ({entidad} ID {entidad_id}): {e}")
+
+def _agregar_columna_si_falta(cursor, tabla, columna, definicion):
+    """ Migración simple: agrega la columna a una tabla existente si todavía no la tiene. """
+    cursor.execute(f"PRAGMA table_info({tabla})")
+    columnas = [row[1] for row in cursor.fetchall()]
+    if columna not in columnas:
+        cursor.execute(f"ALTER TABLE {tabla} ADD COLUMN {columna} {definicion}")
+        print(f"Columna '{columna}' agregada a la tabla '{tabla}'.")
+
+def _migrar_documentos_clave_por_caso(cursor):
+    """
+    Bases anteriores tenían 'ruta' única en toda la tabla, así que dos casos con la misma carpeta se
+    robaban las entradas. SQLite no permite quitar esa restricción: se reconstruye la tabla con la
+    clave (caso_id, ruta) conservando los id (documentos_texto usa id como rowid).
+    """
+    unicos = [row[1] for row in cursor.execute("PRAGMA index_list(documentos)").fetchall() if row[2]]
+    claves = [[row[2] for row in cursor.execute(f"PRAGMA index_info('{nombre}')").fetchall()] for nombre in unicos]
+    if ['ruta'] not in claves:
+        return
+    cursor.execute("DROP TABLE IF EXISTS documentos_migracion")
+    cursor.execute(DEFINICION_DOCUMENTOS.format(tabla='documentos_migracion'))
+    nuevas = {row[1] for row in cursor.execute("PRAGMA table_info(documentos_migracion)").fetchall()}
+    columnas = []
+    for row in cursor.execute("PRAGMA table_info(documentos)").fetchall():
+        if row[1] not in nuevas: # Columnas agregadas después por _agregar_columna_si_falta
+            cursor.execute(f"ALTER TABLE documentos_migracion ADD COLUMN {row[1]} {row[2]}")
+        columnas.append(row[1])
+    lista = ", ".join(columnas)
+    cursor.execute(f"INSERT INTO documentos_migracion ({lista}) SELECT {lista} FROM documentos")
+    cursor.execute("DROP TABLE documentos") # Se lleva sus índices y el trigger de documentos_texto; se recrean abajo
+    cursor.execute("ALTER TABLE documentos_migracion RENAME TO documentos")
+    print("Tabla 'documentos' migrada: la ruta ahora es única por caso.")
+
 def create_tables():
     """ Crea las tablas en la base de datos si no existen, basado en el esquema. """
     conn = connect_db()
@@ -40,6 +145,8 @@ def create_tables():
                     created_at INTEGER
                 );
             ''')
+            # Orden estable (nombre, id) para paginar la lista de clientes por keyset
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_clientes_nombre_id ON clientes (nombre, id);')
 
             # Tabla casos
             cursor.execute('''
@@ -74,9 +181,11 @@ def create_tables():
                     recordatorio_activo INTEGER DEFAULT 0, 
                     recordatorio_minutos INTEGER DEFAULT 15,
                     created_at INTEGER,
+                    duracion_minutos INTEGER DEFAULT 60, -- Duración estimada, para detectar superposiciones
                     FOREIGN KEY (caso_id) REFERENCES casos(id) ON DELETE CASCADE
                 );
             ''')
+            _agregar_columna_si_falta(cursor, 'audiencias', 'duracion_minutos', 'INTEGER DEFAULT 60')
             cursor.execute('CREATE INDEX IF NOT EXISTS idx_audiencias_fecha ON audiencias (fecha);')
             cursor.execute('CREATE INDEX IF NOT EXISTS idx_audiencias_caso_id ON audiencias (caso_id);')
             cursor.execute('CREATE INDEX IF NOT EXISTS idx_audiencias_recordatorio ON audiencias (recordatorio_activo);')
@@ -205,6 +314,158 @@ def create_tables():
             cursor.execute('CREATE INDEX IF NOT EXISTS idx_tareas_recordatorio_activo ON tareas (recordatorio_activo, fecha_vencimiento);')
             # --- FIN NUEVA TABLA tareas ---
 
+            # --- NUEVA TABLA: reminder_deliveries (registro persistente de recordatorios entregados) ---
+            # La clave única (entidad, entidad_id, fire_time, alcance) permite "reclamar" un recordatorio
+            # con un solo INSERT OR IGNORE: solo una estación (o una por estación, según alcance) lo entrega.
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS reminder_deliveries (
+                    entidad TEXT NOT NULL,               -- 'audiencia', 'tarea', ...
+                    entidad_id INTEGER NOT NULL,
+                    fire_time TEXT NOT NULL,             -- YYYY-MM-DD HH:MM en que debía dispararse
+                    alcance TEXT NOT NULL DEFAULT '',    -- '' = una vez en total; nombre de estación = una vez por estación
+                    workstation TEXT,                    -- Estación que lo entregó
+                    delivered_at INTEGER NOT NULL,       -- Timestamp de entrega
+                    PRIMARY KEY (entidad, entidad_id, fire_time, alcance)
+                ) WITHOUT ROWID;
+            ''')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_reminder_deliveries_delivered_at ON reminder_deliveries (delivered_at);')
+            # --- FIN NUEVA TABLA reminder_deliveries ---
+
+            # --- NUEVA TABLA: ics_importados (UIDs de eventos .ics ya importados, para no duplicar) ---
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS ics_importados (
+                    uid TEXT PRIMARY KEY,
+                    audiencia_id INTEGER NOT NULL,
+                    importado_at INTEGER,
+                    FOREIGN KEY (audiencia_id) REFERENCES audiencias(id) ON DELETE CASCADE
+                );
+            ''')
+            # --- FIN NUEVA TABLA ics_importados ---
+
+            # --- NUEVA TABLA: documentos (índice de archivos y subcarpetas bajo la ruta_carpeta de cada caso) ---
+            # Se refresca comparando tamaño/mtime, así que un re-escaneo solo escribe lo que cambió.
+            # hash queda NULL hasta que alguien lo calcule (p.ej. el buscador de duplicados) y se
+            # borra solo cuando cambian tamaño o mtime. La clave es (caso_id, ruta): dos casos con la
+            # misma carpeta (o una dentro de la otra) tienen cada uno su propia entrada.
+            cursor.execute(DEFINICION_DOCUMENTOS.format(tabla='documentos'))
+            _migrar_documentos_clave_por_caso(cursor)
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_documentos_caso_carpeta ON documentos (caso_id, carpeta);')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_documentos_caso_nombre ON documentos (caso_id, nombre COLLATE NOCASE);')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_documentos_caso_relativa ON documentos (caso_id, ruta_relativa);')
+            # Buscador de duplicados: agrupa archivos por tamaño antes de leer su contenido
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_documentos_tamano ON documentos (tamano) WHERE es_carpeta = 0;')
+            # Seguimiento de la extracción de texto: tamaño/mtime con los que se extrajo por última vez.
+            # Si no coinciden con tamano/mtime el archivo está pendiente (así se retoma tras un cierre).
+            _agregar_columna_si_falta(cursor, 'documentos', 'texto_tamano', 'INTEGER')
+            _agregar_columna_si_falta(cursor, 'documentos', 'texto_mtime', 'REAL')
+            _agregar_columna_si_falta(cursor, 'documentos', 'texto_estado', 'TEXT')
+            # --- FIN NUEVA TABLA documentos ---
+
+            # --- NUEVA TABLA: documentos_texto (FTS5 con el contenido de los documentos; rowid = documentos.id) ---
+            try:
+                cursor.execute('''
+                    CREATE VIRTUAL TABLE IF NOT EXISTS documentos_texto
+                    USING fts5(nombre, contenido, tokenize = 'unicode61 remove_diacritics 2');
+                ''')
+                # Al borrar un documento (también en cascada al borrar el caso) se va su texto
+                cursor.execute('''
+                    CREATE TRIGGER IF NOT EXISTS documentos_texto_ad AFTER DELETE ON documentos BEGIN
+                        DELETE FROM documentos_texto WHERE rowid = old.id;
+                    END;
+                ''')
+            except sqlite3.OperationalError as e:
+                print(f"Advertencia: SQLite sin FTS5, la búsqueda en el contenido de documentos no estará disponible: {e}")
+            # --- FIN NUEVA TABLA documentos_texto ---
+
+            # --- NUEVA TABLA: cache_ia (respuestas del Asistente IA por hash de entrada normalizada + endpoint + parámetros) ---
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS cache_ia (
+                    clave TEXT PRIMARY KEY,
+                    endpoint TEXT NOT NULL,
+                    respuesta TEXT NOT NULL,
+                    tamano INTEGER NOT NULL,
+                    creado_at INTEGER NOT NULL,
+                    usado_at INTEGER NOT NULL,
+                    aciertos INTEGER NOT NULL DEFAULT 0
+                );
+            ''')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_cache_ia_usado ON cache_ia (usado_at);')
+            # --- FIN NUEVA TABLA cache_ia ---
+
+            # --- NUEVA TABLA: trabajos_ia (cola persistente de operaciones del Asistente IA por lotes de casos) ---
+            # estado: pendiente / en_curso / hecho / error / omitido / cancelado. Los 'en_curso' que quedan
+            # al cerrar la aplicación se vuelven a 'pendiente' al iniciar (reanudar_trabajos_ia).
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS trabajos_ia (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    lote TEXT NOT NULL,
+                    caso_id INTEGER NOT NULL,
+                    operacion TEXT NOT NULL,
+                    estado TEXT NOT NULL DEFAULT 'pendiente',
+                    intentos INTEGER NOT NULL DEFAULT 0,
+                    proximo_intento_at INTEGER NOT NULL DEFAULT 0,
+                    error TEXT,
+                    creado_at INTEGER NOT NULL,
+                    actualizado_at INTEGER,
+                    FOREIGN KEY (caso_id) REFERENCES casos(id) ON DELETE CASCADE
+                );
+            ''')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_trabajos_ia_estado ON trabajos_ia (estado, proximo_intento_at);')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_trabajos_ia_lote ON trabajos_ia (lote);')
+            # --- FIN NUEVA TABLA trabajos_ia ---
+
+            # --- NUEVA TABLA: interacciones_ia (consulta y respuesta completas del Asistente IA, comprimidas con zlib) ---
+            # La actividad del caso guarda solo una referencia corta; el texto completo se lee de acá al abrir el detalle.
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS interacciones_ia (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    caso_id INTEGER NOT NULL,
+                    actividad_id INTEGER UNIQUE,
+                    tipo_consulta TEXT NOT NULL,
+                    modelo TEXT,
+                    consulta BLOB NOT NULL,
+                    contexto BLOB,
+                    respuesta BLOB NOT NULL,
+                    caracteres_consulta INTEGER NOT NULL,
+                    caracteres_respuesta INTEGER NOT NULL,
+                    tokens_consulta INTEGER,
+                    tokens_respuesta INTEGER,
+                    latencia_ms INTEGER,
+                    creado_at INTEGER NOT NULL,
+                    FOREIGN KEY (caso_id) REFERENCES casos(id) ON DELETE CASCADE,
+                    FOREIGN KEY (actividad_id) REFERENCES actividades_caso(id) ON DELETE CASCADE
+                );
+            ''')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_interacciones_ia_caso ON interacciones_ia (caso_id, creado_at);')
+            # --- FIN NUEVA TABLA interacciones_ia ---
+
+            # --- NUEVAS TABLAS: índice semántico (los vectores están en un archivo aparte, ver indice_semantico.py) ---
+            # fuentes_semanticas: qué versión (huella) de cada actividad, nota de caso o documento está indexada.
+            # vectores_semanticos: a qué fuente y fragmento corresponde cada fila del archivo de vectores.
+            # Son datos derivados: sin claves foráneas, lo borrado se detecta al comparar y se libera.
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS fuentes_semanticas (
+                    origen TEXT NOT NULL,
+                    origen_id INTEGER NOT NULL,
+                    caso_id INTEGER NOT NULL,
+                    huella TEXT NOT NULL,
+                    indexado_at INTEGER NOT NULL,
+                    PRIMARY KEY (origen, origen_id)
+                );
+            ''')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_fuentes_semanticas_caso ON fuentes_semanticas (caso_id);')
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS vectores_semanticos (
+                    fila INTEGER PRIMARY KEY,
+                    origen TEXT NOT NULL,
+                    origen_id INTEGER NOT NULL,
+                    caso_id INTEGER NOT NULL,
+                    parte INTEGER NOT NULL
+                );
+            ''')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_vectores_semanticos_fuente ON vectores_semanticos (origen, origen_id);')
+            # --- FIN NUEVAS TABLAS índice semántico ---
+
             conn.commit()
             print("Tablas verificadas/creadas con éxito (partes_intervinientes actualizada).")
         except sqlite3.Error as e:
@@ -286,21 +547,111 @@ def add_client(nombre, direccion="", email="", whatsapp=""):
         finally:
             close_db(conn)
 
-def get_clients():
+def get_clients(compacto=False, columnas=None):
+    """
+    Lista de clientes ordenada por nombre. Por defecto devuelve dicts; con compacto=True devuelve
+    registros compactos (registros.py) y con 'columnas' solo trae las columnas indicadas.
+    """
     conn = connect_db()
     clients = []
     if conn:
         try:
+            select = _proyeccion_columnas(columnas, COLUMNAS_CLIENTES) if columnas else ', '.join(COLUMNAS_CLIENTES)
+            if compacto:
+                conn.row_factory = None # Tuplas simples: evita crear un sqlite3.Row por fila
             cursor = conn.cursor()
-            cursor.execute('SELECT id, nombre, direccion, email, whatsapp, created_at FROM clientes ORDER BY nombre')
+            cursor.execute(f'SELECT {select} FROM clientes ORDER BY nombre')
             rows = cursor.fetchall()
-            clients = [dict(row) for row in rows]
+            clients = registros.filas_a_registros(cursor, rows, 'clientes') if compacto else [dict(row) for row in rows]
         except sqlite3.Error as e:
             print(f"Error al obtener clientes: {e}")
         finally:
             close_db(conn)
     return clients
 
+# Columnas por las que se puede ordenar/paginar la lista de clientes
+ORDENES_CLIENTES = ('nombre', 'id')
+
+def _orden_clientes(orden, descendente):
+    if orden not in ORDENES_CLIENTES:
+        print(f"Advertencia: orden '{orden}' no permitido para clientes, se usa 'nombre'.")
+        orden = 'nombre'
+    direccion = 'DESC' if descendente else 'ASC'
+    # El id desempata: con nombres repetidos el orden sigue siendo total y la paginación no salta filas
+    clausula = f"{orden} {direccion}" if orden == 'id' else f"{orden} {direccion}, id {direccion}"
+    return orden, clausula
+
+def contar_clientes():
+    conn = connect_db()
+    total = 0
+    if conn:
+        try:
+            cursor = conn.cursor()
+            cursor.execute('SELECT COUNT(*) FROM clientes')
+            total = cursor.fetchone()[0]
+        except sqlite3.Error as e:
+            print(f"Error al contar clientes: {e}")
+        finally:
+            close_db(conn)
+    return total
+
+def get_clients_pagina(offset, limite, orden='nombre', descendente=False, despues_de=None, columnas=None):
+    """
+    Una página de la lista de clientes como registros compactos.
+    Si se pasa despues_de=(valor_orden, id) de la última fila de la página anterior se pagina
+    por keyset (usa el índice y no recorre las filas salteadas); si no, por OFFSET.
+    """
+    conn = connect_db()
+    clients = []
+    if conn:
+        try:
+            orden, clausula = _orden_clientes(orden, descendente)
+            columnas = tuple(columnas) if columnas else COLUMNAS_CLIENTES
+            if orden not in columnas or 'id' not in columnas: # Hacen falta para el keyset de la página siguiente
+                columnas = tuple(dict.fromkeys(('id', orden) + columnas))
+            select = _proyeccion_columnas(columnas, COLUMNAS_CLIENTES)
+            conn.row_factory = None
+            cursor = conn.cursor()
+            if despues_de is not None:
+                comparador = '<' if descendente else '>'
+                if orden == 'id':
+                    cursor.execute(f'SELECT {select} FROM clientes WHERE id {comparador} ? ORDER BY {clausula} LIMIT ?',
+                                   (despues_de[1], limite))
+                else:
+                    cursor.execute(f'SELECT {select} FROM clientes WHERE ({orden}, id) {comparador} (?, ?) ORDER BY {clausula} LIMIT ?',
+                                   (despues_de[0], despues_de[1], limite))
+            else:
+                cursor.execute(f'SELECT {select} FROM clientes ORDER BY {clausula} LIMIT ? OFFSET ?', (limite, offset))
+            clients = registros.filas_a_registros(cursor, cursor.fetchall(), 'clientes')
+        except sqlite3.Error as e:
+            print(f"Error al obtener página de clientes (offset {offset}): {e}")
+        finally:
+            close_db(conn)
+    return clients
+
+def get_posicion_cliente(cliente_id, orden='nombre', descendente=False):
+    """ Índice (base 0) del cliente en la lista ordenada, o None si no existe. """
+    conn = connect_db()
+    posicion = None
+    if conn:
+        try:
+            orden, _ = _orden_clientes(orden, descendente)
+            cursor = conn.cursor()
+            cursor.execute(f'SELECT {orden}, id FROM clientes WHERE id = ?', (cliente_id,))
+            row = cursor.fetchone()
+            if row:
+                comparador = '>' if descendente else '<'
+                if orden == 'id':
+                    cursor.execute(f'SELECT COUNT(*) FROM clientes WHERE id {comparador} ?', (row[1],))
+                else:
+                    cursor.execute(f'SELECT COUNT(*) FROM clientes WHERE ({orden}, id) {comparador} (?, ?)', (row[0], row[1]))
+                posicion = cursor.fetchone()[0]
+        except sqlite3.Error as e:
+            print(f"Error al obtener posición del cliente ID {cliente_id}: {e}")
+        finally:
+            close_db(conn)
+    return posicion
+
 def get_client_by_id(client_id):
     conn = connect_db()
     client_data = None
@@ -346,6 +697,7 @@ def delete_client(client_id):
             cursor.execute('DELETE FROM clientes WHERE id = ?', (client_id,))
             conn.commit()
             success = True
+            _notificar_cambio('cliente', client_id) # Borra en cascada casos y audiencias
         except sqlite3.Error as e:
             print(f"Error al eliminar cliente ID {client_id}: {e}")
             conn.rollback()
@@ -374,21 +726,33 @@ def add_case(cliente_id, caratula, numero_expediente="", anio_caratula="", juzga
             close_db(conn)
     return new_id
 
-def get_cases_by_client(cliente_id):
+def get_cases_by_client(cliente_id, compacto=False, columnas=None):
+    """ Casos de un cliente. compacto/columnas funcionan igual que en get_clients. """
     conn = connect_db()
     cases = []
     if conn:
         try:
+            if columnas:
+                select = _proyeccion_columnas(columnas, COLUMNAS_CASOS, prefijo='ca.')
+                sql = f'''
+                    SELECT {select} FROM casos ca
+                    WHERE ca.cliente_id = ?
+                    ORDER BY ca.anio_caratula DESC, ca.numero_expediente ASC
+                '''
+            else:
+                sql = '''
+                    SELECT ca.*, cl.nombre as nombre_cliente
+                    FROM casos ca
+                    JOIN clientes cl ON ca.cliente_id = cl.id
+                    WHERE ca.cliente_id = ?
+                    ORDER BY ca.anio_caratula DESC, ca.numero_expediente ASC
+                '''
+            if compacto:
+                conn.row_factory = None
             cursor = conn.cursor()
-            cursor.execute('''
-                SELECT ca.*, cl.nombre as nombre_cliente
-                FROM casos ca
-                JOIN clientes cl ON ca.cliente_id = cl.id
-                WHERE ca.cliente_id = ?
-                ORDER BY ca.anio_caratula DESC, ca.numero_expediente ASC
-            ''', (cliente_id,))
+            cursor.execute(sql, (cliente_id,))
             rows = cursor.fetchall()
-            cases = [dict(row) for row in rows]
+            cases = registros.filas_a_registros(cursor, rows, 'casos') if compacto else [dict(row) for row in rows]
         except sqlite3.Error as e:
             print(f"Error al obtener casos por cliente: {e}")
         finally:
@@ -432,6 +796,7 @@ def update_case(case_id, caratula, numero_expediente, anio_caratula, juzgado, ju
             conn.commit()
             if cursor.rowcount > 0:
                 update_last_activity(case_id) # Actualizar si hubo cambios
+                _notificar_cambio('caso', case_id, case_id)
             success = True
         except sqlite3.Error as e:
             print(f"Error al actualizar caso ID {case_id}: {e}")
@@ -449,6 +814,7 @@ def delete_case(case_id):
             cursor.execute('DELETE FROM casos WHERE id = ?', (case_id,))
             conn.commit()
             success = True
+            _notificar_cambio('caso', case_id, case_id) # Borra en cascada audiencias
         except sqlite3.Error as e:
             print(f"Error al eliminar caso ID {case_id}: {e}")
             conn.rollback()
@@ -504,6 +870,7 @@ def add_actividad_caso(caso_id, fecha_hora, tipo_actividad, descripcion, creado_
             conn.commit()
             new_id = cursor.lastrowid
             update_last_activity(caso_id)
+            _notificar_cambio('actividad', new_id, caso_id)
             return new_id
         except sqlite3.Error as e:
             print(f"Error al agregar actividad al caso ID {caso_id}: {e}")
@@ -512,28 +879,97 @@ def add_actividad_caso(caso_id, fecha_hora, tipo_actividad, descripcion, creado_
         finally:
             close_db(conn)
 
-def get_actividades_by_caso_id(caso_id, order_desc=True):
+def get_actividades_by_caso_id(caso_id, order_desc=True, compacto=False, columnas=None):
+    """
+    Actividades de un caso. compacto/columnas funcionan igual que en get_clients; además se puede
+    pedir 'descripcion_corta' (primeros 120 caracteres) para no cargar descripciones largas en la lista.
+    """
     conn = connect_db()
     actividades = []
     if conn:
         try:
+            if columnas:
+                select = _proyeccion_columnas(columnas, COLUMNAS_ACTIVIDADES, calculadas=COLUMNAS_CALCULADAS_ACTIVIDADES)
+            else:
+                select = ', '.join(COLUMNAS_ACTIVIDADES)
+            if compacto:
+                conn.row_factory = None
             cursor = conn.cursor()
             order_direction = "DESC" if order_desc else "ASC"
             sql = f'''
-                SELECT id, caso_id, fecha_hora, tipo_actividad, descripcion, creado_por, referencia_documento 
+                SELECT {select}
                 FROM actividades_caso 
                 WHERE caso_id = ? 
                 ORDER BY datetime(fecha_hora) {order_direction}
             ''' # Usar datetime() para asegurar ordenamiento correcto de fechas como texto
             cursor.execute(sql, (caso_id,))
             rows = cursor.fetchall()
-            actividades = [dict(row) for row in rows]
+            actividades = registros.filas_a_registros(cursor, rows, 'actividades_caso') if compacto else [dict(row) for row in rows]
         except sqlite3.Error as e:
             print(f"Error al obtener actividades para el caso ID {caso_id}: {e}")
         finally:
             close_db(conn)
     return actividades
 
+def contar_actividades_caso(caso_id):
+    conn = connect_db()
+    total = 0
+    if conn:
+        try:
+            cursor = conn.cursor()
+            cursor.execute('SELECT COUNT(*) FROM actividades_caso WHERE caso_id = ?', (caso_id,))
+            total = cursor.fetchone()[0]
+        except sqlite3.Error as e:
+            print(f"Error al contar actividades del caso ID {caso_id}: {e}")
+        finally:
+            close_db(conn)
+    return total
+
+def iter_lotes_actividades_by_caso_id(caso_id, order_desc=True, columnas=None, tamano_lote=500):
+    """
+    Igual que get_actividades_by_caso_id(compacto=True) pero en lotes de registros, para que la
+    interfaz pueda ir mostrando la lista mientras se lee. Cada lote es una consulta corta que
+    sigue desde la clave (fecha, id) del anterior, y la conexión se cierra antes de entregarlo:
+    entre lote y lote no queda ninguna lectura abierta que bloquee a quien guarda actividades.
+    """
+    if columnas:
+        select = _proyeccion_columnas(columnas, COLUMNAS_ACTIVIDADES, calculadas=COLUMNAS_CALCULADAS_ACTIVIDADES)
+    else:
+        select = ', '.join(COLUMNAS_ACTIVIDADES)
+    order_direction = "DESC" if order_desc else "ASC"
+    comparacion = "<" if order_desc else ">"
+    orden = "COALESCE(datetime(fecha_hora), '')" # Las fechas vacías quedan al final (DESC) o al principio (ASC)
+    clase, ultima_clave = None, None
+    while True:
+        conn = connect_db()
+        if not conn:
+            return
+        try:
+            conn.row_factory = None
+            cursor = conn.cursor()
+            desde = f"AND ({orden}, id) {comparacion} (?, ?)" if ultima_clave else ""
+            cursor.execute(f'''
+                SELECT {select}, {orden}, id
+                FROM actividades_caso
+                WHERE caso_id = ? {desde}
+                ORDER BY {orden} {order_direction}, id {order_direction}
+                LIMIT ?
+            ''', (caso_id, *(ultima_clave or ()), tamano_lote))
+            if clase is None:
+                clase = registros.clase_registro('actividades_caso', [d[0] for d in cursor.description[:-2]])
+            rows = cursor.fetchall()
+        except sqlite3.Error as e:
+            print(f"Error al leer actividades del caso ID {caso_id}: {e}")
+            return
+        finally:
+            close_db(conn)
+        if not rows:
+            return
+        ultima_clave = rows[-1][-2:]
+        yield [clase._make(row[:-2]) for row in rows]
+        if len(rows) < tamano_lote:
+            return
+
 def get_actividad_by_id(actividad_id):
     conn = connect_db()
     actividad_data = None
@@ -574,6 +1010,7 @@ def update_actividad_caso(actividad_id, tipo_actividad, descripcion, referencia_
             conn.commit()
             if cursor.rowcount > 0 and row_check:
                 update_last_activity(row_check['caso_id'])
+                _notificar_cambio('actividad', actividad_id, row_check['caso_id'])
             success = True
         except sqlite3.Error as e:
             print(f"Error al actualizar actividad ID {actividad_id}: {e}")
@@ -596,6 +1033,7 @@ def delete_actividad_caso(actividad_id):
             conn.commit()
             if cursor.rowcount > 0 and row_check:
                 update_last_activity(row_check['caso_id'])
+                _notificar_cambio('actividad', actividad_id, row_check['caso_id'])
             success = True
         except sqlite3.Error as e:
             print(f"Error al eliminar actividad ID {actividad_id}: {e}")
@@ -636,6 +1074,7 @@ def add_tarea(descripcion, caso_id=None, fecha_vencimiento=None, prioridad='Medi
             new_id = cursor.lastrowid
             if new_id and caso_id:
                 update_last_activity(caso_id) # Actualizar timestamp del caso si la tarea está asociada
+            _notificar_cambio('tarea', new_id, caso_id, (fecha_vencimiento,))
             print(f"Tarea ID {new_id} ('{descripcion[:30]}...') agregada.")
         except sqlite3.Error as e:
             print(f"Error al agregar tarea: {e}")
@@ -761,6 +1200,9 @@ def update_tarea(tarea_id, descripcion, fecha_vencimiento=None, prioridad=None,
                 print(f"Tarea ID {tarea_id} actualizada con éxito.")
                 if current_tarea.get('caso_id'):
                     update_last_activity(current_tarea['caso_id'])
+                tarea_actualizada = get_tarea_by_id(tarea_id) or {}
+                _notificar_cambio('tarea', tarea_id, current_tarea.get('caso_id'),
+                                  (current_tarea.get('fecha_vencimiento'), tarea_actualizada.get('fecha_vencimiento')))
                 success = True
             else:
                 print(f"Tarea ID {tarea_id} no necesitó actualización (datos iguales).")
@@ -787,6 +1229,8 @@ def delete_tarea(tarea_id):
                 print(f"Tarea ID {tarea_id} eliminada con éxito.")
                 if current_tarea and current_tarea.get('caso_id'):
                     update_last_activity(current_tarea['caso_id'])
+                if current_tarea:
+                    _notificar_cambio('tarea', tarea_id, current_tarea.get('caso_id'), (current_tarea.get('fecha_vencimiento'),))
                 success = True
             else:
                 print(f"Advertencia: No se eliminó ninguna tarea con ID {tarea_id} (quizás ya no existía).")
@@ -851,8 +1295,65 @@ def update_fecha_ultima_notificacion_tarea(tarea_id):
 
 # --- Fin NUEVAS Funciones CRUD para Tareas ---
 
+# --- Registro de Entregas de Recordatorios ---
+
+def get_nombre_estacion():
+    """ Identificador de esta estación de trabajo para el registro de recordatorios. """
+    try:
+        return socket.gethostname() or "desconocida"
+    except OSError:
+        return "desconocida"
+
+def reclamar_entrega_recordatorio(entidad, entidad_id, fire_time, workstation=None, por_estacion=False):
+    """
+    Reclama de forma atómica la entrega de un recordatorio.
+    Devuelve True si esta llamada lo reclamó (hay que mostrarlo), False si ya había sido
+    entregado antes (por esta u otra estación) y None si no se pudo saber (p.ej. BD bloqueada):
+    en ese caso conviene reintentar más tarde.
+    Con por_estacion=True cada estación lo entrega una vez; si no, se entrega una sola vez en total.
+    """
+    workstation = workstation or get_nombre_estacion()
+    alcance = workstation if por_estacion else ''
+    conn = connect_db()
+    reclamado = None
+    if conn:
+        try:
+            cursor = conn.cursor()
+            cursor.execute('''
+                INSERT OR IGNORE INTO reminder_deliveries (entidad, entidad_id, fire_time, alcance, workstation, delivered_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', (entidad, entidad_id, fire_time, alcance, workstation, int(time.time())))
+            conn.commit()
+            reclamado = cursor.rowcount == 1
+        except sqlite3.Error as e:
+            print(f"Error al reclamar recordatorio {entidad} ID {entidad_id} ({fire_time}): {e}")
+            conn.rollback()
+        finally:
+            close_db(conn)
+    return reclamado
+
+def purgar_entregas_recordatorios(dias_retencion=30):
+    """ Elimina del registro las entregas más antiguas que dias_retencion. Devuelve la cantidad borrada. """
+    conn = connect_db()
+    borradas = 0
+    if conn:
+        try:
+            cursor = conn.cursor()
+            limite = int(time.time()) - int(dias_retencion) * 86400
+            cursor.execute('DELETE FROM reminder_deliveries WHERE delivered_at < ?', (limite,))
+            conn.commit()
+            borradas = cursor.rowcount
+        except sqlite3.Error as e:
+            print(f"Error al purgar registro de recordatorios: {e}")
+            conn.rollback()
+        finally:
+            close_db(conn)
+    return borradas
+
+# --- Fin Registro de Entregas de Recordatorios ---
+
 # --- Funciones CRUD para Audiencias (sin cambios en su lógica principal) ---
-def add_audiencia(caso_id, fecha, hora, descripcion, link="", recordatorio_activo=0, recordatorio_minutos=15):
+def add_audiencia(caso_id, fecha, hora, descripcion, link="", recordatorio_activo=0, recordatorio_minutos=15, duracion_minutos=60):
     conn = connect_db()
     new_id = None
     if conn:
@@ -860,12 +1361,13 @@ def add_audiencia(caso_id, fecha, hora, descripcion, link="", recordatorio_activ
             cursor = conn.cursor()
             timestamp = int(time.time())
             cursor.execute('''
-                INSERT INTO audiencias (caso_id, fecha, hora, descripcion, link, recordatorio_activo, recordatorio_minutos, created_at)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (caso_id, fecha, hora, descripcion, link, recordatorio_activo, recordatorio_minutos, timestamp))
+                INSERT INTO audiencias (caso_id, fecha, hora, descripcion, link, recordatorio_activo, recordatorio_minutos, created_at, duracion_minutos)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (caso_id, fecha, hora, descripcion, link, recordatorio_activo, recordatorio_minutos, timestamp, duracion_minutos))
             conn.commit()
             new_id = cursor.lastrowid
             update_last_activity(caso_id)
+            _notificar_cambio('audiencia', new_id, caso_id, (fecha,))
         except sqlite3.Error as e:
             print(f"Error al agregar audiencia: {e}")
             conn.rollback()
@@ -931,6 +1433,178 @@ def get_fechas_con_audiencias():
             close_db(conn)
     return fechas
 
+def get_fechas_con_audiencias_en_rango(fecha_desde, fecha_hasta):
+    """ Fechas distintas (YYYY-MM-DD) con audiencias entre fecha_desde y fecha_hasta, inclusive. Usa idx_audiencias_fecha. """
+    conn = connect_db()
+    fechas = []
+    if conn:
+        try:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT DISTINCT fecha FROM audiencias
+                WHERE fecha BETWEEN ? AND ?
+                ORDER BY fecha
+            ''', (fecha_desde, fecha_hasta))
+            rows = cursor.fetchall()
+            fechas = [row['fecha'] for row in rows]
+        except sqlite3.Error as e:
+            print(f"Error al obtener fechas con audiencias entre {fecha_desde} y {fecha_hasta}: {e}")
+        finally:
+            close_db(conn)
+    return fechas
+
+def get_agenda_en_rango(fecha_desde, fecha_hasta):
+    """
+    Audiencias y vencimientos de tareas entre fecha_desde y fecha_hasta (YYYY-MM-DD, inclusive)
+    en una sola consulta. Cada fila trae 'tipo' ('audiencia' o 'tarea') y columnas comunes.
+    """
+    conn = connect_db()
+    eventos = []
+    if conn:
+        try:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT 'audiencia' AS tipo, a.id, a.caso_id, a.fecha, a.hora, a.descripcion, a.link,
+                       NULL AS prioridad, NULL AS estado, 0 AS es_plazo_procesal, ca.caratula AS caso_caratula
+                FROM audiencias a
+                JOIN casos ca ON a.caso_id = ca.id
+                WHERE a.fecha BETWEEN ? AND ?
+                UNION ALL
+                SELECT 'tarea' AS tipo, t.id, t.caso_id, t.fecha_vencimiento AS fecha, NULL AS hora, t.descripcion, NULL AS link,
+                       t.prioridad, t.estado, t.es_plazo_procesal, ca.caratula AS caso_caratula
+                FROM tareas t
+                LEFT JOIN casos ca ON t.caso_id = ca.id
+                WHERE t.fecha_vencimiento BETWEEN ? AND ?
+                ORDER BY fecha, hora
+            ''', (fecha_desde, fecha_hasta, fecha_desde, fecha_hasta))
+            rows = cursor.fetchall()
+            eventos = [dict(row) for row in rows]
+        except sqlite3.Error as e:
+            print(f"Error al obtener agenda entre {fecha_desde} y {fecha_hasta}: {e}")
+        finally:
+            close_db(conn)
+    return eventos
+
+def get_intervalos_audiencias(fecha_desde=None, fecha_hasta=None):
+    """
+    Audiencias con hora (y su duración y juzgado) para el motor de superposiciones.
+    Sin fechas devuelve todo el calendario; con fechas usa idx_audiencias_fecha.
+    """
+    conn = connect_db()
+    intervalos = []
+    if conn:
+        try:
+            cursor = conn.cursor()
+            sql = '''
+                SELECT a.id, a.caso_id, a.fecha, a.hora, IFNULL(a.duracion_minutos, 60) AS duracion_minutos,
+                       a.descripcion, ca.caratula AS caso_caratula, ca.juzgado
+                FROM audiencias a
+                JOIN casos ca ON a.caso_id = ca.id
+                WHERE a.hora IS NOT NULL AND a.hora != ''
+            '''
+            params = []
+            if fecha_desde:
+                sql += " AND a.fecha >= ?"
+                params.append(fecha_desde)
+            if fecha_hasta:
+                sql += " AND a.fecha <= ?"
+                params.append(fecha_hasta)
+            sql += " ORDER BY a.fecha, a.hora"
+            cursor.execute(sql, params)
+            rows = cursor.fetchall()
+            intervalos = [dict(row) for row in rows]
+        except sqlite3.Error as e:
+            print(f"Error al obtener intervalos de audiencias: {e}")
+        finally:
+            close_db(conn)
+    return intervalos
+
+def iter_audiencias_para_ics(tamano_lote=500):
+    """ Generador de audiencias (mismos campos que get_audiencia_by_id) para exportar a .ics sin cargar todo en memoria. """
+    conn = connect_db()
+    if not conn:
+        return
+    try:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT a.*, ca.caratula as caso_caratula, ca.juzgado as caso_juzgado, cl.nombre as cliente_nombre
+            FROM audiencias a
+            JOIN casos ca ON a.caso_id = ca.id
+            JOIN clientes cl ON ca.cliente_id = cl.id
+            ORDER BY a.id
+        ''')
+        while True:
+            rows = cursor.fetchmany(tamano_lote)
+            if not rows:
+                break
+            for row in rows:
+                yield dict(row)
+    except sqlite3.Error as e:
+        print(f"Error al recorrer audiencias para .ics: {e}")
+    finally:
+        close_db(conn)
+
+def iter_tareas_para_ics(tamano_lote=500):
+    """ Generador de tareas con fecha de vencimiento (y la carátula del caso) para exportar a .ics. """
+    conn = connect_db()
+    if not conn:
+        return
+    try:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT t.id, t.caso_id, t.descripcion, t.fecha_vencimiento, t.prioridad, t.estado, t.notas,
+                   t.es_plazo_procesal, t.fecha_creacion, ca.caratula as caso_caratula
+            FROM tareas t
+            LEFT JOIN casos ca ON t.caso_id = ca.id
+            WHERE t.fecha_vencimiento IS NOT NULL AND t.fecha_vencimiento != ''
+            ORDER BY t.id
+        ''')
+        while True:
+            rows = cursor.fetchmany(tamano_lote)
+            if not rows:
+                break
+            for row in rows:
+                yield dict(row)
+    except sqlite3.Error as e:
+        print(f"Error al recorrer tareas para .ics: {e}")
+    finally:
+        close_db(conn)
+
+def get_audiencia_id_por_uid_ics(uid):
+    """ ID de la audiencia creada al importar el UID indicado, o None si no se importó (o fue borrada). """
+    conn = connect_db()
+    audiencia_id = None
+    if conn:
+        try:
+            cursor = conn.cursor()
+            cursor.execute('SELECT audiencia_id FROM ics_importados WHERE uid = ?', (uid,))
+            row = cursor.fetchone()
+            if row:
+                audiencia_id = row['audiencia_id']
+        except sqlite3.Error as e:
+            print(f"Error al buscar UID .ics '{uid}': {e}")
+        finally:
+            close_db(conn)
+    return audiencia_id
+
+def registrar_uid_ics_importado(uid, audiencia_id):
+    conn = connect_db()
+    success = False
+    if conn:
+        try:
+            cursor = conn.cursor()
+            cursor.execute('''
+                INSERT OR REPLACE INTO ics_importados (uid, audiencia_id, importado_at) VALUES (?, ?, ?)
+            ''', (uid, audiencia_id, int(time.time())))
+            conn.commit()
+            success = True
+        except sqlite3.Error as e:
+            print(f"Error al registrar UID .ics '{uid}': {e}")
+            conn.rollback()
+        finally:
+            close_db(conn)
+    return success
+
 def get_audiencias_con_recordatorio_activo():
     conn = connect_db()
     audiencias = []
@@ -956,25 +1630,27 @@ def get_audiencias_con_recordatorio_activo():
             close_db(conn)
     return audiencias
 
-def update_audiencia(audiencia_id, fecha, hora, descripcion, link, recordatorio_activo, recordatorio_minutos):
+def update_audiencia(audiencia_id, fecha, hora, descripcion, link, recordatorio_activo, recordatorio_minutos, duracion_minutos=None):
     conn = connect_db()
     success = False
     if conn:
         try:
             cursor = conn.cursor()
             cursor_check = conn.cursor()
-            cursor_check.execute('SELECT caso_id FROM audiencias WHERE id = ?', (audiencia_id,))
+            cursor_check.execute('SELECT caso_id, fecha FROM audiencias WHERE id = ?', (audiencia_id,))
             row_check = cursor_check.fetchone()
 
             cursor.execute('''
                 UPDATE audiencias
                 SET fecha = ?, hora = ?, descripcion = ?, link = ?,
-                    recordatorio_activo = ?, recordatorio_minutos = ?
+                    recordatorio_activo = ?, recordatorio_minutos = ?,
+                    duracion_minutos = COALESCE(?, duracion_minutos)
                 WHERE id = ?
-            ''', (fecha, hora, descripcion, link, recordatorio_activo, recordatorio_minutos, audiencia_id))
+            ''', (fecha, hora, descripcion, link, recordatorio_activo, recordatorio_minutos, duracion_minutos, audiencia_id))
             conn.commit()
             if cursor.rowcount > 0 and row_check:
                 update_last_activity(row_check['caso_id'])
+                _notificar_cambio('audiencia', audiencia_id, row_check['caso_id'], (row_check['fecha'], fecha))
             success = True
         except sqlite3.Error as e:
             print(f"Error al actualizar audiencia ID {audiencia_id}: {e}")
@@ -990,13 +1666,14 @@ def delete_audiencia(audiencia_id):
         try:
             cursor = conn.cursor()
             cursor_check = conn.cursor()
-            cursor_check.execute('SELECT caso_id FROM audiencias WHERE id = ?', (audiencia_id,))
+            cursor_check.execute('SELECT caso_id, fecha FROM audiencias WHERE id = ?', (audiencia_id,))
             row_check = cursor_check.fetchone()
 
             cursor.execute('DELETE FROM audiencias WHERE id = ?', (audiencia_id,))
             conn.commit()
             if cursor.rowcount > 0 and row_check:
                 update_last_activity(row_check['caso_id'])
+                _notificar_cambio('audiencia', audiencia_id, row_check['caso_id'], (row_check['fecha'],))
             success = True
         except sqlite3.Error as e:
             print(f"Error al eliminar audiencia ID {audiencia_id}: {e}")
@@ -1023,6 +1700,7 @@ def add_parte_interviniente(caso_id, nombre, tipo="", direccion="", contacto="",
             conn.commit()
             new_id = cursor.lastrowid
             update_last_activity(caso_id) # Actualizar timestamp del caso
+            _notificar_cambio('parte', new_id, caso_id)
             print(f"Parte ID {new_id} ('{nombre}') agregada al caso ID {caso_id}.")
         except sqlite3.Error as e:
             print(f"Error al agregar parte interviniente al caso ID {caso_id}: {e}")
@@ -1097,6 +1775,7 @@ def update_parte_interviniente(parte_id, nombre, tipo, direccion, contacto, nota
             
             if cursor.rowcount > 0 and row_check:
                 update_last_activity(row_check['caso_id']) # Actualizar timestamp del caso
+                _notificar_cambio('parte', parte_id, row_check['caso_id'])
                 print(f"Parte ID {parte_id} actualizada con éxito.")
                 success = True
             elif cursor.rowcount == 0:
@@ -1128,6 +1807,7 @@ def delete_parte_interviniente(parte_id):
 
             if cursor.rowcount > 0 and row_check:
                 update_last_activity(row_check['caso_id']) # Actualizar timestamp del caso
+                _notificar_cambio('parte', parte_id, row_check['caso_id'])
                 print(f"Parte ID {parte_id} eliminada con éxito.")
                 success = True
             elif row_check is None: # La parte no existía
@@ -1372,5 +2052,1195 @@ def get_etiquetas_de_caso(caso_id):
 
 # --- Fin Funciones CRUD para Etiquetas ---
 
+# --- Funciones para el Índice de Documentos ---
+# Las entradas que recibe/devuelve el índice son tuplas (ruta, nombre, es_carpeta, tamano, mtime),
+# el mismo orden de campos que escaner_carpetas.EntradaCarpeta.
+
+def get_documentos_indice_carpeta(caso_id, carpeta):
+    """ Entradas indexadas directamente dentro de 'carpeta' (sin recorrer subcarpetas). """
+    conn = connect_db()
+    entradas = []
+    if conn:
+        try:
+            conn.row_factory = None
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT ruta, nombre, es_carpeta, tamano, mtime FROM documentos
+                WHERE caso_id = ? AND carpeta = ?
+                ORDER BY es_carpeta DESC, nombre COLLATE NOCASE
+            ''', (caso_id, carpeta))
+            entradas = cursor.fetchall()
+        except sqlite3.Error as e:
+            print(f"Error al leer el índice de documentos de {carpeta}: {e}")
+        finally:
+            close_db(conn)
+    return entradas
+
+def get_firmas_documentos_caso(caso_id, carpeta=None):
+    """ {ruta: (es_carpeta, tamano, mtime)} del caso (o de una carpeta) para comparar con el disco. """
+    conn = connect_db()
+    firmas = {}
+    if conn:
+        try:
+            conn.row_factory = None
+            cursor = conn.cursor()
+            if carpeta is None:
+                cursor.execute('SELECT ruta, es_carpeta, tamano, mtime FROM documentos WHERE caso_id = ?', (caso_id,))
+            else:
+                cursor.execute('SELECT ruta, es_carpeta, tamano, mtime FROM documentos WHERE caso_id = ? AND carpeta = ?', (caso_id, carpeta))
+            firmas = {ruta: (es_carpeta, tamano, mtime) for ruta, es_carpeta, tamano, mtime in cursor}
+        except sqlite3.Error as e:
+            print(f"Error al leer firmas del índice de documentos del caso ID {caso_id}: {e}")
+        finally:
+            close_db(conn)
+    return firmas
+
+def aplicar_cambios_indice_documentos(caso_id, raiz, altas_cambios=(), bajas=()):
+    """
+    Inserta/actualiza las entradas dadas y borra las rutas de 'bajas' (con todo lo que cuelga de
+    ellas, si eran carpetas). Todo en una transacción. Devuelve True si se aplicó.
+    """
+    if not altas_cambios and not bajas:
+        return True
+    conn = connect_db()
+    success = False
+    if conn:
+        try:
+            cursor = conn.cursor()
+            ahora = int(time.time())
+            filas = []
+            for ruta, nombre, es_carpeta, tamano, mtime in altas_cambios:
+                relativa = os.path.relpath(ruta, raiz) if raiz else nombre
+                extension = '' if es_carpeta else os.path.splitext(nombre)[1].lower()
+                filas.append((caso_id, ruta, relativa, os.path.dirname(ruta), nombre, int(bool(es_carpeta)), extension, tamano, mtime, ahora))
+            cursor.executemany('''
+                INSERT INTO documentos (caso_id, ruta, ruta_relativa, carpeta, nombre, es_carpeta, extension, tamano, mtime, indexado_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(caso_id, ruta) DO UPDATE SET
+                    ruta_relativa = excluded.ruta_relativa, carpeta = excluded.carpeta,
+                    nombre = excluded.nombre, es_carpeta = excluded.es_carpeta, extension = excluded.extension,
+                    hash = CASE WHEN documentos.tamano IS excluded.tamano AND documentos.mtime IS excluded.mtime
+                                THEN documentos.hash ELSE NULL END,
+                    tamano = excluded.tamano, mtime = excluded.mtime, indexado_at = excluded.indexado_at
+            ''', filas)
+            for ruta in bajas:
+                # Si era una carpeta, también se va su contenido (ruta + separador como prefijo)
+                cursor.execute("DELETE FROM documentos WHERE caso_id = ? AND (ruta = ? OR substr(ruta, 1, ?) = ?)",
+                               (caso_id, ruta, len(ruta) + 1, ruta + os.sep))
+            conn.commit()
+            success = True
+        except sqlite3.Error as e:
+            print(f"Error al actualizar el índice de documentos del caso ID {caso_id}: {e}")
+            conn.rollback()
+        finally:
+            close_db(conn)
+    return success
+
+def buscar_documentos_indice(caso_id, filtro='', carpeta=None, extension=None, orden='nombre', descendente=False, limite=1000):
+    """
+    Listado desde el índice, sin tocar el disco. 'filtro' busca en el nombre (sin distinguir
+    mayúsculas) en todo el caso; 'carpeta' limita a una carpeta. Carpetas primero.
+    """
+    conn = connect_db()
+    entradas = []
+    if conn:
+        try:
+            columna_orden = ORDENES_DOCUMENTOS.get(orden, ORDENES_DOCUMENTOS['nombre'])
+            direccion = "DESC" if descendente else "ASC"
+            condiciones, parametros = ["caso_id = ?"], [caso_id]
+            if carpeta is not None:
+                condiciones.append("carpeta = ?"); parametros.append(carpeta)
+            if filtro:
+                patron = filtro.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+                condiciones.append("nombre LIKE ? ESCAPE '\\'"); parametros.append(f"%{patron}%")
+            if extension:
+                condiciones.append("extension = ?"); parametros.append(extension.lower())
+            parametros.append(limite)
+            conn.row_factory = None
+            cursor = conn.cursor()
+            cursor.execute(f'''
+                SELECT ruta, nombre, es_carpeta, tamano, mtime, ruta_relativa FROM documentos
+                WHERE {" AND ".join(condiciones)}
+                ORDER BY es_carpeta DESC, {columna_orden} {direccion}, nombre COLLATE NOCASE
+                LIMIT ?
+            ''', parametros)
+            entradas = cursor.fetchall()
+        except sqlite3.Error as e:
+            print(f"Error al buscar en el índice de documentos del caso ID {caso_id}: {e}")
+        finally:
+            close_db(conn)
+    return entradas
+
+def resolver_referencia_documento(caso_id, referencia):
+    """
+    Ruta del archivo indexado al que apunta referencia_documento (ruta completa, relativa a la
+    carpeta del caso o solo el nombre), o None si no se encuentra. Con nombres repetidos en
+    distintas subcarpetas gana el modificado más recientemente.
+    """
+    if not referencia or not referencia.strip():
+        return None
+    referencia = referencia.strip()
+    conn = connect_db()
+    ruta = None
+    if conn:
+        try:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT ruta FROM documentos
+                WHERE caso_id = ? AND es_carpeta = 0
+                  AND (ruta = ? OR ruta_relativa = ? OR nombre = ? COLLATE NOCASE)
+                ORDER BY (ruta = ?) DESC, (ruta_relativa = ?) DESC, mtime DESC
+                LIMIT 1
+            ''', (caso_id, referencia, referencia, referencia, referencia, referencia))
+            row = cursor.fetchone()
+            if row:
+                ruta = row['ruta']
+        except sqlite3.Error as e:
+            print(f"Error al resolver la referencia '{referencia}' del caso ID {caso_id}: {e}")
+        finally:
+            close_db(conn)
+    return ruta
+
+def get_referencias_documentos_rotas(caso_id=None):
+    """
+    Actividades cuya referencia_documento no coincide con ningún archivo del índice de su caso.
+    Solo se consideran casos que ya tienen índice (si no, no se puede saber si la referencia existe).
+    """
+    conn = connect_db()
+    rotas = []
+    if conn:
+        try:
+            cursor = conn.cursor()
+            filtro_caso = "AND a.caso_id = ?" if caso_id is not None else ""
+            cursor.execute(f'''
+                SELECT a.id, a.caso_id, a.fecha_hora, a.referencia_documento, c.caratula
+                FROM actividades_caso a
+                JOIN casos c ON c.id = a.caso_id
+                WHERE a.referencia_documento IS NOT NULL AND trim(a.referencia_documento) != '' {filtro_caso}
+                  AND EXISTS (SELECT 1 FROM documentos d0 WHERE d0.caso_id = a.caso_id)
+                  AND NOT EXISTS (
+                      SELECT 1 FROM documentos d
+                      WHERE d.caso_id = a.caso_id AND d.es_carpeta = 0
+                        AND (d.ruta = trim(a.referencia_documento) OR d.ruta_relativa = trim(a.referencia_documento)
+                             OR d.nombre = trim(a.referencia_documento) COLLATE NOCASE))
+                ORDER BY a.caso_id, datetime(a.fecha_hora) DESC
+            ''', (caso_id,) if caso_id is not None else ())
+            rotas = [dict(row) for row in cursor.fetchall()]
+        except sqlite3.Error as e:
+            print(f"Error al buscar referencias a documentos rotas: {e}")
+        finally:
+            close_db(conn)
+    return rotas
+
+def get_casos_con_carpeta():
+    """ [(id, caratula, ruta_carpeta)] de los casos que tienen carpeta asignada. """
+    conn = connect_db()
+    casos = []
+    if conn:
+        try:
+            conn.row_factory = None
+            cursor = conn.cursor()
+            cursor.execute("SELECT id, caratula, ruta_carpeta FROM casos WHERE ruta_carpeta IS NOT NULL AND trim(ruta_carpeta) != '' ORDER BY id")
+            casos = cursor.fetchall()
+        except sqlite3.Error as e:
+            print(f"Error al obtener casos con carpeta: {e}")
+        finally:
+            close_db(conn)
+    return casos
+
+def get_documentos_mismo_tamano(tamano_minimo=1):
+    """
+    Archivos indexados cuyo tamaño se repite en algún otro archivo (candidatos a duplicado), de
+    todos los casos. Tuplas (id, caso_id, ruta, tamano, mtime, hash), ordenadas por tamaño.
+    """
+    conn = connect_db()
+    candidatos = []
+    if conn:
+        try:
+            conn.row_factory = None
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT id, caso_id, ruta, tamano, mtime, hash FROM documentos
+                WHERE es_carpeta = 0 AND tamano >= ? AND tamano IN (
+                    SELECT tamano FROM documentos WHERE es_carpeta = 0 AND tamano >= ?
+                    GROUP BY tamano HAVING COUNT(*) > 1)
+                ORDER BY tamano DESC, id
+            ''', (tamano_minimo, tamano_minimo))
+            candidatos = cursor.fetchall()
+        except sqlite3.Error as e:
+            print(f"Error al buscar candidatos a documentos duplicados: {e}")
+        finally:
+            close_db(conn)
+    return candidatos
+
+def guardar_hashes_documentos(hashes):
+    """
+    hashes: [(id, tamano, mtime, hash)] con el tamaño/mtime leídos al calcularlo; si el registro
+    cambió desde entonces no se guarda (el hash ya no corresponde). Devuelve True si se guardó.
+    """
+    if not hashes:
+        return True
+    conn = connect_db()
+    success = False
+    if conn:
+        try:
+            cursor = conn.cursor()
+            cursor.executemany("UPDATE documentos SET hash = ? WHERE id = ? AND tamano IS ? AND mtime IS ?",
+                               [(hash_contenido, doc_id, tamano, mtime) for doc_id, tamano, mtime, hash_contenido in hashes])
+            conn.commit()
+            success = True
+        except sqlite3.Error as e:
+            print(f"Error al guardar hashes de documentos: {e}")
+            conn.rollback()
+        finally:
+            close_db(conn)
+    return success
+
+# --- Fin Funciones para el Índice de Documentos ---
+
+# --- Funciones para el Texto Completo de Documentos (FTS5) ---
+
+def get_documentos_para_extraer(extensiones, limite=50):
+    """
+    Archivos indexados con extensión soportada cuyo texto falta o quedó viejo (tamaño/mtime distintos
+    a los de la última extracción). Devuelve tuplas (id, ruta, nombre, extension, tamano, mtime):
+    tamano/mtime se devuelven para guardarlos tal cual en guardar_textos_documentos.
+    """
+    if not extensiones:
+        return []
+    conn = connect_db()
+    pendientes = []
+    if conn:
+        try:
+            conn.row_factory = None
+            cursor = conn.cursor()
+            marcadores = ", ".join("?" for _ in extensiones)
+            cursor.execute(f'''
+                SELECT id, ruta, nombre, extension, tamano, mtime FROM documentos
+                WHERE es_carpeta = 0 AND extension IN ({marcadores})
+                  AND (texto_tamano IS NOT tamano OR texto_mtime IS NOT mtime)
+                ORDER BY mtime DESC
+                LIMIT ?
+            ''', (*extensiones, limite))
+            pendientes = cursor.fetchall()
+        except sqlite3.Error as e:
+            print(f"Error al buscar documentos pendientes de extraer texto: {e}")
+        finally:
+            close_db(conn)
+    return pendientes
+
+def contar_documentos_pendientes_texto(extensiones):
+    if not extensiones:
+        return 0
+    conn = connect_db()
+    total = 0
+    if conn:
+        try:
+            cursor = conn.cursor()
+            marcadores = ", ".join("?" for _ in extensiones)
+            cursor.execute(f'''
+                SELECT COUNT(*) FROM documentos
+                WHERE es_carpeta = 0 AND extension IN ({marcadores})
+                  AND (texto_tamano IS NOT tamano OR texto_mtime IS NOT mtime)
+            ''', tuple(extensiones))
+            total = cursor.fetchone()[0]
+        except sqlite3.Error as e:
+            print(f"Error al contar documentos pendientes de extraer texto: {e}")
+        finally:
+            close_db(conn)
+    return total
+
+def guardar_textos_documentos(resultados):
+    """
+    resultados: [(id, tamano, mtime, estado, texto)] con el tamano/mtime que tenía el archivo al
+    pedirlo. Si el archivo cambió mientras se extraía, el registro queda pendiente y se vuelve a
+    extraer en la próxima vuelta. Todo en una transacción. Devuelve True si se guardó.
+    """
+    if not resultados:
+        return True
+    conn = connect_db()
+    success = False
+    if conn:
+        try:
+            cursor = conn.cursor()
+            for doc_id, tamano, mtime, estado, texto in resultados:
+                cursor.execute('''
+                    UPDATE documentos SET texto_tamano = ?, texto_mtime = ?, texto_estado = ?
+                    WHERE id = ? AND tamano IS ? AND mtime IS ?
+                ''', (tamano, mtime, estado, doc_id, tamano, mtime))
+                if cursor.rowcount == 0:
+                    continue # Se borró o cambió mientras se extraía: queda pendiente (o ya no está)
+                cursor.execute("DELETE FROM documentos_texto WHERE rowid = ?", (doc_id,))
+                if texto:
+                    cursor.execute('''
+                        INSERT INTO documentos_texto (rowid, nombre, contenido)
+                        SELECT id, nombre, ? FROM documentos WHERE id = ?
+                    ''', (texto, doc_id))
+            conn.commit()
+            success = True
+        except sqlite3.Error as e:
+            print(f"Error al guardar el texto de documentos: {e}")
+            conn.rollback()
+        finally:
+            close_db(conn)
+    return success
+
+def _consulta_fts(texto):
+    """ Convierte lo escrito por el usuario en una consulta FTS5 segura: cada palabra entre comillas
+    (sin operadores) y la última como prefijo, para que funcione mientras se escribe. """
+    palabras = re.findall(r"\w+", texto or "")
+    if not palabras:
+        return None
+    terminos = [f'"{p}"' for p in palabras]
+    terminos[-1] += "*"
+    return " ".join(terminos)
+
+def buscar_texto_documentos(texto, limite=100):
+    """
+    Búsqueda en el contenido (y nombre) de los documentos de todos los casos, por relevancia.
+    Devuelve dicts con id, ruta, nombre, caso_id, caratula y fragmento (coincidencias entre [ ]).
+    """
+    consulta = _consulta_fts(texto)
+    if not consulta:
+        return []
+    conn = connect_db()
+    resultados = []
+    if conn:
+        try:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT d.id, d.ruta, d.nombre, d.caso_id, c.caratula,
+                       snippet(documentos_texto, 1, '[', ']', '…', 12) AS fragmento
+                FROM documentos_texto
+                JOIN documentos d ON d.id = documentos_texto.rowid
+                JOIN casos c ON c.id = d.caso_id
+                WHERE documentos_texto MATCH ?
+                ORDER BY bm25(documentos_texto, 5.0, 1.0)
+                LIMIT ?
+            ''', (consulta, limite))
+            resultados = [dict(row) for row in cursor.fetchall()]
+        except sqlite3.Error as e:
+            print(f"Error en la búsqueda de texto de documentos ('{texto}'): {e}")
+        finally:
+            close_db(conn)
+    return resultados
+
+def _patron_like(texto):
+    return "%" + texto.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + "%"
+
+def buscar_clientes_por_texto(texto, limite=50):
+    """ Clientes cuyo nombre, email o WhatsApp contiene el texto (sin distinguir mayúsculas). """
+    if not texto or not texto.strip():
+        return []
+    conn = connect_db()
+    clientes = []
+    if conn:
+        try:
+            patron = _patron_like(texto.strip())
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT id, nombre, email, whatsapp FROM clientes
+                WHERE nombre LIKE ? ESCAPE '\\' OR email LIKE ? ESCAPE '\\' OR whatsapp LIKE ? ESCAPE '\\'
+                ORDER BY nombre LIMIT ?
+            ''', (patron, patron, patron, limite))
+            clientes = [dict(row) for row in cursor.fetchall()]
+        except sqlite3.Error as e:
+            print(f"Error al buscar clientes por texto: {e}")
+        finally:
+            close_db(conn)
+    return clientes
+
+def buscar_casos_por_texto(texto, limite=50):
+    """ Casos cuya carátula, expediente, juzgado o notas contienen el texto. """
+    if not texto or not texto.strip():
+        return []
+    conn = connect_db()
+    casos = []
+    if conn:
+        try:
+            patron = _patron_like(texto.strip())
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT c.id, c.cliente_id, c.caratula, c.numero_expediente, c.anio_caratula, cl.nombre AS cliente_nombre
+                FROM casos c JOIN clientes cl ON cl.id = c.cliente_id
+                WHERE c.caratula LIKE ? ESCAPE '\\' OR c.numero_expediente LIKE ? ESCAPE '\\'
+                   OR c.juzgado LIKE ? ESCAPE '\\' OR c.notas LIKE ? ESCAPE '\\'
+                ORDER BY c.caratula LIMIT ?
+            ''', (patron, patron, patron, patron, limite))
+            casos = [dict(row) for row in cursor.fetchall()]
+        except sqlite3.Error as e:
+            print(f"Error al buscar casos por texto: {e}")
+        finally:
+            close_db(conn)
+    return casos
+
+# --- Fin Funciones para el Texto Completo de Documentos ---
+
+# --- Funciones para la Caché de Respuestas IA ---
+
+def get_cache_ia(clave, creado_desde=None):
+    """ Respuesta guardada para la clave (y no más vieja que creado_desde), o None. Marca el uso para el LRU. """
+    conn = connect_db()
+    respuesta = None
+    if conn:
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT respuesta, creado_at FROM cache_ia WHERE clave = ? AND creado_at >= ?", (clave, creado_desde or 0))
+            row = cursor.fetchone()
+            if row:
+                respuesta = {'respuesta': row['respuesta'], 'creado_at': row['creado_at']}
+                cursor.execute("UPDATE cache_ia SET usado_at = ?, aciertos = aciertos + 1 WHERE clave = ?", (int(time.time()), clave))
+                conn.commit()
+        except sqlite3.Error as e:
+            print(f"Error al leer la caché de respuestas IA: {e}")
+        finally:
+            close_db(conn)
+    return respuesta
+
+def guardar_cache_ia(clave, endpoint, respuesta, creado_desde=None, max_entradas=None, max_bytes=None):
+    """
+    Guarda (o reemplaza) una respuesta y aplica el desalojo en la misma transacción: primero las
+    vencidas (creadas antes de creado_desde) y después las usadas hace más tiempo hasta entrar en
+    max_entradas / max_bytes. Devuelve la cantidad de entradas desalojadas, o None si falló.
+    """
+    conn = connect_db()
+    desalojadas = None
+    if conn:
+        try:
+            cursor = conn.cursor()
+            ahora = int(time.time())
+            tamano = len(respuesta.encode('utf-8'))
+            cursor.execute('''
+                INSERT OR REPLACE INTO cache_ia (clave, endpoint, respuesta, tamano, creado_at, usado_at, aciertos)
+                VALUES (?, ?, ?, ?, ?, ?, 0)
+            ''', (clave, endpoint, respuesta, tamano, ahora, ahora))
+            desalojadas = 0
+            if creado_desde:
+                cursor.execute("DELETE FROM cache_ia WHERE creado_at < ?", (creado_desde,))
+                desalojadas += cursor.rowcount
+            if max_entradas:
+                cursor.execute('''
+                    DELETE FROM cache_ia WHERE clave IN (
+                        SELECT clave FROM cache_ia ORDER BY usado_at DESC LIMIT -1 OFFSET ?)
+                ''', (max_entradas,))
+                desalojadas += cursor.rowcount
+            if max_bytes:
+                # Suma acumulada de la más reciente a la más vieja: se va todo lo que queda por encima del tope
+                cursor.execute('''
+                    DELETE FROM cache_ia WHERE clave IN (
+                        SELECT clave FROM (
+                            SELECT clave, SUM(tamano) OVER (ORDER BY usado_at DESC, clave) AS acumulado FROM cache_ia)
+                        WHERE acumulado > ?)
+                ''', (max_bytes,))
+                desalojadas += cursor.rowcount
+            conn.commit()
+        except sqlite3.Error as e:
+            print(f"Error al guardar en la caché de respuestas IA: {e}")
+            conn.rollback()
+            desalojadas = None
+        finally:
+            close_db(conn)
+    return desalojadas
+
+def borrar_cache_ia():
+    conn = connect_db()
+    success = False
+    if conn:
+        try:
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM cache_ia")
+            conn.commit()
+            success = True
+        except sqlite3.Error as e:
+            print(f"Error al vaciar la caché de respuestas IA: {e}")
+            conn.rollback()
+        finally:
+            close_db(conn)
+    return success
+
+def get_estadisticas_cache_ia():
+    """ {'entradas', 'bytes', 'aciertos'} acumulados de la tabla. """
+    conn = connect_db()
+    stats = {'entradas': 0, 'bytes': 0, 'aciertos': 0}
+    if conn:
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT COUNT(*), COALESCE(SUM(tamano), 0), COALESCE(SUM(aciertos), 0) FROM cache_ia")
+            stats['entradas'], stats['bytes'], stats['aciertos'] = cursor.fetchone()
+        except sqlite3.Error as e:
+            print(f"Error al leer estadísticas de la caché de respuestas IA: {e}")
+        finally:
+            close_db(conn)
+    return stats
+
+# --- Fin Funciones para la Caché de Respuestas IA ---
+
+# --- Funciones para la Cola de Trabajos IA por Lotes ---
+
+def get_casos_para_lote_ia():
+    """ [(id, caratula, cliente)] de todos los casos, para elegir a cuáles aplicar una operación. """
+    conn = connect_db()
+    casos = []
+    if conn:
+        try:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT ca.id, ca.caratula, cl.nombre
+                FROM casos ca JOIN clientes cl ON cl.id = ca.cliente_id
+                ORDER BY cl.nombre COLLATE NOCASE, ca.caratula COLLATE NOCASE
+            ''')
+            casos = [tuple(row) for row in cursor.fetchall()]
+        except sqlite3.Error as e:
+            print(f"Error al obtener casos para el lote IA: {e}")
+        finally:
+            close_db(conn)
+    return casos
+
+def crear_trabajos_ia(lote, operacion, caso_ids):
+    """
+    Encola la operación para cada caso. Se saltean los casos que ya tienen esa misma operación
+    pendiente o en curso. Devuelve la cantidad de trabajos creados, o None si falló.
+    """
+    if not caso_ids:
+        return 0
+    conn = connect_db()
+    creados = None
+    if conn:
+        try:
+            cursor = conn.cursor()
+            ahora = int(time.time())
+            creados = 0
+            for caso_id in dict.fromkeys(caso_ids):
+                cursor.execute('''
+                    INSERT INTO trabajos_ia (lote, caso_id, operacion, estado, creado_at, actualizado_at)
+                    SELECT ?, ?, ?, 'pendiente', ?, ?
+                    WHERE NOT EXISTS (SELECT 1 FROM trabajos_ia WHERE caso_id = ? AND operacion = ?
+                                      AND estado IN ('pendiente', 'en_curso'))
+                ''', (lote, caso_id, operacion, ahora, ahora, caso_id, operacion))
+                creados += cursor.rowcount
+            conn.commit()
+        except sqlite3.Error as e:
+            print(f"Error al crear trabajos IA del lote {lote}: {e}")
+            conn.rollback()
+            creados = None
+        finally:
+            close_db(conn)
+    return creados
+
+def reanudar_trabajos_ia():
+    """ Al iniciar: los trabajos que quedaron 'en_curso' (la aplicación se cerró a mitad) vuelven a la cola. """
+    conn = connect_db()
+    reanudados = 0
+    if conn:
+        try:
+            cursor = conn.cursor()
+            cursor.execute("UPDATE trabajos_ia SET estado = 'pendiente', proximo_intento_at = 0 WHERE estado = 'en_curso'")
+            reanudados = cursor.rowcount
+            conn.commit()
+        except sqlite3.Error as e:
+            print(f"Error al reanudar trabajos IA: {e}")
+            conn.rollback()
+        finally:
+            close_db(conn)
+    return reanudados
+
+def tomar_trabajo_ia():
+    """
+    Reserva el próximo trabajo pendiente cuyo reintento ya venció (lo pasa a 'en_curso') y lo
+    devuelve como dict {id, lote, caso_id, operacion, intentos}, o None si no hay.
+    """
+    conn = connect_db()
+    trabajo = None
+    if conn:
+        try:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT id, lote, caso_id, operacion, intentos FROM trabajos_ia
+                WHERE estado = 'pendiente' AND proximo_intento_at <= ?
+                ORDER BY proximo_intento_at, id LIMIT 1
+            ''', (int(time.time()),))
+            row = cursor.fetchone()
+            if row:
+                cursor.execute("UPDATE trabajos_ia SET estado = 'en_curso', actualizado_at = ? WHERE id = ? AND estado = 'pendiente'",
+                               (int(time.time()), row['id']))
+                if cursor.rowcount:
+                    trabajo = dict(row)
+            conn.commit()
+        except sqlite3.Error as e:
+            print(f"Error al tomar un trabajo IA: {e}")
+            conn.rollback()
+        finally:
+            close_db(conn)
+    return trabajo
+
+def proximo_reintento_trabajo_ia():
+    """ Cuándo vence (epoch) la espera del próximo trabajo pendiente, o None si no hay pendientes. """
+    conn = connect_db()
+    proximo = None
+    if conn:
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT MIN(proximo_intento_at) FROM trabajos_ia WHERE estado = 'pendiente'")
+            proximo = cursor.fetchone()[0]
+        except sqlite3.Error as e:
+            print(f"Error al consultar el próximo reintento IA: {e}")
+        finally:
+            close_db(conn)
+    return proximo
+
+def finalizar_trabajos_ia(resultados):
+    """
+    Guarda en una sola transacción el resultado de varios trabajos. resultados: [dict] con
+    'id', 'estado', 'error', 'proximo_intento_at' (para los que vuelven a 'pendiente') e
+    'interaccion' = argumentos de add_interaccion_ia (dict) o None. Las interacciones se
+    guardan solo si el caso sigue existiendo. Devuelve True si se guardó.
+    """
+    if not resultados:
+        return True
+    conn = connect_db()
+    success = False
+    if conn:
+        try:
+            cursor = conn.cursor()
+            ahora = int(time.time())
+            casos_con_actividad = set()
+            for r in resultados:
+                interaccion = r.get('interaccion')
+                if interaccion and _insertar_interaccion_ia(cursor, **interaccion):
+                    casos_con_actividad.add(interaccion['caso_id'])
+            cursor.executemany("UPDATE casos SET last_activity_timestamp = ? WHERE id = ?",
+                               [(ahora, caso_id) for caso_id in casos_con_actividad])
+            cursor.executemany('''
+                UPDATE trabajos_ia SET estado = ?, error = ?, intentos = intentos + 1,
+                                       proximo_intento_at = ?, actualizado_at = ?
+                WHERE id = ? AND estado = 'en_curso'
+            ''', [(r['estado'], r.get('error'), r.get('proximo_intento_at') or 0, ahora, r['id']) for r in resultados])
+            conn.commit()
+            success = True
+            for caso_id in casos_con_actividad:
+                _notificar_cambio('actividad', None, caso_id)
+        except sqlite3.Error as e:
+            print(f"Error al guardar resultados de trabajos IA: {e}")
+            conn.rollback()
+        finally:
+            close_db(conn)
+    return success
+
+def get_lotes_trabajos_ia(limite=20):
+    """ Lotes más recientes: [{'lote', 'operacion', 'creado_at', 'total', 'terminados'}]. """
+    conn = connect_db()
+    lotes = []
+    if conn:
+        try:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT lote, MIN(operacion) AS operacion, MIN(creado_at) AS creado_at, COUNT(*) AS total,
+                       SUM(estado NOT IN ('pendiente', 'en_curso')) AS terminados
+                FROM trabajos_ia GROUP BY lote ORDER BY MIN(id) DESC LIMIT ?
+            ''', (limite,))
+            lotes = [dict(row) for row in cursor.fetchall()]
+        except sqlite3.Error as e:
+            print(f"Error al obtener lotes de trabajos IA: {e}")
+        finally:
+            close_db(conn)
+    return lotes
+
+def get_trabajos_ia(lote):
+    """ Trabajos de un lote con la carátula del caso, en el orden en que se encolaron. """
+    conn = connect_db()
+    trabajos = []
+    if conn:
+        try:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT t.id, t.caso_id, ca.caratula, t.operacion, t.estado, t.intentos, t.error, t.actualizado_at
+                FROM trabajos_ia t JOIN casos ca ON ca.id = t.caso_id
+                WHERE t.lote = ? ORDER BY t.id
+            ''', (lote,))
+            trabajos = [dict(row) for row in cursor.fetchall()]
+        except sqlite3.Error as e:
+            print(f"Error al obtener trabajos IA del lote {lote}: {e}")
+        finally:
+            close_db(conn)
+    return trabajos
+
+def reintentar_trabajos_ia(lote):
+    """ Vuelve a encolar los trabajos con error del lote (con los intentos en cero). """
+    conn = connect_db()
+    cantidad = 0
+    if conn:
+        try:
+            cursor = conn.cursor()
+            cursor.execute('''
+                UPDATE trabajos_ia SET estado = 'pendiente', intentos = 0, proximo_intento_at = 0, error = NULL, actualizado_at = ?
+                WHERE lote = ? AND estado = 'error'
+            ''', (int(time.time()), lote))
+            cantidad = cursor.rowcount
+            conn.commit()
+        except sqlite3.Error as e:
+            print(f"Error al reintentar trabajos IA del lote {lote}: {e}")
+            conn.rollback()
+        finally:
+            close_db(conn)
+    return cantidad
+
+def cancelar_trabajos_ia(lote):
+    """ Cancela lo que todavía no empezó; los trabajos en curso terminan normalmente. """
+    conn = connect_db()
+    cantidad = 0
+    if conn:
+        try:
+            cursor = conn.cursor()
+            cursor.execute("UPDATE trabajos_ia SET estado = 'cancelado', actualizado_at = ? WHERE lote = ? AND estado = 'pendiente'",
+                           (int(time.time()), lote))
+            cantidad = cursor.rowcount
+            conn.commit()
+        except sqlite3.Error as e:
+            print(f"Error al cancelar trabajos IA del lote {lote}: {e}")
+            conn.rollback()
+        finally:
+            close_db(conn)
+    return cantidad
+
+def get_actividades_caso_desde(caso_id, fecha_desde, excluir_tipo_prefijo=None):
+    """ [(fecha_hora, tipo_actividad, descripcion)] del caso desde fecha_desde (YYYY-MM-DD), más viejas primero. """
+    conn = connect_db()
+    actividades = []
+    if conn:
+        try:
+            cursor = conn.cursor()
+            sql = '''
+                SELECT fecha_hora, tipo_actividad, descripcion FROM actividades_caso
+                WHERE caso_id = ? AND datetime(fecha_hora) >= datetime(?)
+            '''
+            params = [caso_id, fecha_desde]
+            if excluir_tipo_prefijo:
+                sql += " AND tipo_actividad NOT LIKE ? ESCAPE '\\'"
+                params.append(_patron_like(excluir_tipo_prefijo)[1:]) # Solo prefijo: sin el % inicial
+            cursor.execute(sql + " ORDER BY datetime(fecha_hora)", params)
+            actividades = [tuple(row) for row in cursor.fetchall()]
+        except sqlite3.Error as e:
+            print(f"Error al obtener actividades recientes del caso ID {caso_id}: {e}")
+        finally:
+            close_db(conn)
+    return actividades
+
+def get_material_contexto_caso(caso_id, desde_actividades, desde_audiencias, hasta_audiencias, max_actividades=30, max_tareas=15, max_audiencias=10):
+    """
+    Todo lo que usa el contexto del Asistente IA para un caso, con una sola conexión: {'caso', 'partes',
+    'actividades' (más nuevas primero, sin las de Asistencia IA), 'tareas' (pendientes), 'audiencias'
+    (entre desde_audiencias y hasta_audiencias)}. None si el caso no existe.
+    """
+    conn = connect_db()
+    material = None
+    if conn:
+        try:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT id, caratula, numero_expediente, anio_caratula, juzgado, jurisdiccion, etapa_procesal, notas
+                FROM casos WHERE id = ?
+            ''', (caso_id,))
+            caso = cursor.fetchone()
+            if caso:
+                material = {'caso': dict(caso)}
+                cursor.execute("SELECT nombre, tipo, notas FROM partes_intervinientes WHERE caso_id = ? ORDER BY tipo, nombre", (caso_id,))
+                material['partes'] = [dict(row) for row in cursor.fetchall()]
+                cursor.execute('''
+                    SELECT fecha_hora, tipo_actividad, descripcion FROM actividades_caso
+                    WHERE caso_id = ? AND datetime(fecha_hora) >= datetime(?) AND tipo_actividad NOT LIKE ?
+                    ORDER BY datetime(fecha_hora) DESC LIMIT ?
+                ''', (caso_id, desde_actividades, PREFIJO_ACTIVIDAD_IA + '%', max_actividades))
+                material['actividades'] = [dict(row) for row in cursor.fetchall()]
+                cursor.execute('''
+                    SELECT descripcion, fecha_vencimiento, prioridad, estado, es_plazo_procesal FROM tareas
+                    WHERE caso_id = ? AND estado NOT IN ('Completada', 'Cancelada')
+                    ORDER BY es_plazo_procesal DESC, CASE WHEN fecha_vencimiento IS NULL THEN 1 ELSE 0 END, fecha_vencimiento,
+                             CASE prioridad WHEN 'Alta' THEN 1 WHEN 'Media' THEN 2 WHEN 'Baja' THEN 3 ELSE 4 END
+                    LIMIT ?
+                ''', (caso_id, max_tareas))
+                material['tareas'] = [dict(row) for row in cursor.fetchall()]
+                cursor.execute('''
+                    SELECT fecha, hora, descripcion FROM audiencias
+                    WHERE caso_id = ? AND fecha >= ? AND fecha <= ?
+                    ORDER BY fecha, hora LIMIT ?
+                ''', (caso_id, desde_audiencias, hasta_audiencias, max_audiencias))
+                material['audiencias'] = [dict(row) for row in cursor.fetchall()]
+        except sqlite3.Error as e:
+            print(f"Error al obtener el material de contexto del caso ID {caso_id}: {e}")
+            material = None
+        finally:
+            close_db(conn)
+    return material
+
+# --- Fin Funciones para la Cola de Trabajos IA ---
+
+# --- Funciones para las Interacciones con el Asistente IA ---
+
+MAX_CARACTERES_REFERENCIA_IA = 160
+# Formato con el que se guardaban las consultas completas en actividades_caso.descripcion
+_PATRON_DESCRIPCION_IA_ANTIGUA = re.compile(r'\ACONSULTA A IA \((.*?)\):\n(.*?)\n\nRESPUESTA IA:\n(.*)\Z', re.DOTALL)
+
+def _comprimir(texto):
+    return zlib.compress(texto.encode('utf-8'), 6) if texto is not None else None
+
+def _descomprimir(blob):
+    return zlib.decompress(blob).decode('utf-8') if blob is not None else None
+
+def referencia_interaccion_ia(interaccion_id, respuesta):
+    """ Descripción corta de la actividad: comienzo de la respuesta y el número de interacción. """
+    inicio = ' '.join(respuesta.split())
+    if len(inicio) > MAX_CARACTERES_REFERENCIA_IA:
+        inicio = inicio[:MAX_CARACTERES_REFERENCIA_IA - 1].rstrip() + "…"
+    return f"{inicio}\n[Interacción IA #{interaccion_id}: {len(respuesta)} caracteres, ver detalle]"
+
+def _insertar_interaccion_ia(cursor, caso_id, fecha_hora, tipo_consulta, consulta, respuesta, contexto=None, modelo=None,
+                             latencia_ms=None, tokens_consulta=None, tokens_respuesta=None):
+    """ Inserta la actividad (referencia corta) y la interacción. Devuelve el ID de la actividad o None si el caso no existe. """
+    cursor.execute('''
+        INSERT INTO actividades_caso (caso_id, fecha_hora, tipo_actividad, descripcion)
+        SELECT ?, ?, ?, '' WHERE EXISTS (SELECT 1 FROM casos WHERE id = ?)
+    ''', (caso_id, fecha_hora, f"{PREFIJO_ACTIVIDAD_IA} - {tipo_consulta}", caso_id))
+    if not cursor.rowcount:
+        return None
+    actividad_id = cursor.lastrowid
+    cursor.execute('''
+        INSERT INTO interacciones_ia (caso_id, actividad_id, tipo_consulta, modelo, consulta, contexto, respuesta,
+                                      caracteres_consulta, caracteres_respuesta, tokens_consulta, tokens_respuesta, latencia_ms, creado_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', (caso_id, actividad_id, tipo_consulta, modelo, _comprimir(consulta), _comprimir(contexto or None), _comprimir(respuesta),
+          len(consulta), len(respuesta), tokens_consulta, tokens_respuesta,
+          int(latencia_ms) if latencia_ms is not None else None, int(time.time())))
+    cursor.execute("UPDATE actividades_caso SET descripcion = ? WHERE id = ?",
+                   (referencia_interaccion_ia(cursor.lastrowid, respuesta), actividad_id))
+    return actividad_id
+
+def add_interaccion_ia(caso_id, fecha_hora, tipo_consulta, consulta, respuesta, contexto=None, modelo=None,
+                       latencia_ms=None, tokens_consulta=None, tokens_respuesta=None):
+    """ Registra una consulta al Asistente IA en el caso. Devuelve el ID de la actividad creada o None. """
+    conn = connect_db()
+    actividad_id = None
+    if conn:
+        try:
+            cursor = conn.cursor()
+            actividad_id = _insertar_interaccion_ia(cursor, caso_id, fecha_hora, tipo_consulta, consulta, respuesta, contexto, modelo,
+                                                    latencia_ms, tokens_consulta, tokens_respuesta)
+            if actividad_id:
+                cursor.execute("UPDATE casos SET last_activity_timestamp = ? WHERE id = ?", (int(time.time()), caso_id))
+            conn.commit()
+            if actividad_id:
+                _notificar_cambio('actividad', actividad_id, caso_id)
+        except sqlite3.Error as e:
+            print(f"Error al guardar la interacción IA del caso ID {caso_id}: {e}")
+            conn.rollback()
+            actividad_id = None
+        finally:
+            close_db(conn)
+    return actividad_id
+
+def get_interaccion_ia_por_actividad(actividad_id):
+    """ La interacción ligada a la actividad, con consulta, contexto y respuesta descomprimidas; None si no hay. """
+    conn = connect_db()
+    interaccion = None
+    if conn:
+        try:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT id, caso_id, actividad_id, tipo_consulta, modelo, consulta, contexto, respuesta, caracteres_consulta,
+                       caracteres_respuesta, tokens_consulta, tokens_respuesta, latencia_ms, creado_at,
+                       length(consulta) + COALESCE(length(contexto), 0) + length(respuesta) AS bytes_comprimidos
+                FROM interacciones_ia WHERE actividad_id = ?
+            ''', (actividad_id,))
+            row = cursor.fetchone()
+            if row:
+                interaccion = dict(row)
+                for campo in ('consulta', 'contexto', 'respuesta'):
+                    interaccion[campo] = _descomprimir(interaccion[campo])
+        except (sqlite3.Error, zlib.error) as e:
+            print(f"Error al obtener la interacción IA de la actividad ID {actividad_id}: {e}")
+            interaccion = None
+        finally:
+            close_db(conn)
+    return interaccion
+
+def migrar_actividades_ia(tam_lote=500):
+    """
+    Pasa a interacciones_ia las actividades de Asistencia IA que todavía tienen la consulta y la respuesta
+    completas en la descripción, y deja en la actividad solo la referencia corta. Se hace por lotes (una
+    transacción cada tam_lote) para no bloquear la BD mucho tiempo; las que no tienen el formato esperado
+    quedan como están. Devuelve la cantidad migrada.
+    """
+    conn = connect_db()
+    migradas = 0
+    if conn:
+        try:
+            cursor = conn.cursor()
+            ultimo_id = 0
+            while True:
+                cursor.execute('''
+                    SELECT a.id, a.caso_id, a.descripcion, a.fecha_hora FROM actividades_caso a
+                    WHERE a.id > ? AND a.tipo_actividad LIKE ? AND a.descripcion LIKE 'CONSULTA A IA (%'
+                      AND NOT EXISTS (SELECT 1 FROM interacciones_ia i WHERE i.actividad_id = a.id)
+                    ORDER BY a.id LIMIT ?
+                ''', (ultimo_id, PREFIJO_ACTIVIDAD_IA + '%', tam_lote))
+                filas = cursor.fetchall()
+                if not filas:
+                    break
+                ultimo_id = filas[-1]['id']
+                for fila in filas:
+                    coincidencia = _PATRON_DESCRIPCION_IA_ANTIGUA.match(fila['descripcion'])
+                    if not coincidencia:
+                        continue
+                    tipo_consulta, consulta, respuesta = coincidencia.groups()
+                    try:
+                        creado_at = int(datetime.datetime.fromisoformat(fila['fecha_hora']).timestamp())
+                    except (TypeError, ValueError):
+                        creado_at = int(time.time())
+                    cursor.execute('''
+                        INSERT INTO interacciones_ia (caso_id, actividad_id, tipo_consulta, consulta, respuesta,
+                                                      caracteres_consulta, caracteres_respuesta, creado_at)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                    ''', (fila['caso_id'], fila['id'], tipo_consulta, _comprimir(consulta), _comprimir(respuesta),
+                          len(consulta), len(respuesta), creado_at))
+                    cursor.execute("UPDATE actividades_caso SET descripcion = ? WHERE id = ?",
+                                   (referencia_interaccion_ia(cursor.lastrowid, respuesta), fila['id']))
+                    migradas += 1
+                conn.commit()
+            if migradas:
+                print(f"{migradas} actividades de Asistencia IA migradas a la tabla interacciones_ia.")
+        except sqlite3.Error as e:
+            print(f"Error al migrar las actividades de Asistencia IA: {e}")
+            conn.rollback()
+        finally:
+            close_db(conn)
+    return migradas
+
+# --- Fin Funciones para las Interacciones con el Asistente IA ---
+
+# --- Funciones para el Índice Semántico ---
+# Fuentes: ('actividad', id), ('nota', caso_id) y ('documento', id). La huella identifica la versión indexada:
+# largo + CRC32 del texto para actividades y notas; tamaño y mtime con que se extrajo el texto para documentos.
+
+def _huella_texto(texto):
+    return f"{len(texto)}:{zlib.crc32(texto.encode('utf-8')):08x}"
+
+def _texto_actividad_semantico(tipo_actividad, descripcion):
+    return f"{tipo_actividad}: {descripcion or ''}"
+
+def _grupos(ids, tamano=500):
+    """ ids en grupos para usar en IN (...); None (sin filtro) da un único grupo None. """
+    if ids is None:
+        yield None; return
+    ids = list(ids)
+    for inicio in range(0, len(ids), tamano):
+        yield ids[inicio:inicio + tamano]
+
+def _filtro_casos(columna, caso_ids):
+    """ (sql, params) para limitar una consulta a algunos casos; caso_ids None = todos. """
+    if caso_ids is None:
+        return "", []
+    return f" AND {columna} IN ({','.join('?' * len(caso_ids))})", list(caso_ids)
+
+def get_fuentes_semanticas_actuales(caso_ids=None):
+    """ {(origen, origen_id): (caso_id, huella)} de todo lo que debería estar indexado (o solo de caso_ids). """
+    conn = connect_db()
+    fuentes = {}
+    if conn:
+        try:
+            conn.row_factory = None # Se recorren todas las actividades: tuplas simples
+            cursor = conn.cursor()
+            for grupo in _grupos(caso_ids):
+                sql, params = _filtro_casos('caso_id', grupo)
+                cursor.execute("SELECT id, caso_id, tipo_actividad, descripcion FROM actividades_caso WHERE tipo_actividad NOT LIKE ?" + sql,
+                               [PREFIJO_ACTIVIDAD_IA + '%'] + params)
+                for actividad_id, caso_id, tipo, descripcion in cursor:
+                    fuentes[('actividad', actividad_id)] = (caso_id, _huella_texto(_texto_actividad_semantico(tipo, descripcion)))
+                sql, params = _filtro_casos('id', grupo)
+                cursor.execute("SELECT id, notas FROM casos WHERE trim(COALESCE(notas, '')) != ''" + sql, params)
+                for caso_id, notas in cursor:
+                    fuentes[('nota', caso_id)] = (caso_id, _huella_texto(notas))
+                sql, params = _filtro_casos('caso_id', grupo)
+                cursor.execute("SELECT id, caso_id, texto_tamano, texto_mtime FROM documentos WHERE texto_estado = 'ok'" + sql, params)
+                for doc_id, caso_id, tamano, mtime in cursor:
+                    fuentes[('documento', doc_id)] = (caso_id, f"{tamano}:{mtime}")
+        except sqlite3.Error as e:
+            print(f"Error al obtener las fuentes del índice semántico: {e}")
+            fuentes = None
+        finally:
+            close_db(conn)
+    return fuentes
+
+def get_fuentes_semanticas_indexadas(caso_ids=None):
+    """ {(origen, origen_id): huella} de lo que ya tiene vectores (o solo de caso_ids). None si falló la BD. """
+    conn = connect_db()
+    fuentes = {}
+    if conn:
+        try:
+            conn.row_factory = None
+            cursor = conn.cursor()
+            for grupo in _grupos(caso_ids):
+                sql, params = _filtro_casos('caso_id', grupo)
+                cursor.execute("SELECT origen, origen_id, huella FROM fuentes_semanticas WHERE 1 = 1" + sql, params)
+                fuentes.update(((origen, origen_id), huella) for origen, origen_id, huella in cursor)
+        except sqlite3.Error as e:
+            print(f"Error al obtener las fuentes indexadas del índice semántico: {e}")
+            fuentes = None
+        finally:
+            close_db(conn)
+    return fuentes
+
+def get_textos_fuentes_semanticas(claves):
+    """
+    {(origen, origen_id): {'caso_id', 'caratula', 'huella', 'texto', 'titulo', 'fecha', 'ruta'}} para indexar o
+    mostrar resultados. Las fuentes que ya no existen (o documentos sin texto) no aparecen.
+    """
+    conn = connect_db()
+    textos = {}
+    if conn:
+        try:
+            cursor = conn.cursor()
+            por_origen = {}
+            for origen, origen_id in claves:
+                por_origen.setdefault(origen, []).append(origen_id)
+            for origen, ids in por_origen.items():
+                for grupo in _grupos(ids):
+                    marcas = ','.join('?' * len(grupo))
+                    if origen == 'actividad':
+                        cursor.execute(f'''
+                            SELECT a.id, a.caso_id, c.caratula, a.tipo_actividad, a.descripcion, a.fecha_hora
+                            FROM actividades_caso a JOIN casos c ON c.id = a.caso_id WHERE a.id IN ({marcas})
+                        ''', grupo)
+                        for row in cursor.fetchall():
+                            texto = _texto_actividad_semantico(row['tipo_actividad'], row['descripcion'])
+                            textos[(origen, row['id'])] = {'caso_id': row['caso_id'], 'caratula': row['caratula'], 'huella': _huella_texto(texto),
+                                                           'texto': texto, 'titulo': row['tipo_actividad'], 'fecha': row['fecha_hora'], 'ruta': None}
+                    elif origen == 'nota':
+                        cursor.execute(f"SELECT id, caratula, notas FROM casos WHERE id IN ({marcas})", grupo)
+                        for row in cursor.fetchall():
+                            if not (row['notas'] or '').strip(): continue
+                            textos[(origen, row['id'])] = {'caso_id': row['id'], 'caratula': row['caratula'], 'huella': _huella_texto(row['notas']),
+                                                           'texto': row['notas'], 'titulo': "Notas del caso", 'fecha': None, 'ruta': None}
+                    elif origen == 'documento':
+                        cursor.execute(f'''
+                            SELECT d.id, d.caso_id, c.caratula, d.nombre, d.ruta, d.texto_tamano, d.texto_mtime, t.contenido
+                            FROM documentos d JOIN casos c ON c.id = d.caso_id JOIN documentos_texto t ON t.rowid = d.id
+                            WHERE d.id IN ({marcas}) AND d.texto_estado = 'ok'
+                        ''', grupo)
+                        for row in cursor.fetchall():
+                            textos[(origen, row['id'])] = {'caso_id': row['caso_id'], 'caratula': row['caratula'],
+                                                           'huella': f"{row['texto_tamano']}:{row['texto_mtime']}",
+                                                           'texto': f"{row['nombre']}\n{row['contenido'] or ''}", 'titulo': row['nombre'],
+                                                           'fecha': None, 'ruta': row['ruta']}
+        except sqlite3.Error as e:
+            print(f"Error al obtener textos para el índice semántico: {e}")
+            textos = None
+        finally:
+            close_db(conn)
+    return textos
+
+def _borrar_fuentes_semanticas(cursor, claves):
+    """ Borra las fuentes y sus filas; devuelve las filas que quedaron libres. """
+    libres = []
+    for origen, origen_id in claves:
+        cursor.execute("SELECT fila FROM vectores_semanticos WHERE origen = ? AND origen_id = ?", (origen, origen_id))
+        libres.extend(row[0] for row in cursor.fetchall())
+    cursor.executemany("DELETE FROM vectores_semanticos WHERE origen = ? AND origen_id = ?", claves)
+    cursor.executemany("DELETE FROM fuentes_semanticas WHERE origen = ? AND origen_id = ?", claves)
+    return libres
+
+def guardar_vectores_semanticos(fuentes, filas):
+    """
+    Registra, en una transacción, las fuentes recién indexadas (fuentes: [(origen, origen_id, caso_id, huella)])
+    y sus filas en el archivo de vectores (filas: [(fila, origen, origen_id, caso_id, parte)]), reemplazando
+    lo que hubiera de esas fuentes. Devuelve las filas anteriores que quedaron libres, o None si falló.
+    """
+    conn = connect_db()
+    libres = None
+    if conn:
+        try:
+            cursor = conn.cursor()
+            anteriores = _borrar_fuentes_semanticas(cursor, [(origen, origen_id) for origen, origen_id, _caso, _huella in fuentes])
+            ahora = int(time.time())
+            cursor.executemany("INSERT INTO fuentes_semanticas (origen, origen_id, caso_id, huella, indexado_at) VALUES (?, ?, ?, ?, ?)",
+                               [(origen, origen_id, caso_id, huella, ahora) for origen, origen_id, caso_id, huella in fuentes])
+            cursor.executemany("INSERT INTO vectores_semanticos (fila, origen, origen_id, caso_id, parte) VALUES (?, ?, ?, ?, ?)", filas)
+            conn.commit()
+            libres = anteriores
+        except sqlite3.Error as e:
+            print(f"Error al guardar vectores del índice semántico: {e}")
+            conn.rollback()
+        finally:
+            close_db(conn)
+    return libres
+
+def borrar_fuentes_semanticas(claves):
+    """ Quita del índice las fuentes [(origen, origen_id)] que ya no existen. Filas liberadas, o None si falló. """
+    conn = connect_db()
+    libres = None
+    if conn:
+        try:
+            libres = _borrar_fuentes_semanticas(conn.cursor(), claves)
+            conn.commit()
+        except sqlite3.Error as e:
+            print(f"Error al borrar fuentes del índice semántico: {e}")
+            conn.rollback()
+            libres = None
+        finally:
+            close_db(conn)
+    return libres
+
+def get_ocupacion_vectores_semanticos():
+    """ [(fila, caso_id)] de todas las filas en uso del archivo de vectores. """
+    conn = connect_db()
+    filas = []
+    if conn:
+        try:
+            conn.row_factory = None
+            cursor = conn.cursor()
+            cursor.execute("SELECT fila, caso_id FROM vectores_semanticos")
+            filas = cursor.fetchall()
+        except sqlite3.Error as e:
+            print(f"Error al obtener la ocupación del índice semántico: {e}")
+        finally:
+            close_db(conn)
+    return filas
+
+def get_vectores_semanticos_por_fila(filas):
+    """ {fila: (origen, origen_id, caso_id, parte)} """
+    conn = connect_db()
+    resultado = {}
+    if conn:
+        try:
+            conn.row_factory = None
+            cursor = conn.cursor()
+            for grupo in _grupos(int(f) for f in filas):
+                cursor.execute(f"SELECT fila, origen, origen_id, caso_id, parte FROM vectores_semanticos WHERE fila IN ({','.join('?' * len(grupo))})", grupo)
+                resultado.update((row[0], row[1:]) for row in cursor.fetchall())
+        except sqlite3.Error as e:
+            print(f"Error al obtener filas del índice semántico: {e}")
+        finally:
+            close_db(conn)
+    return resultado
+
+def vaciar_vectores_semanticos():
+    """ Olvida todo lo indexado (p.ej. al cambiar el modelo de embeddings). """
+    conn = connect_db()
+    success = False
+    if conn:
+        try:
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM vectores_semanticos")
+            cursor.execute("DELETE FROM fuentes_semanticas")
+            conn.commit()
+            success = True
+        except sqlite3.Error as e:
+            print(f"Error al vaciar el índice semántico: {e}")
+            conn.rollback()
+        finally:
+            close_db(conn)
+    return success
+
+# --- Fin Funciones para el Índice Semántico ---
+
 # --- Inicializar la base de datos ---
-create_tables()
\ No newline at end of file
+create_tables()
+migrar_actividades_ia()
\ No newline at end of file
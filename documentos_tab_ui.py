@@ -5,14 +5,17 @@ import sys
 import subprocess
 import datetime
 
+from previsualizacion_ui import PanelPrevisualizacion
+
 class DocumentosTab(ttk.Frame):
-    def __init__(self, parent, app_controller, case_data):
+    def __init__(self, parent, app_controller, case_data, cargar_inicial=True):
         super().__init__(parent, padding="10")
         self.app_controller = app_controller
         self.case_data = case_data
         self.case_id = case_data.get('id')
         self.create_widgets()
-        self.load_case_documents(self.case_data.get('ruta_carpeta', ''))
+        if cargar_inicial: # Con carga perezosa, la ventana del caso la carga al mostrar la pestaña
+            self.load_case_documents(self.case_data.get('ruta_carpeta', ''))
 
     def create_widgets(self):
         self.columnconfigure(0, weight=1)
@@ -35,8 +38,10 @@ class DocumentosTab(ttk.Frame):
 
         ttk.Label(self, text="Archivos y Carpetas:").grid(row=2, column=0, pady=(5, 5), sticky=tk.NW)
         
-        documents_tree_frame = ttk.Frame(self)
-        documents_tree_frame.grid(row=3, column=0, sticky='nsew')
+        documentos_paned = ttk.PanedWindow(self, orient=tk.HORIZONTAL)
+        documentos_paned.grid(row=3, column=0, sticky='nsew')
+        documents_tree_frame = ttk.Frame(documentos_paned)
+        documentos_paned.add(documents_tree_frame, weight=3)
         documents_tree_frame.columnconfigure(0, weight=1)
         documents_tree_frame.rowconfigure(0, weight=1)
         
@@ -55,14 +60,25 @@ class DocumentosTab(ttk.Frame):
         
         self.document_tree.bind("<Double-1>", self.on_document_double_click)
 
+        self.previsualizacion = PanelPrevisualizacion(documentos_paned, self.app_controller, f"previsualizacion:{self.document_tree}")
+        documentos_paned.add(self.previsualizacion, weight=1)
+        self.previsualizacion.conectar(self.document_tree)
+
     def load_case_documents(self, folder_path):
         # Utiliza los métodos del app_controller que ya existen
         self.app_controller.clear_document_list_for_tab(self.document_tree)
-        self.app_controller.load_case_documents_for_tab(self.document_tree, folder_path, self.case_data)
+        self.previsualizacion.limpiar()
+        # El listado corre en segundo plano; el botón se habilita cuando se sabe si la carpeta existe
+        self.app_controller.load_case_documents_for_tab(self.document_tree, folder_path, self.case_data,
+                                                        al_estado_carpeta=self._actualizar_estado_carpeta)
         
         # Actualizar labels y botones de esta pestaña
         self.folder_path_lbl.config(text=folder_path if folder_path else "Carpeta no asignada")
-        self.open_folder_btn.config(state=tk.NORMAL if folder_path and os.path.isdir(folder_path) else tk.DISABLED)
+        self.open_folder_btn.config(state=tk.DISABLED)
+
+    def _actualizar_estado_carpeta(self, carpeta_existe, raiz_existe):
+        if self.open_folder_btn.winfo_exists():
+            self.open_folder_btn.config(state=tk.NORMAL if carpeta_existe else tk.DISABLED)
 
     def select_case_folder(self):
         # Llama a la lógica del controlador principal, pero actualiza su propia UI
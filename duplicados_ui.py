@@ -0,0 +1,107 @@
+# duplicados_ui.py
+# Reporte de documentos duplicados entre las carpetas de los casos (ver buscador_duplicados).
+# La búsqueda corre en el cargador asíncrono y se puede cancelar cerrando la ventana.
+import os
+import tkinter as tk
+from tkinter import ttk
+
+from buscador_duplicados import BuscadorDuplicados
+from escaner_carpetas import formatear_tamano
+
+
+class DuplicadosWindow(tk.Toplevel):
+    CANAL = 'duplicados'
+
+    def __init__(self, parent, app_controller, *args, **kwargs):
+        super().__init__(parent, *args, **kwargs)
+        self.app_controller = app_controller
+        self.buscador = BuscadorDuplicados(app_controller.db_crm, app_controller.indice_documentos)
+        self._rutas = {} # {iid: ruta} de las filas de archivo
+
+        self.title("Documentos Duplicados")
+        self.geometry("900x560")
+        self.minsize(600, 360)
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
+
+        self._create_widgets()
+        self.buscar()
+
+    def _create_widgets(self):
+        self.columnconfigure(0, weight=1)
+        self.rowconfigure(1, weight=1)
+
+        barra = ttk.Frame(self, padding=(10, 10, 10, 5))
+        barra.grid(row=0, column=0, sticky='ew')
+        barra.columnconfigure(0, weight=1)
+        self.estado_label = ttk.Label(barra, text="")
+        self.estado_label.grid(row=0, column=0, sticky=tk.W)
+        self.buscar_btn = ttk.Button(barra, text="Volver a Buscar", command=self.buscar)
+        self.buscar_btn.grid(row=0, column=1)
+
+        tree_frame = ttk.Frame(self, padding=(10, 0, 10, 10))
+        tree_frame.grid(row=1, column=0, sticky='nsew')
+        tree_frame.columnconfigure(0, weight=1)
+        tree_frame.rowconfigure(0, weight=1)
+
+        cols = ('Caso', 'Tamaño')
+        self.dup_tree = ttk.Treeview(tree_frame, columns=cols, show='tree headings', selectmode='browse')
+        self.dup_tree.heading('#0', text='Grupo / Archivo')
+        self.dup_tree.column('#0', width=520)
+        self.dup_tree.heading('Caso', text='Caso')
+        self.dup_tree.column('Caso', width=240)
+        self.dup_tree.heading('Tamaño', text='Tamaño')
+        self.dup_tree.column('Tamaño', width=90, stretch=tk.NO, anchor=tk.E)
+        scroll_y = ttk.Scrollbar(tree_frame, orient=tk.VERTICAL, command=self.dup_tree.yview)
+        self.dup_tree.configure(yscrollcommand=scroll_y.set)
+        self.dup_tree.grid(row=0, column=0, sticky='nsew')
+        scroll_y.grid(row=0, column=1, sticky='ns')
+        self.dup_tree.bind('<Double-1>', self._on_doble_click)
+
+        ttk.Label(self, text="Doble clic en un archivo para abrirlo. No se borra nada automáticamente.",
+                  foreground="gray", padding=(10, 0, 10, 8)).grid(row=2, column=0, sticky=tk.W)
+
+    def buscar(self):
+        self.buscar_btn.config(state=tk.DISABLED)
+        self.estado_label.config(text="Buscando duplicados...")
+        self.app_controller.cargador_async.enviar(
+            self.CANAL,
+            lambda token: self.buscador.buscar(token, al_progreso=token.publicar),
+            self._mostrar, al_error=self._on_error, al_parcial=self._on_progreso)
+
+    def _on_progreso(self, texto):
+        if self.winfo_exists(): self.estado_label.config(text=texto)
+
+    def _on_error(self, error):
+        if not self.winfo_exists(): return
+        self.estado_label.config(text=f"Error buscando duplicados: {error}")
+        self.buscar_btn.config(state=tk.NORMAL)
+
+    def _mostrar(self, grupos):
+        if not self.winfo_exists(): return
+        tree = self.dup_tree
+        tree.delete(*tree.get_children())
+        self._rutas.clear()
+        for n, grupo in enumerate(grupos):
+            archivos = grupo['archivos']
+            padre = tree.insert('', tk.END, iid=f"grupo{n}", open=n < 20,
+                                text=f"{os.path.basename(archivos[0]['ruta'])}  ({len(archivos)} copias, recuperable {formatear_tamano(grupo['recuperable'])})",
+                                values=("", formatear_tamano(grupo['tamano'])))
+            for archivo in archivos:
+                iid = tree.insert(padre, tk.END, text=archivo['ruta'],
+                                  values=((archivo['caratula'] or f"Caso {archivo['caso_id']}")[:50], ""))
+                self._rutas[iid] = archivo['ruta']
+        stats = self.buscador.stats
+        self.estado_label.config(text=(f"{len(grupos)} grupos de duplicados; espacio recuperable: {formatear_tamano(stats.get('recuperable', 0))}. "
+                                       f"({stats.get('candidatos', 0)} candidatos por tamaño, {stats.get('hash_completo', 0)} leídos completos, "
+                                       f"{stats.get('hash_en_cache', 0)} hashes reutilizados)"))
+        self.buscar_btn.config(state=tk.NORMAL)
+
+    def _on_doble_click(self, event):
+        item_id = self.dup_tree.identify_row(event.y)
+        if item_id in self._rutas:
+            self.app_controller._abrir_en_sistema(self._rutas[item_id])
+
+    def on_close(self):
+        self.app_controller.cargador_async.cancelar(self.CANAL) # La búsqueda se corta en el próximo verificar()
+        self.app_controller.duplicados_window = None
+        self.destroy()
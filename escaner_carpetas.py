@@ -0,0 +1,111 @@
+# escaner_carpetas.py
+# Listado de carpetas de casos con una sola pasada de os.scandir y caché por (ruta, mtime de la
+# carpeta). Corre en hilos del pool (ver cargador_async); no toca widgets. Volver a un caso ya
+# visitado cuesta un stat de la carpeta en vez de un scandir + stat por archivo (caro en red).
+import datetime
+import os
+import threading
+from collections import OrderedDict, namedtuple
+
+MAX_CARPETAS_EN_CACHE = 64
+TAMANO_LOTE = 100
+
+# tamano y mtime se guardan crudos: el formato para la vista lo da fila_documento()
+EntradaCarpeta = namedtuple('EntradaCarpeta', 'ruta nombre es_carpeta tamano mtime')
+
+
+def clave_orden(entrada):
+    """ Carpetas primero y luego archivos, cada grupo alfabético sin distinguir mayúsculas. """
+    return (0 if entrada.es_carpeta else 1, entrada.nombre.lower())
+
+
+def formatear_tamano(size_bytes):
+    if size_bytes < 1024: return f"{size_bytes} B"
+    elif size_bytes < 1024**2: return f"{size_bytes/1024:.1f} KB"
+    elif size_bytes < 1024**3: return f"{size_bytes/1024**2:.1f} MB"
+    return f"{size_bytes/1024**3:.1f} GB"
+
+
+def fila_documento(entrada):
+    """ (iid, values, tags) para los Treeview de documentos; el iid es la ruta completa. """
+    mod_time = datetime.datetime.fromtimestamp(entrada.mtime).strftime('%Y-%m-%d %H:%M')
+    if entrada.es_carpeta:
+        return (entrada.ruta, (f"[CARPETA] {entrada.nombre}", "Carpeta", mod_time), ('folder',))
+    return (entrada.ruta, (entrada.nombre, formatear_tamano(entrada.tamano), mod_time), ('file',))
+
+
+def leer_entrada(ruta):
+    """ EntradaCarpeta de una sola ruta (para actualizaciones puntuales), o None si ya no existe. """
+    try:
+        st = os.stat(ruta)
+    except OSError:
+        return None
+    es_carpeta = os.path.isdir(ruta)
+    return EntradaCarpeta(ruta, os.path.basename(ruta), es_carpeta, 0 if es_carpeta else st.st_size, st.st_mtime)
+
+
+class EscanerCarpetas:
+    """
+    listar(ruta, token=None, al_lote=None) -> lista de EntradaCarpeta ordenada (clave_orden).
+    Con caché válida devuelve la lista guardada sin recorrer la carpeta. Si no, recorre una vez y,
+    si se pasa al_lote, lo llama con lotes de entradas a medida que aparecen (para ir mostrando).
+    Nota: el mtime de una carpeta cambia con altas, bajas y renombres, no al editar un archivo
+    existente; para eso están el observador de carpetas y la recarga manual (invalidar()).
+    """
+
+    def __init__(self, max_carpetas=MAX_CARPETAS_EN_CACHE):
+        self.max_carpetas = max_carpetas
+        self._cache = OrderedDict() # {ruta normalizada: (mtime_ns, tupla de entradas)}
+        self._lock = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+
+    @staticmethod
+    def _clave(ruta):
+        return os.path.normcase(os.path.abspath(ruta))
+
+    def listar(self, ruta, token=None, al_lote=None, tamano_lote=TAMANO_LOTE):
+        clave = self._clave(ruta)
+        mtime_ns = os.stat(ruta).st_mtime_ns # OSError se propaga: la carpeta no es accesible
+        with self._lock:
+            guardado = self._cache.get(clave)
+            if guardado and guardado[0] == mtime_ns:
+                self._cache.move_to_end(clave)
+                self.aciertos += 1
+                return list(guardado[1])
+        self.fallos += 1
+
+        entradas, lote = [], []
+        with os.scandir(ruta) as it:
+            for entry in it:
+                if token is not None: token.verificar()
+                try:
+                    es_carpeta = entry.is_dir()
+                    if not es_carpeta and not entry.is_file(): continue # Sockets, enlaces rotos, etc.
+                    st = entry.stat() # En Windows viene del propio scandir, sin otra llamada al sistema
+                    entrada = EntradaCarpeta(entry.path, entry.name, es_carpeta, 0 if es_carpeta else st.st_size, st.st_mtime)
+                except OSError as e:
+                    print(f"Warn: No se pudo leer info de {entry.path}: {e}")
+                    continue
+                entradas.append(entrada)
+                if al_lote:
+                    lote.append(entrada)
+                    if len(lote) >= tamano_lote:
+                        al_lote(lote); lote = []
+        if al_lote and lote:
+            al_lote(lote)
+        entradas.sort(key=clave_orden)
+
+        with self._lock:
+            self._cache[clave] = (mtime_ns, tuple(entradas))
+            self._cache.move_to_end(clave)
+            while len(self._cache) > self.max_carpetas:
+                self._cache.popitem(last=False)
+        return entradas
+
+    def invalidar(self, ruta=None):
+        with self._lock:
+            if ruta is None:
+                self._cache.clear()
+            else:
+                self._cache.pop(self._clave(ruta), None)
@@ -0,0 +1,169 @@
+# extraccion_texto.py
+# Extrae el texto de documentos para el índice de texto completo. Funciones de módulo y sin
+# estado para poder correr en un ProcessPoolExecutor (se envían por pickle a los procesos hijos).
+#   .docx  -> python-docx (párrafos y tablas)
+#   .txt   -> decodificación utf-8 con respaldo cp1252
+#   .rtf   -> limpieza mínima de palabras de control
+#   .pdf   -> solo PDFs con capa de texto: operadores Tj/TJ de los content streams (FlateDecode)
+#             Los PDFs escaneados (solo imagen) o con fuentes CID sin mapeo quedan como 'sin_texto'.
+import re
+import zlib
+
+EXTENSIONES_SOPORTADAS = ('.docx', '.txt', '.rtf', '.pdf')
+MAX_BYTES_ARCHIVO = 50 * 1024 * 1024 # Más grande que esto no se lee (suele ser un escaneo)
+MAX_CARACTERES = 1_000_000 # Tope de texto guardado por documento
+MAX_BYTES_DESCOMPRIMIDOS_PDF = 64 * 1024 * 1024 # Entre todos los streams: un PDF chico puede inflarse a GB (bomba zip)
+
+ESTADO_OK, ESTADO_SIN_TEXTO, ESTADO_ERROR = 'ok', 'sin_texto', 'error'
+
+
+def extraer_texto(ruta, extension):
+    """ Devuelve (estado, texto). Nunca lanza: los errores vuelven como ESTADO_ERROR con el mensaje. """
+    try:
+        if extension == '.docx':
+            texto = _texto_docx(ruta)
+        elif extension == '.txt':
+            texto = _decodificar(_leer(ruta))
+        elif extension == '.rtf':
+            texto = _texto_rtf(_decodificar(_leer(ruta)))
+        elif extension == '.pdf':
+            texto = _texto_pdf(_leer(ruta))
+        else:
+            return ESTADO_SIN_TEXTO, ''
+    except Exception as e:
+        return ESTADO_ERROR, f"{type(e).__name__}: {e}"
+    texto = re.sub(r'[ \t\r\f\v]+', ' ', texto or '').strip()[:MAX_CARACTERES]
+    return (ESTADO_OK, texto) if texto else (ESTADO_SIN_TEXTO, '')
+
+
+def _leer(ruta):
+    with open(ruta, 'rb') as f:
+        datos = f.read(MAX_BYTES_ARCHIVO + 1)
+    if len(datos) > MAX_BYTES_ARCHIVO:
+        raise ValueError("archivo demasiado grande para extraer texto")
+    return datos
+
+
+def _decodificar(datos):
+    for codificacion in ('utf-8-sig', 'cp1252'):
+        try:
+            return datos.decode(codificacion)
+        except UnicodeDecodeError:
+            continue
+    return datos.decode('latin-1')
+
+
+def _texto_docx(ruta):
+    from docx import Document # Importación local: el proceso hijo solo la carga si hay .docx
+    documento = Document(ruta)
+    partes = [p.text for p in documento.paragraphs]
+    for tabla in documento.tables:
+        for fila in tabla.rows:
+            partes.append(" | ".join(celda.text for celda in fila.cells))
+    return "\n".join(partes)
+
+
+# --- RTF ---
+_RTF_DESTINOS_IGNORADOS = ('fonttbl', 'colortbl', 'stylesheet', 'info', 'pict', 'header', 'footer', 'listtable', 'listoverridetable', 'themedata', 'datastore')
+_RTF_TOKEN = re.compile(r"\\([a-zA-Z]+)(-?\d+)? ?|\\'([0-9a-fA-F]{2})|\\(.)|([{}])|([^\\{}]+)", re.S)
+
+
+def _texto_rtf(rtf):
+    salida, pila, ignorar = [], [], False
+    saltar_unicode = 0
+    for palabra, param, hexa, simbolo, llave, texto in _RTF_TOKEN.findall(rtf):
+        if llave == '{':
+            pila.append(ignorar)
+        elif llave == '}':
+            ignorar = pila.pop() if pila else False
+        elif ignorar:
+            continue
+        elif palabra:
+            if palabra in _RTF_DESTINOS_IGNORADOS:
+                ignorar = True
+            elif palabra in ('par', 'line', 'sect', 'page'):
+                salida.append('\n')
+            elif palabra == 'tab':
+                salida.append('\t')
+            elif palabra == 'u' and param:
+                salida.append(chr(int(param) % 65536)); saltar_unicode = 1
+        elif simbolo:
+            if simbolo == '*': ignorar = True # Destino opcional {\*\...}
+            elif simbolo in '\\{}': salida.append(simbolo)
+            elif simbolo == '~': salida.append(' ')
+        elif hexa:
+            if saltar_unicode: saltar_unicode = 0; continue # Carácter de respaldo de un \uN
+            salida.append(bytes([int(hexa, 16)]).decode('cp1252', errors='replace'))
+        elif texto:
+            texto = texto.replace('\r', '').replace('\n', '')
+            if saltar_unicode and texto:
+                texto = texto[1:]; saltar_unicode = 0
+            salida.append(texto)
+    return ''.join(salida)
+
+
+# --- PDF (capa de texto) ---
+_PDF_STREAM = re.compile(rb'<<(.{0,2000}?)>>\s*stream\r?\n', re.S)
+_PDF_TEXTO = re.compile(rb'\((?:\\.|[^\\()]|\((?:\\.|[^\\()])*\))*\)\s*(?:Tj|\'|")|\[(?:[^\]\\]|\\.)*\]\s*TJ|T\*|Td|TD|ET', re.S)
+_PDF_LITERAL = re.compile(rb'\((?:\\.|[^\\()]|\((?:\\.|[^\\()])*\))*\)', re.S)
+_PDF_ESCAPES = {b'n': b'\n', b'r': b'\r', b't': b'\t', b'b': b'\b', b'f': b'\f', b'(': b'(', b')': b')', b'\\': b'\\'}
+
+
+def _texto_pdf(datos):
+    if not datos.startswith(b'%PDF'):
+        raise ValueError("no es un PDF")
+    if b'/Encrypt' in datos:
+        raise ValueError("PDF cifrado")
+    partes, caracteres, restantes = [], 0, MAX_BYTES_DESCOMPRIMIDOS_PDF
+    for m in _PDF_STREAM.finditer(datos):
+        diccionario = m.group(1)
+        if b'/Image' in diccionario or (b'/XObject' in diccionario and b'/Form' not in diccionario):
+            continue
+        inicio = m.end()
+        fin = datos.find(b'endstream', inicio)
+        if fin < 0: break
+        contenido = datos[inicio:fin]
+        if b'/FlateDecode' in diccionario:
+            try:
+                contenido = zlib.decompressobj().decompress(contenido, restantes) # Lo que pase del tope se descarta
+            except zlib.error:
+                continue
+            restantes -= len(contenido)
+        elif b'/Filter' in diccionario:
+            continue # Otros filtros (DCT, LZW...) no traen texto útil o no se soportan
+        if b'BT' in contenido:
+            partes.append(_texto_content_stream(contenido))
+            caracteres += len(partes[-1])
+        if caracteres >= MAX_CARACTERES or restantes <= 0:
+            break # Ya hay tanto texto como se guarda, o se agotó lo que se acepta descomprimir
+    return '\n'.join(p for p in partes if p.strip())
+
+
+def _texto_content_stream(contenido):
+    salida = []
+    for m in _PDF_TEXTO.finditer(contenido):
+        token = m.group(0)
+        if token in (b'T*', b'ET') or token.endswith((b'Td', b'TD')):
+            salida.append('\n' if token == b'ET' or token == b'T*' else ' ')
+            continue
+        for literal in _PDF_LITERAL.findall(token):
+            salida.append(_literal_pdf(literal[1:-1]))
+    return re.sub(r'\n\s*\n+', '\n', ''.join(salida))
+
+
+def _literal_pdf(cuerpo):
+    resultado, i = bytearray(), 0
+    while i < len(cuerpo):
+        c = cuerpo[i:i + 1]
+        if c == b'\\' and i + 1 < len(cuerpo):
+            siguiente = cuerpo[i + 1:i + 2]
+            if siguiente in _PDF_ESCAPES:
+                resultado += _PDF_ESCAPES[siguiente]; i += 2; continue
+            octal = re.match(rb'[0-7]{1,3}', cuerpo[i + 1:i + 4])
+            if octal:
+                resultado.append(int(octal.group(0), 8) & 0xFF); i += 1 + len(octal.group(0)); continue
+            i += 2; continue # Fin de línea escapado u otro escape desconocido
+        resultado += c; i += 1
+    if resultado.startswith(b'\xfe\xff'): # Texto UTF-16BE
+        return resultado[2:].decode('utf-16-be', errors='replace')
+    return resultado.decode('cp1252', errors='replace') # Aproximación de WinAnsiEncoding
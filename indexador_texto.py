@@ -0,0 +1,147 @@
+# indexador_texto.py
+# Extrae en segundo plano el texto de los documentos del índice (.docx, .txt, .rtf, PDFs con capa de
+# texto) y lo guarda en la tabla FTS5 documentos_texto para la búsqueda global.
+# - Un hilo orquestador pide a la BD los archivos pendientes (texto_tamano/texto_mtime distintos de
+#   tamano/mtime), así que tras cerrar la aplicación se retoma donde quedó y solo se re-extrae lo que cambió.
+# - La extracción (CPU: descompresión, parseo) corre en un ProcessPoolExecutor para no competir por el GIL
+#   con la interfaz. Los procesos se crean al haber trabajo y se liberan al quedar al día.
+# - Se envían a la vez tantos archivos como procesos, así cada uno tiene su propio plazo: si uno se cuelga
+#   queda como error y se matan los procesos (shutdown no interrumpe una tarea en curso).
+# - Los resultados se guardan por lote en el hilo escritor del índice de documentos.
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from extraccion_texto import EXTENSIONES_SOPORTADAS, ESTADO_ERROR, extraer_texto
+
+TAM_LOTE = 32
+ESPERA_SIN_TRABAJO_S = 120 # Además de despertar() por cambios del índice, revisa cada tanto
+TIMEOUT_ARCHIVO_S = 120 # Un archivo que tarda más que esto queda como error (y se reintenta si cambia)
+
+
+def _procesos_por_defecto():
+    # Deja núcleos libres para la interfaz y el resto del sistema
+    return max(1, min(4, (os.cpu_count() or 2) - 1))
+
+
+class IndexadorTexto:
+    """
+    iniciar() arranca el hilo; despertar() avisa que puede haber archivos nuevos; detener() lo corta.
+    al_progreso(procesados, pendientes) se llama desde el hilo del indexador (envolver con root.after).
+    """
+
+    def __init__(self, db, indice, max_procesos=None, tam_lote=TAM_LOTE, al_progreso=None):
+        self.db = db
+        self.indice = indice # IndiceDocumentos: sus escrituras y las nuestras pasan por el mismo hilo
+        self.max_procesos = max_procesos or _procesos_por_defecto()
+        self.tam_lote = tam_lote
+        self.al_progreso = al_progreso
+        self._despertar = threading.Event()
+        self._detenido = threading.Event()
+        self._pool = None
+        self._hilo = None
+        self.procesados = 0 # Desde que arrancó la aplicación
+
+    def iniciar(self):
+        if self._hilo is None:
+            self._hilo = threading.Thread(target=self._bucle, daemon=True, name="indexador_texto")
+            self._hilo.start()
+
+    def despertar(self, *_args):
+        """ Se puede registrar directamente como oyente del índice de documentos. """
+        self._despertar.set()
+
+    def detener(self):
+        self._detenido.set(); self._despertar.set()
+        self._cerrar_pool()
+
+    def _cerrar_pool(self):
+        pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def _matar_pool(self):
+        # ProcessPoolExecutor no tiene cómo cortar una tarea colgada (recién en Python 3.14): se matan sus procesos
+        pool, self._pool = self._pool, None
+        if pool is not None:
+            for proceso in list((pool._processes or {}).values()):
+                proceso.kill()
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def _avisar_progreso(self, pendientes):
+        if self.al_progreso:
+            try:
+                self.al_progreso(self.procesados, pendientes)
+            except Exception as e:
+                print(f"[Indexador] Error informando progreso: {e}")
+
+    # --- Hilo orquestador ---
+    def _bucle(self):
+        while not self._detenido.is_set():
+            try:
+                lote = self.db.get_documentos_para_extraer(EXTENSIONES_SOPORTADAS, limite=self.tam_lote)
+                if not lote:
+                    self._cerrar_pool() # Al día: se liberan los procesos hasta que haya más trabajo
+                    self._avisar_progreso(0)
+                    self._despertar.wait(ESPERA_SIN_TRABAJO_S)
+                    self._despertar.clear()
+                    continue
+                self._avisar_progreso(self.db.contar_documentos_pendientes_texto(EXTENSIONES_SOPORTADAS))
+                inicio = time.perf_counter()
+                resultados = self._extraer_lote(lote)
+                if self._detenido.is_set(): break
+                futuro = self.indice.encolar_escritura(self.db.guardar_textos_documentos, resultados)
+                if futuro is None or not futuro.result(): # Índice cerrado o error de BD: se reintenta más tarde
+                    self._detenido.wait(10); continue
+                self.procesados += len(resultados)
+                print(f"[Indexador] {len(resultados)} documentos procesados ({(time.perf_counter() - inicio) * 1000:.0f} ms)")
+            except Exception as e:
+                print(f"[Indexador] Error en el bucle de indexación: {e}")
+                self._cerrar_pool()
+                self._detenido.wait(10)
+
+    def _extraer_lote(self, lote):
+        """ [(id, tamano, mtime, estado, texto)] para guardar_textos_documentos. """
+        pendientes = list(reversed(lote))
+        en_curso = {} # {futuro: (archivo del lote, inicio)}
+        resultados = []
+
+        def anotar(archivo, estado, texto):
+            doc_id, _ruta, nombre, _extension, tamano, mtime = archivo
+            if estado == ESTADO_ERROR:
+                print(f"[Indexador] No se pudo extraer texto de '{nombre}': {texto}")
+                texto = ''
+            resultados.append((doc_id, tamano, mtime, estado, texto))
+
+        while (pendientes or en_curso) and not self._detenido.is_set():
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.max_procesos)
+            while pendientes and len(en_curso) < self.max_procesos:
+                archivo = pendientes.pop()
+                en_curso[self._pool.submit(extraer_texto, archivo[1], archivo[3])] = (archivo, time.monotonic())
+            vence = min(inicio for _archivo, inicio in en_curso.values()) + TIMEOUT_ARCHIVO_S
+            hechos, _ = wait(en_curso, timeout=max(0.0, vence - time.monotonic()), return_when=FIRST_COMPLETED)
+            roto = False
+            for futuro in hechos:
+                archivo, _inicio = en_curso.pop(futuro)
+                try:
+                    estado, texto = futuro.result()
+                except BrokenProcessPool:
+                    # Un archivo tiró abajo un proceso: no se sabe cuál de los que estaban en curso, quedan todos como error
+                    roto, estado, texto = True, ESTADO_ERROR, "el proceso de extracción terminó inesperadamente"
+                except Exception as e:
+                    estado, texto = ESTADO_ERROR, f"{type(e).__name__}: {e}"
+                anotar(archivo, estado, texto)
+            ahora = time.monotonic()
+            vencidos = [futuro for futuro, (_archivo, inicio) in en_curso.items() if ahora - inicio >= TIMEOUT_ARCHIVO_S]
+            for futuro in vencidos:
+                # No se reintenta hasta que el archivo cambie
+                anotar(en_curso.pop(futuro)[0], ESTADO_ERROR, f"tardó más de {TIMEOUT_ARCHIVO_S} s")
+            if vencidos or roto:
+                self._matar_pool()
+                # Los que seguían en curso no tuvieron la culpa: vuelven a la cola para el pool nuevo
+                pendientes.extend(archivo for archivo, _inicio in en_curso.values())
+                en_curso.clear()
+        return resultados
@@ -0,0 +1,177 @@
+# indice_documentos.py
+# Mantiene la tabla 'documentos' (índice de archivos y subcarpetas de la ruta_carpeta de cada caso)
+# al día con el disco. Un re-escaneo compara tamaño/mtime contra el índice y solo escribe lo que
+# cambió. Todas las escrituras pasan por un único hilo, así nunca compiten dos escritores de SQLite.
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from escaner_carpetas import EntradaCarpeta, leer_entrada
+
+# Un caso completo se vuelve a recorrer como mucho cada tanto; entre medio lo mantienen
+# al día los listados de carpeta y el observador de carpetas.
+INTERVALO_MINIMO_CASO_S = 300
+
+
+def dentro_de(ruta, raiz):
+    """ True si ruta es raiz o está debajo de ella. """
+    if not ruta or not raiz:
+        return False
+    ruta, raiz = os.path.normcase(os.path.abspath(ruta)), os.path.normcase(os.path.abspath(raiz))
+    return ruta == raiz or ruta.startswith(raiz.rstrip(os.sep) + os.sep)
+
+
+def _firma(entrada):
+    return (int(bool(entrada.es_carpeta)), entrada.tamano, entrada.mtime)
+
+
+class IndiceDocumentos:
+    def __init__(self, db, intervalo_minimo_caso_s=INTERVALO_MINIMO_CASO_S):
+        self.db = db
+        self.intervalo_minimo_caso = intervalo_minimo_caso_s
+        self._escritor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="indice_docs")
+        self._lock = threading.Lock()
+        self._casos_en_curso = set()
+        self._ultimo_recorrido = {} # {caso_id: time.monotonic() del último recorrido completo}
+        self._oyentes = [] # callback(caso_id) tras cada escritura que cambió algo (corre en el hilo del índice)
+        self._cerrado = False
+
+    def agregar_oyente(self, callback):
+        self._oyentes.append(callback)
+
+    def _avisar(self, caso_id):
+        for callback in list(self._oyentes):
+            try:
+                callback(caso_id)
+            except Exception as e:
+                print(f"[Índice] Error en oyente del índice (caso ID {caso_id}): {e}")
+
+    # --- Lecturas (desde cualquier hilo) ---
+    def entradas_carpeta(self, caso_id, carpeta):
+        """ Lo que el índice sabe de 'carpeta' (lista de EntradaCarpeta), o None si no la tiene indexada. """
+        filas = self.db.get_documentos_indice_carpeta(caso_id, carpeta)
+        return [EntradaCarpeta(*f) for f in filas] if filas else None
+
+    def buscar(self, caso_id, filtro='', carpeta=None, orden='nombre', descendente=False, limite=1000):
+        """ [(EntradaCarpeta, ruta_relativa)] desde el índice, sin tocar el disco. """
+        filas = self.db.buscar_documentos_indice(caso_id, filtro=filtro, carpeta=carpeta, orden=orden, descendente=descendente, limite=limite)
+        return [(EntradaCarpeta(*f[:5]), f[5]) for f in filas]
+
+    # --- Escrituras (se encolan en el hilo del índice) ---
+    def _enviar(self, funcion, *args):
+        if self._cerrado:
+            return None
+        try:
+            return self._escritor.submit(funcion, *args)
+        except RuntimeError: # El ejecutor ya se cerró
+            return None
+
+    def encolar_escritura(self, funcion, *args):
+        """ Corre funcion(*args) en el hilo del índice (otros escritores de 'documentos', p.ej. el indexador de texto). """
+        return self._enviar(funcion, *args)
+
+    def sincronizar_carpeta(self, caso_id, raiz, carpeta, entradas):
+        """ Ajusta el índice de una carpeta (sin recursión) al listado recién leído del disco. """
+        return self._enviar(self._sincronizar_carpeta, caso_id, raiz, carpeta, list(entradas))
+
+    def _sincronizar_carpeta(self, caso_id, raiz, carpeta, entradas):
+        indexadas = self.db.get_firmas_documentos_caso(caso_id, carpeta=carpeta)
+        cambios = [e for e in entradas if indexadas.get(e.ruta) != _firma(e)]
+        vistas = {e.ruta for e in entradas}
+        bajas = [ruta for ruta in indexadas if ruta not in vistas]
+        self.db.aplicar_cambios_indice_documentos(caso_id, raiz, cambios, bajas)
+        if cambios or bajas: self._avisar(caso_id)
+        return len(cambios), len(bajas)
+
+    def registrar_cambios(self, caso_id, raiz, cambios):
+        """ cambios del observador de carpetas: [(ruta, EntradaCarpeta o None si se borró)]. """
+        return self._enviar(self._registrar_cambios, caso_id, raiz, list(cambios))
+
+    def _registrar_cambios(self, caso_id, raiz, cambios):
+        altas = [e for _, e in cambios if e is not None and dentro_de(e.ruta, raiz)]
+        bajas = [ruta for ruta, e in cambios if e is None]
+        self.db.aplicar_cambios_indice_documentos(caso_id, raiz, altas, bajas)
+        if altas or bajas: self._avisar(caso_id)
+
+    def actualizar_caso_en_segundo_plano(self, caso_id, raiz, forzar=False, al_terminar=None):
+        """
+        Recorre toda la carpeta del caso y actualiza el índice. No repite un caso ya en curso ni uno
+        recorrido hace menos de intervalo_minimo_caso (salvo forzar). al_terminar(stats) corre en el
+        hilo del índice.
+        """
+        if not caso_id or not raiz:
+            return None
+        with self._lock:
+            reciente = time.monotonic() - self._ultimo_recorrido.get(caso_id, -self.intervalo_minimo_caso) < self.intervalo_minimo_caso
+            if caso_id in self._casos_en_curso or (reciente and not forzar):
+                return None
+            self._casos_en_curso.add(caso_id)
+        def trabajo():
+            try:
+                stats = self.actualizar_caso(caso_id, raiz)
+                if al_terminar: al_terminar(stats)
+                return stats
+            finally:
+                with self._lock:
+                    self._casos_en_curso.discard(caso_id)
+                    self._ultimo_recorrido[caso_id] = time.monotonic()
+        futuro = self._enviar(trabajo)
+        if futuro is None:
+            with self._lock: self._casos_en_curso.discard(caso_id)
+        return futuro
+
+    def actualizar_caso(self, caso_id, raiz):
+        """
+        Recorrido completo (en el hilo que llame). Devuelve {'total', 'altas_cambios', 'bajas'}.
+        Si la raíz no existe no borra nada: puede ser una unidad de red desconectada.
+        """
+        stats = {'total': 0, 'altas_cambios': 0, 'bajas': 0}
+        if not os.path.isdir(raiz):
+            return stats
+        inicio = time.perf_counter()
+        indexadas = self.db.get_firmas_documentos_caso(caso_id)
+        vistas, cambios = set(), []
+        pendientes = [raiz]
+        while pendientes and not self._cerrado:
+            carpeta = pendientes.pop()
+            try:
+                with os.scandir(carpeta) as it:
+                    for entry in it:
+                        try:
+                            es_carpeta = entry.is_dir(follow_symlinks=False)
+                            if not es_carpeta and not entry.is_file(): continue
+                            st = entry.stat(follow_symlinks=False)
+                        except OSError:
+                            continue
+                        entrada = EntradaCarpeta(entry.path, entry.name, es_carpeta, 0 if es_carpeta else st.st_size, st.st_mtime)
+                        vistas.add(entry.path)
+                        if indexadas.get(entry.path) != _firma(entrada):
+                            cambios.append(entrada)
+                        if es_carpeta:
+                            pendientes.append(entry.path)
+            except OSError as e:
+                print(f"[Índice] No se pudo recorrer {carpeta}: {e}")
+                # Lo indexado debajo de una carpeta ilegible se conserva (puede ser un permiso temporal)
+                prefijo = carpeta.rstrip(os.sep) + os.sep
+                vistas.update(r for r in indexadas if r.startswith(prefijo))
+        if self._cerrado:
+            return stats
+        bajas = [ruta for ruta in indexadas if ruta not in vistas]
+        self.db.aplicar_cambios_indice_documentos(caso_id, raiz, cambios, bajas)
+        if cambios or bajas: self._avisar(caso_id)
+        stats.update(total=len(vistas), altas_cambios=len(cambios), bajas=len(bajas))
+        print(f"[Índice] Caso {caso_id}: {stats['total']} entradas, {stats['altas_cambios']} nuevas/cambiadas, {stats['bajas']} bajas ({(time.perf_counter() - inicio) * 1000:.0f} ms)")
+        return stats
+
+    def resolver_referencia(self, caso_id, referencia):
+        """ Ruta real a la que apunta una referencia_documento, o None (referencia rota o caso sin índice). """
+        ruta = self.db.resolver_referencia_documento(caso_id, referencia)
+        if ruta and leer_entrada(ruta) is None: # El índice puede estar atrasado respecto del disco
+            self._enviar(self._registrar_cambios, caso_id, None, [(ruta, None)])
+            return None
+        return ruta
+
+    def cerrar(self):
+        self._cerrado = True
+        self._escritor.shutdown(wait=False, cancel_futures=True)
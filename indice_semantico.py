@@ -0,0 +1,407 @@
+# indice_semantico.py
+# Búsqueda por significado en el historial de los casos: actividades, notas del caso y texto de los
+# documentos ("despido sin causa" encuentra "desvinculación injustificada").
+# - Los textos se parten en fragmentos y se convierten en vectores con el endpoint /api/embeddings del
+#   Asistente IA local (servidor_ia_simulado tiene uno de prueba).
+# - Los vectores (float32, normalizados) viven en un archivo mapeado en memoria junto a la BD
+#   (crm_legal.vectores.f32); la tabla vectores_semanticos dice a qué fuente y caso pertenece cada fila.
+#   Buscar es un producto matriz-vector con NumPy (similitud coseno) y argpartition para quedarse con los
+#   mejores: un millón de vectores de 256 dimensiones se recorre en una fracción de segundo.
+# - Incremental: fuentes_semanticas guarda la huella del texto indexado de cada fuente; un hilo compara con
+#   la BD, pide vectores solo de lo nuevo o modificado y libera las filas de lo borrado (que se reutilizan).
+#   Los avisos de escritura de la BD lo despiertan para los casos tocados; cada tanto se compara todo.
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+from cliente_ia import ErrorIA, IARespuestaInvalida
+
+SUFIJO_VECTORES = '.vectores.f32'
+SUFIJO_META = '.vectores.json'
+CAPACIDAD_INICIAL = 4096 # Filas; el archivo se duplica al llenarse
+TAM_LOTE_FUENTES = 64
+TAM_LOTE_EMBEDDINGS = 32 # Textos por pedido al endpoint
+MAX_CARACTERES_FRAGMENTO = 1200
+SOLAPAMIENTO_CARACTERES = 150
+MAX_FRAGMENTOS_FUENTE = 40 # Un documento muy largo se indexa solo hasta acá
+LIMITE_RESULTADOS = 50
+FACTOR_CANDIDATOS = 4 # Varias filas pueden ser de la misma fuente: se piden más y se agrupan
+SIMILITUD_MINIMA = 0.3 # Por debajo, el fragmento no tiene que ver con la consulta (depende del modelo de embeddings)
+ESPERA_SIN_TRABAJO_S = 300 # Pasado esto sin avisos, se compara todo (casos nuevos, documentos extraídos...)
+ESPERA_TRAS_ERROR_S = 60
+DEMORA_CAMBIOS_S = 2.0 # Junta una ráfaga de escrituras en una sola comparación
+
+
+def fragmentar(texto, max_caracteres=MAX_CARACTERES_FRAGMENTO, solapamiento=SOLAPAMIENTO_CARACTERES, max_fragmentos=MAX_FRAGMENTOS_FUENTE):
+    """ Trozos de hasta max_caracteres, cortados entre palabras y con un poco de solapamiento. """
+    texto = ' '.join((texto or '').split())
+    if len(texto) <= max_caracteres:
+        return [texto] if texto else []
+    fragmentos, inicio = [], 0
+    while len(fragmentos) < max_fragmentos:
+        fin = min(len(texto), inicio + max_caracteres)
+        if fin < len(texto):
+            corte = texto.rfind(' ', inicio + max_caracteres // 2, fin)
+            if corte > 0: fin = corte
+        fragmentos.append(texto[inicio:fin])
+        if fin >= len(texto): break
+        siguiente = max(fin - solapamiento, inicio + 1)
+        espacio = texto.find(' ', siguiente, fin)
+        inicio = espacio + 1 if espacio != -1 else siguiente
+    return fragmentos
+
+
+class AlmacenVectores:
+    """
+    Matriz float32 (capacidad x dimensión) mapeada desde un archivo. Los vectores se guardan normalizados,
+    así la similitud coseno es un producto punto. casos[fila] es el caso de cada fila en uso (0 = libre);
+    se reconstruye desde la BD al abrir. No es thread-safe: IndiceSemantico lo usa con su lock.
+    """
+
+    def __init__(self, ruta, dimension, capacidad_inicial=CAPACIDAD_INICIAL):
+        self.ruta = ruta
+        self.dimension = dimension
+        bytes_fila = 4 * dimension
+        tamano = os.path.getsize(ruta) if os.path.exists(ruta) else 0
+        self.creado = tamano == 0 or tamano % bytes_fila != 0 # Nuevo (o de otra dimensión): sin vectores válidos
+        if self.creado:
+            tamano = capacidad_inicial * bytes_fila
+            with open(ruta, 'wb') as f:
+                f.truncate(tamano)
+        self.capacidad = tamano // bytes_fila
+        self.matriz = np.memmap(ruta, dtype=np.float32, mode='r+', shape=(self.capacidad, dimension))
+        self.casos = np.zeros(self.capacidad, dtype=np.int64)
+        self.usadas = 0 # Las filas en uso están todas antes de esta
+        self._libres = set()
+
+    def cargar_ocupacion(self, filas_casos):
+        """ filas_casos: [(fila, caso_id)] de la BD. Las filas que no figuran quedan libres. """
+        self.casos[:] = 0
+        datos = np.array(filas_casos, dtype=np.int64).reshape(-1, 2)
+        datos = datos[datos[:, 0] < self.capacidad]
+        self.casos[datos[:, 0]] = datos[:, 1]
+        self.usadas = int(datos[:, 0].max()) + 1 if len(datos) else 0
+        self._libres = set(np.flatnonzero(self.casos[:self.usadas] == 0).tolist())
+
+    @property
+    def ocupadas(self):
+        return self.usadas - len(self._libres)
+
+    def reservar(self, cantidad):
+        filas = [self._libres.pop() for _ in range(min(cantidad, len(self._libres)))]
+        faltan = cantidad - len(filas)
+        if faltan:
+            if self.usadas + faltan > self.capacidad:
+                self._crecer(self.usadas + faltan)
+            filas.extend(range(self.usadas, self.usadas + faltan))
+            self.usadas += faltan
+        return filas
+
+    def escribir(self, filas, vectores, caso_ids):
+        self.matriz[filas] = vectores
+        self.casos[filas] = caso_ids
+
+    def liberar(self, filas):
+        filas = [f for f in filas if f < self.usadas]
+        self.casos[filas] = 0 # Basta para que la búsqueda las ignore; el vector se pisa al reutilizarla
+        self._libres.update(filas)
+
+    def sincronizar(self):
+        self.matriz.flush()
+
+    def _crecer(self, minimo):
+        capacidad = max(minimo, self.capacidad * 2)
+        self.matriz.flush()
+        self.matriz = None # Suelta el mapeo antes de agrandar el archivo (necesario en Windows)
+        with open(self.ruta, 'r+b') as f:
+            f.truncate(capacidad * 4 * self.dimension)
+        self.matriz = np.memmap(self.ruta, dtype=np.float32, mode='r+', shape=(capacidad, self.dimension))
+        casos = np.zeros(capacidad, dtype=np.int64)
+        casos[:self.capacidad] = self.casos
+        self.casos, self.capacidad = casos, capacidad
+
+    def buscar(self, consulta, cantidad, caso_id=None):
+        """ [(fila, similitud)] de las filas más parecidas al vector consulta (normalizado), de mayor a menor. """
+        if self.usadas == 0 or cantidad <= 0:
+            return []
+        if caso_id is None:
+            filas = None
+            similitudes = np.asarray(self.matriz[:self.usadas] @ consulta)
+            similitudes[self.casos[:self.usadas] == 0] = -np.inf
+        else:
+            filas = np.flatnonzero(self.casos[:self.usadas] == caso_id)
+            if not len(filas): return []
+            similitudes = np.asarray(self.matriz[filas] @ consulta)
+        cantidad = min(cantidad, len(similitudes))
+        mejores = np.argpartition(similitudes, len(similitudes) - cantidad)[-cantidad:]
+        mejores = mejores[np.argsort(similitudes[mejores])[::-1]]
+        return [(int(filas[i]) if filas is not None else int(i), float(similitudes[i])) for i in mejores if similitudes[i] > -np.inf]
+
+
+class IndiceSemantico:
+    """
+    iniciar() arranca el hilo que mantiene el índice al día; buscar() se puede llamar desde cualquier hilo
+    (cargador asíncrono). revisar_todo() pide una comparación completa (p.ej. cuando el indexador de texto
+    terminó una tanda de documentos). al_progreso(indexadas, pendientes) se llama desde el hilo del índice
+    (envolver con root.after).
+    """
+
+    def __init__(self, db, cliente_ia, ruta_base=None, tam_lote=TAM_LOTE_FUENTES, al_progreso=None):
+        base = ruta_base or os.path.splitext(os.path.abspath(db.DATABASE_FILE))[0]
+        self.db = db
+        self.cliente_ia = cliente_ia
+        self.ruta_vectores = base + SUFIJO_VECTORES
+        self.ruta_meta = base + SUFIJO_META
+        self.tam_lote = tam_lote
+        self.al_progreso = al_progreso
+        self._lock = threading.RLock() # Protege el almacén (búsquedas y escrituras)
+        self._almacen = None # Se abre en el hilo del índice (cargar la ocupación lleva un momento con muchos vectores)
+        self.modelo = None
+        self._lock_cambios = threading.Lock()
+        self._casos_sucios = set()
+        self._revisar_todo = True
+        self._modelo_nuevo = None # (dimensión, modelo) visto en una búsqueda: el hilo rehace el índice
+        self._despertar = threading.Event()
+        self._detenido = threading.Event()
+        self._hilo = None
+        self.indexadas = 0 # Fuentes (re)indexadas desde que arrancó la aplicación
+        self.pendientes = 0
+        db.registrar_oyente_cambios(self._on_cambio_db)
+
+    # --- API ---
+    def iniciar(self):
+        if self._hilo is None:
+            self._hilo = threading.Thread(target=self._bucle, daemon=True, name="indice_semantico")
+            self._hilo.start()
+
+    def revisar_todo(self, *_args):
+        with self._lock_cambios:
+            self._revisar_todo = True
+        self._despertar.set()
+
+    def detener(self):
+        self._detenido.set(); self._despertar.set()
+        with self._lock:
+            if self._almacen is not None:
+                self._almacen.sincronizar()
+
+    def estadisticas(self):
+        with self._lock:
+            almacen = self._almacen
+            return {'vectores': almacen.ocupadas if almacen else 0, 'dimension': almacen.dimension if almacen else None,
+                    'bytes': almacen.capacidad * almacen.dimension * 4 if almacen else 0, 'modelo': self.modelo,
+                    'indexadas': self.indexadas, 'pendientes': self.pendientes}
+
+    def buscar(self, texto, limite=LIMITE_RESULTADOS, caso_id=None):
+        """
+        [{'origen', 'origen_id', 'caso_id', 'caratula', 'titulo', 'fecha', 'ruta', 'fragmento', 'similitud'}],
+        una entrada por fuente, de mayor a menor similitud (solo desde SIMILITUD_MINIMA: si nada se parece,
+        lista vacía). Lanza ErrorIA si no se pudo vectorizar la consulta.
+        """
+        texto = ' '.join((texto or '').split())
+        with self._lock:
+            if not texto or self._almacen is None:
+                return []
+        vectores, modelo = self._vectorizar([texto])
+        with self._lock:
+            almacen = self._almacen
+            if modelo != self.modelo or vectores.shape[1] != almacen.dimension:
+                self._modelo_nuevo = (vectores.shape[1], modelo); self._despertar.set()
+                raise ErrorIA("Cambió el modelo de embeddings del Asistente IA; el índice semántico se está rehaciendo.")
+            candidatos = almacen.buscar(vectores[0], limite * FACTOR_CANDIDATOS, caso_id)
+        candidatos = [(fila, similitud) for fila, similitud in candidatos if similitud >= SIMILITUD_MINIMA]
+        if not candidatos:
+            return []
+        ubicaciones = self.db.get_vectores_semanticos_por_fila([fila for fila, _similitud in candidatos])
+        mejores = {} # {(origen, origen_id): (similitud, parte)}, en orden de similitud
+        for fila, similitud in candidatos:
+            ubicacion = ubicaciones.get(fila)
+            if ubicacion is None: continue
+            origen, origen_id, _caso_id, parte = ubicacion
+            mejores.setdefault((origen, origen_id), (similitud, parte))
+            if len(mejores) >= limite: break
+        datos = self.db.get_textos_fuentes_semanticas(list(mejores)) or {}
+        resultados = []
+        for (origen, origen_id), (similitud, parte) in mejores.items():
+            fuente = datos.get((origen, origen_id))
+            if not fuente: continue # Se borró después de indexarse
+            partes = fragmentar(fuente['texto'])
+            resultados.append({'origen': origen, 'origen_id': origen_id, 'caso_id': fuente['caso_id'], 'caratula': fuente['caratula'],
+                               'titulo': fuente['titulo'], 'fecha': fuente['fecha'], 'ruta': fuente['ruta'],
+                               'fragmento': partes[min(parte, len(partes) - 1)] if partes else '', 'similitud': similitud})
+        return resultados
+
+    # --- Vectores ---
+    def _vectorizar(self, textos):
+        """ (matriz float32 con una fila normalizada por texto, modelo) """
+        vectores, modelo = [], None
+        for inicio in range(0, len(textos), TAM_LOTE_EMBEDDINGS):
+            respuesta = self.cliente_ia.embeddings(textos[inicio:inicio + TAM_LOTE_EMBEDDINGS])
+            vectores.extend(respuesta['embeddings'])
+            modelo = respuesta.get('modelo') or modelo
+        try:
+            matriz = np.asarray(vectores, dtype=np.float32)
+        except (TypeError, ValueError):
+            raise IARespuestaInvalida("El servidor del Asistente IA devolvió vectores de distinto largo o no numéricos.")
+        if matriz.ndim != 2 or matriz.shape[1] == 0:
+            raise IARespuestaInvalida("El servidor del Asistente IA devolvió vectores vacíos.")
+        normas = np.linalg.norm(matriz, axis=1, keepdims=True)
+        normas[normas == 0] = 1
+        return matriz / normas, modelo or f"sin-nombre-{matriz.shape[1]}"
+
+    def _abrir(self, dimension, modelo):
+        """ Abre (o crea) el archivo de vectores. Si no sirve lo indexado en la BD, lo vacía y pide revisar todo. """
+        almacen = AlmacenVectores(self.ruta_vectores, dimension)
+        ocupacion = self.db.get_ocupacion_vectores_semanticos()
+        if almacen.creado and ocupacion:
+            self.db.vaciar_vectores_semanticos(); ocupacion = []
+        almacen.cargar_ocupacion(ocupacion)
+        if almacen.creado:
+            self.revisar_todo()
+        with open(self.ruta_meta, 'w', encoding='utf-8') as f:
+            json.dump({'dimension': dimension, 'modelo': modelo}, f)
+        with self._lock:
+            self._almacen, self.modelo = almacen, modelo
+        print(f"[Índice semántico] {almacen.ocupadas} vectores de {dimension} dimensiones ({modelo}).")
+
+    def _abrir_existente(self):
+        try:
+            with open(self.ruta_meta, encoding='utf-8') as f:
+                meta = json.load(f)
+            dimension, modelo = int(meta['dimension']), meta.get('modelo')
+        except (OSError, ValueError, KeyError, TypeError):
+            # Sin descripción del archivo no se puede confiar en él: se empieza de cero con el primer lote
+            self.db.vaciar_vectores_semanticos()
+            return
+        self._abrir(dimension, modelo)
+
+    def _preparar_almacen(self, dimension, modelo):
+        """ El almacén listo para vectores de este modelo; si el modelo cambió, se descarta lo indexado. """
+        with self._lock:
+            almacen = self._almacen
+            if almacen is not None and almacen.dimension == dimension and self.modelo == modelo:
+                return
+            if almacen is not None:
+                print(f"[Índice semántico] Cambió el modelo de embeddings ({self.modelo} -> {modelo}); se rehace el índice.")
+                self._almacen = None
+                almacen.matriz = None
+                os.remove(self.ruta_vectores)
+        self._abrir(dimension, modelo)
+
+    # --- Hilo del índice ---
+    def _on_cambio_db(self, entidad, entidad_id, caso_id, fechas):
+        if entidad not in ('actividad', 'caso', 'cliente'):
+            return
+        with self._lock_cambios:
+            if caso_id is None or entidad == 'cliente':
+                self._revisar_todo = True # Borrado en cascada sin caso conocido
+            else:
+                self._casos_sucios.add(caso_id)
+        self._despertar.set()
+
+    def _avisar_progreso(self):
+        if self.al_progreso:
+            try:
+                self.al_progreso(self.indexadas, self.pendientes)
+            except Exception as e:
+                print(f"[Índice semántico] Error informando progreso: {e}")
+
+    def _comparar(self):
+        """ (claves a indexar, claves a quitar) según lo que cambió desde la última vez. """
+        with self._lock_cambios:
+            completo, sucios = self._revisar_todo, self._casos_sucios
+            self._revisar_todo, self._casos_sucios = False, set()
+        if not completo and not sucios:
+            return [], []
+        caso_ids = None if completo else sorted(sucios)
+        actuales = self.db.get_fuentes_semanticas_actuales(caso_ids)
+        indexadas = self.db.get_fuentes_semanticas_indexadas(caso_ids)
+        if actuales is None or indexadas is None:
+            raise RuntimeError("no se pudieron leer las fuentes del índice")
+        pendientes = [clave for clave, (_caso_id, huella) in actuales.items() if indexadas.get(clave) != huella]
+        return pendientes, [clave for clave in indexadas if clave not in actuales]
+
+    def _quitar(self, claves):
+        libres = self.db.borrar_fuentes_semanticas(claves)
+        if libres:
+            with self._lock:
+                if self._almacen is not None: self._almacen.liberar(libres)
+
+    def _indexar_lote(self, claves):
+        textos = self.db.get_textos_fuentes_semanticas(claves)
+        if textos is None:
+            raise RuntimeError("no se pudieron leer los textos a indexar")
+        fuentes, fragmentos, desaparecidas = [], [], []
+        for clave in claves:
+            datos = textos.get(clave)
+            if datos is None:
+                desaparecidas.append(clave); continue
+            fuentes.append((clave[0], clave[1], datos['caso_id'], datos['huella']))
+            fragmentos.extend((clave, datos['caso_id'], parte, texto) for parte, texto in enumerate(fragmentar(datos['texto'])))
+        filas, almacen = [], None
+        if fragmentos:
+            vectores, modelo = self._vectorizar([texto for _clave, _caso_id, _parte, texto in fragmentos])
+            self._preparar_almacen(vectores.shape[1], modelo)
+            with self._lock:
+                almacen = self._almacen
+                filas = almacen.reservar(len(fragmentos))
+                almacen.escribir(filas, vectores, [caso_id for _clave, caso_id, _parte, _texto in fragmentos])
+                almacen.sincronizar() # En disco antes de que la BD las dé por buenas
+        if fuentes:
+            registros = [(fila, clave[0], clave[1], caso_id, parte) for fila, (clave, caso_id, parte, _texto) in zip(filas, fragmentos)]
+            libres = self.db.guardar_vectores_semanticos(fuentes, registros)
+            with self._lock:
+                if almacen is None: almacen = self._almacen
+                if almacen is not None:
+                    almacen.liberar(filas if libres is None else libres)
+            if libres is None:
+                raise RuntimeError("no se pudieron guardar los vectores en la BD")
+            self.indexadas += len(fuentes)
+        if desaparecidas:
+            self._quitar(desaparecidas)
+
+    def _bucle(self):
+        try:
+            self._abrir_existente()
+        except Exception as e:
+            print(f"[Índice semántico] No se pudo abrir el archivo de vectores: {e}")
+        while not self._detenido.is_set():
+            try:
+                if self._modelo_nuevo is not None:
+                    (dimension, modelo), self._modelo_nuevo = self._modelo_nuevo, None
+                    self._preparar_almacen(dimension, modelo)
+                pendientes, eliminadas = self._comparar()
+                if eliminadas:
+                    self._quitar(eliminadas)
+                if not pendientes:
+                    self.pendientes = 0
+                    self._avisar_progreso()
+                    if not self._despertar.wait(ESPERA_SIN_TRABAJO_S):
+                        self.revisar_todo()
+                    self._despertar.clear()
+                    self._detenido.wait(DEMORA_CAMBIOS_S)
+                    continue
+                for inicio in range(0, len(pendientes), self.tam_lote):
+                    if self._detenido.is_set(): return
+                    lote = pendientes[inicio:inicio + self.tam_lote]
+                    comienzo = time.perf_counter()
+                    self._indexar_lote(lote)
+                    self.pendientes = len(pendientes) - inicio - len(lote)
+                    self._avisar_progreso()
+                    print(f"[Índice semántico] {len(lote)} fuentes indexadas ({(time.perf_counter() - comienzo) * 1000:.0f} ms), quedan {self.pendientes}")
+            except ErrorIA as e:
+                # Sin servidor de embeddings: lo que quedó pendiente se vuelve a buscar en la próxima comparación
+                print(f"[Índice semántico] Asistente IA no disponible ({type(e).__name__}); se reintenta en {ESPERA_TRAS_ERROR_S} s.")
+                self._marcar_revision()
+                self._detenido.wait(ESPERA_TRAS_ERROR_S)
+            except Exception as e:
+                print(f"[Índice semántico] Error en el bucle de indexación: {e}")
+                self._marcar_revision()
+                self._detenido.wait(10)
+
+    def _marcar_revision(self):
+        with self._lock_cambios:
+            self._revisar_todo = True
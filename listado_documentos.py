@@ -0,0 +1,271 @@
+# listado_documentos.py
+# Vista de una carpeta de caso en un ttk.Treeview, compartida por la pestaña Documentos de la
+# ventana principal y por DocumentosTab (ventana de detalle del caso). El recorrido de la carpeta
+# lo hace EscanerCarpetas en el pool de CargadorAsync; aquí solo se pintan las filas.
+import bisect
+import os
+import tkinter as tk
+
+from escaner_carpetas import clave_orden, fila_documento
+from indice_documentos import dentro_de
+from render_por_tramos import RenderizadorPorTramos
+from treeview_sync import SincronizadorTreeview
+
+
+class ListadoDocumentos:
+    """
+    cargar(carpeta, carpeta_raiz, ...) pide el listado al pool:
+      - primera visita: las entradas llegan por lotes mientras se recorre la carpeta y cada una
+        se inserta ya en su lugar (carpetas primero, orden alfabético);
+      - carpeta en caché: la lista completa llega de una vez y se inserta por tramos.
+    Un cargar() o limpiar() posterior descarta lo que quede de la carga anterior.
+    Con un ObservadorCarpetas, la carpeta mostrada se observa mientras está a la vista y sus
+    cambios se aplican fila por fila (aplicar_cambios), sin volver a listarla.
+    Con un IndiceDocumentos y caso_id, lo que el índice ya sabe de la carpeta se muestra antes de
+    tocar el disco; el listado del disco después corrige la vista y el índice. Filtrar por nombre
+    y ordenar por columna se resuelven con consultas al índice (consultar_indice).
+    """
+
+    COLUMNAS_ORDEN = {'Nombre': 'nombre', 'Tamaño': 'tamano', 'Fecha Mod.': 'mtime'}
+
+    def __init__(self, tree, cargador, escaner, canal, progreso_lbl=None, observador=None, indice=None):
+        self.tree = tree
+        self.cargador = cargador
+        self.escaner = escaner
+        self.canal = canal
+        self.progreso_lbl = progreso_lbl
+        self.sincronizador = SincronizadorTreeview(tree)
+        self.renderizador = RenderizadorPorTramos(tree)
+        self.carpeta = None # Carpeta mostrada (puede ser una subcarpeta del caso)
+        self._claves = [] # clave_orden de cada entrada pintada, en el orden del Treeview
+        self._hay_padre = False # Fila "[..] Subir Nivel" en el índice 0
+        self.observador = observador
+        self._suscripcion = None
+        self._ultima_carga = None # Argumentos de cargar(), para recargar si la carpeta se mueve
+        self._cambios_pendientes = [] # Cambios que llegan mientras se está cargando
+        self.indice = indice
+        self._caso_id = None
+        self._filtro, self._orden, self._descendente = '', 'nombre', False
+        self._en_consulta = False # La vista muestra una consulta al índice y no la carpeta
+        self._titulos = {}
+        if indice is not None:
+            for columna, orden in self.COLUMNAS_ORDEN.items():
+                if columna in tree['columns']:
+                    self._titulos[columna] = tree.heading(columna, 'text')
+                    tree.heading(columna, command=lambda o=orden: self.ordenar_por(o))
+
+    def _progreso(self, texto):
+        if self.progreso_lbl is not None:
+            self.progreso_lbl.config(text=texto)
+
+    def cargar(self, carpeta, carpeta_raiz, hay_caso=True, al_estado_carpeta=None, caso_id=None):
+        """ al_estado_carpeta(carpeta_existe, raiz_existe) se llama al terminar, para habilitar botones. """
+        self.limpiar()
+        self.carpeta = carpeta
+        self._caso_id = caso_id
+        self._ultima_carga = (carpeta, carpeta_raiz, hay_caso, al_estado_carpeta, caso_id)
+        self._filtro, self._orden, self._descendente = '', 'nombre', False
+        self._actualizar_titulos()
+        if self.observador and carpeta:
+            # Antes del listado, para no perder lo que cambie mientras se recorre la carpeta
+            self._suscripcion = self.observador.observar(carpeta, self.aplicar_cambios)
+        self._progreso("Cargando...")
+        self.cargador.enviar(self.canal, lambda token: self._listar(carpeta, carpeta_raiz, token, caso_id),
+                             lambda res: self._aplicar(hay_caso, al_estado_carpeta, *res),
+                             al_error=self._error, al_parcial=self._aplicar_lote)
+
+    def limpiar(self):
+        self.cargador.cancelar(self.canal)
+        self.renderizador.cancelar() # Si se cambió de caso o de carpeta a mitad de una carga
+        self._progreso("")
+        self.sincronizador.limpiar()
+        self._claves = []
+        self._hay_padre = False
+        self.carpeta = None
+        self._cambios_pendientes = []
+        self._en_consulta = False
+        if self._suscripcion is not None:
+            self.observador.dejar(self._suscripcion)
+            self._suscripcion = None
+
+    def cerrar(self):
+        """ Al destruir la vista: cancela la carga y suelta el watch (sin tocar el Treeview, que ya se destruye). """
+        self.cargador.cancelar(self.canal)
+        self.renderizador.cancelar()
+        if self._suscripcion is not None:
+            self.observador.dejar(self._suscripcion)
+            self._suscripcion = None
+        self._ultima_carga = None
+        self.carpeta = None
+
+    def recargar(self):
+        if self._ultima_carga:
+            self.escaner.invalidar(self._ultima_carga[0])
+            self.cargar(*self._ultima_carga)
+
+    @property
+    def cargando(self):
+        return self.cargador.esta_cargando(self.canal) or self.renderizador.activo
+
+    def aplicar_cambios(self, cambios):
+        """ cambios: [(ruta, EntradaCarpeta o None si se borró)] del observador, o None para recargar. """
+        if cambios is None:
+            self.recargar(); return
+        if not self.carpeta: return
+        self.escaner.invalidar(self.carpeta) # Editar un archivo no cambia el mtime de la carpeta
+        if self.indice and self._caso_id:
+            escrito = self.indice.registrar_cambios(self._caso_id, self._ultima_carga[1], cambios)
+            if self._en_consulta:
+                # La vista es una consulta al índice: se repite cuando el índice ya tiene los cambios
+                self._consultar(esperar=escrito); return
+        if self.cargando:
+            self._cambios_pendientes.extend(cambios); return
+        offset = 1 if self._hay_padre else 0
+        for ruta, entrada in cambios:
+            if entrada is None:
+                if self.tree.exists(ruta) and 'parent_folder' not in self.tree.item(ruta, 'tags'):
+                    del self._claves[self.tree.index(ruta) - offset]
+                    self.sincronizador.quitar_fila(ruta)
+            elif self.tree.exists(entrada.ruta):
+                indice = self.tree.index(entrada.ruta) - offset
+                if self._claves[indice] == clave_orden(entrada):
+                    self.sincronizador.actualizar_fila(*fila_documento(entrada))
+                else: # Pasó de archivo a carpeta o al revés: va a otro lugar
+                    del self._claves[indice]
+                    self.sincronizador.quitar_fila(entrada.ruta)
+                    self._insertar_ordenada(entrada)
+            else:
+                self._insertar_ordenada(entrada)
+
+    def _aplicar_pendientes(self):
+        pendientes, self._cambios_pendientes = self._cambios_pendientes, []
+        if pendientes: self.aplicar_cambios(pendientes)
+
+    # --- Filtro y orden desde el índice ---
+    def filtrar(self, texto):
+        self.consultar_indice(filtro=texto.strip(), orden=self._orden, descendente=self._descendente)
+
+    def ordenar_por(self, orden):
+        descendente = not self._descendente if orden == self._orden else False
+        self.consultar_indice(filtro=self._filtro, orden=orden, descendente=descendente)
+
+    def consultar_indice(self, filtro='', orden='nombre', descendente=False):
+        """ Filtro: busca por nombre en todo el caso. Sin filtro y con otro orden: la carpeta actual ordenada. """
+        if not (self.indice and self._caso_id and self._ultima_carga):
+            return False
+        self._filtro, self._orden, self._descendente = filtro, orden, descendente
+        self._actualizar_titulos()
+        if not filtro and orden == 'nombre' and not descendente:
+            if self._en_consulta: # Vuelve a la vista normal de la carpeta (con observador)
+                carga = self._ultima_carga
+                self.cargar(*carga)
+            return True
+        self.renderizador.cancelar()
+        self._en_consulta = True
+        self._consultar()
+        return True
+
+    def _consultar(self, esperar=None):
+        caso_id, filtro, orden, descendente = self._caso_id, self._filtro, self._orden, self._descendente
+        carpeta = None if filtro else self.carpeta
+        def trabajo(token):
+            if esperar is not None: esperar.result() # Que el índice ya tenga los últimos cambios
+            return self.indice.buscar(caso_id, filtro=filtro, carpeta=carpeta, orden=orden, descendente=descendente)
+        self._progreso("Buscando...")
+        self.cargador.enviar(self.canal, trabajo, self._mostrar_consulta, al_error=self._error)
+
+    def _mostrar_consulta(self, resultados):
+        if not self._en_consulta: return
+        filas = []
+        for entrada, relativa in resultados:
+            iid, values, tags = fila_documento(entrada)
+            if self._filtro: # En todo el caso: se muestra dónde está cada archivo
+                values = ((f"[CARPETA] {relativa}" if entrada.es_carpeta else relativa),) + tuple(values[1:])
+            filas.append((iid, values, tags))
+        self._claves, self._hay_padre = [], False
+        self.sincronizador.sincronizar(filas)
+        self._progreso(f"{len(filas)} resultado(s) en el índice" if self._filtro else "")
+
+    def _actualizar_titulos(self):
+        for columna, titulo in self._titulos.items():
+            marca = (" ▼" if self._descendente else " ▲") if self.COLUMNAS_ORDEN[columna] == self._orden and (self._orden != 'nombre' or self._descendente) else ""
+            self.tree.heading(columna, text=titulo + marca)
+
+    # --- En el pool ---
+    def _listar(self, carpeta, carpeta_raiz, token, caso_id=None):
+        """ Devuelve (fila_subir_nivel, entradas, error, carpeta_existe, raiz_existe). """
+        raiz_existe = bool(carpeta_raiz and os.path.isdir(carpeta_raiz))
+        if not (carpeta and os.path.isdir(carpeta)):
+            return None, None, None, False, raiz_existe
+        fila_padre = None
+        # Botón para subir un nivel, si no estamos en la carpeta raíz del caso
+        if carpeta_raiz and carpeta != carpeta_raiz:
+            parent_dir = os.path.dirname(carpeta)
+            # Solo si el padre es la carpeta raíz del caso o una subcarpeta de ella (evita salir del caso)
+            if parent_dir and os.path.isdir(parent_dir) and parent_dir != carpeta and \
+               (parent_dir == carpeta_raiz or parent_dir.startswith(carpeta_raiz + os.sep)):
+                fila_padre = (parent_dir, ("[..] Subir Nivel", "Carpeta", ""), ('parent_folder',))
+        indexar = bool(self.indice and caso_id and dentro_de(carpeta, carpeta_raiz))
+        if indexar:
+            previas = self.indice.entradas_carpeta(caso_id, carpeta)
+            if previas: token.publicar(previas) # Se ve enseguida; el disco confirma después
+        try:
+            entradas = self.escaner.listar(carpeta, token=token, al_lote=token.publicar)
+        except OSError as e:
+            print(f"Error listando directorio {carpeta}: {e}")
+            return fila_padre, None, f"Error al leer directorio: {e}", True, raiz_existe
+        if indexar:
+            self.indice.sincronizar_carpeta(caso_id, carpeta_raiz, carpeta, entradas)
+        return fila_padre, entradas, None, True, raiz_existe
+
+    # --- En el hilo de Tk ---
+    def _insertar_ordenada(self, entrada):
+        clave = clave_orden(entrada)
+        iid, values, tags = fila_documento(entrada)
+        if self.tree.exists(iid):
+            return
+        i = bisect.bisect(self._claves, clave)
+        self._claves.insert(i, clave)
+        self.sincronizador.actualizar_fila(iid, values, tags, indice=i + (1 if self._hay_padre else 0))
+
+    def _agregar_al_final(self, entrada):
+        iid, values, tags = fila_documento(entrada)
+        self._claves.append(clave_orden(entrada))
+        self.sincronizador.actualizar_fila(iid, values, tags)
+
+    def _aplicar_lote(self, lote):
+        for entrada in lote:
+            self._insertar_ordenada(entrada)
+        self._progreso(f"Cargando... {len(self._claves)}")
+
+    def _aplicar(self, hay_caso, al_estado_carpeta, fila_padre, entradas, error, carpeta_existe, raiz_existe):
+        if al_estado_carpeta:
+            al_estado_carpeta(carpeta_existe, raiz_existe)
+        self._progreso("")
+        if entradas is None and self._claves: # Se mostró lo indexado pero la carpeta ya no se puede leer
+            self.sincronizador.limpiar(); self._claves = []
+        if fila_padre:
+            self.sincronizador.actualizar_fila(*fila_padre, indice=0)
+            self._hay_padre = True
+        if error:
+            self.tree.insert('', tk.END, values=(error, "", ""), iid="error_dir_listing")
+        elif entradas is None:
+            if hay_caso: self.tree.insert('', tk.END, values=("Carpeta no asignada o no encontrada.", "", ""), iid="no_folder_or_invalid")
+        elif self._claves:
+            # Ya se mostraron por lotes: una pasada de sincronización deja el orden final exacto
+            filas = ([fila_padre] if fila_padre else []) + [fila_documento(e) for e in entradas]
+            self.sincronizador.sincronizar(filas)
+            self._claves = [clave_orden(e) for e in entradas]
+            self._aplicar_pendientes()
+        else:
+            total = len(entradas)
+            self.renderizador.iniciar(
+                entradas, self._agregar_al_final,
+                progreso=lambda hechos, tot: self._progreso(f"Cargando... {hechos} de {tot}" if tot and hechos < tot else ""),
+                al_terminar=lambda hechos: (self._progreso(""), self._aplicar_pendientes()),
+                total=total)
+
+    def _error(self, error):
+        print(f"Error inesperado listando documentos: {error}")
+        self._progreso("")
+        self.tree.insert('', tk.END, values=("Error inesperado al listar", "", ""), iid="error_unexpected_listing")
@@ -11,7 +11,6 @@ import time
 import sys
 import subprocess
 import sqlite3
-import requests
 import json
 from docx import Document
 from docx.enum.text import WD_ALIGN_PARAGRAPH
@@ -24,12 +23,39 @@ from PIL import Image, ImageTk
 import plyer
 from pystray import MenuItem as item, Icon as icon
 import shutil
+import multiprocessing
 
 # --- Imports para la ventana Toplevel y sus pestañas ---
 from case_detail_window import CaseDetailWindow
 from seguimiento_ui import SeguimientoTab
 from partes_ui import PartesTab
 from tareas_ui import TareasTab
+from agenda_vistas_ui import AgendaVistasWindow
+from carga_perezosa import CargadorPestanas
+from virtual_treeview import VirtualTreeview, FuenteLista, FuenteConsulta
+from treeview_sync import SincronizadorTreeview
+from cargador_async import CargadorAsync
+from escaner_carpetas import EscanerCarpetas
+from listado_documentos import ListadoDocumentos
+from observador_carpetas import ObservadorCarpetas
+from indice_documentos import IndiceDocumentos
+from indexador_texto import IndexadorTexto
+from busqueda_global_ui import BusquedaGlobalWindow
+from duplicados_ui import DuplicadosWindow
+from previsualizaciones import ServicioPrevisualizaciones, NOMBRE_CARPETA_CACHE
+from previsualizacion_ui import PanelPrevisualizacion
+from cliente_ia import ClienteIA, ControlStream, ErrorIA, IACancelada, IANoDisponible
+from cache_ia import CacheRespuestasIA
+from cola_ia import ColaTrabajosIA
+from contexto_ia import ConstructorContextoIA, estimar_tokens
+from trabajos_ia_ui import TrabajosIAWindow
+from indice_semantico import IndiceSemantico
+from agenda_cache import CacheAgenda
+import agenda_conflictos
+import calendario_ics
+
+# Días que se conservan las entregas de recordatorios en la BD antes de purgarlas
+DIAS_RETENCION_ENTREGAS_RECORDATORIOS = 30
 
 def resource_path(relative_path):
     try:
@@ -49,8 +75,10 @@ class CRMLegalApp:
 
         menubar = tk.Menu(self.root)
         filemenu = tk.Menu(menubar, tearoff=0); filemenu.add_command(label="Mostrar Ventana", command=self._mostrar_ventana_callback); filemenu.add_separator(); filemenu.add_command(label="Ocultar a Bandeja", command=self.ocultar_a_bandeja); filemenu.add_separator(); filemenu.add_command(label="Salir", command=self.cerrar_aplicacion_directamente); menubar.add_cascade(label="Archivo", menu=filemenu)
-        ia_menu = tk.Menu(menubar, tearoff=0); ia_menu.add_command(label="Reformular Hechos...", command=self.open_reformular_hechos_dialog); menubar.add_cascade(label="Asistente IA", menu=ia_menu)
-        adminmenu = tk.Menu(menubar, tearoff=0); adminmenu.add_command(label="Crear Copia de Seguridad...", command=self.crear_copia_de_seguridad); menubar.add_cascade(label="Administración", menu=adminmenu)
+        ia_menu = tk.Menu(menubar, tearoff=0); ia_menu.add_command(label="Reformular Hechos...", command=self.open_reformular_hechos_dialog); ia_menu.add_command(label="Trabajos por Lotes...", command=self.abrir_trabajos_ia); ia_menu.add_separator(); ia_menu.add_command(label="Estado del Asistente...", command=self.mostrar_estado_asistente_ia); ia_menu.add_command(label="Vaciar Caché de Respuestas", command=self.vaciar_cache_ia); menubar.add_cascade(label="Asistente IA", menu=ia_menu)
+        agenda_menu = tk.Menu(menubar, tearoff=0); agenda_menu.add_command(label="Vista Semanal / Mensual...", command=self.abrir_vistas_agenda); agenda_menu.add_command(label="Reporte de Conflictos...", command=self.mostrar_reporte_conflictos_agenda); agenda_menu.add_separator(); agenda_menu.add_command(label="Exportar Agenda (.ics)...", command=self.exportar_agenda_ics); agenda_menu.add_command(label="Importar .ics al Caso Seleccionado...", command=self.importar_ics_caso_seleccionado); agenda_menu.add_command(label="Feed de Calendario (.ics)...", command=self.mostrar_info_feed_ics); menubar.add_cascade(label="Agenda", menu=agenda_menu)
+        buscar_menu = tk.Menu(menubar, tearoff=0); buscar_menu.add_command(label="Búsqueda Global...", command=self.abrir_busqueda_global, accelerator="Ctrl+Shift+F"); menubar.add_cascade(label="Buscar", menu=buscar_menu); self.root.bind_all('<Control-Shift-F>', lambda e: self.abrir_busqueda_global()); self.root.bind_all('<Control-Shift-f>', lambda e: self.abrir_busqueda_global())
+        adminmenu = tk.Menu(menubar, tearoff=0); adminmenu.add_command(label="Crear Copia de Seguridad...", command=self.crear_copia_de_seguridad); adminmenu.add_command(label="Referencias a Documentos Rotas...", command=self.mostrar_referencias_documentos_rotas); adminmenu.add_command(label="Documentos Duplicados...", command=self.abrir_documentos_duplicados); menubar.add_cascade(label="Administración", menu=adminmenu)
         self.root.config(menu=menubar)
         
         self.selected_client = None
@@ -61,7 +89,36 @@ class CRMLegalApp:
         self.fecha_seleccionada_agenda = datetime.date.today().strftime("%Y-%m-%d")
         self.audiencia_seleccionada_id = None
         self.recordatorios_mostrados_hoy = set()
+        self.cache_fechas_audiencias_por_mes = {} # {(anio, mes): set(fechas YYYY-MM-DD)}
+        self.eventos_calendario_por_fecha = {} # {fecha YYYY-MM-DD: ev_id de tkcalendar}
+        self.agenda_cache = CacheAgenda(db) # Audiencias + vencimientos por mes, invalidada por las escrituras
+        self.agenda_vistas_window = None
+        self.feed_ics = calendario_ics.FeedICS(os.path.join(os.path.dirname(os.path.abspath(db.DATABASE_FILE)), calendario_ics.NOMBRE_FEED_POR_DEFECTO), db)
+        self._feed_ics_programado = False; self._feed_ics_lock = threading.Lock()
+        db.registrar_oyente_cambios(self._on_cambio_agenda_para_feed)
         self.stop_event = threading.Event()
+        # Consultas de selección/agenda/documentos fuera del hilo de Tk; cada canal aplica solo su último pedido
+        self.cargador_async = CargadorAsync(self.root, indicador=self._mostrar_estado_carga)
+        self.escaner_carpetas = EscanerCarpetas() # Caché de listados por (carpeta, mtime), compartida con las ventanas de caso
+        self.observador_carpetas = ObservadorCarpetas(self.root) # Solo observa las carpetas que están a la vista
+        self.indice_documentos = IndiceDocumentos(db) # Tabla 'documentos': listados, filtros y referencias sin ir al disco
+        # Texto completo de los documentos indexados (FTS5) para la búsqueda global; se despierta con cada cambio del índice
+        self.indexador_texto = IndexadorTexto(db, self.indice_documentos, al_progreso=lambda hechos, pendientes: self.root.after(0, self._mostrar_progreso_indexador, hechos, pendientes))
+        self.indice_documentos.agregar_oyente(self.indexador_texto.despertar)
+        self.busqueda_global_window = None
+        self.duplicados_window = None
+        self.cliente_ia = ClienteIA() # Sesión HTTP compartida con el Asistente IA (URL en CRM_IA_URL)
+        self.cache_ia = CacheRespuestasIA(db) # Respuestas ya generadas, por hash de la entrada normalizada
+        self.contexto_ia = ConstructorContextoIA(db) # Material del caso para las consultas, por caso y con presupuesto de tokens
+        # Operaciones IA sobre muchos casos (tabla trabajos_ia); sigue trabajando con su ventana cerrada
+        self.cola_ia = ColaTrabajosIA(db, self.cliente_ia, self.cache_ia, contexto_ia=self.contexto_ia, al_cambio=lambda: self.root.after(0, self._on_cambio_cola_ia))
+        self.trabajos_ia_window = None
+        # Búsqueda por significado: vectores de actividades, notas y documentos en un archivo junto a la BD
+        self.indice_semantico = IndiceSemantico(db, self.cliente_ia, al_progreso=lambda hechas, pendientes: self.root.after(0, self._mostrar_progreso_semantico, pendientes))
+        self._pendientes_texto = self._pendientes_semantico = 0; self._textos_indexados_vistos = 0
+        # Miniaturas y extractos para el panel de vista previa; caché en disco junto a la base de datos
+        self.servicio_previsualizaciones = ServicioPrevisualizaciones(os.path.join(os.path.dirname(os.path.abspath(db.DATABASE_FILE)), NOMBRE_CARPETA_CACHE))
+        self.listados_documentos_tabs = {} # {str(tree): ListadoDocumentos} de las DocumentosTab abiertas
         self.logo_image_tk = None
 
         self.create_widgets()
@@ -69,13 +126,18 @@ class CRMLegalApp:
         self.cargar_audiencias_fecha_actual()
         self.marcar_dias_audiencias_calendario()
 
+        self.programar_regeneracion_feed_ics(demora_ms=3000)
+        self.root.after(5000, self.indexador_texto.iniciar) # Después del arranque, para no competir con la carga inicial
+        self.root.after(6000, self.cola_ia.iniciar) # Retoma los lotes que quedaron a medias
+        self.root.after(8000, self.indice_semantico.iniciar) # Indexa lo nuevo o modificado desde el último cierre
         self.hilo_recordatorios = threading.Thread(target=self.verificar_recordatorios_periodicamente, daemon=True); self.hilo_recordatorios.start()
         self.hilo_bandeja = threading.Thread(target=self.setup_tray_icon, daemon=True); self.hilo_bandeja.start()
         self.root.protocol("WM_DELETE_WINDOW", self.ocultar_a_bandeja)
         
-    def open_case_detail_window(self, event=None):
-        if not self.selected_case: return
-        case_id = self.selected_case['id']
+    def open_case_detail_window(self, event=None, case_id=None):
+        if case_id is None:
+            if not self.selected_case: return
+            case_id = self.selected_case['id']
         if case_id in self.open_case_windows:
             window = self.open_case_windows[case_id]; window.lift(); window.focus_force(); return
         new_window = CaseDetailWindow(self.root, self, case_id)
@@ -293,7 +355,7 @@ class CRMLegalApp:
             if db.delete_client(client_id): # ON DELETE CASCADE se encarga del resto
                 messagebox.showinfo("Éxito", "Cliente eliminado.", parent=self.root)
                 self.load_clients() # Refresca todo, incluyendo la limpieza de casos, etc.
-                self.actualizar_lista_audiencias(); self.marcar_dias_audiencias_calendario() # Actualizar agenda global
+                self.actualizar_lista_audiencias(); self.marcar_dias_audiencias_calendario(forzar=True) # Actualizar agenda global (borrado en cascada)
             else: messagebox.showerror("Error", "No se pudo eliminar el cliente.", parent=self.root)
 
     def open_case_dialog(self, case_id=None):
@@ -511,7 +573,7 @@ class CRMLegalApp:
                 messagebox.showinfo("Éxito", "Caso eliminado con éxito.", parent=self.root)
                 if self.selected_client: self.load_cases_by_client(self.selected_client['id'])
                 else: self.clear_case_list(); self.clear_case_details() # Si no había cliente seleccionado, limpiar
-                self.actualizar_lista_audiencias(); self.marcar_dias_audiencias_calendario() # Actualizar agenda global
+                self.actualizar_lista_audiencias(); self.marcar_dias_audiencias_calendario(forzar=True) # Actualizar agenda global (borrado en cascada)
             else: messagebox.showerror("Error", "No se pudo eliminar el caso.", parent=self.root)
 
     
@@ -560,9 +622,14 @@ class CRMLegalApp:
         resultado_ia_scroll.grid(row=0, column=1, sticky='ns')
         resultado_ia_text['yscrollcommand'] = resultado_ia_scroll.set
 
+        status_frame = ttk.Frame(main_frame); status_frame.grid(row=4, column=0, sticky=tk.EW, pady=(5,5)); status_frame.columnconfigure(0, weight=1) # Pady para separar de botones
         status_var = tk.StringVar(value="Listo para recibir hechos.")
-        status_label = ttk.Label(main_frame, textvariable=status_var, relief=tk.SUNKEN, anchor=tk.W)
-        status_label.grid(row=4, column=0, sticky=tk.EW, pady=(5,5)) # Pady para separar de botones
+        status_label = ttk.Label(status_frame, textvariable=status_var, relief=tk.SUNKEN, anchor=tk.W)
+        status_label.grid(row=0, column=0, sticky=tk.EW)
+        forzar_nueva_var = tk.BooleanVar(value=False) # Ignora la caché y vuelve a generar (la nueva respuesta la reemplaza)
+        ttk.Checkbutton(status_frame, text="Forzar nueva respuesta", variable=forzar_nueva_var).grid(row=0, column=1, padx=(8, 0))
+        incluir_contexto_var = tk.BooleanVar(value=caso_actual_id is not None) # Carátula, partes, actividades, tareas y audiencias del caso
+        ttk.Checkbutton(status_frame, text="Incluir contexto del caso", variable=incluir_contexto_var, state=tk.NORMAL if caso_actual_id else tk.DISABLED).grid(row=0, column=2, padx=(8, 0))
         
         # --- AQUÍ DEBEN ESTAR LAS DEFINICIONES DE LAS FUNCIONES ---
         def actualizar_ui_con_respuesta(resultado_json): # Movida antes de su uso
@@ -598,44 +665,117 @@ class CRMLegalApp:
             copiar_btn.config(state=tk.DISABLED)
             guardar_docx_btn.config(state=tk.DISABLED)
 
+        # Estado de la solicitud en curso: los fragmentos llegan en el hilo de red y se vuelcan al Text por lotes
+        solicitud = {'control': None, 'pendientes': [], 'lock': threading.Lock(), 'after': None, 'inicio': 0.0, 'ttft_mostrado': False,
+                     'ultima': None} # 'ultima': consulta, contexto, respuesta y latencia de la última respuesta completa (para guardarla en el caso)
+
+        def habilitar_guardar_en_caso(ultima):
+            solicitud['ultima'] = ultima
+            guardar_caso_btn.config(state=tk.NORMAL if ultima and caso_actual_id else tk.DISABLED)
+
+        def volcar_fragmentos():
+            with solicitud['lock']:
+                texto_nuevo = "".join(solicitud['pendientes']); solicitud['pendientes'].clear()
+            if texto_nuevo and dialog.winfo_exists():
+                resultado_ia_text.config(state=tk.NORMAL); resultado_ia_text.insert(tk.END, texto_nuevo); resultado_ia_text.see(tk.END); resultado_ia_text.config(state=tk.DISABLED)
+                if not solicitud['ttft_mostrado']:
+                    solicitud['ttft_mostrado'] = True
+                    status_var.set(f"Recibiendo respuesta... (primer fragmento en {(time.perf_counter() - solicitud['inicio']) * 1000:.0f} ms)")
+
+        def bombear_fragmentos(): # Un solo insert cada INTERVALO ms, sin importar cuántos tokens llegaron
+            solicitud['after'] = None
+            volcar_fragmentos()
+            if solicitud['control'] is not None and dialog.winfo_exists():
+                solicitud['after'] = dialog.after(50, bombear_fragmentos)
+
+        def terminar_solicitud():
+            if solicitud['after'] is not None: dialog.after_cancel(solicitud['after']); solicitud['after'] = None
+            solicitud['control'] = None
+            volcar_fragmentos()
+            reformular_btn.config(state=tk.NORMAL); cancelar_btn.config(state=tk.DISABLED)
+
+        def finalizar_stream(resultado, ultima):
+            if not dialog.winfo_exists(): return
+            terminar_solicitud()
+            hay_texto = bool(resultado_ia_text.get("1.0", tk.END).strip())
+            copiar_btn.config(state=tk.NORMAL if hay_texto else tk.DISABLED); guardar_docx_btn.config(state=tk.NORMAL if hay_texto else tk.DISABLED)
+            if not hay_texto:
+                actualizar_ui_con_respuesta(None); return
+            habilitar_guardar_en_caso(ultima)
+            ttft = f", primer fragmento en {resultado['ttft_s'] * 1000:.0f} ms" if resultado.get('ttft_s') is not None else ""
+            status_var.set(f"Respuesta de IA recibida en {resultado['total_s']:.1f} s{ttft}.")
+
+        def error_stream(mensaje_error, es_error_conexion=False):
+            if not dialog.winfo_exists(): return
+            terminar_solicitud()
+            actualizar_ui_con_error(mensaje_error, es_error_conexion)
+
+        def mostrar_desde_cache(en_cache, ultima):
+            if not dialog.winfo_exists() or solicitud['control'] is None: return
+            terminar_solicitud()
+            resultado_ia_text.config(state=tk.NORMAL); resultado_ia_text.delete("1.0", tk.END); resultado_ia_text.insert("1.0", en_cache['respuesta']); resultado_ia_text.config(state=tk.DISABLED)
+            copiar_btn.config(state=tk.NORMAL); guardar_docx_btn.config(state=tk.NORMAL)
+            habilitar_guardar_en_caso(ultima)
+            fecha = datetime.datetime.fromtimestamp(en_cache['creado_at']).strftime('%d/%m/%Y %H:%M')
+            status_var.set(f"Respuesta guardada del {fecha} (marque 'Forzar nueva respuesta' para volver a generarla).")
+
+        def cancelar_solicitud():
+            control = solicitud['control']
+            if control is None: return
+            control.cancelar()
+            terminar_solicitud()
+            status_var.set("Solicitud cancelada.")
+            copiar_btn.config(state=tk.DISABLED); guardar_docx_btn.config(state=tk.DISABLED)
+
         def solicitar_reformulacion():
             texto_hechos = hechos_entrada_text.get("1.0", tk.END).strip()
             if not texto_hechos:
                 messagebox.showwarning("Entrada Vacía", "Por favor, ingrese el texto de los hechos a reformular.", parent=dialog)
                 return
+            if solicitud['control'] is not None: return # Ya hay una en curso
 
             status_var.set("Procesando con Asistente IA local, por favor espere...")
             resultado_ia_text.config(state=tk.NORMAL); resultado_ia_text.delete("1.0", tk.END); resultado_ia_text.config(state=tk.DISABLED)
-            dialog.update_idletasks() 
+            copiar_btn.config(state=tk.DISABLED); guardar_docx_btn.config(state=tk.DISABLED); habilitar_guardar_en_caso(None)
+            reformular_btn.config(state=tk.DISABLED); cancelar_btn.config(state=tk.NORMAL)
+            control = ControlStream()
+            forzar_nueva = forzar_nueva_var.get()
+            incluir_contexto = incluir_contexto_var.get() and caso_actual_id is not None
+            solicitud.update(control=control, inicio=time.perf_counter(), ttft_mostrado=False)
+            with solicitud['lock']: solicitud['pendientes'].clear()
+            bombear_fragmentos()
+
+            def al_fragmento(texto):
+                with solicitud['lock']: solicitud['pendientes'].append(texto)
 
             def do_request_thread():
                 try:
-                    mcp_url = "http://localhost:5000/api/reformular_hechos"
-                    payload = {"texto_hechos": texto_hechos}
-                    response = requests.post(mcp_url, json=payload, timeout=90)
-                    response.raise_for_status()
-                    resultado_json = response.json()
-                    self.root.after(0, lambda: actualizar_ui_con_respuesta(resultado_json))
-                except requests.exceptions.ConnectionError:
-                    error_msg = (f"Error de Conexión: No se pudo conectar con el servidor del Asistente IA local en {mcp_url}.\n\n"
-                                 f"Verifique que:\n1. 'mcp_server.py' esté ejecutándose.\n"
-                                 f"2. Ollama/LM Studio esté activo y sirviendo el modelo correcto.\n"
-                                 f"3. No haya un firewall bloqueando la conexión a localhost en ese puerto.")
-                    self.root.after(0, lambda: actualizar_ui_con_error(error_msg, es_error_conexion=True))
-                except requests.exceptions.Timeout:
-                    error_msg = (f"Timeout: La solicitud al Asistente IA local en {mcp_url} tardó demasiado en responder (90s).\n\n"
-                                 f"Verifique el modelo LLM y la carga de su sistema.")
-                    self.root.after(0, lambda: actualizar_ui_con_error(error_msg))
-                except requests.exceptions.HTTPError as http_err:
-                    error_msg = f"Error HTTP {http_err.response.status_code} del servidor MCP: {http_err.response.text}"
-                    self.root.after(0, lambda: actualizar_ui_con_error(error_msg))
-                except requests.exceptions.JSONDecodeError:
-                    error_msg = "Error: El servidor MCP no devolvió una respuesta JSON válida."
-                    self.root.after(0, lambda: actualizar_ui_con_error(error_msg))
+                    endpoint = '/api/reformular_hechos'
+                    contexto = self.contexto_ia.construir(caso_actual_id) if incluir_contexto else None
+                    clave = self.cache_ia.clave(endpoint, texto_hechos, dict(self.cliente_ia.parametros_modelo(), contexto=contexto))
+                    en_cache = None if forzar_nueva else self.cache_ia.obtener(clave)
+                    if en_cache:
+                        ultima = {'consulta': texto_hechos, 'contexto': contexto, 'respuesta': en_cache['respuesta'], 'latencia_ms': None}
+                        self.root.after(0, lambda: mostrar_desde_cache(en_cache, ultima) if solicitud['control'] is control else None); return
+                    if contexto:
+                        aviso = f"Procesando con Asistente IA local, con contexto del caso (~{estimar_tokens(contexto)} tokens)..."
+                        self.root.after(0, lambda: status_var.set(aviso) if solicitud['control'] is control else None)
+                    resultado = self.cliente_ia.reformular_hechos_stream(texto_hechos, al_fragmento, control=control, contexto_caso=contexto)
+                    if resultado.get('completo'): self.cache_ia.guardar(clave, endpoint, resultado['texto']) # Solo si el fin del stream se confirmó
+                    ultima = {'consulta': texto_hechos, 'contexto': contexto, 'respuesta': resultado['texto'], 'latencia_ms': resultado['total_s'] * 1000}
+                    self.root.after(0, lambda: finalizar_stream(resultado, ultima) if solicitud['control'] is control else None)
+                except IACancelada:
+                    pass # La interfaz ya se actualizó al cancelar
+                except IANoDisponible as e_conexion:
+                    error_msg = str(e_conexion)
+                    self.root.after(0, lambda: error_stream(error_msg, es_error_conexion=True))
+                except ErrorIA as e_ia: # Timeout, error HTTP o respuesta inválida
+                    error_msg = str(e_ia)
+                    self.root.after(0, lambda: error_stream(error_msg))
                 except Exception as e_thread: 
                     error_msg = f"Error inesperado durante la solicitud a la IA: {type(e_thread).__name__}: {e_thread}"
                     import traceback; traceback.print_exc()
-                    self.root.after(0, lambda: actualizar_ui_con_error(error_msg))
+                    self.root.after(0, lambda: error_stream(error_msg))
             
             threading.Thread(target=do_request_thread, daemon=True).start()
 
@@ -677,6 +817,15 @@ class CRMLegalApp:
                     messagebox.showerror("Error Librería", "Falta 'python-docx'. Instálala con: pip install python-docx", parent=dialog)
                 except Exception as e_docx:
                     messagebox.showerror("Error al Guardar DOCX", f"No se pudo guardar:\n{e_docx}", parent=dialog)
+
+        def guardar_en_caso():
+            ultima = solicitud['ultima']
+            if not ultima or not caso_actual_id: return
+            actividad_id = self._guardar_interaccion_ia_como_actividad(caso_actual_id, "Reformulación de Hechos", ultima['consulta'], ultima['respuesta'],
+                                                                       contexto=ultima['contexto'], latencia_ms=ultima['latencia_ms'], parent=dialog)
+            if actividad_id:
+                habilitar_guardar_en_caso(None) # Una vez por respuesta
+                status_var.set(f"Consulta y respuesta guardadas en el caso (actividad ID {actividad_id}).")
         # --- FIN DEFINICIONES DE FUNCIONES ---
 
         button_frame_dialog = ttk.Frame(main_frame)
@@ -686,29 +835,65 @@ class CRMLegalApp:
         button_frame_dialog.columnconfigure(1, weight=1)
         button_frame_dialog.columnconfigure(2, weight=1)
         button_frame_dialog.columnconfigure(3, weight=1)
+        button_frame_dialog.columnconfigure(4, weight=1)
+        button_frame_dialog.columnconfigure(5, weight=1)
         
         reformular_btn = ttk.Button(button_frame_dialog, text="Reformular con IA", command=solicitar_reformulacion)
         reformular_btn.grid(row=0, column=0, padx=2, pady=2, sticky=tk.EW)
+
+        cancelar_btn = ttk.Button(button_frame_dialog, text="Cancelar", command=cancelar_solicitud, state=tk.DISABLED)
+        cancelar_btn.grid(row=0, column=1, padx=2, pady=2, sticky=tk.EW)
         
         copiar_btn = ttk.Button(button_frame_dialog, text="Copiar Resultado", command=copiar_resultado_ia, state=tk.DISABLED)
-        copiar_btn.grid(row=0, column=1, padx=2, pady=2, sticky=tk.EW)
+        copiar_btn.grid(row=0, column=2, padx=2, pady=2, sticky=tk.EW)
         
         guardar_docx_btn = ttk.Button(button_frame_dialog, text="Guardar como DOCX", command=guardar_resultado_como_docx, state=tk.DISABLED)
-        guardar_docx_btn.grid(row=0, column=2, padx=2, pady=2, sticky=tk.EW)
+        guardar_docx_btn.grid(row=0, column=3, padx=2, pady=2, sticky=tk.EW)
+
+        guardar_caso_btn = ttk.Button(button_frame_dialog, text="Guardar en Caso", command=guardar_en_caso, state=tk.DISABLED)
+        guardar_caso_btn.grid(row=0, column=4, padx=2, pady=2, sticky=tk.EW)
         
-        cerrar_btn = ttk.Button(button_frame_dialog, text="Cerrar", command=dialog.destroy)
-        cerrar_btn.grid(row=0, column=3, padx=2, pady=2, sticky=tk.EW)
+        def cerrar_dialogo():
+            cancelar_solicitud() # No dejar una respuesta generándose para una ventana que ya no existe
+            dialog.destroy()
 
-        hechos_entrada_text.focus_set()
-        dialog.protocol("WM_DELETE_WINDOW", dialog.destroy)
+        cerrar_btn = ttk.Button(button_frame_dialog, text="Cerrar", command=cerrar_dialogo)
+        cerrar_btn.grid(row=0, column=5, padx=2, pady=2, sticky=tk.EW)
 
-    # Necesitarás añadir un método para guardar la interacción si quieres ese botón
-    def _guardar_interaccion_ia_como_actividad(self, caso_id, tipo_consulta, consulta, respuesta_ia):
-        if not caso_id: return
-        descripcion_completa = f"CONSULTA A IA ({tipo_consulta}):\n{consulta}\n\nRESPUESTA IA:\n{respuesta_ia}"
-        # Llamar a tu función _save_new_actividad o db.add_actividad_caso
-        self._save_new_actividad(caso_id, f"Asistencia IA - {tipo_consulta}", descripcion_completa)
-        print(f"Interacción con IA guardada como actividad en caso ID {caso_id}")
+        hechos_entrada_text.focus_set()
+        dialog.protocol("WM_DELETE_WINDOW", cerrar_dialogo)
+
+    def mostrar_estado_asistente_ia(self):
+        resumen = self.cliente_ia.resumen_metricas()
+        estados = {'cerrado': "disponible", 'abierto': "sin respuesta (pausado)", 'semiabierto': "probando reconexión"}
+        lineas = [f"Servidor: {resumen['url']}", f"Estado: {estados.get(resumen['disyuntor'], resumen['disyuntor'])}", ""]
+        for endpoint, m in resumen['endpoints'].items():
+            lineas.append(f"{endpoint}\n  {m['pedidos']} pedidos, {m['fallos']} fallidos ({m['tasa_fallos']:.0%})\n  Latencia p50 {m['p50_ms']:.0f} ms · p95 {m['p95_ms']:.0f} ms · máx {m['max_ms']:.0f} ms")
+        if not resumen['endpoints']: lineas.append("Todavía no se hicieron consultas al asistente en esta sesión.")
+        cache = self.cache_ia.estadisticas()
+        lineas += ["", f"Caché de respuestas: {cache['entradas']} guardadas ({cache['bytes'] / 1024:.0f} KB), {cache['aciertos']} reutilizadas en total",
+                   f"  Esta sesión: {cache['aciertos_sesion']} aciertos, {cache['fallos_sesion']} fallos ({cache['tasa_aciertos_sesion']:.0%} de aciertos)"]
+        lineas.append(f"Contexto de casos: {self.contexto_ia.armados} armados, {self.contexto_ia.aciertos} reutilizados (presupuesto {self.contexto_ia.presupuesto_tokens} tokens)")
+        semantico = self.indice_semantico.estadisticas()
+        lineas.append(f"Índice semántico: {semantico['vectores']} fragmentos ({semantico['bytes'] / 1024 ** 2:.1f} MB, modelo {semantico['modelo'] or '-'}), {semantico['pendientes']} fuentes pendientes")
+        messagebox.showinfo("Estado del Asistente IA", "\n".join(lineas), parent=self.root)
+
+    def vaciar_cache_ia(self):
+        if messagebox.askyesno("Vaciar Caché", "¿Borrar todas las respuestas del Asistente IA guardadas?\nLas próximas consultas volverán a generarse.", parent=self.root):
+            if self.cache_ia.vaciar(): messagebox.showinfo("Caché Vaciada", "Se borraron las respuestas guardadas.", parent=self.root)
+
+    # La consulta y la respuesta completas van comprimidas a interacciones_ia; la actividad queda con una referencia corta
+    def _guardar_interaccion_ia_como_actividad(self, caso_id, tipo_consulta, consulta, respuesta_ia, contexto=None, latencia_ms=None, parent=None):
+        if not caso_id: return None
+        fecha_hora_actual = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        actividad_id = db.add_interaccion_ia(caso_id, fecha_hora_actual, tipo_consulta, consulta, respuesta_ia, contexto=contexto,
+                                             modelo=self.cliente_ia.parametros_modelo()['modelo'] or None, latencia_ms=latencia_ms,
+                                             tokens_consulta=estimar_tokens(consulta + (contexto or '')), tokens_respuesta=estimar_tokens(respuesta_ia))
+        if actividad_id:
+            if hasattr(self, 'seguimiento_tab_frame'): self.seguimiento_tab_frame.actualizar_actividad(actividad_id, seleccionar=True)
+            print(f"Interacción con IA guardada como actividad ID {actividad_id} en caso ID {caso_id}")
+        else: messagebox.showerror("Error BD", "No se pudo guardar la interacción con el Asistente IA en el caso.", parent=parent or self.root)
+        return actividad_id
 
     def crear_copia_de_seguridad(self):
         print("[Backup] Iniciando proceso de creación de copia de seguridad...") # Mensaje para tu consola
@@ -789,11 +974,25 @@ class CRMLegalApp:
             print("Icono de bandeja no visible, no iniciado, o ya detenido.")
         # Esperar un poco para que los hilos puedan terminar si es necesario
         # self.root.after(100, ...) # A veces ayuda, pero destroy() debería ser suficiente
+        self.cargador_async.cerrar() # Descarta cargas en curso; sus resultados ya no se aplican
+        self.observador_carpetas.cerrar() # Suelta los watches de carpetas
+        self.servicio_previsualizaciones.cerrar()
+        self.cola_ia.detener() # Guarda lo terminado; lo que seguía en curso se retoma al próximo inicio
+        self.indice_semantico.detener() # Lo no indexado se detecta al comparar en el próximo inicio
+        self.cliente_ia.cerrar()
+        self.indexador_texto.detener() # Lo pendiente queda marcado en la BD y se retoma al próximo inicio
+        self.indice_documentos.cerrar()
         self.root.destroy() # Cierra la ventana principal y termina el mainloop
         print("Solicitud de cierre completada.")
 
 
     def create_widgets(self):
+        # Barra de estado: indica qué cargas en segundo plano siguen en curso
+        barra_estado = ttk.Frame(self.root); barra_estado.pack(side=tk.BOTTOM, fill=tk.X)
+        self.estado_carga_lbl = ttk.Label(barra_estado, text="", anchor=tk.W, padding=(10, 0, 10, 2), foreground="gray")
+        self.estado_carga_lbl.pack(side=tk.LEFT, fill=tk.X, expand=True)
+        self.estado_indexador_lbl = ttk.Label(barra_estado, text="", anchor=tk.E, padding=(10, 0, 10, 2), foreground="gray")
+        self.estado_indexador_lbl.pack(side=tk.RIGHT)
         crm_main_frame = ttk.Frame(self.root, padding="10")
         crm_main_frame.pack(fill=tk.BOTH, expand=True)
         
@@ -815,12 +1014,12 @@ class CRMLegalApp:
         client_list_frame.grid(row=0, column=0, sticky='nsew', pady=(0, 5))
         client_list_frame.columnconfigure(0, weight=1); client_list_frame.rowconfigure(0, weight=1); client_list_frame.rowconfigure(1, weight=0) # Para scrollbar X
         client_cols = ('ID', 'Nombre')
-        self.client_tree = ttk.Treeview(client_list_frame, columns=client_cols, show='headings', selectmode='browse')
+        # Lista virtual: solo se crean items para las filas visibles; las páginas se piden a la BD al desplazarse
+        self.client_tree = VirtualTreeview(client_list_frame, client_cols, lambda c: (c['id'], c['nombre']),
+                                           columnas_orden={'ID': 'id', 'Nombre': 'nombre'})
         self.client_tree.heading('ID', text='ID'); self.client_tree.heading('Nombre', text='Nombre')
         self.client_tree.column('ID', width=40, stretch=tk.NO); self.client_tree.column('Nombre', width=150, stretch=tk.NO)
-        client_scrollbar_y = ttk.Scrollbar(client_list_frame, orient=tk.VERTICAL, command=self.client_tree.yview); self.client_tree.configure(yscrollcommand=client_scrollbar_y.set)
-        client_scrollbar_x = ttk.Scrollbar(client_list_frame, orient=tk.HORIZONTAL, command=self.client_tree.xview); self.client_tree.configure(xscrollcommand=client_scrollbar_x.set)
-        self.client_tree.grid(row=0, column=0, sticky='nsew'); client_scrollbar_y.grid(row=0, column=1, sticky='ns'); client_scrollbar_x.grid(row=1, column=0, sticky='ew')
+        self.client_tree.grid(row=0, column=0, rowspan=2, sticky='nsew')
         self.client_tree.bind('<<TreeviewSelect>>', self.on_client_select)
 
         client_buttons_frame = ttk.Frame(col1_frame); client_buttons_frame.grid(row=1, column=0, sticky='ew', pady=5)
@@ -848,12 +1047,11 @@ class CRMLegalApp:
         case_list_frame = ttk.LabelFrame(col2_frame, text="Casos Cliente", padding="5"); case_list_frame.grid(row=0, column=0, sticky='nsew', pady=(0, 5))
         case_list_frame.columnconfigure(0, weight=1); case_list_frame.rowconfigure(0, weight=1); case_list_frame.rowconfigure(1, weight=0) # Para scrollbar X
         case_cols = ('ID', 'Número/Año', 'Carátula')
-        self.case_tree = ttk.Treeview(case_list_frame, columns=case_cols, show='headings', selectmode='browse')
+        self.case_tree = VirtualTreeview(case_list_frame, case_cols, self._formatear_fila_caso,
+                                         columnas_orden={'ID': 'id', 'Carátula': 'caratula'})
         self.case_tree.heading('ID', text='ID'); self.case_tree.heading('Número/Año', text='Nro/Año'); self.case_tree.heading('Carátula', text='Carátula')
         self.case_tree.column('ID', width=40, stretch=tk.NO); self.case_tree.column('Número/Año', width=80, stretch=tk.NO); self.case_tree.column('Carátula', width=150, stretch=tk.NO)
-        case_scrollbar_Y = ttk.Scrollbar(case_list_frame, orient=tk.VERTICAL, command=self.case_tree.yview); self.case_tree.configure(yscrollcommand=case_scrollbar_Y.set)
-        case_scrollbar_x = ttk.Scrollbar(case_list_frame, orient=tk.HORIZONTAL, command=self.case_tree.xview); self.case_tree.configure(xscrollcommand=case_scrollbar_x.set)
-        self.case_tree.grid(row=0, column=0, sticky='nsew'); case_scrollbar_Y.grid(row=0, column=1, sticky='ns'); case_scrollbar_x.grid(row=1, column=0, sticky='ew')
+        self.case_tree.grid(row=0, column=0, rowspan=2, sticky='nsew')
         self.case_tree.bind('<<TreeviewSelect>>', self.on_case_select)
 
         case_buttons_frame = ttk.Frame(col2_frame); case_buttons_frame.grid(row=1, column=0, sticky='ew', pady=5)
@@ -866,6 +1064,7 @@ class CRMLegalApp:
         self.agenda_cal = Calendar(cal_frame, selectmode='day', date_pattern='y-mm-dd', tooltipforeground='black', tooltipbackground='#FFFFE0', locale='es_ES')
         self.agenda_cal.grid(row=0, column=0, sticky='nsew', padx=5, pady=5)
         self.agenda_cal.bind("<<CalendarSelected>>", self.actualizar_lista_audiencias)
+        self.agenda_cal.bind("<<CalendarMonthChanged>>", lambda e: self.marcar_dias_audiencias_calendario())
         self.agenda_cal.tag_config('audiencia_marcador', background='lightblue', foreground='black')
 
         add_aud_frame = ttk.Frame(col2_frame); add_aud_frame.grid(row=3, column=0, sticky='ew', pady=(5, 0))
@@ -972,10 +1171,18 @@ class CRMLegalApp:
         self.select_folder_btn = ttk.Button(folder_frame, text="...", command=self.select_case_folder, state=tk.DISABLED, width=3); self.select_folder_btn.grid(row=0, column=1, sticky=tk.E, padx=(0,5))
         self.open_folder_btn = ttk.Button(folder_frame, text="Abrir Carpeta", command=self.open_case_folder, state=tk.DISABLED, width=12); self.open_folder_btn.grid(row=0, column=2, sticky=tk.E)
         ttk.Label(self.documents_tab, text="Archivos y Carpetas:").grid(row=2, column=0, pady=(5, 5), sticky=tk.NW)
-        documents_tree_frame = ttk.Frame(self.documents_tab); documents_tree_frame.grid(row=3, column=0, sticky='nsew'); documents_tree_frame.columnconfigure(0, weight=1); documents_tree_frame.rowconfigure(0, weight=1)
+        self.documentos_progreso_lbl = ttk.Label(self.documents_tab, text="", foreground="gray"); self.documentos_progreso_lbl.grid(row=2, column=0, pady=(5, 5), sticky=tk.NE)
+        # Búsqueda por nombre en todo el caso (consulta el índice de documentos, no el disco)
+        filtro_frame = ttk.Frame(self.documents_tab); filtro_frame.grid(row=2, column=0, pady=(5, 5), sticky=tk.N)
+        ttk.Label(filtro_frame, text="Buscar:").pack(side=tk.LEFT, padx=(0, 3)); self.documentos_filtro_var = tk.StringVar(); self._documentos_filtro_after = None
+        documentos_filtro_entry = ttk.Entry(filtro_frame, textvariable=self.documentos_filtro_var, width=25); documentos_filtro_entry.pack(side=tk.LEFT); documentos_filtro_entry.bind('<KeyRelease>', self._on_documentos_filtro)
+        documentos_paned = ttk.PanedWindow(self.documents_tab, orient=tk.HORIZONTAL); documentos_paned.grid(row=3, column=0, sticky='nsew')
+        documents_tree_frame = ttk.Frame(documentos_paned); documentos_paned.add(documents_tree_frame, weight=3); documents_tree_frame.columnconfigure(0, weight=1); documents_tree_frame.rowconfigure(0, weight=1)
         self.document_tree = ttk.Treeview(documents_tree_frame, columns=('Nombre', 'Tamaño', 'Fecha Mod.'), show='headings'); self.document_tree.heading('Nombre', text='Nombre'); self.document_tree.heading('Tamaño', text='Tamaño'); self.document_tree.heading('Fecha Mod.', text='Modificado'); self.document_tree.column('Nombre', width=250, stretch=True); self.document_tree.column('Tamaño', width=100, stretch=tk.NO, anchor=tk.E); self.document_tree.column('Fecha Mod.', width=140, stretch=tk.NO)
         document_scrollbar = ttk.Scrollbar(documents_tree_frame, orient=tk.VERTICAL, command=self.document_tree.yview); self.document_tree.configure(yscrollcommand=document_scrollbar.set); document_scrollbar.pack(side=tk.RIGHT, fill=tk.Y); self.document_tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
         self.document_tree.bind("<Double-1>", self.on_document_double_click)
+        self.listado_documentos = ListadoDocumentos(self.document_tree, self.cargador_async, self.escaner_carpetas, 'documentos', progreso_lbl=self.documentos_progreso_lbl, observador=self.observador_carpetas, indice=self.indice_documentos)
+        self.previsualizacion_documentos = PanelPrevisualizacion(documentos_paned, self, 'previsualizacion'); documentos_paned.add(self.previsualizacion_documentos, weight=1); self.previsualizacion_documentos.conectar(self.document_tree)
 
         # --- Pestaña de Tareas (NUEVA) ---
         self.tareas_tab_frame = TareasTab(self.main_notebook, self) # 'self' es CRMLegalApp (app_controller)
@@ -991,6 +1198,13 @@ class CRMLegalApp:
         self.seguimiento_tab_frame = SeguimientoTab(self.main_notebook, self) # 'self' es CRMLegalApp (app_controller)
         self.main_notebook.add(self.seguimiento_tab_frame, text="Seguimiento")
 
+        # Las pestañas del caso cargan sus datos la primera vez que se muestran
+        self.cargador_pestanas_caso = CargadorPestanas(self.main_notebook)
+        self.cargador_pestanas_caso.registrar(self.documents_tab, self._cargar_pestana_documentos, self.clear_document_list)
+        self.cargador_pestanas_caso.registrar(self.tareas_tab_frame, self._cargar_pestana_tareas, lambda: self.tareas_tab_frame.load_tareas(None))
+        self.cargador_pestanas_caso.registrar(self.partes_tab_frame, self._cargar_pestana_partes, lambda: self.partes_tab_frame.load_partes(None))
+        self.cargador_pestanas_caso.registrar(self.seguimiento_tab_frame, self._cargar_pestana_seguimiento, lambda: self.seguimiento_tab_frame.load_actividades(None))
+
         # --- Área de audiencias (lista y detalles) ---
         audiencia_area_frame = ttk.Frame(col3_frame) # Parent es col3_frame
         audiencia_area_frame.grid(row=1, column=0, sticky='nsew', pady=5)
@@ -1015,6 +1229,7 @@ class CRMLegalApp:
         agenda_scroll_y = ttk.Scrollbar(agenda_list_frame, orient=tk.VERTICAL, command=self.audiencia_tree.yview); self.audiencia_tree.configure(yscrollcommand=agenda_scroll_y.set)
         agenda_scroll_y.grid(row=0, column=1, sticky='ns'); self.audiencia_tree.grid(row=0, column=0, sticky='nsew')
         self.audiencia_tree.bind('<<TreeviewSelect>>', self.on_audiencia_tree_select)
+        self.sincronizador_audiencias = SincronizadorTreeview(self.audiencia_tree)
         self.audiencia_tree.bind("<Double-1>", self.abrir_link_audiencia_seleccionada)
 
         audiencia_actions_frame = ttk.Frame(audiencias_list_with_actions_frame); audiencia_actions_frame.grid(row=1, column=0, sticky='ew', padx=(0,5), pady=5)
@@ -1049,10 +1264,15 @@ class CRMLegalApp:
         print("Widgets creados con estructura de 3 columnas y pestañas modulares + TareasTab.")
 
     # --- Métodos de Lógica CRM (Clientes y Casos) ---
+    def _fuente_clientes(self):
+        # Páginas de (id, nombre) por keyset sobre idx_clientes_nombre_id; no se trae la lista entera
+        return FuenteConsulta(db.contar_clientes,
+                              lambda offset, limite, orden, desc, despues_de: db.get_clients_pagina(
+                                  offset, limite, orden, desc, despues_de, columnas=('id', 'nombre')),
+                              db.get_posicion_cliente, orden='nombre')
+
     def load_clients(self):
-        for i in self.client_tree.get_children(): self.client_tree.delete(i)
-        clients = db.get_clients()
-        for client in clients: self.client_tree.insert('', tk.END, values=(client['id'], client['nombre']), iid=str(client['id']))
+        self.client_tree.set_fuente(self._fuente_clientes())
         self.selected_client = None
         self.selected_case = None
         self.clear_client_details()
@@ -1067,45 +1287,54 @@ class CRMLegalApp:
 
     def on_client_select(self, event):
         selected_items = self.client_tree.selection()
+        client_id = None
         if selected_items:
             try:
                 client_id = int(selected_items[0])
-                self.selected_client = db.get_client_by_id(client_id)
             except (IndexError, ValueError, TypeError):
                 print("Error: Selección de cliente inválida.")
-                self.selected_client = None
-            
-            if self.selected_client:
-                print(f"Cliente seleccionado ID: {self.selected_client['id']}")
-                self.display_client_details(self.selected_client)
-                self.load_cases_by_client(self.selected_client['id']) # Esto llama a clear_case_list y clear_case_details
-                self.enable_client_buttons()
-            else: # Si get_client_by_id falla o no hay selección válida
-                self.selected_client = None
-                self.clear_client_details()
-                self.clear_case_list() # Limpia casos y detalles de caso (incluyendo pestañas)
-                self.disable_client_buttons()
-
-            if not self.selected_client: # Si la selección de cliente falla o no es válida      
-                if hasattr(self, 'tareas_tab_frame'):
-                    self.main_notebook.tab(self.tareas_tab_frame, state='disabled')
-                    self.tareas_tab_frame.load_tareas(None)
 
-        else: # No hay items seleccionados en client_tree
-            if hasattr(self, 'tareas_tab_frame'):
-                self.main_notebook.tab(self.tareas_tab_frame, state='disabled')
-                self.tareas_tab_frame.load_tareas(None)
-            
-            self.selected_client = None
+        # Lo del cliente anterior se limpia ya; cliente, etiquetas y casos se consultan en el pool
+        self.cargador_async.cancelar('caso')
+        self.selected_client = None
+        self.clear_case_list() # Limpia casos y detalles de caso (incluyendo pestañas)
+        self.disable_client_buttons()
+        self.add_case_btn.config(state=tk.DISABLED)
+        if client_id is None:
+            self.cargador_async.cancelar('cliente')
+            self._aplicar_seleccion_cliente(None)
+            return
+
+        def consultar(token):
+            cliente = db.get_client_by_id(client_id)
+            if not cliente or token.cancelado: return cliente, [], []
+            etiquetas = db.get_etiquetas_de_cliente(client_id)
+            token.verificar()
+            casos = db.get_cases_by_client(client_id, compacto=True, columnas=('id', 'numero_expediente', 'anio_caratula', 'caratula'))
+            return cliente, etiquetas, casos
+        self.cargador_async.enviar('cliente', consultar, lambda res: self._aplicar_seleccion_cliente(*res),
+                                   al_error=lambda e: self._aplicar_seleccion_cliente(None))
+
+    def _aplicar_seleccion_cliente(self, cliente, etiquetas=None, casos=None):
+        self.selected_client = cliente
+        if self.selected_client:
+            print(f"Cliente seleccionado ID: {self.selected_client['id']}")
+            self.display_client_details(self.selected_client, etiquetas=etiquetas)
+            self.load_cases_by_client(self.selected_client['id'], casos=casos) # Esto llama a clear_case_list y clear_case_details
+            self.enable_client_buttons()
+        else: # Si get_client_by_id falla o no hay selección válida
             self.clear_client_details()
             self.clear_case_list() # Limpia casos y detalles de caso (incluyendo pestañas)
             self.disable_client_buttons()
+            if hasattr(self, 'tareas_tab_frame'):
+                self.main_notebook.tab(self.tareas_tab_frame, state='disabled')
+                self.tareas_tab_frame.load_tareas(None)
         self.update_add_audiencia_button_state()
 
 
     # En main_app.py, dentro de la clase CRMLegalApp
 
-    def display_client_details(self, client_data):
+    def display_client_details(self, client_data, etiquetas=None):
         if client_data:
             self.client_detail_name_lbl.config(text=client_data.get('nombre', 'N/A'))
             self.client_detail_address_lbl.config(text=client_data.get('direccion', 'N/A'))
@@ -1116,7 +1345,7 @@ class CRMLegalApp:
             nombres_etiquetas = [] # Inicializar como lista vacía
             client_id = client_data.get('id')
             if client_id: 
-                etiquetas_obj = db.get_etiquetas_de_cliente(client_id)
+                etiquetas_obj = etiquetas if etiquetas is not None else db.get_etiquetas_de_cliente(client_id)
                 nombres_etiquetas = [e['nombre_etiqueta'] for e in etiquetas_obj]
             
             if hasattr(self, 'client_detail_tags_lbl'):
@@ -1145,81 +1374,125 @@ class CRMLegalApp:
     def disable_client_buttons(self):
         self.edit_client_btn.config(state=tk.DISABLED); self.delete_client_btn.config(state=tk.DISABLED)
 
-    def load_cases_by_client(self, client_id):
+    def load_cases_by_client(self, client_id, casos=None):
         self.clear_case_list() # Limpia la lista de casos y los detalles del caso anterior
         self.selected_case = None 
         # self.clear_case_details() # Ya se llama desde clear_case_list
 
-        cases = db.get_cases_by_client(client_id)
-        for case in cases:
-            num_anio = f"{case.get('numero_expediente','?')}/{case.get('anio_caratula','?')}"
-            self.case_tree.insert('', tk.END, values=(case['id'], num_anio, case['caratula']), iid=str(case['id']))
-        
+        cases = casos if casos is not None else db.get_cases_by_client(client_id, compacto=True, columnas=('id', 'numero_expediente', 'anio_caratula', 'caratula'))
+        self.case_tree.set_fuente(FuenteLista(cases))
+
         self.add_case_btn.config(state=tk.NORMAL if self.selected_client else tk.DISABLED)
         self.update_add_audiencia_button_state() # El botón de agregar audiencia depende de si hay un caso seleccionado
 
+    def _formatear_fila_caso(self, case):
+        num_anio = f"{case.get('numero_expediente','?')}/{case.get('anio_caratula','?')}"
+        return (case['id'], num_anio, case['caratula'])
+
     def clear_case_list(self):
-        for i in self.case_tree.get_children(): self.case_tree.delete(i)
+        self.case_tree.limpiar()
         self.selected_case = None
         self.clear_case_details() # Limpia detalles, documentos y pestañas relacionadas al caso
 
     def on_case_select(self, event):
         selected_items = self.case_tree.selection()
+        case_id = None
         if selected_items:
             try:
                 case_id = int(selected_items[0])
-                self.selected_case = db.get_case_by_id(case_id)
             except (IndexError, ValueError, TypeError):
                 print("Error: Selección de caso inválida.")
-                self.selected_case = None
-            
-            if self.selected_case:
-                # print(f"Caso seleccionado ID: {self.selected_case['id']}")
-                print(f"[MainApp Debug] Caso seleccionado para Partes: {self.selected_case['id'] if self.selected_case else 'None'}") # DEBUG
-                self.display_case_details(self.selected_case) # Muestra detalles básicos
-                self.load_case_documents(self.selected_case.get('ruta_carpeta', '')) # Carga documentos
-                self.enable_case_buttons()
-                self.enable_detail_tabs_for_case() # Habilita pestañas
-                
-                # Cargar datos en pestañas modulares
-                if hasattr(self, 'seguimiento_tab_frame'):
-                    self.seguimiento_tab_frame.load_actividades(self.selected_case['id'])
-                    self.seguimiento_tab_frame.set_add_button_state(None) 
-                if hasattr(self, 'partes_tab_frame'):
-                    self.partes_tab_frame.load_partes(self.selected_case['id'])
-                    self.partes_tab_frame.set_add_button_state(None)
-            else: 
-                print("[MainApp Debug] Ningún caso seleccionado para Partes.") # DEBUG
-                self.selected_case = None
-                self.clear_case_details() # Limpia todo lo relacionado al caso
-                if hasattr(self, 'partes_tab_frame'): # NUEVO
-                    self.partes_tab_frame.load_partes(None)
-                    self.partes_tab_frame.set_add_button_state(None) # Esto llama a _update_action_buttons_state
-
-        else: 
-            self.selected_case = None
+        if case_id is None:
+            self.cargador_async.cancelar('caso')
+            self._aplicar_seleccion_caso(None)
+            return
+
+        def consultar(token):
+            caso = db.get_case_by_id(case_id)
+            if not caso or token.cancelado: return caso, None, None
+            etiquetas = db.get_etiquetas_de_caso(case_id)
+            ruta = caso.get('ruta_carpeta', '')
+            return caso, etiquetas, bool(ruta and os.path.isdir(ruta)) # isdir puede tardar en unidades de red
+        self.cargador_async.enviar('caso', consultar, lambda res: self._aplicar_seleccion_caso(*res),
+                                   al_error=lambda e: self._aplicar_seleccion_caso(None))
+
+    def _aplicar_seleccion_caso(self, caso, etiquetas=None, carpeta_existe=None):
+        self.selected_case = caso
+        if self.selected_case:
+            self.display_case_details(self.selected_case, etiquetas=etiquetas, carpeta_existe=carpeta_existe) # Muestra detalles básicos (pestaña visible por defecto)
+            self.enable_case_buttons()
+            self.enable_detail_tabs_for_case() # Habilita pestañas
+            # Documentos, tareas, partes y seguimiento se cargan al mostrar su pestaña;
+            # las cargas pendientes del caso anterior quedan canceladas.
+            self.cargador_pestanas_caso.set_contexto(self.selected_case)
+        else:
+            self.cargador_pestanas_caso.set_contexto(None)
             self.clear_case_details() # Limpia todo lo relacionado al caso
-            self.update_add_audiencia_button_state()
-            if hasattr(self, 'partes_tab_frame'): # NUEVO
-                self.partes_tab_frame.load_partes(None)
+            if hasattr(self, 'partes_tab_frame'):
                 self.partes_tab_frame.set_add_button_state(None) # Esto llama a _update_action_buttons_state
-        
-        if self.selected_case:
-            # ... (lógica existente para detalles, documentos, botones, otras pestañas) ...
             if hasattr(self, 'tareas_tab_frame'):
-                self.tareas_tab_frame.load_tareas(self.selected_case['id'])
-                self.tareas_tab_frame.set_add_button_state()
-        else: # No hay caso seleccionado o la selección falló
-            # ... (lógica existente para limpiar detalles, otras pestañas) ...
-            if hasattr(self, 'tareas_tab_frame'):
-                self.tareas_tab_frame.load_tareas(None)
                 self.tareas_tab_frame.set_add_button_state()
 
-        self.root.update_idletasks() 
-        #print(f"[DEBUG on_case_select] ANTES de update_add_audiencia_button_state -> self.selected_case: {self.selected_case}")
         self.update_add_audiencia_button_state()
 
-    def display_case_details(self, case_data):
+    ETIQUETAS_CARGA = {'cliente': "datos del cliente", 'caso': "datos del caso", 'agenda': "agenda del día", 'documentos': "documentos", 'busqueda': "búsqueda global", 'duplicados': "búsqueda de duplicados", 'previsualizacion': "vista previa", 'trabajos_ia': "trabajos IA"}
+
+    def _mostrar_estado_carga(self, canales):
+        if not hasattr(self, 'estado_carga_lbl'): return
+        nombres = list(dict.fromkeys(self.ETIQUETAS_CARGA.get(c.split(':')[0], c) for c in canales)) # 'documentos:<tree>' de las ventanas de caso
+        self.estado_carga_lbl.config(text=f"Cargando {', '.join(nombres)}..." if nombres else "")
+
+    def _mostrar_progreso_indexador(self, procesados, pendientes):
+        if not pendientes and procesados != self._textos_indexados_vistos: # Terminó una tanda de documentos: también al índice semántico
+            self._textos_indexados_vistos = procesados; self.indice_semantico.revisar_todo()
+        self._pendientes_texto = pendientes; self._actualizar_estado_indexado()
+
+    def _mostrar_progreso_semantico(self, pendientes):
+        self._pendientes_semantico = pendientes; self._actualizar_estado_indexado()
+
+    def _actualizar_estado_indexado(self):
+        if not hasattr(self, 'estado_indexador_lbl'): return
+        partes = []
+        if self._pendientes_texto: partes.append(f"Indexando texto de documentos: {self._pendientes_texto} pendientes")
+        if self._pendientes_semantico: partes.append(f"Índice semántico: {self._pendientes_semantico} pendientes")
+        self.estado_indexador_lbl.config(text=" · ".join(partes))
+
+    def abrir_busqueda_global(self):
+        if self.busqueda_global_window is not None and self.busqueda_global_window.winfo_exists():
+            self.busqueda_global_window.lift(); self.busqueda_global_window.focus_force(); return
+        self.busqueda_global_window = BusquedaGlobalWindow(self.root, self)
+
+    def abrir_documentos_duplicados(self):
+        if self.duplicados_window is not None and self.duplicados_window.winfo_exists():
+            self.duplicados_window.lift(); self.duplicados_window.focus_force(); return
+        self.duplicados_window = DuplicadosWindow(self.root, self)
+
+    def abrir_trabajos_ia(self):
+        if self.trabajos_ia_window is not None and self.trabajos_ia_window.winfo_exists():
+            self.trabajos_ia_window.lift(); self.trabajos_ia_window.focus_force(); return
+        self.trabajos_ia_window = TrabajosIAWindow(self.root, self)
+
+    def _on_cambio_cola_ia(self):
+        if self.trabajos_ia_window is not None and self.trabajos_ia_window.winfo_exists(): self.trabajos_ia_window.refrescar()
+
+    def _cargar_pestana_documentos(self, caso):
+        self.load_case_documents(caso.get('ruta_carpeta', ''))
+        # Recorrido completo del caso para el índice (búsqueda en subcarpetas, referencias); solo escribe lo que cambió
+        self.indice_documentos.actualizar_caso_en_segundo_plano(caso['id'], caso.get('ruta_carpeta', ''))
+
+    def _cargar_pestana_tareas(self, caso):
+        self.tareas_tab_frame.load_tareas(caso['id'])
+        self.tareas_tab_frame.set_add_button_state()
+
+    def _cargar_pestana_partes(self, caso):
+        self.partes_tab_frame.load_partes(caso['id'])
+        self.partes_tab_frame.set_add_button_state(None)
+
+    def _cargar_pestana_seguimiento(self, caso):
+        self.seguimiento_tab_frame.load_actividades(caso['id'])
+        self.seguimiento_tab_frame.set_add_button_state(None)
+
+    def display_case_details(self, case_data, etiquetas=None, carpeta_existe=None):
         if case_data:
             self.caratula_lbl.config(text=case_data.get('caratula', 'N/A'))
             exp = f"{case_data.get('numero_expediente', 'S/N')}/{case_data.get('anio_caratula', 'S/A')}"
@@ -1232,7 +1505,7 @@ class CRMLegalApp:
             nombres_etiquetas_caso = []
             case_id_for_tags = case_data.get('id')
             if case_id_for_tags:
-                etiquetas_obj = db.get_etiquetas_de_caso(case_id_for_tags)
+                etiquetas_obj = etiquetas if etiquetas is not None else db.get_etiquetas_de_caso(case_id_for_tags)
                 nombres_etiquetas_caso = [e['nombre_etiqueta'] for e in etiquetas_obj]
             
             if hasattr(self, 'case_detail_tags_lbl'):
@@ -1248,7 +1521,8 @@ class CRMLegalApp:
             folder_path = case_data.get('ruta_carpeta', '');
             self.folder_path_lbl.config(text=folder_path if folder_path else "Carpeta no asignada")
             self.select_folder_btn.config(state=tk.NORMAL)
-            self.open_folder_btn.config(state=tk.NORMAL if folder_path and os.path.isdir(folder_path) else tk.DISABLED)
+            if carpeta_existe is None: carpeta_existe = bool(folder_path and os.path.isdir(folder_path))
+            self.open_folder_btn.config(state=tk.NORMAL if carpeta_existe else tk.DISABLED)
         else:
             self.clear_case_details()
 
@@ -1547,10 +1821,10 @@ class CRMLegalApp:
         if success:
             messagebox.showinfo("Éxito", f"Tarea {msg_op} con éxito.", parent=self.root)
             dialog.destroy()
-            # Recargar la lista de tareas en la pestaña correspondiente
+            # Actualizar solo la fila de la tarea guardada en la pestaña correspondiente
             if hasattr(self, 'tareas_tab_frame'):
-                if caso_id: # Si la tarea está asociada a un caso, recargar las tareas de ese caso
-                    self.tareas_tab_frame.load_tareas(caso_id=caso_id)
+                if caso_id: # Si la tarea está asociada a un caso, la pestaña decide si la muestra
+                    self.tareas_tab_frame.actualizar_tarea(new_id if tarea_id is None else tarea_id)
                 # else:
                     # Si implementamos una vista de "todas las tareas", recargar esa vista.
                     # self.tareas_tab_frame.load_tareas(mostrar_solo_pendientes_activas=True) 
@@ -1577,11 +1851,8 @@ class CRMLegalApp:
         if success:
             messagebox.showinfo("Tarea Completada", f"Tarea '{desc_corta}...' marcada como completada.", parent=self.root)
             if hasattr(self, 'tareas_tab_frame'):
-                # Recargar la lista de tareas del caso actual o la vista global
-                if self.selected_case and self.selected_case['id'] == caso_id_asociado :
-                     self.tareas_tab_frame.load_tareas(caso_id=self.selected_case['id'])
-                elif caso_id_asociado: # Si la tarea era de otro caso (no debería pasar si el botón depende de selección)
-                     self.tareas_tab_frame.load_tareas(caso_id=caso_id_asociado)
+                # Una tarea completada sale de la lista de pendientes: solo se actualiza esa fila
+                self.tareas_tab_frame.actualizar_tarea(tarea_id)
                 # else:
                     # self.tareas_tab_frame.load_tareas(mostrar_solo_pendientes_activas=True) # Para vista global
         else:
@@ -1605,11 +1876,7 @@ class CRMLegalApp:
             if success:
                 messagebox.showinfo("Tarea Eliminada", f"Tarea '{desc_confirm}...' eliminada correctamente.", parent=self.root)
                 if hasattr(self, 'tareas_tab_frame'):
-                    # Recargar la lista de tareas del caso actual o la vista global
-                    if self.selected_case and self.selected_case['id'] == caso_id_asociado:
-                        self.tareas_tab_frame.load_tareas(caso_id=self.selected_case['id'])
-                    elif caso_id_asociado:
-                        self.tareas_tab_frame.load_tareas(caso_id=caso_id_asociado)
+                    self.tareas_tab_frame.quitar_tarea(tarea_id)
                     # else:
                         # self.tareas_tab_frame.load_tareas(mostrar_solo_pendientes_activas=True)
             else:
@@ -1762,7 +2029,8 @@ class CRMLegalApp:
 
             messagebox.showinfo("Éxito", f"Cliente {msg_op} con éxito. Etiquetas actualizadas.", parent=self.root)
             dialog.destroy()
-            self.load_clients() # Recargar la lista de clientes
+            # Solo se actualiza la fila guardada; un cliente nuevo queda seleccionado
+            self.client_tree.actualizar_registro({'id': saved_client_id, 'nombre': nombre.strip()}, seleccionar=client_id is None)
         else:
             messagebox.showerror("Error", f"No se pudo guardar la información principal del cliente.", parent=dialog)
 
@@ -1772,8 +2040,8 @@ class CRMLegalApp:
         if messagebox.askyesno("Confirmar", f"¿Eliminar cliente '{client_name}' y TODOS sus casos, actividades y audiencias asociadas?", parent=self.root, icon='warning'):
             if db.delete_client(client_id): # ON DELETE CASCADE se encarga del resto
                 messagebox.showinfo("Éxito", "Cliente eliminado.", parent=self.root)
-                self.load_clients() # Refresca todo, incluyendo la limpieza de casos, etc.
-                self.actualizar_lista_audiencias(); self.marcar_dias_audiencias_calendario() # Actualizar agenda global
+                self.client_tree.quitar_registro(client_id) # Al quitar la selección se limpian casos y detalles
+                self.actualizar_lista_audiencias(); self.marcar_dias_audiencias_calendario(forzar=True) # Actualizar agenda global (borrado en cascada)
             else: messagebox.showerror("Error", "No se pudo eliminar el cliente.", parent=self.root)
 
     def open_case_dialog(self, case_id=None):
@@ -1942,8 +2210,8 @@ class CRMLegalApp:
                 # Actualizar datos del caso seleccionado si es el mismo
                 if self.selected_case and self.selected_case['id'] == case_id:
                     self.selected_case = db.get_case_by_id(case_id) # Refrescar
-                    # self.display_case_details(self.selected_case) # Se llamará indirectamente al recargar lista
-                    # self.load_case_documents(...) # También se maneja al recargar
+                    # Las pestañas ya cargadas se recargan con los datos nuevos (carpeta, notas...) al mostrarse
+                    self.cargador_pestanas_caso.invalidar(contexto=self.selected_case)
             else:
                 msg_op = "falló al actualizar"
         
@@ -1973,8 +2241,10 @@ class CRMLegalApp:
 
             messagebox.showinfo("Éxito", f"Caso {msg_op} con éxito. Etiquetas actualizadas.", parent=self.root)
             dialog.destroy()
-            if self.selected_client: # Recargar la lista de casos del cliente actual
-                self.load_cases_by_client(self.selected_client['id'])
+            if self.selected_client and self.selected_client['id'] == cliente_id: # Actualizar solo la fila del caso guardado
+                caso_guardado = db.get_case_by_id(saved_case_id)
+                if caso_guardado:
+                    self.case_tree.actualizar_registro(caso_guardado, seleccionar=case_id is None)
                 # Si el caso guardado era el seleccionado, refrescar sus detalles (incluyendo etiquetas)
                 if self.selected_case and self.selected_case['id'] == saved_case_id:
                     self.selected_case = db.get_case_by_id(saved_case_id) # Volver a cargar el caso con sus etiquetas
@@ -1989,9 +2259,9 @@ class CRMLegalApp:
         if messagebox.askyesno("Confirmar Eliminación", f"¿Eliminar caso '{case_caratula}' y TODAS sus actividades, partes y audiencias asociadas?", parent=self.root, icon='warning'):
             if db.delete_case(case_id): # ON DELETE CASCADE se encarga del resto
                 messagebox.showinfo("Éxito", "Caso eliminado con éxito.", parent=self.root)
-                if self.selected_client: self.load_cases_by_client(self.selected_client['id'])
+                if self.selected_client: self.case_tree.quitar_registro(case_id) # Al quitar la selección se limpian los detalles
                 else: self.clear_case_list(); self.clear_case_details() # Si no había cliente seleccionado, limpiar
-                self.actualizar_lista_audiencias(); self.marcar_dias_audiencias_calendario() # Actualizar agenda global
+                self.actualizar_lista_audiencias(); self.marcar_dias_audiencias_calendario(forzar=True) # Actualizar agenda global (borrado en cascada)
             else: messagebox.showerror("Error", "No se pudo eliminar el caso.", parent=self.root)
 
 
@@ -2005,7 +2275,7 @@ class CRMLegalApp:
                 self.selected_case['ruta_carpeta'] = folder_selected # Actualizar en memoria
                 self.folder_path_lbl.config(text=folder_selected);
                 self.open_folder_btn.config(state=tk.NORMAL if os.path.isdir(folder_selected) else tk.DISABLED)
-                self.load_case_documents(folder_selected) # Recargar lista de documentos
+                self.cargador_pestanas_caso.invalidar(self.documents_tab, contexto=self.selected_case) # Recarga la lista ahora o al mostrar la pestaña
                 messagebox.showinfo("Éxito", "Carpeta de documentos asignada con éxito.", parent=self.root)
             else: messagebox.showerror("Error", "No se pudo guardar la ruta de la carpeta en la base de datos.", parent=self.root)
 
@@ -2014,109 +2284,105 @@ class CRMLegalApp:
         if not self.selected_case or not self.selected_case.get('ruta_carpeta'):
             messagebox.showwarning("Advertencia", "Selecciona un caso con una carpeta de documentos asignada.", parent=self.root)
             return
-        folder_path = self.selected_case.get('ruta_carpeta')
-        if folder_path and os.path.isdir(folder_path):
-            try:
-                if sys.platform == "win32": os.startfile(folder_path)
-                elif sys.platform == "darwin": subprocess.call(["open", folder_path])
-                else: subprocess.call(["xdg-open", folder_path])
-            except Exception as e: messagebox.showerror("Error", f"No se pudo abrir la carpeta:\n{e}", parent=self.root)
-        else:
-            messagebox.showwarning("Advertencia", "La ruta de la carpeta no existe o es inválida.", parent=self.root)
+        if not self._abrir_en_sistema(self.selected_case.get('ruta_carpeta'), es_carpeta=True):
             self.open_folder_btn.config(state=tk.DISABLED)
 
 
     def load_case_documents(self, folder_path):
-        self.clear_document_list()
-        current_folder_for_display = folder_path # Guardar la carpeta que se está mostrando
-        if folder_path and os.path.isdir(folder_path):
-            try:
-                # Botón para subir un nivel, si no estamos en la carpeta raíz del caso
-                if self.selected_case and folder_path != self.selected_case.get('ruta_carpeta'):
-                    parent_dir = os.path.dirname(folder_path)
-                    # Solo mostrar "subir" si el directorio padre es accesible y no es idéntico a la ruta actual (evitar bucles en raíz del sistema)
-                    # y si el directorio padre es la carpeta raíz del caso o una subcarpeta de ella.
-                    root_case_folder = self.selected_case.get('ruta_carpeta', '')
-                    if parent_dir and os.path.isdir(parent_dir) and parent_dir != folder_path and \
-                       (parent_dir == root_case_folder or parent_dir.startswith(root_case_folder + os.sep)):
-                        self.document_tree.insert('', 0, values=("[..] Subir Nivel", "Carpeta", ""), iid=parent_dir, tags=('parent_folder',))
-
-
-                # Listar directorios primero
-                for entry in sorted(os.scandir(folder_path), key=lambda e: e.name.lower()): # Ordenar alfabéticamente
-                    if self.stop_event.is_set(): break
-                    if entry.is_dir():
-                        try:
-                            stat_info = entry.stat()
-                            mod_time = datetime.datetime.fromtimestamp(stat_info.st_mtime).strftime('%Y-%m-%d %H:%M')
-                            self.document_tree.insert('', tk.END, values=(f"[CARPETA] {entry.name}", "Carpeta", mod_time), iid=entry.path, tags=('folder',))
-                        except OSError as e: print(f"Warn: No se pudo leer info de carpeta {entry.path}: {e}")
-                        except Exception as e: print(f"Error procesando carpeta {entry.path}: {e}")
-                
-                # Luego listar archivos
-                for entry in sorted(os.scandir(folder_path), key=lambda e: e.name.lower()): # Ordenar alfabéticamente
-                    if self.stop_event.is_set(): break
-                    if entry.is_file():
-                        try:
-                            stat_info = entry.stat(); size_bytes = stat_info.st_size
-                            if size_bytes < 1024: size_display = f"{size_bytes} B"
-                            elif size_bytes < 1024**2: size_display = f"{size_bytes/1024:.1f} KB"
-                            elif size_bytes < 1024**3: size_display = f"{size_bytes/1024**2:.1f} MB"
-                            else: size_display = f"{size_bytes/1024**3:.1f} GB"
-                            mod_time = datetime.datetime.fromtimestamp(stat_info.st_mtime).strftime('%Y-%m-%d %H:%M')
-                            self.document_tree.insert('', tk.END, values=(entry.name, size_display, mod_time), iid=entry.path, tags=('file',))
-                        except OSError as e: print(f"Warn: No se pudo leer info de archivo {entry.path}: {e}")
-                        except Exception as e: print(f"Error procesando archivo {entry.path}: {e}")
-
-            except OSError as e:
-                print(f"Error listando directorio {folder_path}: {e}")
-                self.document_tree.insert('', tk.END, values=(f"Error al leer directorio: {e}", "", ""), iid="error_dir_listing")
-            except Exception as e:
-                print(f"Error inesperado listando directorio {folder_path}: {e}")
-                self.document_tree.insert('', tk.END, values=("Error inesperado al listar", "", ""), iid="error_unexpected_listing")
-        elif self.selected_case:
-            self.document_tree.insert('', tk.END, values=("Carpeta no asignada o no encontrada.", "", ""), iid="no_folder_or_invalid")
-        
         # Actualizar la etiqueta de la ruta que se está mostrando actualmente
-        self.folder_path_lbl.config(text=current_folder_for_display if current_folder_for_display else "Carpeta no asignada")
+        self.folder_path_lbl.config(text=folder_path if folder_path else "Carpeta no asignada")
         # El botón de "Abrir Carpeta" siempre abre la carpeta raíz del caso, no la subcarpeta actual
         root_folder_path = self.selected_case.get('ruta_carpeta', '') if self.selected_case else ''
-        self.open_folder_btn.config(state=tk.NORMAL if root_folder_path and os.path.isdir(root_folder_path) else tk.DISABLED)
+        self.documentos_filtro_var.set("") # Navegar a una carpeta sale del modo búsqueda
+        self.listado_documentos.cargar(folder_path, root_folder_path, hay_caso=self.selected_case is not None,
+                                       al_estado_carpeta=lambda existe, raiz_existe: self.open_folder_btn.config(state=tk.NORMAL if raiz_existe else tk.DISABLED),
+                                       caso_id=self.selected_case.get('id') if self.selected_case else None)
 
+    def _on_documentos_filtro(self, event=None):
+        # Espera a que se deje de tipear para consultar el índice
+        if self._documentos_filtro_after: self.root.after_cancel(self._documentos_filtro_after)
+        self._documentos_filtro_after = self.root.after(300, self._aplicar_documentos_filtro)
+
+    def _aplicar_documentos_filtro(self):
+        self._documentos_filtro_after = None
+        self.listado_documentos.filtrar(self.documentos_filtro_var.get())
 
     def clear_document_list(self):
-        for i in self.document_tree.get_children(): self.document_tree.delete(i)
+        self.listado_documentos.limpiar()
+        self.previsualizacion_documentos.limpiar()
+
+    # --- Métodos para DocumentosTab (ventana de detalle del caso) ---
+    def _listado_documentos_de(self, tree):
+        listado = self.listados_documentos_tabs.get(str(tree))
+        if listado is None:
+            listado = ListadoDocumentos(tree, self.cargador_async, self.escaner_carpetas, f"documentos:{tree}", observador=self.observador_carpetas, indice=self.indice_documentos)
+            self.listados_documentos_tabs[str(tree)] = listado
+            tree.bind('<Destroy>', lambda e, t=str(tree): self._cerrar_listado_documentos(t) if e.widget is tree else None, add='+')
+        return listado
+
+    def _cerrar_listado_documentos(self, clave_tree):
+        listado = self.listados_documentos_tabs.pop(clave_tree, None)
+        if listado: listado.cerrar() # Suelta también el watch de su carpeta
+
+    def clear_document_list_for_tab(self, tree):
+        self._listado_documentos_de(tree).limpiar()
+
+    def load_case_documents_for_tab(self, tree, folder_path, case_data, al_estado_carpeta=None):
+        case_data = case_data or {}
+        self._listado_documentos_de(tree).cargar(folder_path, case_data.get('ruta_carpeta', ''), hay_caso=bool(case_data), al_estado_carpeta=al_estado_carpeta, caso_id=case_data.get('id'))
+        self.indice_documentos.actualizar_caso_en_segundo_plano(case_data.get('id'), case_data.get('ruta_carpeta', ''))
+
+    def open_case_folder_from_tab(self, case_data):
+        folder_path = (case_data or {}).get('ruta_carpeta')
+        if not folder_path:
+            messagebox.showwarning("Advertencia", "El caso no tiene una carpeta de documentos asignada.", parent=self.root); return
+        self._abrir_en_sistema(folder_path, es_carpeta=True)
+
+    def on_document_double_click_from_tab(self, event, tree, case_id, case_data):
+        item_id = tree.identify_row(event.y)
+        if not item_id: return
+        self._abrir_item_documento(tree, item_id, case_id, lambda ruta: self.load_case_documents_for_tab(tree, ruta, case_data))
 
+    def _abrir_en_sistema(self, ruta, es_carpeta=False):
+        existe = os.path.isdir(ruta) if es_carpeta else os.path.isfile(ruta)
+        if not existe:
+            messagebox.showwarning("Advertencia", "La ruta de la carpeta no existe o es inválida." if es_carpeta else f"El archivo no se encuentra:\n{ruta}", parent=self.root)
+            return False
+        try:
+            if sys.platform == "win32": os.startfile(ruta)
+            elif sys.platform == "darwin": subprocess.call(["open", ruta])
+            else: subprocess.call(["xdg-open", ruta])
+            return True
+        except Exception as e:
+            messagebox.showerror("Error", f"No se pudo abrir:\n{ruta}\n\nError: {e}", parent=self.root)
+            return False
 
     def on_document_double_click(self, event):
         item_id = self.document_tree.identify_row(event.y)
         if not item_id: return
+        case_id = self.selected_case.get('id') if self.selected_case else None
+        self._abrir_item_documento(self.document_tree, item_id, case_id, self.load_case_documents)
 
+    def _abrir_item_documento(self, tree, item_id, case_id, navegar):
+        """ Abre el archivo (y lo registra como actividad del caso) o navega a la carpeta con navegar(ruta). """
         path_to_open = item_id # El iid es la ruta completa
-        item_tags = self.document_tree.item(item_id, "tags")
-
-        if 'file' in item_tags and os.path.isfile(path_to_open):
-            try:
-                if sys.platform == "win32": os.startfile(path_to_open)
-                elif sys.platform == "darwin": subprocess.call(["open", path_to_open])
-                else: subprocess.call(["xdg-open", path_to_open])
+        item_tags = tree.item(item_id, "tags")
 
-                if self.selected_case and self.selected_case.get('id'):
-                    try:
-                        file_name = os.path.basename(path_to_open)
-                        self._save_new_actividad(
-                            caso_id=self.selected_case['id'],
-                            tipo_actividad="Documento Abierto",
-                            descripcion=f"Se abrió el documento: {file_name}",
-                            referencia_doc=file_name
-                        )
-                    except Exception as e_act: print(f"Error al registrar actividad por abrir documento: {e_act}")
-            except FileNotFoundError: messagebox.showerror("Error", f"El archivo no se encuentra:\n{path_to_open}", parent=self.root)
-            except Exception as e: messagebox.showerror("Error al abrir archivo", f"No se pudo abrir:\n{path_to_open}\n\nError: {e}", parent=self.root)
+        if 'file' in item_tags:
+            if self._abrir_en_sistema(path_to_open) and case_id:
+                try:
+                    file_name = os.path.basename(path_to_open)
+                    self._save_new_actividad(
+                        caso_id=case_id,
+                        tipo_actividad="Documento Abierto",
+                        descripcion=f"Se abrió el documento: {file_name}",
+                        referencia_doc=file_name
+                    )
+                except Exception as e_act: print(f"Error al registrar actividad por abrir documento: {e_act}")
         
         elif ('folder' in item_tags or 'parent_folder' in item_tags) and os.path.isdir(path_to_open):
             print(f"Navegando a carpeta: {path_to_open}")
-            self.load_case_documents(path_to_open) # Recargar con el contenido de la (sub)carpeta
+            navegar(path_to_open) # Recargar con el contenido de la (sub)carpeta
         
 
     # --- Métodos para SeguimientoTab (Llamadas a diálogos) ---
@@ -2249,7 +2515,7 @@ class CRMLegalApp:
             nuevo_id_actividad = db.add_actividad_caso(caso_id=caso_id, fecha_hora=fecha_hora_actual, tipo_actividad=tipo_actividad, descripcion=descripcion, creado_por=None, referencia_documento=referencia_doc)
             if nuevo_id_actividad:
                 messagebox.showinfo("Éxito", f"Actividad (ID: {nuevo_id_actividad}) agregada.", parent=self.root)
-                if hasattr(self, 'seguimiento_tab_frame'): self.seguimiento_tab_frame.load_actividades(caso_id)
+                if hasattr(self, 'seguimiento_tab_frame'): self.seguimiento_tab_frame.actualizar_actividad(nuevo_id_actividad, seleccionar=True)
             else: messagebox.showerror("Error BD", "No se pudo guardar la actividad (ID nulo).", parent=self.root)
         except sqlite3.Error as e: messagebox.showerror("Error BD", f"Error al guardar actividad:\n{e}", parent=self.root); print(f"Error SQLite: {e}")
         except Exception as e: messagebox.showerror("Error", f"Error inesperado guardando actividad:\n{e}", parent=self.root); print(f"Error general: {e}")
@@ -2261,7 +2527,7 @@ class CRMLegalApp:
             success = self.db_crm.update_actividad_caso(actividad_id, nuevo_tipo, nueva_descripcion, nueva_ref_doc)
             if success:
                 messagebox.showinfo("Éxito", f"Actividad ID {actividad_id} actualizada.", parent=self.root)
-                if hasattr(self, 'seguimiento_tab_frame'): self.seguimiento_tab_frame.load_actividades(caso_id)
+                if hasattr(self, 'seguimiento_tab_frame'): self.seguimiento_tab_frame.actualizar_actividad(actividad_id)
             else: messagebox.showwarning("Advertencia", f"No se actualizó actividad ID {actividad_id} (sin cambios o error).", parent=self.root)
         except sqlite3.Error as e: messagebox.showerror("Error BD", f"Error actualizando actividad ID {actividad_id}:\n{e}", parent=self.root); print(f"Error SQLite: {e}")
         except Exception as e: messagebox.showerror("Error", f"Error inesperado actualizando actividad ID {actividad_id}:\n{e}", parent=self.root); print(f"Error general: {e}")
@@ -2278,7 +2544,7 @@ class CRMLegalApp:
                 success = self.db_crm.delete_actividad_caso(actividad_id)
                 if success:
                     messagebox.showinfo("Éxito", f"Actividad ID {actividad_id} eliminada.", parent=self.root)
-                    if hasattr(self, 'seguimiento_tab_frame'): self.seguimiento_tab_frame.load_actividades(caso_id)
+                    if hasattr(self, 'seguimiento_tab_frame'): self.seguimiento_tab_frame.quitar_actividad(actividad_id)
                 else: messagebox.showerror("Error", f"No se pudo eliminar actividad ID {actividad_id}.", parent=self.root)
             except sqlite3.Error as e: messagebox.showerror("Error BD", f"Error eliminando actividad ID {actividad_id}:\n{e}", parent=self.root); print(f"Error SQLite: {e}")
             except Exception as e: messagebox.showerror("Error", f"Error inesperado eliminando actividad ID {actividad_id}:\n{e}", parent=self.root); print(f"Error general: {e}")
@@ -2363,13 +2629,13 @@ class CRMLegalApp:
         success = False; msg_op = ""
         if parte_id is None:
             new_id = self.db_crm.add_parte_interviniente(caso_id, nombre.strip(), tipo.strip(), direccion.strip(), contacto.strip(), notas.strip())
-            success = new_id is not None; msg_op = "agregada"
+            success = new_id is not None; msg_op = "agregada"; parte_id_guardada = new_id
         else:
             success = self.db_crm.update_parte_interviniente(parte_id, nombre.strip(), tipo.strip(), direccion.strip(), contacto.strip(), notas.strip())
-            msg_op = "actualizada"
+            msg_op = "actualizada"; parte_id_guardada = parte_id
         if success:
             messagebox.showinfo("Éxito", f"Parte interviniente {msg_op}.", parent=self.root)
-            if hasattr(self, 'partes_tab_frame'): self.partes_tab_frame.load_partes(caso_id)
+            if hasattr(self, 'partes_tab_frame'): self.partes_tab_frame.actualizar_parte(parte_id_guardada)
             dialog.destroy()
         else: messagebox.showerror("Error", f"No se pudo {msg_op} la parte.", parent=dialog)
 
@@ -2381,30 +2647,148 @@ class CRMLegalApp:
             success = self.db_crm.delete_parte_interviniente(parte_id)
             if success:
                 messagebox.showinfo("Éxito", f"Parte '{nombre_parte}' eliminada.", parent=self.root)
-                if hasattr(self, 'partes_tab_frame'): self.partes_tab_frame.load_partes(caso_id)
+                if hasattr(self, 'partes_tab_frame'): self.partes_tab_frame.quitar_parte(parte_id)
             else: messagebox.showerror("Error", f"No se pudo eliminar '{nombre_parte}'.", parent=self.root)
 
 
     # --- Métodos de Lógica para la Agenda Global ---
-    def marcar_dias_audiencias_calendario(self):
-        self.agenda_cal.calevent_remove(tag='audiencia_marcador'); fechas = db.get_fechas_con_audiencias()
-        for fecha_str in fechas:
-            try:
-                fecha_dt = datetime.datetime.strptime(fecha_str, "%Y-%m-%d").date()
-                self.agenda_cal.calevent_create(fecha_dt, 'Audiencia', tags='audiencia_marcador')
-            except ValueError: print(f"Advertencia: Formato fecha inválido en BD: {fecha_str}")
-            except Exception as e: print(f"Error marcando fecha {fecha_str}: {e}")
+    def _meses_visibles_agenda(self):
+        """ Mes mostrado en el calendario más el anterior y el siguiente, como lista de (anio, mes). """
+        try: mes, anio = self.agenda_cal.get_displayed_month()
+        except Exception: hoy = datetime.date.today(); mes, anio = hoy.month, hoy.year
+        meses = []
+        for delta in (-1, 0, 1):
+            m = mes + delta; a = anio
+            if m < 1: m += 12; a -= 1
+            elif m > 12: m -= 12; a += 1
+            meses.append((a, m))
+        return meses
+
+    def _rango_fechas_mes(self, anio, mes):
+        ultimo_dia = (datetime.date(anio + (mes == 12), mes % 12 + 1, 1) - datetime.timedelta(days=1)).day
+        return f"{anio:04d}-{mes:02d}-01", f"{anio:04d}-{mes:02d}-{ultimo_dia:02d}"
+
+    def marcar_dias_audiencias_calendario(self, forzar=False):
+        """
+        Marca en el calendario los días con audiencias del mes visible ± 1.
+        Solo consulta la BD por los meses que no están en caché (una consulta por rango),
+        y solo crea/elimina los eventos de tkcalendar que cambian.
+        forzar=True descarta la caché (p.ej. tras borrar un cliente/caso con audiencias en cascada).
+        """
+        if forzar: self.cache_fechas_audiencias_por_mes.clear()
+        meses = self._meses_visibles_agenda()
+        faltantes = [am for am in meses if am not in self.cache_fechas_audiencias_por_mes]
+        if faltantes:
+            desde, _ = self._rango_fechas_mes(*faltantes[0]); _, hasta = self._rango_fechas_mes(*faltantes[-1])
+            for am in faltantes: self.cache_fechas_audiencias_por_mes[am] = set()
+            for fecha_str in db.get_fechas_con_audiencias_en_rango(desde, hasta):
+                clave = (int(fecha_str[0:4]), int(fecha_str[5:7]))
+                if clave in self.cache_fechas_audiencias_por_mes: self.cache_fechas_audiencias_por_mes[clave].add(fecha_str)
+        # Mantener la caché acotada a la ventana visible
+        for am in list(self.cache_fechas_audiencias_por_mes):
+            if am not in meses: del self.cache_fechas_audiencias_por_mes[am]
+
+        fechas_deseadas = set().union(*(self.cache_fechas_audiencias_por_mes[am] for am in meses))
+        if forzar:
+            self.agenda_cal.calevent_remove(tag='audiencia_marcador'); self.eventos_calendario_por_fecha.clear()
+        for fecha_str in [f for f in self.eventos_calendario_por_fecha if f not in fechas_deseadas]:
+            self._quitar_marca_fecha(fecha_str)
+        for fecha_str in sorted(fechas_deseadas):
+            if fecha_str not in self.eventos_calendario_por_fecha: self._crear_marca_fecha(fecha_str)
+
+    def _crear_marca_fecha(self, fecha_str):
+        try:
+            fecha_dt = datetime.datetime.strptime(fecha_str, "%Y-%m-%d").date()
+            self.eventos_calendario_por_fecha[fecha_str] = self.agenda_cal.calevent_create(fecha_dt, 'Audiencia', tags='audiencia_marcador')
+        except ValueError: print(f"Advertencia: Formato fecha inválido en BD: {fecha_str}")
+        except Exception as e: print(f"Error marcando fecha {fecha_str}: {e}")
+
+    def _quitar_marca_fecha(self, fecha_str):
+        ev_id = self.eventos_calendario_por_fecha.pop(fecha_str, None)
+        if ev_id is not None:
+            try: self.agenda_cal.calevent_remove(ev_id)
+            except Exception as e: print(f"Error quitando marca de fecha {fecha_str}: {e}")
+
+    def actualizar_marca_fecha_audiencia(self, fecha_str):
+        """ Actualiza de forma incremental la marca de un único día tras agregar, mover o borrar una audiencia. """
+        if not fecha_str: return
+        tiene_audiencias = bool(db.get_fechas_con_audiencias_en_rango(fecha_str, fecha_str))
+        try: clave = (int(fecha_str[0:4]), int(fecha_str[5:7]))
+        except ValueError: return
+        if clave not in self.cache_fechas_audiencias_por_mes: return # Fuera de la ventana visible: se consultará al navegar
+        if tiene_audiencias:
+            self.cache_fechas_audiencias_por_mes[clave].add(fecha_str)
+            if fecha_str not in self.eventos_calendario_por_fecha: self._crear_marca_fecha(fecha_str)
+        else:
+            self.cache_fechas_audiencias_por_mes[clave].discard(fecha_str)
+            self._quitar_marca_fecha(fecha_str)
+
+    def abrir_vistas_agenda(self):
+        if self.agenda_vistas_window is not None and self.agenda_vistas_window.winfo_exists():
+            self.agenda_vistas_window.lift(); self.agenda_vistas_window.focus_force(); return
+        self.agenda_vistas_window = AgendaVistasWindow(self.root, self)
+
+    # --- iCalendar (.ics) ---
+    def _on_cambio_agenda_para_feed(self, entidad, entidad_id, caso_id, fechas):
+        if entidad in ('audiencia', 'tarea', 'caso', 'cliente'): self.root.after(0, self.programar_regeneracion_feed_ics)
+
+    def programar_regeneracion_feed_ics(self, demora_ms=2000):
+        """ Agrupa ráfagas de cambios en una sola regeneración del feed, que corre en un hilo aparte. """
+        if self._feed_ics_programado: return
+        self._feed_ics_programado = True
+        def lanzar():
+            self._feed_ics_programado = False
+            threading.Thread(target=self._regenerar_feed_ics, daemon=True).start()
+        self.root.after(demora_ms, lanzar)
+
+    def _regenerar_feed_ics(self):
+        if not self._feed_ics_lock.acquire(blocking=False): self.root.after(0, self.programar_regeneracion_feed_ics); return
+        try:
+            stats = self.feed_ics.regenerar()
+            if stats.get('reescrito'): print(f"[Feed ICS] Regenerado: {stats['renderizados']} renderizados, {stats['copiados']} copiados, {stats['eliminados']} eliminados.")
+        except Exception as e: print(f"[Feed ICS] Error regenerando feed: {e}")
+        finally: self._feed_ics_lock.release()
+
+    def mostrar_info_feed_ics(self):
+        ruta = self.feed_ics.ruta_feed
+        if messagebox.askyesno("Feed de Calendario", f"La agenda (audiencias y vencimientos) se publica y actualiza automáticamente en:\n\n{ruta}\n\nSuscríbase a este archivo desde su calendario de escritorio.\n\n¿Copiar la ruta al portapapeles?", parent=self.root):
+            self.root.clipboard_clear(); self.root.clipboard_append(ruta)
+
+    def exportar_agenda_ics(self):
+        ruta = filedialog.asksaveasfilename(title="Exportar Agenda", defaultextension=".ics", initialfile=calendario_ics.NOMBRE_FEED_POR_DEFECTO, filetypes=[("iCalendar", "*.ics"), ("Todos los archivos", "*.*")], parent=self.root)
+        if not ruta: return
+        try:
+            cantidad = calendario_ics.exportar_ics(ruta, db)
+            messagebox.showinfo("Exportación Completa", f"Se exportaron {cantidad} eventos a:\n{ruta}", parent=self.root)
+        except Exception as e: messagebox.showerror("Error", f"No se pudo exportar la agenda:\n{e}", parent=self.root)
+
+    def importar_ics_caso_seleccionado(self):
+        if not self.selected_case: messagebox.showwarning("Advertencia", "Selecciona el caso al que se importarán los eventos.", parent=self.root); return
+        ruta = filedialog.askopenfilename(title="Importar Calendario (.ics)", filetypes=[("iCalendar", "*.ics"), ("Todos los archivos", "*.*")], parent=self.root)
+        if not ruta: return
+        try: stats = calendario_ics.importar_ics(ruta, self.selected_case['id'], db)
+        except Exception as e: messagebox.showerror("Error", f"No se pudo importar el archivo:\n{e}", parent=self.root); return
+        self.actualizar_lista_audiencias(); self.marcar_dias_audiencias_calendario(forzar=True)
+        messagebox.showinfo("Importación Completa", f"Nuevas: {stats['nuevas']}\nActualizadas: {stats['actualizadas']}\nDuplicadas (omitidas): {stats['duplicadas']}\nInválidas: {stats['omitidas']}", parent=self.root)
 
     def actualizar_lista_audiencias(self, event=None):
         if event: self.fecha_seleccionada_agenda = self.agenda_cal.get_date()
-        for i in self.audiencia_tree.get_children(): self.audiencia_tree.delete(i)
-        audiencias = db.get_audiencias_by_fecha(self.fecha_seleccionada_agenda)
+        fecha = self.fecha_seleccionada_agenda
+        # Al recorrer días rápido en el calendario solo se pinta la respuesta del último
+        self.cargador_async.enviar('agenda', lambda token: db.get_audiencias_by_fecha(fecha), self._aplicar_lista_audiencias)
+
+    def _aplicar_lista_audiencias(self, audiencias):
+        filas = []
         for aud in audiencias:
             hora = aud.get('hora', '--:--') or "--:--"; desc_full = aud.get('descripcion',''); desc_corta = (desc_full.split('\n')[0])[:60] + ('...' if len(desc_full) > 60 else '')
             caso_full = aud.get('caso_caratula', 'Caso Desc.'); caso_corto = caso_full[:50] + ('...' if len(caso_full) > 50 else '')
             link_full = aud.get('link','') or ""; link_corto = link_full[:40] + ('...' if len(link_full) > 40 else '')
-            self.audiencia_tree.insert("", tk.END, values=(aud['id'], hora, desc_corta, caso_corto, link_corto), iid=str(aud['id']))
-        self.deshabilitar_botones_audiencia(); self.limpiar_detalles_audiencia()
+            filas.append((str(aud['id']), (aud['id'], hora, desc_corta, caso_corto, link_corto)))
+        # Solo se aplican las diferencias; si la audiencia seleccionada sigue en el día, queda seleccionada
+        seleccion_previa = self.audiencia_tree.selection()
+        self.sincronizador_audiencias.sincronizar(filas)
+        if seleccion_previa and self.audiencia_tree.exists(seleccion_previa[0]): self.on_audiencia_tree_select()
+        else: self.deshabilitar_botones_audiencia(); self.limpiar_detalles_audiencia()
 
     def cargar_audiencias_fecha_actual(self):
         self.fecha_seleccionada_agenda = datetime.date.today().strftime("%Y-%m-%d")
@@ -2544,7 +2928,8 @@ class CRMLegalApp:
         
         ttk.Label(frame, text="Caso:").grid(row=0, column=0, sticky=tk.W, pady=3, padx=5); ttk.Label(frame, text=caso_asociado_caratula, wraplength=300).grid(row=0, column=1, sticky=tk.W, pady=3, padx=5)
         fecha_inicial = datos_audiencia.get('fecha') if is_edit else self.fecha_seleccionada_agenda; ttk.Label(frame, text="*Fecha (YYYY-MM-DD):").grid(row=1, column=0, sticky=tk.W, pady=3, padx=5); fecha_var = tk.StringVar(value=fecha_inicial); entry_fecha = ttk.Entry(frame, textvariable=fecha_var, width=12); entry_fecha.grid(row=1, column=1, sticky=tk.W, pady=3, padx=5)
-        ttk.Label(frame, text="Hora (HH:MM):").grid(row=2, column=0, sticky=tk.W, pady=3, padx=5); hora_var = tk.StringVar(value=datos_audiencia.get('hora', '')); entry_hora = ttk.Entry(frame, textvariable=hora_var, width=7); entry_hora.grid(row=2, column=1, sticky=tk.W, pady=3, padx=5)
+        ttk.Label(frame, text="Hora (HH:MM):").grid(row=2, column=0, sticky=tk.W, pady=3, padx=5); hora_frame = ttk.Frame(frame); hora_frame.grid(row=2, column=1, sticky=tk.W, pady=3, padx=5); hora_var = tk.StringVar(value=datos_audiencia.get('hora', '')); entry_hora = ttk.Entry(hora_frame, textvariable=hora_var, width=7); entry_hora.pack(side=tk.LEFT)
+        ttk.Label(hora_frame, text="Duración (min):").pack(side=tk.LEFT, padx=(15, 5)); duracion_var = tk.StringVar(value=str(datos_audiencia.get('duracion_minutos') or agenda_conflictos.DURACION_POR_DEFECTO_MINUTOS)); ttk.Spinbox(hora_frame, from_=5, to=600, increment=15, width=5, textvariable=duracion_var).pack(side=tk.LEFT)
         ttk.Label(frame, text="Link:").grid(row=3, column=0, sticky=tk.W, pady=3, padx=5); link_var = tk.StringVar(value=datos_audiencia.get('link', '')); ttk.Entry(frame, textvariable=link_var).grid(row=3, column=1, sticky=tk.EW, pady=3, padx=5)
         
         ttk.Label(frame, text="*Descripción:").grid(row=4, column=0, sticky=tk.NW, pady=3, padx=5); desc_frame = ttk.Frame(frame); desc_frame.grid(row=4, column=1, sticky=tk.NSEW, pady=3, padx=5); desc_frame.rowconfigure(0, weight=1); desc_frame.columnconfigure(0, weight=1); desc_text_dialog = tk.Text(desc_frame, height=6, wrap=tk.WORD); desc_text_dialog.grid(row=0, column=0, sticky='nsew'); desc_scroll_dialog = ttk.Scrollbar(desc_frame, orient=tk.VERTICAL, command=desc_text_dialog.yview); desc_scroll_dialog.grid(row=0, column=1, sticky='ns'); desc_text_dialog['yscrollcommand'] = desc_scroll_dialog.set
@@ -2553,7 +2938,7 @@ class CRMLegalApp:
         rec_frame = ttk.LabelFrame(frame, text="Recordatorio"); rec_frame.grid(row=5, column=0, columnspan=2, sticky=tk.EW, pady=10, padx=5); rec_act_var = tk.IntVar(value=datos_audiencia.get('recordatorio_activo', 0)); rec_chk = ttk.Checkbutton(rec_frame, text="Activar", variable=rec_act_var); rec_chk.pack(side=tk.LEFT, padx=(5, 10)); ttk.Label(rec_frame, text="Minutos antes:").pack(side=tk.LEFT); rec_min_var = tk.IntVar(value=datos_audiencia.get('recordatorio_minutos', 15)); vcmd = (frame.register(self.validate_int_positive), '%P'); rec_spin = ttk.Spinbox(rec_frame, from_=1, to=1440, width=5, textvariable=rec_min_var, validate='key', validatecommand=vcmd); rec_spin.pack(side=tk.LEFT, padx=5)
         
         btn_frame_dialog = ttk.Frame(frame); btn_frame_dialog.grid(row=6, column=0, columnspan=2, pady=15)
-        save_cmd = lambda: self.guardar_audiencia(audiencia_id, caso_asociado_id, fecha_var.get(), hora_var.get(), link_var.get(), desc_text_dialog.get("1.0", tk.END).strip(), rec_act_var.get(), rec_min_var.get(), dialog)
+        save_cmd = lambda: self.guardar_audiencia(audiencia_id, caso_asociado_id, fecha_var.get(), hora_var.get(), link_var.get(), desc_text_dialog.get("1.0", tk.END).strip(), rec_act_var.get(), rec_min_var.get(), dialog, duracion_str=duracion_var.get())
         ttk.Button(btn_frame_dialog, text="Guardar", command=save_cmd).pack(side=tk.LEFT, padx=5)
         ttk.Button(btn_frame_dialog, text="Cancelar", command=dialog.destroy).pack(side=tk.LEFT, padx=5)
         
@@ -2562,6 +2947,45 @@ class CRMLegalApp:
 
     def validate_int_positive(self, P): return (P.isdigit() and int(P) >= 0) or P == ""
 
+    def verificar_conflictos_audiencia(self, audiencia_id, caso_id, fecha_db, hora_db, duracion_min):
+        """ Devuelve [(otra_audiencia, tipo)] que chocan con la audiencia propuesta. Solo consulta el día y sus vecinos. """
+        if not hora_db: return []
+        fecha_dt = datetime.datetime.strptime(fecha_db, "%Y-%m-%d").date()
+        desde = (fecha_dt - datetime.timedelta(days=1)).strftime("%Y-%m-%d"); hasta = (fecha_dt + datetime.timedelta(days=1)).strftime("%Y-%m-%d")
+        indice = agenda_conflictos.IndiceIntervalos(db.get_intervalos_audiencias(desde, hasta))
+        caso = db.get_case_by_id(caso_id) or {}
+        propuesta = {'id': audiencia_id, 'fecha': fecha_db, 'hora': hora_db, 'duracion_minutos': duracion_min, 'juzgado': caso.get('juzgado')}
+        return indice.conflictos_para(propuesta, excluir_id=audiencia_id)
+
+    def _describir_conflicto(self, otra, tipo):
+        desc = (otra.get('descripcion') or '').split('\n')[0][:50]; juzgado = otra.get('juzgado') or 'juzgado s/d'
+        return f"- {otra.get('fecha')} {otra.get('hora')} ({otra.get('duracion_minutos')} min) [{tipo}] {desc} - {otra.get('caso_caratula', '')[:40]} / {juzgado}"
+
+    def mostrar_reporte_conflictos_agenda(self):
+        audiencias = db.get_intervalos_audiencias()
+        conflictos = agenda_conflictos.reporte_conflictos(audiencias)
+        win = tk.Toplevel(self.root); win.title("Reporte de Conflictos de Agenda"); win.geometry("760x480"); win.transient(self.root)
+        frame = ttk.Frame(win, padding=10); frame.pack(expand=True, fill=tk.BOTH); frame.rowconfigure(1, weight=1); frame.columnconfigure(0, weight=1)
+        ttk.Label(frame, text=f"{len(conflictos)} conflictos entre {len(audiencias)} audiencias con hora (margen de traslado: {agenda_conflictos.MARGEN_TRASLADO_MINUTOS} min).").grid(row=0, column=0, sticky=tk.W, pady=(0, 5))
+        texto = tk.Text(frame, wrap=tk.WORD); texto.grid(row=1, column=0, sticky='nsew'); scroll = ttk.Scrollbar(frame, orient=tk.VERTICAL, command=texto.yview); scroll.grid(row=1, column=1, sticky='ns'); texto['yscrollcommand'] = scroll.set
+        if not conflictos: texto.insert('1.0', "No se encontraron superposiciones ni audiencias sin tiempo de traslado.")
+        for a, b, tipo in conflictos:
+            texto.insert(tk.END, f"{tipo.upper()}:\n{self._describir_conflicto(a, tipo)}\n{self._describir_conflicto(b, tipo)}\n\n")
+        texto.config(state=tk.DISABLED)
+        ttk.Button(frame, text="Cerrar", command=win.destroy).grid(row=2, column=0, columnspan=2, pady=(8, 0))
+
+    def mostrar_referencias_documentos_rotas(self):
+        rotas = db.get_referencias_documentos_rotas()
+        win = tk.Toplevel(self.root); win.title("Referencias a Documentos Rotas"); win.geometry("760x480"); win.transient(self.root)
+        frame = ttk.Frame(win, padding=10); frame.pack(expand=True, fill=tk.BOTH); frame.rowconfigure(1, weight=1); frame.columnconfigure(0, weight=1)
+        ttk.Label(frame, text=f"{len(rotas)} actividades con referencia_documento que no coincide con ningún archivo indexado de su caso.").grid(row=0, column=0, sticky=tk.W, pady=(0, 5))
+        texto = tk.Text(frame, wrap=tk.WORD); texto.grid(row=1, column=0, sticky='nsew'); scroll = ttk.Scrollbar(frame, orient=tk.VERTICAL, command=texto.yview); scroll.grid(row=1, column=1, sticky='ns'); texto['yscrollcommand'] = scroll.set
+        if not rotas: texto.insert('1.0', "No se encontraron referencias rotas (solo se revisan los casos cuya carpeta ya fue indexada).")
+        for r in rotas:
+            texto.insert(tk.END, f"Caso {r['caso_id']} - {r['caratula'][:60]}\n  Actividad {r['id']} ({r['fecha_hora']}): '{r['referencia_documento']}'\n\n")
+        texto.config(state=tk.DISABLED)
+        ttk.Button(frame, text="Cerrar", command=win.destroy).grid(row=2, column=0, columnspan=2, pady=(8, 0))
+
     def parsear_hora(self, hora_str):
         if not hora_str or hora_str.isspace(): return None
         hora_str = hora_str.strip().replace('.', ':').replace(' ', '')
@@ -2577,7 +3001,7 @@ class CRMLegalApp:
              else: return None
         return None
 
-    def guardar_audiencia(self, audiencia_id, caso_id, fecha_str, hora_str, link, desc, r_act, r_min, dialog):
+    def guardar_audiencia(self, audiencia_id, caso_id, fecha_str, hora_str, link, desc, r_act, r_min, dialog, duracion_str=None):
         try: fecha_dt = datetime.datetime.strptime(fecha_str, "%Y-%m-%d"); fecha_db = fecha_dt.strftime("%Y-%m-%d")
         except ValueError: messagebox.showerror("Validación", "Formato fecha: YYYY-MM-DD.", parent=dialog); return
         hora_db = self.parsear_hora(hora_str)
@@ -2585,16 +3009,28 @@ class CRMLegalApp:
         if not desc: messagebox.showerror("Validación", "Descripción obligatoria.", parent=dialog); return
         try: minutos_rec = int(r_min)
         except ValueError: minutos_rec = 15
+        try: duracion_min = max(1, int(duracion_str)) if duracion_str not in (None, "") else agenda_conflictos.DURACION_POR_DEFECTO_MINUTOS
+        except ValueError: messagebox.showerror("Validación", "Duración inválida (minutos).", parent=dialog); return
+
+        conflictos = self.verificar_conflictos_audiencia(audiencia_id, caso_id, fecha_db, hora_db, duracion_min)
+        if conflictos:
+            detalle = "\n".join(self._describir_conflicto(otra, tipo) for otra, tipo in conflictos[:8])
+            if len(conflictos) > 8: detalle += f"\n... y {len(conflictos) - 8} más."
+            if not messagebox.askyesno("Conflicto de Agenda", f"La audiencia choca con:\n\n{detalle}\n\n¿Guardar de todos modos?", parent=dialog, icon='warning'): return
         
-        success = False; msg_op = ""
+        success = False; msg_op = ""; fecha_anterior = None
         if audiencia_id is None:
-            new_id = db.add_audiencia(caso_id, fecha_db, hora_db, desc, link.strip(), r_act, minutos_rec); success = new_id is not None; msg_op = "agregada"
+            new_id = db.add_audiencia(caso_id, fecha_db, hora_db, desc, link.strip(), r_act, minutos_rec, duracion_min); success = new_id is not None; msg_op = "agregada"
         else:
-            success = db.update_audiencia(audiencia_id, fecha_db, hora_db, desc, link.strip(), r_act, minutos_rec); msg_op = "actualizada"
+            audiencia_anterior = db.get_audiencia_by_id(audiencia_id); fecha_anterior = audiencia_anterior.get('fecha') if audiencia_anterior else None
+            success = db.update_audiencia(audiencia_id, fecha_db, hora_db, desc, link.strip(), r_act, minutos_rec, duracion_min); msg_op = "actualizada"
         
         if success:
             messagebox.showinfo("Éxito", f"Audiencia {msg_op}.", parent=self.root); dialog.destroy()
-            self.agenda_cal.selection_set(fecha_dt.date()); self.actualizar_lista_audiencias(); self.marcar_dias_audiencias_calendario()
+            self.agenda_cal.selection_set(fecha_dt.date()); self.fecha_seleccionada_agenda = fecha_db; self.actualizar_lista_audiencias()
+            self.marcar_dias_audiencias_calendario() # Por si la fecha nueva está en otro mes visible
+            if fecha_anterior and fecha_anterior != fecha_db: self.actualizar_marca_fecha_audiencia(fecha_anterior)
+            self.actualizar_marca_fecha_audiencia(fecha_db)
             # db.update_last_activity(caso_id) # Ya se hace en add/update_audiencia en db
         else: messagebox.showerror("Error", f"No se pudo {msg_op} audiencia.", parent=dialog)
 
@@ -2609,10 +3045,11 @@ class CRMLegalApp:
         except: desc_corta = f"ID {self.audiencia_seleccionada_id}"
         
         if messagebox.askyesno("Confirmar", f"¿Eliminar audiencia:\n'{desc_corta}'?", parent=self.root, icon='warning'):
-            # audiencia_info = db.get_audiencia_by_id(self.audiencia_seleccionada_id) # Para caso_id, ya se maneja en delete_audiencia en db
+            audiencia_info = db.get_audiencia_by_id(self.audiencia_seleccionada_id)
+            fecha_audiencia = audiencia_info.get('fecha') if audiencia_info else self.fecha_seleccionada_agenda
             if db.delete_audiencia(self.audiencia_seleccionada_id):
                 messagebox.showinfo("Éxito", "Audiencia eliminada.", parent=self.root)
-                self.actualizar_lista_audiencias(); self.marcar_dias_audiencias_calendario(); self.limpiar_detalles_audiencia()
+                self.actualizar_lista_audiencias(); self.actualizar_marca_fecha_audiencia(fecha_audiencia); self.limpiar_detalles_audiencia()
                 # if audiencia_info and audiencia_info.get('caso_id'): db.update_last_activity(audiencia_info['caso_id']) # Ya se maneja en db
             else: messagebox.showerror("Error", "No se pudo eliminar audiencia.", parent=self.root)
 
@@ -2620,24 +3057,39 @@ class CRMLegalApp:
     # --- Funciones de Recordatorios y Bandeja del Sistema ---
     def verificar_recordatorios_periodicamente(self):
         print("[Recordatorios] Hilo iniciado.")
+        estacion = db.get_nombre_estacion()
         while not self.stop_event.is_set():
             current_processing_start_time = time.monotonic()
             try:
                 ahora = datetime.datetime.now(); hoy_str = ahora.strftime("%Y-%m-%d")
                 if not hasattr(self, '_dia_verificacion_recordatorios') or self._dia_verificacion_recordatorios != hoy_str:
-                    print(f"[Recordatorios] Nuevo día ({hoy_str}), reseteando mostrados."); self.recordatorios_mostrados_hoy = set(); self._dia_verificacion_recordatorios = hoy_str
+                    print(f"[Recordatorios] Nuevo día ({hoy_str}), reseteando caché y purgando registro de entregas.")
+                    self.recordatorios_mostrados_hoy = set(); self._dia_verificacion_recordatorios = hoy_str
+                    borradas = db.purgar_entregas_recordatorios(DIAS_RETENCION_ENTREGAS_RECORDATORIOS)
+                    if borradas: print(f"[Recordatorios] {borradas} entregas antiguas purgadas.")
                 
                 audiencias_a_revisar = db.get_audiencias_con_recordatorio_activo()
                 for aud in audiencias_a_revisar:
                     if self.stop_event.is_set(): break
                     aud_id = aud['id']
-                    if not aud.get('fecha') or not aud.get('hora') or aud_id in self.recordatorios_mostrados_hoy: continue
+                    if not aud.get('fecha') or not aud.get('hora'): continue
                     try:
                         tiempo_audiencia = datetime.datetime.strptime(f"{aud['fecha']} {aud['hora']}", "%Y-%m-%d %H:%M"); minutos_antes = aud.get('recordatorio_minutos', 15)
                         tiempo_recordatorio = tiempo_audiencia - datetime.timedelta(minutes=minutos_antes)
+                        # La clave incluye el momento de disparo: si se cambia fecha/hora/minutos, es un recordatorio nuevo.
+                        fire_time = tiempo_recordatorio.strftime("%Y-%m-%d %H:%M")
+                        if ('audiencia', aud_id, fire_time) in self.recordatorios_mostrados_hoy: continue
                         if tiempo_recordatorio <= ahora < tiempo_audiencia:
-                            print(f"[Recordatorios] ¡Alerta! Audiencia ID: {aud_id} ({aud['hora']}) en {aud['fecha']}.")
-                            self.root.after(0, self.mostrar_recordatorio, aud.copy()); self.recordatorios_mostrados_hoy.add(aud_id)
+                            # El reclamo en BD es atómico: sobrevive a reinicios y evita duplicados entre estaciones.
+                            reclamado = db.reclamar_entrega_recordatorio('audiencia', aud_id, fire_time, estacion)
+                            if reclamado is None:
+                                print(f"[Recordatorios] No se pudo reclamar la audiencia ID: {aud_id}; se reintenta en la próxima pasada."); continue
+                            if reclamado:
+                                print(f"[Recordatorios] ¡Alerta! Audiencia ID: {aud_id} ({aud['hora']}) en {aud['fecha']}.")
+                                self.root.after(0, self.mostrar_recordatorio, aud.copy())
+                            else:
+                                print(f"[Recordatorios] Audiencia ID: {aud_id} ya fue notificada ({fire_time}).")
+                            self.recordatorios_mostrados_hoy.add(('audiencia', aud_id, fire_time))
                     except ValueError as ve: print(f"[Recordatorios] Error parseando fecha/hora ID {aud_id}: {ve}")
                     except Exception as e: print(f"[Recordatorios] Error procesando recordatorio ID {aud_id}: {e}")
             except sqlite3.Error as dbe: print(f"[Recordatorios] Error BD en hilo: {dbe}"); self.stop_event.wait(300)
@@ -2716,6 +3168,7 @@ class CRMLegalApp:
 
 # --- Punto de entrada principal ---
 if __name__ == "__main__":
+    multiprocessing.freeze_support() # El indexador de texto usa procesos; necesario en el ejecutable empaquetado
     root = tk.Tk()
     style = ttk.Style(root)
     available_themes = style.theme_names()
@@ -0,0 +1,287 @@
+# observador_carpetas.py
+# Observa las carpetas de documentos que están a la vista (caso seleccionado y ventanas de caso
+# abiertas) y avisa altas, bajas y cambios de archivos sin volver a listar la carpeta.
+# En Linux usa inotify (vía ctypes, sin dependencias); si no está disponible, o una carpeta no
+# admite watch (límite del sistema, etc.), esa carpeta se revisa por sondeo periódico.
+# Los eventos se agrupan (debounce) en un hilo propio y se entregan en el hilo de Tk con root.after.
+import ctypes
+import ctypes.util
+import errno
+import itertools
+import os
+import select
+import struct
+import sys
+import threading
+import time
+
+from escaner_carpetas import leer_entrada
+
+DEBOUNCE_MS = 400
+ESPERA_MAXIMA_MS = 2000 # Con escrituras continuas (copia de un archivo grande) igual se avisa cada tanto
+INTERVALO_SONDEO_S = 3.0
+TICK_S = 0.2
+
+# Constantes de <sys/inotify.h>
+IN_MODIFY, IN_ATTRIB, IN_CLOSE_WRITE = 0x2, 0x4, 0x8
+IN_MOVED_FROM, IN_MOVED_TO, IN_CREATE, IN_DELETE = 0x40, 0x80, 0x100, 0x200
+IN_DELETE_SELF, IN_MOVE_SELF = 0x400, 0x800
+IN_Q_OVERFLOW, IN_IGNORED, IN_ONLYDIR = 0x4000, 0x8000, 0x1000000
+MASCARA_CARPETA = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+                   | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR)
+_EVENTO = struct.Struct('iIII') # wd, mask, cookie, len (seguido del nombre)
+
+
+class _Inotify:
+    """ Envoltorio mínimo de inotify_init1/add_watch/rm_watch sobre libc. """
+
+    def __init__(self):
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self._add, self._rm = libc.inotify_add_watch, libc.inotify_rm_watch
+        self._add.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self._rm.argtypes = [ctypes.c_int, ctypes.c_int]
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 falló")
+
+    def agregar(self, ruta):
+        wd = self._add(self.fd, os.fsencode(ruta), MASCARA_CARPETA)
+        if wd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err), ruta)
+        return wd
+
+    def quitar(self, wd):
+        self._rm(self.fd, wd) # Si la carpeta ya no existe el kernel ya soltó el watch: se ignora el error
+
+    def leer(self):
+        """ Lista de (wd, mask, nombre) disponibles sin bloquear. """
+        eventos = []
+        while True:
+            try:
+                datos = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            except OSError as e:
+                if e.errno == errno.EINTR: continue
+                raise
+            if not datos: break
+            pos = 0
+            while pos + _EVENTO.size <= len(datos):
+                wd, mask, _cookie, largo = _EVENTO.unpack_from(datos, pos)
+                pos += _EVENTO.size
+                nombre = os.fsdecode(datos[pos:pos + largo].rstrip(b'\0'))
+                pos += largo
+                eventos.append((wd, mask, nombre))
+        return eventos
+
+    def cerrar(self):
+        os.close(self.fd)
+
+
+class _Carpeta:
+    def __init__(self, ruta):
+        self.ruta = ruta
+        self.suscriptores = {} # {id: callback}
+        self.wd = None
+        self.sondeo = False # True si se revisa por sondeo en vez de inotify
+        self.foto = None # {ruta: EntradaCarpeta} para el sondeo
+        self.proximo_sondeo = 0.0
+        self.pendientes = set() # nombres con eventos aún no avisados
+        self.recargar = False # desbordó la cola o la carpeta misma se movió/borró
+        self.primer_evento = self.ultimo_evento = 0.0
+
+
+class ObservadorCarpetas:
+    """
+    observar(carpeta, callback) -> id_suscripcion;  dejar(id_suscripcion) suelta el watch si era el último.
+    callback(cambios) corre en el hilo de Tk con una lista de (ruta, EntradaCarpeta o None si se borró),
+    o con None si hay que volver a listar la carpeta completa.
+    """
+
+    def __init__(self, root, debounce_ms=DEBOUNCE_MS, intervalo_sondeo_s=INTERVALO_SONDEO_S, usar_inotify=True):
+        self.root = root
+        self.debounce = debounce_ms / 1000.0
+        self.espera_maxima = max(ESPERA_MAXIMA_MS / 1000.0, self.debounce)
+        self.intervalo_sondeo = intervalo_sondeo_s
+        self._lock = threading.Lock()
+        self._carpetas = {} # {clave normalizada: _Carpeta}
+        self._por_wd = {} # {wd: _Carpeta}
+        self._suscripciones = {} # {id: clave}
+        self._ids = itertools.count(1)
+        self._comandos = [] # ('agregar'|'quitar', _Carpeta): los watches se tocan solo desde el hilo
+        self._cerrado = threading.Event()
+        self._hilo = None
+        self._inotify = None
+        if usar_inotify and sys.platform.startswith('linux'):
+            try:
+                self._inotify = _Inotify()
+            except (OSError, AttributeError) as e:
+                print(f"[Observador] inotify no disponible, se usará sondeo: {e}")
+
+    @property
+    def modo(self):
+        return 'inotify' if self._inotify else 'sondeo'
+
+    @staticmethod
+    def _clave(ruta):
+        return os.path.normcase(os.path.abspath(ruta))
+
+    def observar(self, carpeta, callback):
+        if self._cerrado.is_set() or not carpeta:
+            return None
+        clave = self._clave(carpeta)
+        with self._lock:
+            id_suscripcion = next(self._ids)
+            entrada = self._carpetas.get(clave)
+            if entrada is None:
+                entrada = self._carpetas[clave] = _Carpeta(carpeta)
+                self._comandos.append(('agregar', entrada))
+            entrada.suscriptores[id_suscripcion] = callback
+            self._suscripciones[id_suscripcion] = clave
+        if self._hilo is None:
+            self._hilo = threading.Thread(target=self._bucle, daemon=True, name="observador_carpetas")
+            self._hilo.start()
+        return id_suscripcion
+
+    def dejar(self, id_suscripcion):
+        with self._lock:
+            clave = self._suscripciones.pop(id_suscripcion, None)
+            entrada = self._carpetas.get(clave) if clave else None
+            if entrada is None:
+                return
+            entrada.suscriptores.pop(id_suscripcion, None)
+            if not entrada.suscriptores:
+                del self._carpetas[clave]
+                self._comandos.append(('quitar', entrada))
+
+    def carpetas_observadas(self):
+        with self._lock:
+            return [c.ruta for c in self._carpetas.values()]
+
+    def cerrar(self):
+        self._cerrado.set()
+        with self._lock:
+            self._carpetas.clear(); self._suscripciones.clear()
+        if self._hilo is not None:
+            self._hilo.join(timeout=1.0)
+        if self._inotify:
+            try: self._inotify.cerrar()
+            except OSError: pass
+            self._inotify = None
+
+    # --- Hilo del observador ---
+    def _bucle(self):
+        while not self._cerrado.is_set():
+            try:
+                self._procesar_comandos()
+                if self._inotify:
+                    listos, _, _ = select.select([self._inotify.fd], [], [], TICK_S)
+                    if listos:
+                        self._registrar_eventos(self._inotify.leer())
+                else:
+                    self._cerrado.wait(TICK_S)
+                self._sondear_vencidas()
+                self._entregar_vencidas()
+            except Exception as e:
+                print(f"[Observador] Error en el bucle de observación: {e}")
+                self._cerrado.wait(1.0)
+
+    def _procesar_comandos(self):
+        with self._lock:
+            comandos, self._comandos = self._comandos, []
+        for accion, carpeta in comandos:
+            if accion == 'agregar':
+                if self._inotify:
+                    try:
+                        carpeta.wd = self._inotify.agregar(carpeta.ruta)
+                        self._por_wd[carpeta.wd] = carpeta
+                        continue
+                    except OSError as e:
+                        if e.errno == errno.ENOENT: continue # La carpeta no existe: nada que observar
+                        print(f"[Observador] Sin watch para {carpeta.ruta} ({e}); se revisará por sondeo.")
+                carpeta.sondeo = True
+            elif carpeta.wd is not None:
+                # Otra suscripción pudo volver a pedir la misma carpeta con el mismo wd (inotify lo reutiliza)
+                if self._por_wd.get(carpeta.wd) is carpeta:
+                    del self._por_wd[carpeta.wd]
+                    if self._inotify: self._inotify.quitar(carpeta.wd)
+
+    def _registrar_eventos(self, eventos):
+        ahora = time.monotonic()
+        for wd, mask, nombre in eventos:
+            if mask & IN_Q_OVERFLOW:
+                for carpeta in list(self._por_wd.values()):
+                    self._marcar(carpeta, ahora, recargar=True)
+                continue
+            carpeta = self._por_wd.get(wd)
+            if carpeta is None: continue
+            if mask & (IN_DELETE_SELF | IN_MOVE_SELF | IN_IGNORED):
+                if mask & IN_IGNORED: self._por_wd.pop(wd, None) # El kernel ya soltó el watch
+                self._marcar(carpeta, ahora, recargar=True)
+            elif nombre:
+                self._marcar(carpeta, ahora)
+                carpeta.pendientes.add(nombre)
+
+    @staticmethod
+    def _marcar(carpeta, ahora, recargar=False):
+        if not carpeta.pendientes and not carpeta.recargar:
+            carpeta.primer_evento = ahora
+        carpeta.ultimo_evento = ahora
+        carpeta.recargar = carpeta.recargar or recargar
+
+    def _sondear_vencidas(self):
+        ahora = time.monotonic()
+        with self._lock:
+            a_sondear = [c for c in self._carpetas.values() if c.sondeo and c.proximo_sondeo <= ahora]
+        for carpeta in a_sondear:
+            carpeta.proximo_sondeo = ahora + self.intervalo_sondeo
+            foto = self._foto(carpeta.ruta)
+            if foto is None: continue
+            if carpeta.foto is not None:
+                cambios = [(ruta, foto.get(ruta)) for ruta in carpeta.foto.keys() | foto.keys()
+                           if carpeta.foto.get(ruta) != foto.get(ruta)]
+                if cambios: self._despachar(carpeta, cambios)
+            carpeta.foto = foto
+
+    @staticmethod
+    def _foto(ruta):
+        foto = {}
+        try:
+            with os.scandir(ruta) as it:
+                for entry in it:
+                    entrada = leer_entrada(entry.path)
+                    if entrada: foto[entry.path] = entrada
+        except OSError:
+            return None
+        return foto
+
+    def _entregar_vencidas(self):
+        ahora = time.monotonic()
+        with self._lock: # No _por_wd: una carpeta borrada ya perdió su watch pero igual debe avisar
+            carpetas = list(self._carpetas.values())
+        for carpeta in carpetas:
+            if not (carpeta.pendientes or carpeta.recargar): continue
+            if ahora - carpeta.ultimo_evento < self.debounce and ahora - carpeta.primer_evento < self.espera_maxima:
+                continue
+            if carpeta.recargar:
+                carpeta.pendientes.clear(); carpeta.recargar = False
+                self._despachar(carpeta, None)
+                continue
+            nombres, carpeta.pendientes = carpeta.pendientes, set()
+            # Se lee el estado actual de cada nombre: una ráfaga crear+escribir+renombrar queda en un solo cambio
+            cambios = [(os.path.join(carpeta.ruta, n), leer_entrada(os.path.join(carpeta.ruta, n))) for n in sorted(nombres)]
+            self._despachar(carpeta, cambios)
+
+    def _despachar(self, carpeta, cambios):
+        def entregar():
+            for callback in list(carpeta.suscriptores.values()):
+                try:
+                    callback(cambios)
+                except Exception as e:
+                    print(f"[Observador] Error aplicando cambios de {carpeta.ruta}: {e}")
+        if self._cerrado.is_set(): return
+        try:
+            self.root.after(0, entregar)
+        except RuntimeError: # El loop de Tk ya terminó
+            pass
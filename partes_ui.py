@@ -2,6 +2,7 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
 import datetime # Aunque no se use directamente aquí, es bueno tenerlo por si acaso
+from treeview_sync import SincronizadorTreeview
 
 class PartesTab(ttk.Frame):
     def __init__(self, parent, app_controller, *args, **kwargs):
@@ -9,6 +10,8 @@ class PartesTab(ttk.Frame):
         self.app_controller = app_controller
         self.db_crm = self.app_controller.db_crm # Acceso directo al módulo de BD
         self.selected_parte_id = None
+        self._caso_id_cargado = None
+        self._partes_modelo = [] # Partes mostradas, en el mismo orden que el Treeview
         self._create_widgets()
 
     def _create_widgets(self):
@@ -53,6 +56,7 @@ class PartesTab(ttk.Frame):
 
         self.partes_tree.grid(row=0, column=0, sticky='nsew')
         self.partes_tree.bind('<<TreeviewSelect>>', self.on_parte_select_treeview)
+        self.sincronizador_partes = SincronizadorTreeview(self.partes_tree)
         self.partes_tree.bind("<Double-1>", self._on_double_click_editar_parte)
 
         # --- Actions Frame (dentro del panel izquierdo) ---
@@ -123,24 +127,44 @@ class PartesTab(ttk.Frame):
                  self._open_edit_parte_dialog_wrapper()
 
     def load_partes(self, caso_id):
-        for i in self.partes_tree.get_children():
-            self.partes_tree.delete(i)
+        mismo_caso = caso_id is not None and caso_id == self._caso_id_cargado
+        self._caso_id_cargado = caso_id
+        self._partes_modelo = self.db_crm.get_partes_by_caso_id(caso_id) if caso_id else []
+        self._sincronizar_lista()
 
-        self.selected_parte_id = None
-        self.limpiar_detalle_completo_parte()
-
-        if caso_id:
-            partes = self.db_crm.get_partes_by_caso_id(caso_id)
-            for parte in partes:
-                # Usar iid con prefijo para evitar colisiones si los IDs son solo números
-                item_iid = f"parte_{parte['id']}"
-                self.partes_tree.insert('', tk.END, values=(
-                    parte['id'],
-                    parte.get('nombre', 'N/A'),
-                    parte.get('tipo', 'N/A'),
-                    parte.get('contacto', 'N/A')
-                ), iid=item_iid)
-        self._update_action_buttons_state()
+        if mismo_caso:
+            self.on_parte_select_treeview() # Recargando el mismo caso se conserva la parte seleccionada
+        else:
+            self.selected_parte_id = None
+            self.limpiar_detalle_completo_parte()
+            self._update_action_buttons_state()
+
+    def _fila_parte(self, parte):
+        # Usar iid con prefijo para evitar colisiones si los IDs son solo números
+        return (f"parte_{parte['id']}", (
+            parte['id'],
+            parte.get('nombre', 'N/A'),
+            parte.get('tipo', 'N/A'),
+            parte.get('contacto', 'N/A')
+        ))
+
+    def _sincronizar_lista(self):
+        self.sincronizador_partes.sincronizar([self._fila_parte(p) for p in self._partes_modelo])
+
+    def actualizar_parte(self, parte_id):
+        """ Tras guardar una parte: relee solo esa parte y actualiza su fila en el lugar que le toca. """
+        parte = self.db_crm.get_parte_by_id(parte_id)
+        self._partes_modelo = [p for p in self._partes_modelo if p['id'] != parte_id]
+        if parte and parte.get('caso_id') == self._caso_id_cargado:
+            self._partes_modelo.append(parte)
+            self._partes_modelo.sort(key=lambda p: p.get('nombre') or '') # Mismo orden que get_partes_by_caso_id
+        self._sincronizar_lista()
+        self.on_parte_select_treeview()
+
+    def quitar_parte(self, parte_id):
+        self._partes_modelo = [p for p in self._partes_modelo if p['id'] != parte_id]
+        self.sincronizador_partes.quitar_fila(f"parte_{parte_id}")
+        self.on_parte_select_treeview()
 
     def on_parte_select_treeview(self, event=None):
         selected_items = self.partes_tree.selection()
@@ -0,0 +1,91 @@
+# previsualizacion_ui.py
+# Panel de vista previa junto a una lista de documentos (pestaña Documentación y DocumentosTab de las
+# ventanas de caso). Al seleccionar un archivo pide la previsualización al servicio en el cargador
+# asíncrono; recorrer la lista con las flechas solo genera la del último archivo seleccionado.
+import os
+import tkinter as tk
+from tkinter import ttk
+
+from PIL import ImageTk
+
+DEMORA_SELECCION_MS = 150
+
+
+class PanelPrevisualizacion(ttk.LabelFrame):
+    def __init__(self, parent, app_controller, canal, **kwargs):
+        super().__init__(parent, text="Vista Previa", padding=5, **kwargs)
+        self.app_controller = app_controller
+        self.canal = canal
+        self._imagen_tk = None # Referencia viva de la PhotoImage mostrada
+        self._after_seleccion = None
+        self._ruta_actual = None
+
+        self.columnconfigure(0, weight=1)
+        self.rowconfigure(1, weight=1)
+        self.info_lbl = ttk.Label(self, text="", foreground="gray", wraplength=300, justify=tk.LEFT)
+        self.info_lbl.grid(row=0, column=0, sticky=tk.EW, pady=(0, 5))
+        self.imagen_lbl = ttk.Label(self, anchor=tk.N)
+        self.texto = tk.Text(self, wrap=tk.WORD, width=40, height=10, relief=tk.FLAT, state=tk.DISABLED)
+        self.limpiar()
+
+    def conectar(self, tree):
+        """ Muestra la vista previa del archivo seleccionado en tree (el iid de las filas es la ruta). """
+        tree.bind('<<TreeviewSelect>>', lambda e: self._on_seleccion(tree), add='+')
+
+    def _on_seleccion(self, tree):
+        if self._after_seleccion: self.after_cancel(self._after_seleccion)
+        self._after_seleccion = self.after(DEMORA_SELECCION_MS, lambda: self._mostrar_foco(tree))
+
+    def _mostrar_foco(self, tree):
+        self._after_seleccion = None
+        if not tree.winfo_exists(): return
+        seleccion = tree.selection()
+        if len(seleccion) != 1 or 'file' not in tree.item(seleccion[0], 'tags'):
+            self.limpiar(); return
+        self.mostrar(seleccion[0], tree.item(seleccion[0], 'values'))
+
+    def mostrar(self, ruta, valores=None):
+        self._ruta_actual = ruta
+        nombre = os.path.basename(ruta)
+        detalle = f"{valores[1]} · {valores[2]}" if valores and len(valores) >= 3 else ""
+        self.info_lbl.config(text=f"{nombre}\n{detalle}" if detalle else nombre)
+        self._mostrar_texto("Generando vista previa...")
+        servicio = self.app_controller.servicio_previsualizaciones
+        self.app_controller.cargador_async.enviar(self.canal, lambda token: servicio.obtener(ruta, token),
+                                                  self._aplicar, al_error=self._on_error)
+
+    def limpiar(self):
+        self.app_controller.cargador_async.cancelar(self.canal)
+        self._ruta_actual = None
+        self.info_lbl.config(text="Seleccione un archivo para ver su contenido.")
+        self._mostrar_texto("")
+
+    def _on_error(self, error):
+        if self.winfo_exists(): self._mostrar_texto(f"No se pudo generar la vista previa: {error}")
+
+    def _aplicar(self, previsualizacion):
+        if not self.winfo_exists() or previsualizacion.ruta != self._ruta_actual: return
+        if previsualizacion.tipo == 'imagen':
+            img = previsualizacion.imagen
+            self._imagen_tk = ImageTk.PhotoImage(img)
+            self.texto.grid_remove()
+            self.imagen_lbl.config(image=self._imagen_tk)
+            self.imagen_lbl.grid(row=1, column=0, sticky='nsew')
+            self.info_lbl.config(text=f"{self.info_lbl.cget('text')}\nMiniatura {img.width}x{img.height}")
+        else:
+            self._mostrar_texto(previsualizacion.texto or "")
+
+    def _mostrar_texto(self, contenido):
+        self._imagen_tk = None
+        self.imagen_lbl.config(image='')
+        self.imagen_lbl.grid_remove()
+        self.texto.config(state=tk.NORMAL)
+        self.texto.delete('1.0', tk.END)
+        self.texto.insert('1.0', contenido)
+        self.texto.config(state=tk.DISABLED)
+        self.texto.grid(row=1, column=0, sticky='nsew')
+
+    def destroy(self):
+        if self._after_seleccion: self.after_cancel(self._after_seleccion)
+        self.app_controller.cargador_async.cancelar(self.canal)
+        super().destroy()
@@ -0,0 +1,276 @@
+# previsualizaciones.py
+# Previsualización de documentos para el panel junto a la lista de archivos:
+#   imágenes  -> miniatura PNG generada con Pillow
+#   .docx/.txt/.rtf/.pdf -> primeros párrafos de texto (Pillow no rasteriza PDFs; se muestra su capa de texto)
+# Se generan en un ProcessPoolExecutor (un archivo dañado no puede colgar ni tirar abajo la interfaz) y se
+# guardan en una caché en disco con clave (ruta, mtime, tamaño) y tope de tamaño; al pasarse se borran
+# las entradas usadas hace más tiempo (LRU por mtime del archivo de caché, que se actualiza en cada uso).
+import hashlib
+import os
+import threading
+import weakref
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from PIL import Image, ImageOps
+
+from extraccion_texto import extraer_texto, ESTADO_OK
+
+EXTENSIONES_IMAGEN = ('.png', '.jpg', '.jpeg', '.gif', '.bmp', '.tif', '.tiff', '.webp')
+EXTENSIONES_TEXTO = ('.docx', '.txt', '.rtf', '.pdf')
+LADO_MAXIMO = 360 # px de la miniatura
+MAX_CARACTERES_EXTRACTO = 2500
+MAX_PARRAFOS_EXTRACTO = 12
+MAX_BYTES_CACHE = 200 * 1024 * 1024
+NOMBRE_CARPETA_CACHE = 'cache_previsualizaciones'
+TIMEOUT_GENERACION_S = 30 # Un archivo que tarda más queda marcado sin vista previa (y se matan los procesos)
+
+# tipo: 'imagen' (imagen = PIL.Image ya cargada), 'texto' (texto = extracto) o 'ninguna' (texto = motivo)
+Previsualizacion = namedtuple('Previsualizacion', 'ruta tipo imagen texto')
+
+
+def tiene_previsualizacion(nombre):
+    return os.path.splitext(nombre)[1].lower() in EXTENSIONES_IMAGEN + EXTENSIONES_TEXTO
+
+
+# --- Generación (corre en los procesos del pool: funciones de módulo, sin estado) ---
+def _escribir_atomico(destino, escribir):
+    temporal = f"{destino}.{os.getpid()}.tmp"
+    try:
+        escribir(temporal)
+        os.replace(temporal, destino)
+    finally:
+        if os.path.exists(temporal):
+            os.remove(temporal)
+
+
+def _escribir_texto(destino, texto):
+    def escribir(temporal):
+        with open(temporal, 'w', encoding='utf-8') as f:
+            f.write(texto)
+    _escribir_atomico(destino, escribir)
+
+
+def generar_previsualizacion(ruta, extension, destino_base, lado_maximo=LADO_MAXIMO):
+    """ Escribe destino_base + '.png' / '.txt' / '.none' y devuelve esa ruta. """
+    if extension in EXTENSIONES_IMAGEN:
+        with Image.open(ruta) as img:
+            img.draft('RGB', (lado_maximo * 2, lado_maximo * 2)) # JPEG: decodifica ya reducido (mucho más rápido)
+            img = ImageOps.exif_transpose(img)
+            if img.mode not in ('RGB', 'RGBA'):
+                img = img.convert('RGBA' if 'A' in img.getbands() or img.mode == 'P' else 'RGB')
+            img.thumbnail((lado_maximo, lado_maximo), Image.Resampling.LANCZOS)
+            destino = destino_base + '.png'
+            _escribir_atomico(destino, lambda tmp: img.save(tmp, 'PNG', optimize=True))
+            return destino
+    if extension in EXTENSIONES_TEXTO:
+        estado, texto = extraer_texto(ruta, extension)
+        if estado == ESTADO_OK:
+            parrafos = [p.strip() for p in texto.split('\n') if p.strip()][:MAX_PARRAFOS_EXTRACTO]
+            extracto = '\n\n'.join(parrafos)[:MAX_CARACTERES_EXTRACTO]
+            destino = destino_base + '.txt'
+            _escribir_texto(destino, extracto)
+            return destino
+    destino = destino_base + '.none'
+    _escribir_texto(destino, '')
+    return destino
+
+
+# --- Caché en disco ---
+class CachePrevisualizaciones:
+    SUFIJOS = ('.png', '.txt', '.none')
+
+    def __init__(self, directorio, max_bytes=MAX_BYTES_CACHE):
+        self.directorio = directorio
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._total = None # Bytes ocupados; se calcula al primer uso (recorre la carpeta una vez)
+
+    @staticmethod
+    def clave(ruta, mtime_ns, tamano):
+        return hashlib.sha1(f"{os.path.normcase(os.path.abspath(ruta))}|{mtime_ns}|{tamano}".encode('utf-8')).hexdigest()
+
+    def ruta_base(self, clave):
+        return os.path.join(self.directorio, clave[:2], clave)
+
+    def buscar(self, clave):
+        base = self.ruta_base(clave)
+        for sufijo in self.SUFIJOS:
+            ruta = base + sufijo
+            try:
+                os.utime(ruta) # Marca de uso para el LRU (y de paso comprueba que existe)
+                return ruta
+            except OSError:
+                continue
+        return None
+
+    def preparar(self, clave):
+        os.makedirs(os.path.dirname(self.ruta_base(clave)), exist_ok=True)
+
+    def registrar(self, ruta):
+        """ Suma una entrada nueva y, si se pasa del tope, libera las menos usadas hasta quedar al 80%. """
+        try:
+            tamano = os.path.getsize(ruta)
+        except OSError:
+            return
+        with self._lock:
+            if self._total is None:
+                self._total = sum(e[2] for e in self._entradas())
+            else:
+                self._total += tamano
+            if self._total > self.max_bytes:
+                self._desalojar(int(self.max_bytes * 0.8))
+
+    def _entradas(self):
+        """ [(ultimo_uso, ruta, tamano)] de toda la caché. """
+        entradas = []
+        try:
+            subcarpetas = list(os.scandir(self.directorio))
+        except OSError:
+            return entradas
+        for sub in subcarpetas:
+            if not sub.is_dir(): continue
+            try:
+                with os.scandir(sub.path) as it:
+                    for entry in it:
+                        try:
+                            st = entry.stat()
+                        except OSError:
+                            continue
+                        entradas.append((st.st_mtime, entry.path, st.st_size))
+            except OSError:
+                continue
+        return entradas
+
+    def _desalojar(self, objetivo):
+        entradas = sorted(self._entradas())
+        self._total = sum(e[2] for e in entradas)
+        borrados = 0
+        for _uso, ruta, tamano in entradas:
+            if self._total <= objetivo: break
+            try:
+                os.remove(ruta)
+            except OSError:
+                continue
+            self._total -= tamano; borrados += 1
+        print(f"[Previsualización] Caché sobre el tope: {borrados} entradas liberadas ({self._total // 1024} KB en uso).")
+
+
+# --- Servicio ---
+class ServicioPrevisualizaciones:
+    """
+    obtener(ruta, token=None) -> Previsualizacion. Bloquea hasta tenerla (caché o generación), así que
+    se llama desde un hilo del cargador asíncrono; el objeto PhotoImage se arma luego en el hilo de Tk.
+    """
+
+    def __init__(self, directorio_cache, max_bytes=MAX_BYTES_CACHE, max_procesos=2):
+        self.cache = CachePrevisualizaciones(directorio_cache, max_bytes)
+        self.max_procesos = max_procesos
+        self._pool = None
+        self._lock = threading.Lock()
+        # Un turno por proceso: cada archivo se envía recién cuando hay un proceso libre, así su plazo
+        # corre desde que empieza a generarse y no mientras espera detrás de otros
+        self._turnos = threading.BoundedSemaphore(max_procesos)
+        self._pools_matados = weakref.WeakSet() # Matados por un colgado: a los demás archivos se les da otra oportunidad
+        self._cerrado = False
+        self.aciertos = 0
+        self.generadas = 0
+
+    def _pool_activo(self):
+        with self._lock:
+            if self._cerrado:
+                raise RuntimeError("servicio de previsualización cerrado")
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.max_procesos)
+            return self._pool
+
+    def obtener(self, ruta, token=None):
+        extension = os.path.splitext(ruta)[1].lower()
+        if extension not in EXTENSIONES_IMAGEN + EXTENSIONES_TEXTO:
+            return Previsualizacion(ruta, 'ninguna', None, "Sin vista previa para este tipo de archivo.")
+        try:
+            st = os.stat(ruta)
+        except OSError as e:
+            return Previsualizacion(ruta, 'ninguna', None, f"No se puede leer el archivo: {e.strerror or e}")
+        clave = self.cache.clave(ruta, st.st_mtime_ns, st.st_size)
+        archivo = self.cache.buscar(clave)
+        if archivo:
+            self.aciertos += 1
+        else:
+            if token is not None: token.verificar()
+            self.cache.preparar(clave)
+            archivo, fallida = self._generar(ruta, extension, clave, token)
+            if fallida is not None:
+                return fallida
+            self.generadas += 1
+            self.cache.registrar(archivo)
+        if token is not None: token.verificar()
+        return self._leer(ruta, archivo)
+
+    def _generar(self, ruta, extension, clave, token):
+        """ (archivo generado, None) o (None, Previsualizacion con el motivo). """
+        while not self._turnos.acquire(timeout=0.2):
+            if token is not None: token.verificar() # Un pedido abandonado no llega a ocupar un proceso
+        try:
+            for intento in range(2):
+                try:
+                    pool = self._pool_activo()
+                    futuro = pool.submit(generar_previsualizacion, ruta, extension, self.cache.ruta_base(clave))
+                    return futuro.result(timeout=TIMEOUT_GENERACION_S), None
+                except BrokenProcessPool:
+                    # Puede ser por otro archivo: no se marca este. Si fue porque se mató el pool por un
+                    # colgado, se reintenta una vez en el pool nuevo.
+                    self._descartar_pool(pool)
+                    if intento == 0 and pool in self._pools_matados: continue
+                    return None, Previsualizacion(ruta, 'ninguna', None, "No se pudo generar la vista previa.")
+                except RuntimeError as e: # Servicio cerrado
+                    return None, Previsualizacion(ruta, 'ninguna', None, f"No se pudo generar la vista previa: {e}")
+                except TimeoutError:
+                    self._descartar_pool(pool, matar=True)
+                    self._marcar_sin_previsualizacion(clave)
+                    return None, Previsualizacion(ruta, 'ninguna', None, f"La vista previa tardó más de {TIMEOUT_GENERACION_S} s; no se reintenta hasta que el archivo cambie.")
+                except Exception as e:
+                    self._marcar_sin_previsualizacion(clave) # Un archivo dañado no se vuelve a procesar cada vez que se lo selecciona
+                    return None, Previsualizacion(ruta, 'ninguna', None, f"No se pudo generar la vista previa: {e}")
+            return None, Previsualizacion(ruta, 'ninguna', None, "No se pudo generar la vista previa.")
+        finally:
+            self._turnos.release()
+
+    def _descartar_pool(self, pool, matar=False):
+        """ Se recrea en el próximo pedido. matar: un proceso colgado no termina con shutdown(). """
+        with self._lock:
+            if self._pool is not pool: return # Otro hilo ya lo reemplazó
+            self._pool = None
+        if matar:
+            self._pools_matados.add(pool)
+            for proceso in list((pool._processes or {}).values()):
+                proceso.kill()
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def _marcar_sin_previsualizacion(self, clave):
+        destino = self.cache.ruta_base(clave) + '.none'
+        try:
+            _escribir_texto(destino, '')
+        except OSError as e:
+            print(f"[Previsualización] No se pudo guardar la marca sin vista previa: {e}")
+            return
+        self.cache.registrar(destino)
+
+    @staticmethod
+    def _leer(ruta, archivo):
+        if archivo.endswith('.png'):
+            with Image.open(archivo) as img:
+                img.load()
+                return Previsualizacion(ruta, 'imagen', img.copy(), None)
+        if archivo.endswith('.txt'):
+            with open(archivo, encoding='utf-8') as f:
+                return Previsualizacion(ruta, 'texto', None, f.read())
+        return Previsualizacion(ruta, 'ninguna', None, "El archivo no tiene texto ni imagen para mostrar.")
+
+    def cerrar(self):
+        with self._lock:
+            self._cerrado = True
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,59 @@
+# registros.py
+# Representación compacta de filas de la BD, alternativa a [dict(row) for row in rows].
+# Cada registro es una tupla con nombre (sin __dict__ por instancia) que además acepta
+# el acceso estilo diccionario que usa el resto de la aplicación: reg['id'], reg.get('x').
+from collections import namedtuple
+
+_clases_por_campos = {}
+
+
+class _AccesoComoDict:
+    __slots__ = ()
+    _indices = {}
+
+    def __getitem__(self, clave):
+        if isinstance(clave, str):
+            try:
+                return tuple.__getitem__(self, self._indices[clave])
+            except KeyError:
+                raise KeyError(clave) from None
+        return tuple.__getitem__(self, clave)
+
+    def get(self, clave, default=None):
+        indice = self._indices.get(clave)
+        return default if indice is None else tuple.__getitem__(self, indice)
+
+    def __contains__(self, clave):
+        return clave in self._indices
+
+    def keys(self):
+        return self._fields
+
+    def values(self):
+        return tuple(self)
+
+    def items(self):
+        return zip(self._fields, self)
+
+    def copy(self):
+        """ Copia mutable como dict (p.ej. para pasar a código que modifica el registro). """
+        return dict(zip(self._fields, self))
+
+
+def clase_registro(nombre, campos):
+    """ Devuelve (y cachea) la clase de registro para una tabla/vista y una lista de columnas. """
+    campos = tuple(campos)
+    clave = (nombre, campos)
+    clase = _clases_por_campos.get(clave)
+    if clase is None:
+        base = namedtuple(f"Registro_{nombre}", campos)
+        clase = type(base.__name__, (_AccesoComoDict, base),
+                     {'__slots__': (), '_indices': {campo: i for i, campo in enumerate(campos)}})
+        _clases_por_campos[clave] = clase
+    return clase
+
+
+def filas_a_registros(cursor, rows, nombre):
+    """ Convierte las filas de un cursor ya ejecutado en registros compactos, usando cursor.description. """
+    clase = clase_registro(nombre, [d[0] for d in cursor.description])
+    return list(map(clase._make, rows))
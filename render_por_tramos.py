@@ -0,0 +1,101 @@
+# render_por_tramos.py
+# Procesa listas grandes en tramos cortos desde el loop de Tk (root.after), para que insertar
+# miles de filas no congele la ventana: cada tramo trabaja hasta agotar un presupuesto de
+# tiempo y cede el control para que Tk redibuje y atienda eventos.
+import time
+import tkinter as tk
+
+PRESUPUESTO_POR_DEFECTO_MS = 8
+# Cada cuánto se informa el progreso (en tramos), para no reconfigurar una etiqueta por tramo
+TRAMOS_POR_AVISO = 5
+
+
+class RenderizadorPorTramos:
+    """
+    Un renderizador por lista. iniciar() cancela la carga anterior (p.ej. al cambiar de caso),
+    así un tramo de una selección vieja nunca escribe sobre la nueva.
+      procesar(item): trabajo por elemento (típicamente tree.insert)
+      progreso(hechos, total): aviso periódico; total es None si no se conoce
+      al_terminar(hechos): al agotar los elementos (no se llama si se cancela)
+    """
+
+    def __init__(self, widget, presupuesto_ms=PRESUPUESTO_POR_DEFECTO_MS):
+        self.widget = widget
+        self.presupuesto = presupuesto_ms / 1000.0
+        self._generacion = 0
+        self._after_id = None
+        self._items = None
+        self.hechos = 0
+
+    @property
+    def activo(self):
+        return self._items is not None
+
+    def iniciar(self, items, procesar, al_terminar=None, progreso=None, total=None, primer_tramo_inmediato=True):
+        self.cancelar()
+        self._generacion += 1
+        self._items = iter(items)
+        self._procesar, self._al_terminar, self._progreso, self._total = procesar, al_terminar, progreso, total
+        self.hechos = 0
+        self._tramos = 0
+        generacion = self._generacion
+        if primer_tramo_inmediato:
+            # El primer tramo va en el mismo evento: lo visible aparece sin esperar un ciclo
+            self._tramo(generacion)
+        else:
+            self._after_id = self.widget.after_idle(lambda: self._tramo(generacion))
+        return generacion
+
+    def cancelar(self):
+        if self._after_id is not None:
+            try:
+                self.widget.after_cancel(self._after_id)
+            except tk.TclError:
+                pass
+            self._after_id = None
+        self._cerrar_items()
+
+    def _cerrar_items(self):
+        items, self._items = self._items, None
+        cerrar = getattr(items, 'close', None)
+        if cerrar: # Generadores: libera lo que tengan abierto (conexiones, scandir)
+            try:
+                cerrar()
+            except Exception as e:
+                print(f"[RenderizadorPorTramos] Error cerrando la carga cancelada: {e}")
+
+    def _tramo(self, generacion):
+        self._after_id = None
+        if generacion != self._generacion or self._items is None:
+            return
+        limite = time.perf_counter() + self.presupuesto
+        terminado = False
+        try:
+            while True:
+                try:
+                    item = next(self._items)
+                except StopIteration:
+                    terminado = True
+                    break
+                self._procesar(item)
+                self.hechos += 1
+                if time.perf_counter() >= limite:
+                    break
+        except tk.TclError as e: # El widget se destruyó en medio de la carga
+            print(f"[RenderizadorPorTramos] Carga interrumpida: {e}")
+            self._cerrar_items()
+            return
+        if generacion != self._generacion: # procesar() disparó otra carga
+            return
+        self._tramos += 1
+        if terminado:
+            self._items = None
+            if self._progreso:
+                self._progreso(self.hechos, self.hechos)
+            if self._al_terminar:
+                self._al_terminar(self.hechos)
+            return
+        if self._progreso and self._tramos % TRAMOS_POR_AVISO == 1:
+            self._progreso(self.hechos, self._total)
+        # after(1) y no after_idle: deja pasar los eventos de teclado/mouse entre tramos
+        self._after_id = self.widget.after(1, lambda: self._tramo(generacion))
@@ -2,6 +2,10 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
 import datetime
+from virtual_treeview import VirtualTreeview, FuenteLista
+from render_por_tramos import RenderizadorPorTramos
+
+COLUMNAS_LISTA_ACTIVIDADES = ('id', 'fecha_hora', 'tipo_actividad', 'descripcion_corta')
 
 class SeguimientoTab(ttk.Frame):
     def __init__(self, parent, app_controller, *args, **kwargs):
@@ -9,6 +13,7 @@ class SeguimientoTab(ttk.Frame):
         self.app_controller = app_controller
         self.db_crm = self.app_controller.db_crm
         self.selected_actividad_id = None
+        self._caso_id_cargado = None
         self._create_widgets()
 
     def _create_widgets(self):
@@ -33,7 +38,9 @@ class SeguimientoTab(ttk.Frame):
         tree_frame.rowconfigure(1, weight=0)
 
         actividad_cols = ('ID', 'Fecha/Hora', 'Tipo', 'Descripción Resumida')
-        self.actividad_tree = ttk.Treeview(tree_frame, columns=actividad_cols, show='headings', selectmode='browse')
+        # Lista virtual: un caso con miles de actividades solo materializa las filas visibles
+        self.actividad_tree = VirtualTreeview(tree_frame, actividad_cols, self._formatear_fila_actividad, prefijo_iid='act_',
+                                              columnas_orden={'ID': 'id', 'Fecha/Hora': 'fecha_hora', 'Tipo': 'tipo_actividad'})
         self.actividad_tree.heading('ID', text='ID')
         self.actividad_tree.heading('Fecha/Hora', text='Fecha y Hora')
         self.actividad_tree.heading('Tipo', text='Tipo Actividad')
@@ -44,17 +51,15 @@ class SeguimientoTab(ttk.Frame):
         self.actividad_tree.column('Tipo', width=120, stretch=tk.NO)
         self.actividad_tree.column('Descripción Resumida', width=300, stretch=True) # Ajustar ancho si es necesario
 
-        actividad_scrollbar_y = ttk.Scrollbar(tree_frame, orient=tk.VERTICAL, command=self.actividad_tree.yview)
-        self.actividad_tree.configure(yscrollcommand=actividad_scrollbar_y.set)
-        actividad_scrollbar_y.grid(row=0, column=1, sticky='ns')
-
-        actividad_scrollbar_x = ttk.Scrollbar(tree_frame, orient=tk.HORIZONTAL, command=self.actividad_tree.xview)
-        self.actividad_tree.configure(xscrollcommand=actividad_scrollbar_x.set)
-        actividad_scrollbar_x.grid(row=1, column=0, sticky='ew')
-
-        self.actividad_tree.grid(row=0, column=0, sticky='nsew')
+        self.actividad_tree.grid(row=0, column=0, rowspan=2, sticky='nsew')
         self.actividad_tree.bind('<<TreeviewSelect>>', self.on_actividad_select_treeview)
-        self.actividad_tree.bind("<Double-1>", self._on_double_click_editar)
+        self.actividad_tree.tree.bind("<Double-1>", self._on_double_click_editar)
+
+        # Aviso de progreso mientras se leen por tramos los casos con muchas actividades
+        self.progreso_lbl = ttk.Label(tree_frame, text="", foreground="gray")
+        self.progreso_lbl.grid(row=2, column=0, sticky='w')
+        self.progreso_lbl.grid_remove()
+        self.renderizador = RenderizadorPorTramos(self)
 
         # --- Actions Frame (dentro del panel izquierdo) ---
         actions_frame = ttk.Frame(left_panel) # Cambiado el parent a left_panel
@@ -125,36 +130,72 @@ class SeguimientoTab(ttk.Frame):
             if self.selected_actividad_id:
                  self._open_edit_actividad_dialog_wrapper()
 
-    def load_actividades(self, caso_id):
-        for i in self.actividad_tree.get_children():
-            self.actividad_tree.delete(i)
+    def _formatear_fila_actividad(self, act):
+        # Se llama solo para las filas que se materializan en pantalla
+        try:
+            # Asumiendo que la fecha viene como YYYY-MM-DD HH:MM:SS desde la BD
+            # y se quiere mostrar como DD-MM-YYYY HH:MM
+            fecha_hora_dt = datetime.datetime.strptime(act['fecha_hora'], "%Y-%m-%d %H:%M:%S")
+            fecha_hora_display = fecha_hora_dt.strftime("%d-%m-%Y %H:%M")
+        except (ValueError, TypeError):
+            # Si falla el parseo (quizás ya está en otro formato o es solo fecha)
+            fecha_hora_display = act['fecha_hora']
+
+        desc_completa = act.get('descripcion_corta') or act.get('descripcion', '') or ''
+        desc_resumida = (desc_completa[:75] + '...') if len(desc_completa) > 75 else desc_completa
+        return (act['id'], fecha_hora_display, act.get('tipo_actividad', 'N/A'), desc_resumida)
 
+    def load_actividades(self, caso_id):
+        self._caso_id_cargado = caso_id
         self.selected_actividad_id = None
         self.limpiar_detalle_completo_actividad()
 
+        self.renderizador.cancelar() # Una carga en curso de otro caso no sigue escribiendo
+        self.progreso_lbl.grid_remove()
         if caso_id:
-            actividades = self.db_crm.get_actividades_by_caso_id(caso_id, order_desc=True)
-            for act in actividades:
-                try:
-                    # Asumiendo que la fecha viene como YYYY-MM-DD HH:MM:SS desde la BD
-                    # y se quiere mostrar como DD-MM-YYYY HH:MM
-                    fecha_hora_dt = datetime.datetime.strptime(act['fecha_hora'], "%Y-%m-%d %H:%M:%S")
-                    fecha_hora_display = fecha_hora_dt.strftime("%d-%m-%Y %H:%M")
-                except ValueError:
-                     # Si falla el parseo (quizás ya está en otro formato o es solo fecha)
-                    fecha_hora_display = act['fecha_hora']
-
-
-                desc_completa = act.get('descripcion', '')
-                desc_resumida = (desc_completa[:75] + '...') if len(desc_completa) > 75 else desc_completa
-
-                item_iid = f"act_{act['id']}"
-
-                self.actividad_tree.insert('', tk.END, values=(
-                    act['id'], fecha_hora_display, act.get('tipo_actividad', 'N/A'), desc_resumida
-                ), iid=item_iid)
+            # Solo las columnas que muestra la lista; el detalle completo se pide al seleccionar.
+            # Se lee en lotes por tramos de tiempo: la primera pantalla aparece enseguida y el resto
+            # se agrega sin congelar la ventana.
+            fuente = FuenteLista([], orden=('fecha_hora', True))
+            self.actividad_tree.set_fuente(fuente)
+            lotes = self.db_crm.iter_lotes_actividades_by_caso_id(caso_id, order_desc=True, columnas=COLUMNAS_LISTA_ACTIVIDADES)
+            self.renderizador.iniciar(lotes, fuente.extender,
+                                      progreso=self._progreso_carga_actividades,
+                                      al_terminar=lambda hechos: self._fin_carga_actividades(),
+                                      total=self.db_crm.contar_actividades_caso(caso_id))
+        else:
+            self.actividad_tree.limpiar()
         self._update_action_buttons_state()
 
+    def _progreso_carga_actividades(self, hechos, total):
+        self.actividad_tree.refrescar() # Crece la barra de desplazamiento; la ventana visible no cambia
+        cargadas = self.actividad_tree.cantidad()
+        if total and cargadas < total:
+            self.progreso_lbl.config(text=f"Cargando actividades... {cargadas} de {total}")
+            self.progreso_lbl.grid()
+
+    def _fin_carga_actividades(self):
+        self.actividad_tree.aplicar_orden_actual() # Los lotes llegan en el orden de la BD
+        self.actividad_tree.refrescar()
+        self.progreso_lbl.grid_remove()
+
+    def actualizar_actividad(self, actividad_id, seleccionar=False):
+        """ Tras guardar una actividad: relee solo esa y actualiza su fila sin recargar la lista. """
+        act = self.db_crm.get_actividad_by_id(actividad_id)
+        if not act:
+            self.quitar_actividad(actividad_id)
+            return
+        if act.get('caso_id') != self._caso_id_cargado:
+            return # Es de otro caso (o la pestaña todavía no se cargó): se verá al cargarla
+        registro = {'id': act['id'], 'fecha_hora': act.get('fecha_hora'), 'tipo_actividad': act.get('tipo_actividad'),
+                    'descripcion_corta': (act.get('descripcion') or '')[:120]}
+        self.actividad_tree.actualizar_registro(registro, seleccionar=seleccionar)
+        if self.selected_actividad_id == actividad_id:
+            self.mostrar_detalle_completo_actividad(actividad_id)
+
+    def quitar_actividad(self, actividad_id):
+        self.actividad_tree.quitar_registro(actividad_id) # Si estaba seleccionada se limpia el detalle
+
 
     def on_actividad_select_treeview(self, event=None):
         selected_items = self.actividad_tree.selection()
@@ -221,13 +262,36 @@ class SeguimientoTab(ttk.Frame):
             texto += f"Tipo de Actividad: {act_details.get('tipo_actividad', 'N/A')}\n"
             if act_details.get('referencia_documento'):
                 texto += f"Referencia Documento: {act_details['referencia_documento']}\n"
-            texto += f"-------------------------\nDescripción Detallada:\n{act_details.get('descripcion', 'Sin descripción.')}"
+                indice = getattr(self.app_controller, 'indice_documentos', None)
+                if indice is not None: # Se resuelve contra el índice de documentos del caso
+                    ruta = indice.resolver_referencia(act_details['caso_id'], act_details['referencia_documento'])
+                    texto += f"  -> {ruta}\n" if ruta else "  -> (no se encuentra en la carpeta del caso)\n"
+            interaccion = None
+            if (act_details.get('tipo_actividad') or '').startswith(self.db_crm.PREFIJO_ACTIVIDAD_IA):
+                interaccion = self.db_crm.get_interaccion_ia_por_actividad(actividad_id)
+            if interaccion: # El texto completo está comprimido en interacciones_ia; la descripción es solo la referencia
+                texto += self._texto_interaccion_ia(interaccion)
+            else:
+                texto += f"-------------------------\nDescripción Detallada:\n{act_details.get('descripcion', 'Sin descripción.')}"
             self.actividad_detail_text.insert('1.0', texto)
         else:
             self.actividad_detail_text.insert('1.0', "Detalles de la actividad no encontrados o no disponibles.")
 
         self.actividad_detail_text.config(state=tk.DISABLED)
 
+    def _texto_interaccion_ia(self, interaccion):
+        datos = [f"Interacción IA #{interaccion['id']}"]
+        if interaccion['modelo']: datos.append(f"modelo {interaccion['modelo']}")
+        if interaccion['latencia_ms'] is not None: datos.append(f"{interaccion['latencia_ms'] / 1000:.1f} s")
+        if interaccion['tokens_consulta'] is not None:
+            datos.append(f"~{interaccion['tokens_consulta']} tokens de consulta, ~{interaccion['tokens_respuesta']} de respuesta")
+        texto = " · ".join(datos) + "\n"
+        texto += f"-------------------------\nConsulta ({interaccion['tipo_consulta']}):\n{interaccion['consulta']}\n"
+        if interaccion['contexto']:
+            texto += f"-------------------------\nContexto del caso enviado:\n{interaccion['contexto']}\n"
+        texto += f"-------------------------\nRespuesta del Asistente IA:\n{interaccion['respuesta']}"
+        return texto
+
     def limpiar_detalle_completo_actividad(self):
         if not hasattr(self, 'actividad_detail_text'): return
         self.actividad_detail_text.config(state=tk.NORMAL)
@@ -0,0 +1,299 @@
+# servidor_ia_simulado.py
+# Servidor Flask que imita al Asistente IA local (mcp_server.py sobre Ollama/LM Studio) para probar y
+# medir la integración sin un modelo: mismos endpoints y formatos que usa cliente_ia, con latencia,
+# errores y límites de capacidad configurables. El texto devuelto es un eco transformado de la entrada.
+#   python servidor_ia_simulado.py --puerto 5000 --latencia-ms 800 --paralelo 2 --tasa-error 0.05
+# y en la aplicación CRM_IA_URL=http://localhost:5000 (es el valor por defecto).
+# Capacidad, como Ollama: 'paralelo' pedidos generan a la vez, hasta 'max_cola' esperan su turno y el
+# resto recibe 503 con Retry-After.
+# /api/embeddings devuelve vectores deterministas (palabras y trigramas de caracteres dispersados en
+# 'dimension_embeddings' componentes, con unos pocos sinónimos jurídicos unificados): textos parecidos dan
+# vectores parecidos, suficiente para probar el índice semántico sin un modelo de embeddings.
+import argparse
+import json
+import logging
+import random
+import re
+import socket
+import threading
+import time
+import unicodedata
+import zlib
+
+import numpy as np
+from flask import Flask, Response, jsonify, request
+from werkzeug.serving import make_server
+
+MS_POR_TOKEN = 15
+DIMENSION_EMBEDDINGS = 256
+MAX_TEXTOS_EMBEDDINGS = 256
+# Grupos de expresiones equivalentes: todas se reemplazan por la primera antes de vectorizar
+SINONIMOS_SIMULADOS = (
+    ('despido', 'desvinculacion', 'cesantia', 'distracto', 'despidio', 'despedido', 'despedida', 'desvinculado', 'desvinculada'),
+    ('injustificado', 'injustificada', 'sin causa', 'sin justa causa', 'incausado', 'incausada', 'arbitrario', 'arbitraria'),
+    ('accidente', 'siniestro', 'infortunio'),
+    ('indemnizacion', 'resarcimiento', 'reparacion'),
+    ('demanda', 'reclamo judicial', 'accion judicial'),
+    ('audiencia', 'comparendo'),
+    ('telegrama', 'carta documento', 'intimacion'),
+)
+
+
+class ConfiguracionSimulador:
+    def __init__(self, latencia_ms=300, jitter_ms=100, ms_por_token=MS_POR_TOKEN, paralelo=2, max_cola=16,
+                 tasa_error=0.0, tasa_colgado=0.0, segundos_colgado=120, tasa_corte=0.0, formato_stream='sse', semilla=None,
+                 dimension_embeddings=DIMENSION_EMBEDDINGS):
+        self.latencia_ms = latencia_ms # Hasta el primer token (procesar el prompt)
+        self.jitter_ms = jitter_ms
+        self.ms_por_token = ms_por_token # Generación de cada token (palabra) siguiente
+        self.paralelo = paralelo
+        self.max_cola = max_cola
+        self.tasa_error = tasa_error # Probabilidad de contestar 500
+        self.tasa_colgado = tasa_colgado # Probabilidad de no contestar en segundos_colgado (para probar timeouts)
+        self.segundos_colgado = segundos_colgado
+        self.tasa_corte = tasa_corte # Probabilidad de cortar un stream a la mitad
+        self.formato_stream = formato_stream # 'sse', 'ndjson' o 'texto'
+        self.dimension_embeddings = dimension_embeddings
+        self.random = random.Random(semilla)
+
+
+class EstadisticasSimulador:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.valores = {'recibidos': 0, 'completados': 0, 'rechazados_503': 0, 'errores_500': 0, 'colgados': 0,
+                        'cortados': 0, 'en_curso': 0, 'en_cola': 0, 'max_simultaneos': 0}
+
+    def sumar(self, clave, cantidad=1):
+        with self._lock:
+            self.valores[clave] += cantidad
+            if clave == 'en_curso':
+                self.valores['max_simultaneos'] = max(self.valores['max_simultaneos'], self.valores['en_curso'])
+
+    def copia(self):
+        with self._lock:
+            return dict(self.valores)
+
+
+def _tokens_respuesta(prefijo, texto):
+    palabras = re.findall(r'\S+', texto) or ["(sin", "texto)"]
+    return [prefijo] + [f" {p}" for p in palabras]
+
+
+def estimar_lineas(texto):
+    return sum(1 for l in texto.splitlines() if l.strip())
+
+
+def _normalizar(texto):
+    texto = unicodedata.normalize('NFKD', texto.lower())
+    texto = ''.join(c for c in texto if not unicodedata.combining(c))
+    texto = ' ' + ' '.join(re.findall(r'\w+', texto)) + ' '
+    for grupo in SINONIMOS_SIMULADOS:
+        for variante in grupo[1:]:
+            texto = texto.replace(f" {variante} ", f" {grupo[0]} ")
+    return texto.strip()
+
+
+def vector_simulado(texto, dimension=DIMENSION_EMBEDDINGS):
+    """ Vector float32 normalizado (hashing de palabras y trigramas con signo). """
+    vector = np.zeros(dimension, dtype=np.float32)
+    palabras = _normalizar(texto).split()
+    rasgos = [(p, 1.0) for p in palabras if len(p) > 2]
+    rasgos += [(p[i:i + 3], 0.4) for p in palabras if len(p) > 3 for i in range(len(p) - 2)]
+    for rasgo, peso in rasgos:
+        h = zlib.crc32(rasgo.encode('utf-8'))
+        vector[h % dimension] += peso if h & 0x80000000 else -peso
+    norma = float(np.linalg.norm(vector))
+    return vector / norma if norma else vector
+
+
+def crear_app(config=None):
+    config = config or ConfiguracionSimulador()
+    stats = EstadisticasSimulador()
+    turnos = threading.BoundedSemaphore(config.paralelo)
+    lock_cola = threading.Lock()
+    app = Flask(__name__)
+    app.config['SIMULADOR'] = config
+    app.config['ESTADISTICAS'] = stats
+
+    def sortear(tasa):
+        return tasa > 0 and config.random.random() < tasa
+
+    def esperar_turno():
+        """ True si consiguió turno de generación; False si la cola estaba llena. """
+        with lock_cola:
+            if turnos.acquire(blocking=False):
+                stats.sumar('en_curso'); return True
+            if stats.copia()['en_cola'] >= config.max_cola:
+                return False
+            stats.sumar('en_cola')
+        turnos.acquire()
+        stats.sumar('en_cola', -1); stats.sumar('en_curso')
+        return True
+
+    def liberar_turno():
+        stats.sumar('en_curso', -1)
+        turnos.release()
+
+    def demora_inicial():
+        return max(0.0, (config.latencia_ms + config.random.uniform(-config.jitter_ms, config.jitter_ms)) / 1000)
+
+    def responder(prefijo, texto, campo):
+        stats.sumar('recibidos')
+        if not esperar_turno():
+            stats.sumar('rechazados_503')
+            return Response("El modelo está ocupado; reintente en unos segundos.", status=503, headers={'Retry-After': '2'})
+        en_stream = False
+        try:
+            if sortear(config.tasa_colgado):
+                stats.sumar('colgados'); time.sleep(config.segundos_colgado)
+            time.sleep(demora_inicial())
+            if sortear(config.tasa_error):
+                stats.sumar('errores_500')
+                return jsonify({'error': "Error simulado del modelo."}), 500
+            tokens = _tokens_respuesta(prefijo, texto)
+            datos = request.get_json(silent=True) or {}
+            if not datos.get('stream'):
+                time.sleep(len(tokens) * config.ms_por_token / 1000)
+                stats.sumar('completados')
+                return jsonify({campo: ''.join(tokens)})
+            en_stream = True
+            return _respuesta_stream(tokens)
+        finally:
+            if not en_stream: liberar_turno()
+
+    def _respuesta_stream(tokens):
+        cortar_en = len(tokens) // 2 if sortear(config.tasa_corte) else None
+        formato = config.formato_stream
+        conexion = request.environ.get('werkzeug.socket') # El generador corre fuera del contexto del pedido
+
+        def generar():
+            try:
+                for n, token in enumerate(tokens):
+                    if n == cortar_en:
+                        # Corte real, como un servidor caído: se cierra el socket sin el chunk final, así ni
+                        # el texto plano llega como una respuesta terminada. La excepción hace que werkzeug
+                        # lo trate como una conexión perdida y no intente escribir nada más.
+                        stats.sumar('cortados')
+                        if conexion is not None:
+                            try:
+                                conexion.shutdown(socket.SHUT_RDWR)
+                            except OSError:
+                                pass
+                        raise ConnectionAbortedError("corte simulado del stream")
+                    if n: time.sleep(config.ms_por_token / 1000)
+                    if formato == 'sse': yield f"data: {json.dumps({'delta': token}, ensure_ascii=False)}\n\n"
+                    elif formato == 'ndjson': yield json.dumps({'response': token, 'done': False}, ensure_ascii=False) + "\n"
+                    else: yield token
+                if formato == 'sse': yield "data: [DONE]\n\n"
+                elif formato == 'ndjson': yield json.dumps({'response': '', 'done': True}) + "\n"
+                stats.sumar('completados')
+            finally:
+                liberar_turno()
+        tipos = {'sse': 'text/event-stream', 'ndjson': 'application/x-ndjson', 'texto': 'text/plain; charset=utf-8'}
+        return Response(generar(), mimetype=tipos.get(formato, 'text/plain'), headers={'Cache-Control': 'no-cache'})
+
+    @app.post('/api/reformular_hechos')
+    def reformular_hechos():
+        datos = request.get_json(silent=True) or {}
+        if not (datos.get('texto_hechos') or '').strip():
+            return jsonify({'error': "No se recibió 'texto_hechos'."}), 400
+        contexto = datos.get('contexto_caso') or ''
+        prefijo = f"HECHOS (reformulación simulada, con {estimar_lineas(contexto)} líneas de contexto del caso):" if contexto else "HECHOS (reformulación simulada):"
+        return responder(prefijo, datos['texto_hechos'], 'hechos_reformulados')
+
+    @app.post('/api/resumir_actividades')
+    def resumir_actividades():
+        datos = request.get_json(silent=True) or {}
+        if not (datos.get('texto_actividades') or '').strip():
+            return jsonify({'error': "No se recibió 'texto_actividades'."}), 400
+        lineas = [l for l in datos['texto_actividades'].splitlines() if l.strip()]
+        return responder(f"RESUMEN (simulado) de {len(lineas)} actividades:", ' '.join(lineas)[:2000], 'resumen')
+
+    @app.post('/api/embeddings')
+    def embeddings():
+        datos = request.get_json(silent=True) or {}
+        textos = datos.get('textos')
+        if not isinstance(textos, list) or not textos or len(textos) > MAX_TEXTOS_EMBEDDINGS:
+            return jsonify({'error': f"Se esperaba 'textos': lista de 1 a {MAX_TEXTOS_EMBEDDINGS} textos."}), 400
+        stats.sumar('recibidos')
+        if not esperar_turno():
+            stats.sumar('rechazados_503')
+            return Response("El modelo está ocupado; reintente en unos segundos.", status=503, headers={'Retry-After': '2'})
+        try:
+            time.sleep(demora_inicial() / 10) # Un modelo de embeddings es mucho más rápido que uno generativo
+            if sortear(config.tasa_error):
+                stats.sumar('errores_500')
+                return jsonify({'error': "Error simulado del modelo."}), 500
+            vectores = [vector_simulado(str(t), config.dimension_embeddings).tolist() for t in textos]
+            stats.sumar('completados')
+            return jsonify({'embeddings': vectores, 'modelo': f"simulado-{config.dimension_embeddings}"})
+        finally:
+            liberar_turno()
+
+    @app.get('/api/estado')
+    def estado():
+        return jsonify(stats.copia())
+
+    return app
+
+
+class ServidorEnHilo:
+    """ Levanta la app en un hilo (para pruebas y bench_cliente_ia). puerto=0 elige uno libre. """
+
+    def __init__(self, config=None, host='127.0.0.1', puerto=0, silencioso=True):
+        if silencioso:
+            logging.getLogger('werkzeug').setLevel(logging.ERROR) # Sin una línea de log por pedido
+        self.app = crear_app(config)
+        self._servidor = make_server(host, puerto, self.app, threaded=True)
+        self.url = f"http://{host}:{self._servidor.server_port}"
+        self._hilo = threading.Thread(target=self._servidor.serve_forever, daemon=True, name="servidor_ia_simulado")
+
+    @property
+    def estadisticas(self):
+        return self.app.config['ESTADISTICAS'].copia()
+
+    def iniciar(self):
+        self._hilo.start()
+        return self
+
+    def detener(self):
+        self._servidor.shutdown()
+
+
+def argumentos_configuracion(parser):
+    """ Opciones del simulador, compartidas con bench_cliente_ia. """
+    parser.add_argument('--latencia-ms', type=float, default=300, help="demora hasta el primer token")
+    parser.add_argument('--jitter-ms', type=float, default=100)
+    parser.add_argument('--ms-por-token', type=float, default=MS_POR_TOKEN)
+    parser.add_argument('--paralelo', type=int, default=2, help="pedidos que generan a la vez")
+    parser.add_argument('--max-cola', type=int, default=16, help="pedidos en espera antes de contestar 503")
+    parser.add_argument('--tasa-error', type=float, default=0.0, help="probabilidad de 500")
+    parser.add_argument('--tasa-colgado', type=float, default=0.0, help="probabilidad de no contestar (timeout)")
+    parser.add_argument('--segundos-colgado', type=float, default=120)
+    parser.add_argument('--tasa-corte', type=float, default=0.0, help="probabilidad de cortar un stream")
+    parser.add_argument('--formato-stream', choices=('sse', 'ndjson', 'texto'), default='sse')
+    parser.add_argument('--semilla', type=int, default=None)
+    parser.add_argument('--dimension-embeddings', type=int, default=DIMENSION_EMBEDDINGS)
+
+
+def configuracion_desde(args):
+    return ConfiguracionSimulador(latencia_ms=args.latencia_ms, jitter_ms=args.jitter_ms, ms_por_token=args.ms_por_token,
+                                  paralelo=args.paralelo, max_cola=args.max_cola, tasa_error=args.tasa_error,
+                                  tasa_colgado=args.tasa_colgado, segundos_colgado=args.segundos_colgado,
+                                  tasa_corte=args.tasa_corte, formato_stream=args.formato_stream, semilla=args.semilla,
+                                  dimension_embeddings=args.dimension_embeddings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor simulado del Asistente IA para pruebas sin modelo.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--puerto', type=int, default=5000)
+    argumentos_configuracion(parser)
+    args = parser.parse_args()
+    app = crear_app(configuracion_desde(args))
+    print(f"Asistente IA simulado en http://{args.host}:{args.puerto} (estadísticas en /api/estado)")
+    app.run(host=args.host, port=args.puerto, threaded=True)
+
+
+if __name__ == "__main__":
+    main()
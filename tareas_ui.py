@@ -2,6 +2,10 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
 import datetime # Lo necesitaremos para formatear fechas si es necesario
+from treeview_sync import SincronizadorTreeview
+
+ESTADOS_TAREA_CERRADA = ("Completada", "Cancelada")
+_ORDEN_PRIORIDAD = {'Alta': 1, 'Media': 2, 'Baja': 3}
 
 class TareasTab(ttk.Frame):
     def __init__(self, parent, app_controller, *args, **kwargs):
@@ -9,6 +13,8 @@ class TareasTab(ttk.Frame):
         self.app_controller = app_controller
         self.db_crm = self.app_controller.db_crm # Acceso al módulo de base de datos
         self.selected_tarea_id = None # Para guardar el ID de la tarea seleccionada en el treeview
+        self._caso_id_cargado = None
+        self._tareas_modelo = [] # Tareas mostradas, en el mismo orden que el Treeview
 
         self._create_widgets()
 
@@ -69,6 +75,7 @@ class TareasTab(ttk.Frame):
 
         self.tareas_tree.grid(row=0, column=0, sticky='nsew')
         self.tareas_tree.bind('<<TreeviewSelect>>', self.on_tarea_select_treeview)
+        self.sincronizador_tareas = SincronizadorTreeview(self.tareas_tree)
         self.tareas_tree.bind("<Double-1>", self._on_double_click_editar_tarea) # Para editar con doble clic
 
         # --- Botones de Acción para Tareas ---
@@ -128,11 +135,7 @@ class TareasTab(ttk.Frame):
         Si caso_id es None y mostrar_solo_pendientes_activas es True, podría cargar tareas generales pendientes.
         (Por ahora, nos enfocaremos en tareas por caso_id si se provee, o nada si no se provee)
         """
-        for i in self.tareas_tree.get_children():
-            self.tareas_tree.delete(i)
-
-        self.selected_tarea_id = None # Resetear selección
-        self.limpiar_detalle_completo_tarea() # Limpiar panel de detalles
+        mismo_caso = caso_id is not None and caso_id == self._caso_id_cargado
 
         tareas_a_mostrar = []
         if caso_id:
@@ -145,29 +148,62 @@ class TareasTab(ttk.Frame):
             # print(f"[TareasTab] Cargando tareas generales pendientes/activas.")
             # pass
 
+        self._caso_id_cargado = caso_id
+        self._tareas_modelo = list(tareas_a_mostrar)
+        self._sincronizar_lista()
 
-        for tarea in tareas_a_mostrar:
-            item_iid = f"tarea_{tarea['id']}" # IID único para el treeview item
-            
-            # Formatear fecha de vencimiento para mejor visualización (ej. manejar Nones)
-            fecha_venc_display = tarea.get('fecha_vencimiento', '')
-            if fecha_venc_display:
-                try:
-                    # Asumimos que la BD guarda YYYY-MM-DD
-                    fv_dt = datetime.datetime.strptime(fecha_venc_display, "%Y-%m-%d")
-                    fecha_venc_display = fv_dt.strftime("%d-%m-%Y") # Mostrar en formato más legible
-                except ValueError:
-                    pass # Dejar como está si no se puede parsear (aunque debería estar bien desde la BD)
-            
-            self.tareas_tree.insert('', tk.END, values=(
-                tarea['id'],
-                tarea.get('descripcion', 'N/A')[:100], # Limitar descripción en el treeview
-                fecha_venc_display,
-                tarea.get('prioridad', 'N/A'),
-                tarea.get('estado', 'N/A')
-            ), iid=item_iid)
-        
-        self._update_action_buttons_state()
+        if mismo_caso:
+            self.on_tarea_select_treeview() # Recargando el mismo caso se conserva la tarea seleccionada
+        else:
+            self.selected_tarea_id = None # Resetear selección
+            self.limpiar_detalle_completo_tarea() # Limpiar panel de detalles
+            self._update_action_buttons_state()
+
+    @staticmethod
+    def _clave_orden_tarea(tarea):
+        # Mismo orden que get_tareas_by_caso_id(orden="fecha_vencimiento_asc")
+        fecha = tarea.get('fecha_vencimiento')
+        return (fecha is None, fecha or '', _ORDEN_PRIORIDAD.get(tarea.get('prioridad'), 4))
+
+    def _fila_tarea(self, tarea):
+        item_iid = f"tarea_{tarea['id']}" # IID único para el treeview item
+
+        # Formatear fecha de vencimiento para mejor visualización (ej. manejar Nones)
+        fecha_venc_display = tarea.get('fecha_vencimiento', '')
+        if fecha_venc_display:
+            try:
+                # Asumimos que la BD guarda YYYY-MM-DD
+                fv_dt = datetime.datetime.strptime(fecha_venc_display, "%Y-%m-%d")
+                fecha_venc_display = fv_dt.strftime("%d-%m-%Y") # Mostrar en formato más legible
+            except ValueError:
+                pass # Dejar como está si no se puede parsear (aunque debería estar bien desde la BD)
+
+        return (item_iid, (
+            tarea['id'],
+            (tarea.get('descripcion') or 'N/A')[:100], # Limitar descripción en el treeview
+            fecha_venc_display or '',
+            tarea.get('prioridad', 'N/A'),
+            tarea.get('estado', 'N/A')
+        ))
+
+    def _sincronizar_lista(self):
+        # Solo se aplican a Tk las filas que cambiaron; se mantiene el desplazamiento
+        self.sincronizador_tareas.sincronizar([self._fila_tarea(t) for t in self._tareas_modelo])
+
+    def actualizar_tarea(self, tarea_id):
+        """ Tras guardar una tarea: relee solo esa tarea y actualiza su fila (o la quita si ya no corresponde). """
+        tarea = self.db_crm.get_tarea_by_id(tarea_id)
+        self._tareas_modelo = [t for t in self._tareas_modelo if t['id'] != tarea_id]
+        if tarea and tarea.get('caso_id') == self._caso_id_cargado and tarea.get('estado') not in ESTADOS_TAREA_CERRADA:
+            self._tareas_modelo.append(tarea)
+            self._tareas_modelo.sort(key=self._clave_orden_tarea)
+        self._sincronizar_lista()
+        self.on_tarea_select_treeview()
+
+    def quitar_tarea(self, tarea_id):
+        self._tareas_modelo = [t for t in self._tareas_modelo if t['id'] != tarea_id]
+        self.sincronizador_tareas.quitar_fila(f"tarea_{tarea_id}")
+        self.on_tarea_select_treeview()
 
     def on_tarea_select_treeview(self, event=None):
         """ Maneja la selección de un item en el Treeview de tareas. """
@@ -0,0 +1,232 @@
+# trabajos_ia_ui.py
+# Ventana de la cola de trabajos del Asistente IA (ver cola_ia): elegir una operación y los casos a los
+# que aplicarla, y seguir el avance de cada lote. La cola sigue trabajando con la ventana cerrada; las
+# consultas a la BD corren en el cargador asíncrono.
+import tkinter as tk
+from tkinter import ttk, messagebox
+
+import crm_database as db
+from cola_ia import OPERACIONES
+
+DEMORA_REFRESCO_MS = 300
+ESTADOS = {'pendiente': "Pendiente", 'en_curso': "En curso", 'hecho': "Hecho", 'error': "Error",
+           'omitido': "Omitido", 'cancelado': "Cancelado"}
+
+
+class TrabajosIAWindow(tk.Toplevel):
+    CANAL_CASOS = 'trabajos_ia:casos'
+    CANAL_PROGRESO = 'trabajos_ia:progreso'
+
+    def __init__(self, parent, app_controller, *args, **kwargs):
+        super().__init__(parent, *args, **kwargs)
+        self.app_controller = app_controller
+        self.cola = app_controller.cola_ia
+        self.operacion_var = tk.StringVar(value=next(iter(OPERACIONES.values())))
+        self.filtro_var = tk.StringVar()
+        self.lote_var = tk.StringVar()
+        self._casos = [] # [(id, caratula, cliente)]
+        self._caso_de_trabajo = {} # {iid de trabajo: caso_id}
+        self._after_refresco = None
+
+        self.title("Trabajos del Asistente IA por Lotes")
+        self.geometry("860x680")
+        self.minsize(640, 480)
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
+
+        self._create_widgets()
+        self._cargar_casos()
+        self.refrescar()
+
+    def _create_widgets(self):
+        self.columnconfigure(0, weight=1)
+        self.rowconfigure(0, weight=1)
+        self.rowconfigure(1, weight=1)
+
+        # --- Nuevo lote ---
+        nuevo = ttk.LabelFrame(self, text="Nuevo Lote", padding=10)
+        nuevo.grid(row=0, column=0, sticky='nsew', padx=10, pady=(10, 5))
+        nuevo.columnconfigure(3, weight=1)
+        nuevo.rowconfigure(1, weight=1)
+        ttk.Label(nuevo, text="Operación:").grid(row=0, column=0, padx=(0, 5))
+        ttk.Combobox(nuevo, textvariable=self.operacion_var, values=list(OPERACIONES.values()), state='readonly', width=36).grid(row=0, column=1, sticky=tk.W)
+        ttk.Label(nuevo, text="Filtrar:").grid(row=0, column=2, padx=(15, 5))
+        ttk.Entry(nuevo, textvariable=self.filtro_var).grid(row=0, column=3, sticky='ew')
+        self.filtro_var.trace_add('write', lambda *_: self._mostrar_casos())
+
+        self.casos_tree = ttk.Treeview(nuevo, columns=('Cliente',), show='tree headings', selectmode='extended', height=8)
+        self.casos_tree.heading('#0', text='Carátula')
+        self.casos_tree.column('#0', width=480)
+        self.casos_tree.heading('Cliente', text='Cliente')
+        self.casos_tree.column('Cliente', width=220)
+        scroll_casos = ttk.Scrollbar(nuevo, orient=tk.VERTICAL, command=self.casos_tree.yview)
+        self.casos_tree.configure(yscrollcommand=scroll_casos.set)
+        self.casos_tree.grid(row=1, column=0, columnspan=4, sticky='nsew', pady=(8, 5))
+        scroll_casos.grid(row=1, column=4, sticky='ns', pady=(8, 5))
+        self.casos_tree.bind('<<TreeviewSelect>>', lambda e: self._actualizar_boton_encolar())
+
+        botones = ttk.Frame(nuevo)
+        botones.grid(row=2, column=0, columnspan=5, sticky='ew')
+        ttk.Button(botones, text="Seleccionar Todos", command=lambda: self.casos_tree.selection_set(self.casos_tree.get_children())).pack(side=tk.LEFT)
+        self.encolar_btn = ttk.Button(botones, text="Encolar Seleccionados", command=self.encolar, state=tk.DISABLED)
+        self.encolar_btn.pack(side=tk.RIGHT)
+
+        # --- Progreso ---
+        progreso = ttk.LabelFrame(self, text="Progreso", padding=10)
+        progreso.grid(row=1, column=0, sticky='nsew', padx=10, pady=(5, 10))
+        progreso.columnconfigure(1, weight=1)
+        progreso.rowconfigure(3, weight=1)
+        ttk.Label(progreso, text="Lote:").grid(row=0, column=0, padx=(0, 5))
+        self.lote_combo = ttk.Combobox(progreso, textvariable=self.lote_var, state='readonly')
+        self.lote_combo.grid(row=0, column=1, sticky='ew')
+        self.lote_combo.bind('<<ComboboxSelected>>', lambda e: self.refrescar())
+        self.pausa_btn = ttk.Button(progreso, text="Pausar Cola", command=self._alternar_pausa)
+        self.pausa_btn.grid(row=0, column=2, padx=(10, 0))
+
+        self.barra = ttk.Progressbar(progreso, mode='determinate')
+        self.barra.grid(row=1, column=0, columnspan=3, sticky='ew', pady=(8, 2))
+        self.resumen_label = ttk.Label(progreso, text="", foreground="gray")
+        self.resumen_label.grid(row=2, column=0, columnspan=3, sticky=tk.W)
+
+        tree_frame = ttk.Frame(progreso)
+        tree_frame.grid(row=3, column=0, columnspan=3, sticky='nsew', pady=(5, 5))
+        tree_frame.columnconfigure(0, weight=1)
+        tree_frame.rowconfigure(0, weight=1)
+        cols = ('Estado', 'Intentos', 'Detalle')
+        self.trabajos_tree = ttk.Treeview(tree_frame, columns=cols, show='tree headings', selectmode='browse', height=8)
+        self.trabajos_tree.heading('#0', text='Caso')
+        self.trabajos_tree.column('#0', width=320)
+        self.trabajos_tree.heading('Estado', text='Estado')
+        self.trabajos_tree.column('Estado', width=80, stretch=tk.NO)
+        self.trabajos_tree.heading('Intentos', text='Intentos')
+        self.trabajos_tree.column('Intentos', width=60, stretch=tk.NO, anchor=tk.CENTER)
+        self.trabajos_tree.heading('Detalle', text='Detalle')
+        self.trabajos_tree.column('Detalle', width=320)
+        scroll_trabajos = ttk.Scrollbar(tree_frame, orient=tk.VERTICAL, command=self.trabajos_tree.yview)
+        self.trabajos_tree.configure(yscrollcommand=scroll_trabajos.set)
+        self.trabajos_tree.grid(row=0, column=0, sticky='nsew')
+        scroll_trabajos.grid(row=0, column=1, sticky='ns')
+        self.trabajos_tree.bind('<Double-1>', self._on_doble_click)
+
+        acciones = ttk.Frame(progreso)
+        acciones.grid(row=4, column=0, columnspan=3, sticky='ew')
+        ttk.Label(acciones, text=f"Hasta {self.cola.max_concurrentes} consultas simultáneas. Doble clic en un trabajo para abrir el caso.",
+                  foreground="gray").pack(side=tk.LEFT)
+        self.cancelar_btn = ttk.Button(acciones, text="Cancelar Pendientes", command=self._cancelar_pendientes, state=tk.DISABLED)
+        self.cancelar_btn.pack(side=tk.RIGHT)
+        self.reintentar_btn = ttk.Button(acciones, text="Reintentar con Error", command=self._reintentar_errores, state=tk.DISABLED)
+        self.reintentar_btn.pack(side=tk.RIGHT, padx=(0, 5))
+        self._actualizar_boton_pausa()
+
+    # --- Casos ---
+    def _cargar_casos(self):
+        self.app_controller.cargador_async.enviar(self.CANAL_CASOS, lambda token: db.get_casos_para_lote_ia(), self._aplicar_casos)
+
+    def _aplicar_casos(self, casos):
+        if not self.winfo_exists(): return
+        self._casos = casos
+        self._mostrar_casos()
+        seleccionado = self.app_controller.selected_case
+        if seleccionado and self.casos_tree.exists(str(seleccionado['id'])):
+            self.casos_tree.selection_set(str(seleccionado['id'])); self.casos_tree.see(str(seleccionado['id']))
+
+    def _mostrar_casos(self):
+        filtro = self.filtro_var.get().strip().lower()
+        tree = self.casos_tree
+        seleccion = set(tree.selection())
+        tree.delete(*tree.get_children())
+        for caso_id, caratula, cliente in self._casos:
+            if filtro and filtro not in f"{caratula} {cliente}".lower(): continue
+            tree.insert('', tk.END, iid=str(caso_id), text=caratula, values=(cliente,))
+        tree.selection_set([iid for iid in seleccion if tree.exists(iid)])
+        self._actualizar_boton_encolar()
+
+    def _actualizar_boton_encolar(self):
+        self.encolar_btn.config(state=tk.NORMAL if self.casos_tree.selection() else tk.DISABLED)
+
+    def encolar(self):
+        caso_ids = [int(iid) for iid in self.casos_tree.selection()]
+        nombre = self.operacion_var.get()
+        operacion = next(clave for clave, texto in OPERACIONES.items() if texto == nombre)
+        if len(caso_ids) > 1 and not messagebox.askyesno("Confirmar Lote", f"¿Aplicar '{nombre}' a {len(caso_ids)} casos?\nCada resultado se guarda como actividad del caso.", parent=self):
+            return
+        lote, creados = self.cola.encolar(operacion, caso_ids)
+        if creados is None:
+            messagebox.showerror("Error BD", "No se pudo crear el lote de trabajos.", parent=self); return
+        if creados < len(caso_ids):
+            messagebox.showinfo("Lote Creado", f"Se encolaron {creados} casos; {len(caso_ids) - creados} ya tenían esta operación pendiente.", parent=self)
+        if creados:
+            self.lote_var.set(lote)
+        self.refrescar()
+
+    # --- Progreso ---
+    def refrescar(self):
+        """ Pide lotes y trabajos del lote elegido; varios avisos seguidos de la cola se juntan en uno. """
+        if self._after_refresco: return
+        self._after_refresco = self.after(DEMORA_REFRESCO_MS, self._refrescar_ahora)
+
+    def _refrescar_ahora(self):
+        self._after_refresco = None
+        lote = self.lote_var.get() or None
+
+        def trabajo(token):
+            lotes = db.get_lotes_trabajos_ia()
+            elegido = lote if lote and any(l['lote'] == lote for l in lotes) else (lotes[0]['lote'] if lotes else None)
+            token.verificar()
+            return lotes, elegido, db.get_trabajos_ia(elegido) if elegido else []
+        self.app_controller.cargador_async.enviar(self.CANAL_PROGRESO, trabajo, self._aplicar_progreso)
+
+    def _aplicar_progreso(self, resultado):
+        if not self.winfo_exists(): return
+        lotes, elegido, trabajos = resultado
+        self.lote_combo.config(values=[l['lote'] for l in lotes])
+        self.lote_var.set(elegido or "")
+
+        tree = self.trabajos_tree
+        tree.delete(*tree.get_children())
+        self._caso_de_trabajo = {str(t['id']): t['caso_id'] for t in trabajos}
+        conteo = {}
+        for t in trabajos:
+            conteo[t['estado']] = conteo.get(t['estado'], 0) + 1
+            detalle = (t['error'] or "").splitlines()[0] if t['error'] else ""
+            if t['estado'] == 'pendiente' and t['intentos']: detalle = f"Reintento pendiente: {detalle}"
+            tree.insert('', tk.END, iid=str(t['id']), text=t['caratula'], values=(ESTADOS.get(t['estado'], t['estado']), t['intentos'], detalle[:200]))
+
+        total = len(trabajos)
+        terminados = total - conteo.get('pendiente', 0) - conteo.get('en_curso', 0)
+        self.barra.config(maximum=max(total, 1), value=terminados)
+        operacion = OPERACIONES.get(trabajos[0]['operacion'], "") if trabajos else ""
+        detalle = ", ".join(f"{n} {ESTADOS[e].lower()}" for e, n in conteo.items() if e in ESTADOS)
+        self.resumen_label.config(text=f"{operacion}: {terminados}/{total} terminados ({detalle})" if total else "No hay lotes todavía.")
+        self.reintentar_btn.config(state=tk.NORMAL if conteo.get('error') else tk.DISABLED)
+        self.cancelar_btn.config(state=tk.NORMAL if conteo.get('pendiente') else tk.DISABLED)
+
+    def _reintentar_errores(self):
+        lote = self.lote_var.get()
+        if lote and db.reintentar_trabajos_ia(lote):
+            self.cola.despertar()
+        self.refrescar()
+
+    def _cancelar_pendientes(self):
+        lote = self.lote_var.get()
+        if lote and messagebox.askyesno("Cancelar Pendientes", "¿Cancelar los trabajos que todavía no empezaron?\nLos que están en curso terminan normalmente.", parent=self):
+            db.cancelar_trabajos_ia(lote)
+            self.refrescar()
+
+    def _alternar_pausa(self):
+        if self.cola.pausada: self.cola.reanudar()
+        else: self.cola.pausar()
+        self._actualizar_boton_pausa()
+
+    def _actualizar_boton_pausa(self):
+        self.pausa_btn.config(text="Reanudar Cola" if self.cola.pausada else "Pausar Cola")
+
+    def _on_doble_click(self, event):
+        caso_id = self._caso_de_trabajo.get(self.trabajos_tree.identify_row(event.y))
+        if caso_id: self.app_controller.open_case_detail_window(case_id=caso_id)
+
+    def on_close(self):
+        if self._after_refresco: self.after_cancel(self._after_refresco)
+        self.app_controller.cargador_async.cancelar(self.CANAL_CASOS)
+        self.app_controller.cargador_async.cancelar(self.CANAL_PROGRESO)
+        self.app_controller.trabajos_ia_window = None
+        self.destroy()
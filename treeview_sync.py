@@ -0,0 +1,130 @@
+# treeview_sync.py
+# Sincroniza un ttk.Treeview con un modelo (lista ordenada de filas) aplicando solo las
+# diferencias por iid: altas, cambios de valores, movimientos y bajas. Así un guardado que
+# cambia una fila cuesta una llamada a Tk y no se pierden ni la selección ni el desplazamiento.
+import tkinter as tk
+from bisect import bisect_left
+
+
+def _mas_larga_creciente(valores):
+    """ Índices de una subsecuencia estrictamente creciente de largo máximo (O(n log n)). """
+    colas, indices_colas, anterior = [], [], [None] * len(valores)
+    for i, valor in enumerate(valores):
+        k = bisect_left(colas, valor)
+        if k == len(colas):
+            colas.append(valor); indices_colas.append(i)
+        else:
+            colas[k] = valor; indices_colas[k] = i
+        anterior[i] = indices_colas[k - 1] if k else None
+    resultado, i = [], indices_colas[-1] if indices_colas else None
+    while i is not None:
+        resultado.append(i); i = anterior[i]
+    return resultado
+
+
+class _ContadorPosiciones:
+    """ Árbol de Fenwick: marca posiciones y cuenta las marcadas antes de una dada, en O(log n). """
+
+    def __init__(self, marcadas, tamano):
+        self._arbol = [0] * (tamano + 1)
+        for posicion in marcadas:
+            self.sumar(posicion, 1)
+
+    def sumar(self, posicion, valor):
+        i = posicion + 1
+        while i < len(self._arbol):
+            self._arbol[i] += valor; i += i & -i
+
+    def antes_de(self, posicion):
+        total, i = 0, posicion
+        while i > 0:
+            total += self._arbol[i]; i -= i & -i
+        return total
+
+
+class SincronizadorTreeview:
+    """
+    Recuerda los values/tags con que se pintó cada iid (evita consultar a Tk para comparar).
+    Las filas del modelo son tuplas (iid, values) o (iid, values, tags).
+    """
+
+    def __init__(self, tree, parent=''):
+        self.tree = tree
+        self.parent = parent
+        self._pintado = {} # {iid: (values, tags)}
+
+    @staticmethod
+    def _normalizar(fila):
+        iid, values = fila[0], tuple(fila[1])
+        tags = tuple(fila[2]) if len(fila) > 2 and fila[2] else ()
+        return iid, values, tags
+
+    def sincronizar(self, filas):
+        """
+        Deja los hijos de 'parent' exactamente como 'filas' (en ese orden).
+        Devuelve un dict con la cantidad de altas, cambios, movimientos y bajas aplicados.
+        """
+        filas = [self._normalizar(f) for f in filas]
+        nuevos = {iid for iid, _, _ in filas}
+        stats = {'insertadas': 0, 'actualizadas': 0, 'movidas': 0, 'borradas': 0}
+
+        actuales = self.tree.get_children(self.parent)
+        a_borrar = [iid for iid in actuales if iid not in nuevos]
+        if a_borrar:
+            self.tree.delete(*a_borrar)
+            for iid in a_borrar:
+                self._pintado.pop(iid, None)
+            stats['borradas'] = len(a_borrar)
+        sobrevivientes = [iid for iid in actuales if iid in nuevos]
+        posicion_actual = {iid: k for k, iid in enumerate(sobrevivientes)}
+
+        # Se quedan quietas las filas de la subsecuencia más larga que ya está en el orden nuevo; el
+        # resto se mueve (y las nuevas se insertan) justo detrás de la que les precede en 'filas'.
+        # Recorriendo 'filas' en orden, lo ya ubicado ocupa las primeras posiciones salvo por las filas
+        # a mover que todavía no se tocaron y siguen antes de la última fija recorrida: esas se cuentan
+        # con el árbol de Fenwick, así cada índice sale en O(log n) sin consultar a Tk.
+        posicion_nueva = {iid: i for i, (iid, _, _) in enumerate(filas)}
+        fijas = {sobrevivientes[k] for k in _mas_larga_creciente([posicion_nueva[iid] for iid in sobrevivientes])}
+        sin_ubicar = _ContadorPosiciones((k for k, iid in enumerate(sobrevivientes) if iid not in fijas), len(sobrevivientes))
+        ultima_fija = 0 # Posición actual de la última fija recorrida (las filas antes de ella quedan antes en Tk)
+        for i, (iid, values, tags) in enumerate(filas):
+            if iid in fijas:
+                ultima_fija = posicion_actual[iid]
+            elif iid in posicion_actual:
+                sin_ubicar.sumar(posicion_actual[iid], -1)
+                self.tree.move(iid, self.parent, i + sin_ubicar.antes_de(ultima_fija))
+                stats['movidas'] += 1
+            else:
+                self.tree.insert(self.parent, i + sin_ubicar.antes_de(ultima_fija), iid=iid, values=values, tags=tags)
+                self._pintado[iid] = (values, tags)
+                stats['insertadas'] += 1
+                continue
+            if self._pintado.get(iid) != (values, tags):
+                self.tree.item(iid, values=values, tags=tags)
+                self._pintado[iid] = (values, tags)
+                stats['actualizadas'] += 1
+        return stats
+
+    def actualizar_fila(self, iid, values, tags=(), indice=None):
+        """ Alta o cambio de una sola fila (p.ej. tras guardar esa entidad). """
+        values, tags = tuple(values), tuple(tags or ())
+        if self.tree.exists(iid):
+            if self._pintado.get(iid) != (values, tags):
+                self.tree.item(iid, values=values, tags=tags)
+                self._pintado[iid] = (values, tags)
+            if indice is not None and self.tree.index(iid) != indice:
+                self.tree.move(iid, self.parent, indice)
+        else:
+            self.tree.insert(self.parent, tk.END if indice is None else indice, iid=iid, values=values, tags=tags)
+            self._pintado[iid] = (values, tags)
+
+    def quitar_fila(self, iid):
+        if self.tree.exists(iid):
+            self.tree.delete(iid)
+        self._pintado.pop(iid, None)
+
+    def limpiar(self):
+        hijos = self.tree.get_children(self.parent)
+        if hijos:
+            self.tree.delete(*hijos)
+        self._pintado.clear()
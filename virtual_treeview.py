@@ -0,0 +1,472 @@
+# virtual_treeview.py
+# Lista virtual sobre ttk.Treeview: solo existen como items de Tk las filas visibles más un
+# margen (overscan); el resto se pide a una "fuente" por posición a medida que se desplaza.
+# Con decenas de miles de clientes o actividades, crear un item por fila es lo que más tarda
+# y más memoria consume; así el costo depende del alto de la ventana y no del total.
+import collections
+import tkinter as tk
+from tkinter import ttk
+
+from treeview_sync import SincronizadorTreeview
+
+FILAS_VISIBLES_POR_DEFECTO = 20
+
+
+def _clave_orden(valor):
+    # None al final y texto sin distinguir mayúsculas; evita comparar None con str al ordenar
+    if valor is None:
+        return (1, '')
+    if isinstance(valor, str):
+        return (0, valor.casefold())
+    return (0, valor)
+
+
+class FuenteLista:
+    """
+    Fuente en memoria (lista de dicts o registros compactos).
+    Interfaz común de las fuentes: contar(), obtener(offset, limite), posicion_de(id),
+    registro_por_id(id), ordenar(campo, descendente), actualizar_registro(registro),
+    quitar_registro(id) e invalidar().
+    'orden' = (campo, descendente) indica cómo vienen ordenados los registros, para ubicar
+    en su lugar los que se agregan después.
+    """
+
+    def __init__(self, registros, clave='id', orden=None):
+        self.clave = clave
+        self.orden = orden
+        self._registros = list(registros)
+        self._posiciones = None # {id: indice}, se arma recién cuando se busca por id
+        self._sueltos = set() # ids agregados de a uno mientras la lista todavía se carga por lotes
+
+    def contar(self):
+        return len(self._registros)
+
+    def obtener(self, offset, limite):
+        return self._registros[offset:offset + limite]
+
+    def _indice_posiciones(self):
+        if self._posiciones is None:
+            self._posiciones = {reg[self.clave]: i for i, reg in enumerate(self._registros)}
+        return self._posiciones
+
+    def posicion_de(self, id_registro):
+        return self._indice_posiciones().get(id_registro)
+
+    def registro_por_id(self, id_registro):
+        posicion = self.posicion_de(id_registro)
+        return None if posicion is None else self._registros[posicion]
+
+    def ordenar(self, campo, descendente=False):
+        self.orden = (campo, descendente)
+        self._registros.sort(key=lambda reg: _clave_orden(reg.get(campo)), reverse=descendente)
+        self._posiciones = None
+
+    def actualizar_registro(self, registro):
+        """ Reemplaza (o agrega) un registro y lo deja en su lugar según el orden actual. """
+        posicion = self.posicion_de(registro[self.clave])
+        if posicion is None:
+            self._registros.append(registro)
+            self._sueltos.add(registro[self.clave])
+        else:
+            self._registros[posicion] = registro
+        if self.orden:
+            # Lista casi ordenada: el sort de Python la resuelve en tiempo lineal
+            self.ordenar(*self.orden)
+        else:
+            self._posiciones = None
+
+    def extender(self, registros):
+        """ Agrega registros que ya vienen en el orden de la lista (carga por lotes). """
+        if self._sueltos: # El lote puede traer uno que ya se agregó suelto tras guardarlo
+            registros = [reg for reg in registros if reg[self.clave] not in self._sueltos]
+        self._registros.extend(registros)
+        self._posiciones = None
+
+    def quitar_registro(self, id_registro):
+        posicion = self.posicion_de(id_registro)
+        if posicion is not None:
+            del self._registros[posicion]
+            self._posiciones = None
+
+    def invalidar(self):
+        self._posiciones = None
+
+
+class FuenteConsulta:
+    """
+    Fuente paginada contra la BD. Las páginas se cachean (LRU) y la que sigue a una página ya
+    cargada se pide por keyset (valor de orden e id de su última fila); un salto con la barra
+    de desplazamiento se resuelve por OFFSET.
+      contar_fn() -> total
+      pagina_fn(offset, limite, orden, descendente, despues_de) -> lista de registros
+      posicion_fn(id, orden, descendente) -> índice o None
+    """
+
+    def __init__(self, contar_fn, pagina_fn, posicion_fn, orden, descendente=False, clave='id',
+                 tam_pagina=200, max_paginas=20):
+        self.clave = clave
+        self.orden = orden
+        self.descendente = descendente
+        self.tam_pagina = tam_pagina
+        self.max_paginas = max_paginas
+        self._contar_fn = contar_fn
+        self._pagina_fn = pagina_fn
+        self._posicion_fn = posicion_fn
+        self._total = None
+        self._paginas = collections.OrderedDict() # {numero_pagina: [registros]}
+
+    def contar(self):
+        if self._total is None:
+            self._total = self._contar_fn()
+        return self._total
+
+    def _pagina(self, numero):
+        filas = self._paginas.get(numero)
+        if filas is not None:
+            self._paginas.move_to_end(numero)
+            return filas
+        anterior = self._paginas.get(numero - 1)
+        if anterior and len(anterior) == self.tam_pagina:
+            ultima = anterior[-1]
+            despues_de = (ultima[self.orden], ultima[self.clave])
+            filas = self._pagina_fn(numero * self.tam_pagina, self.tam_pagina, self.orden, self.descendente, despues_de)
+        else:
+            filas = self._pagina_fn(numero * self.tam_pagina, self.tam_pagina, self.orden, self.descendente, None)
+        self._paginas[numero] = filas
+        while len(self._paginas) > self.max_paginas:
+            self._paginas.popitem(last=False)
+        return filas
+
+    def obtener(self, offset, limite):
+        if limite <= 0:
+            return []
+        primera, ultima = offset // self.tam_pagina, (offset + limite - 1) // self.tam_pagina
+        filas = []
+        for numero in range(primera, ultima + 1):
+            filas.extend(self._pagina(numero))
+        desde = offset - primera * self.tam_pagina
+        return filas[desde:desde + limite]
+
+    def posicion_de(self, id_registro):
+        for numero, filas in self._paginas.items():
+            for i, reg in enumerate(filas):
+                if reg[self.clave] == id_registro:
+                    return numero * self.tam_pagina + i
+        return self._posicion_fn(id_registro, self.orden, self.descendente)
+
+    def registro_por_id(self, id_registro):
+        for filas in self._paginas.values():
+            for reg in filas:
+                if reg[self.clave] == id_registro:
+                    return reg
+        return None
+
+    def ordenar(self, campo, descendente=False):
+        self.orden, self.descendente = campo, descendente
+        self.invalidar()
+
+    def actualizar_registro(self, registro):
+        # La posición depende de la BD: se vuelve a pedir la ventana visible
+        self.invalidar()
+
+    def quitar_registro(self, id_registro):
+        self.invalidar()
+
+    def invalidar(self):
+        self._total = None
+        self._paginas.clear()
+
+
+class VirtualTreeview(ttk.Frame):
+    """
+    Frame con un ttk.Treeview (self.tree) y sus barras de desplazamiento que muestra una fuente
+    virtual. El iid de cada fila es prefijo_iid + id, así que selection() y los handlers de
+    <<TreeviewSelect>> (que se genera sobre este frame) funcionan como con un Treeview común.
+
+      formatear(registro) -> tupla de values de la fila
+      columnas_orden: {columna: campo} de las columnas que ordenan al hacer clic en el encabezado
+    """
+
+    def __init__(self, parent, columnas, formatear, fuente=None, clave='id', prefijo_iid='',
+                 overscan=15, columnas_orden=None, **tree_kwargs):
+        super().__init__(parent)
+        self.formatear = formatear
+        self.clave = clave
+        self.prefijo_iid = prefijo_iid
+        self.overscan = overscan
+        self.columnas_orden = columnas_orden or {}
+        self.fuente = fuente if fuente is not None else FuenteLista([], clave)
+
+        self._total = 0
+        self._inicio = 0 # Posición global del primer item materializado
+        self._iids = [] # iids materializados, en orden
+        self._primera = 0 # Posición global de la primera fila visible
+        self._filas_visibles = FILAS_VISIBLES_POR_DEFECTO
+        self._reposicionando = False
+        self._reventana_pendiente = None
+        self._iid_seleccionado = None
+        self._orden_actual = None # (columna, descendente)
+        self._textos_encabezado = {}
+
+        self.columnconfigure(0, weight=1)
+        self.rowconfigure(0, weight=1)
+        tree_kwargs.setdefault('show', 'headings')
+        tree_kwargs.setdefault('selectmode', 'browse')
+        self.tree = ttk.Treeview(self, columns=columnas, **tree_kwargs)
+        self.scrollbar_y = ttk.Scrollbar(self, orient=tk.VERTICAL, command=self._on_scrollbar)
+        self.scrollbar_x = ttk.Scrollbar(self, orient=tk.HORIZONTAL, command=self.tree.xview)
+        self.tree.configure(yscrollcommand=self._on_tree_yview, xscrollcommand=self.scrollbar_x.set)
+        self._sincronizador = SincronizadorTreeview(self.tree)
+        self.tree.grid(row=0, column=0, sticky='nsew')
+        self.scrollbar_y.grid(row=0, column=1, sticky='ns')
+        self.scrollbar_x.grid(row=1, column=0, sticky='ew')
+
+        self.tree.bind('<<TreeviewSelect>>', self._on_tree_select)
+        self.tree.bind('<Configure>', lambda e: self._programar_reventana())
+        # Inicio/Fin recorren toda la lista, no solo las filas materializadas
+        self.tree.bind('<Control-Home>', lambda e: self._ir_a_extremo(False))
+        self.tree.bind('<Control-End>', lambda e: self._ir_a_extremo(True))
+
+    # --- Configuración de columnas (delegada al Treeview) ---
+    def heading(self, columna, **kwargs):
+        if 'text' in kwargs:
+            self._textos_encabezado[columna] = kwargs['text']
+        if columna in self.columnas_orden and 'command' not in kwargs:
+            kwargs['command'] = lambda c=columna: self.ordenar_por(c)
+        return self.tree.heading(columna, **kwargs)
+
+    def column(self, columna, **kwargs):
+        return self.tree.column(columna, **kwargs)
+
+    def identify_row(self, y):
+        return self.tree.identify_row(y)
+
+    # --- Datos ---
+    def set_fuente(self, fuente, conservar_seleccion=False):
+        """ Reemplaza los datos mostrados. Sin conservar_seleccion vuelve al principio de la lista. """
+        self.fuente = fuente
+        self.aplicar_orden_actual()
+        if not conservar_seleccion:
+            self._iid_seleccionado = None
+            self._primera = 0
+        self.refrescar()
+
+    def aplicar_orden_actual(self):
+        """ Reaplica el orden elegido en los encabezados (p.ej. al terminar una carga por lotes). """
+        if self._orden_actual:
+            columna, descendente = self._orden_actual
+            self.fuente.ordenar(self.columnas_orden[columna], descendente)
+
+    def refrescar(self):
+        """ Vuelve a pedir a la fuente las filas de la ventana actual (p.ej. tras un alta o edición). """
+        self._total = self.fuente.contar()
+        self._mostrar_desde(self._primera)
+
+    def actualizar_registro(self, registro, seleccionar=False):
+        """
+        Aplica el alta o cambio de un solo registro (tras guardarlo) sin recargar la lista:
+        se conserva el desplazamiento y en Tk solo se toca la fila que cambió.
+        """
+        self.fuente.actualizar_registro(registro)
+        self.refrescar()
+        id_registro = registro[self.clave]
+        if seleccionar:
+            self.seleccionar_id(id_registro)
+        elif self._iid_seleccionado == self._iid(id_registro):
+            self.see_id(id_registro) # Si cambió de lugar por el orden, seguirlo
+        return id_registro
+
+    def quitar_registro(self, id_registro):
+        self.fuente.quitar_registro(id_registro)
+        if self._iid_seleccionado == self._iid(id_registro):
+            self.limpiar_seleccion()
+        self.refrescar()
+
+    def limpiar(self):
+        self.set_fuente(FuenteLista([], self.clave))
+
+    def cantidad(self):
+        return self._total
+
+    # --- Selección ---
+    def selection(self):
+        return (self._iid_seleccionado,) if self._iid_seleccionado else ()
+
+    def id_seleccionado(self):
+        return self._id_de_iid(self._iid_seleccionado) if self._iid_seleccionado else None
+
+    def seleccionar_id(self, id_registro, generar_evento=True):
+        """ Selecciona una fila por id aunque no esté materializada, desplazándose hasta ella. """
+        posicion = self.fuente.posicion_de(id_registro)
+        if posicion is None:
+            return False
+        self._iid_seleccionado = self._iid(id_registro)
+        self.see_posicion(posicion)
+        if generar_evento:
+            self.event_generate('<<TreeviewSelect>>')
+        return True
+
+    def limpiar_seleccion(self, generar_evento=True):
+        if self._iid_seleccionado is None:
+            return
+        self._iid_seleccionado = None
+        self._reposicionando = True
+        try:
+            self.tree.selection_set(())
+        finally:
+            self._reposicionando = False
+        if generar_evento:
+            self.event_generate('<<TreeviewSelect>>')
+
+    def see_id(self, id_registro):
+        posicion = self.fuente.posicion_de(id_registro)
+        if posicion is not None:
+            self.see_posicion(posicion)
+
+    def see_posicion(self, posicion):
+        if self._primera <= posicion < self._primera + self._filas_visibles and self._iids:
+            self._aplicar_seleccion()
+            return
+        self._mostrar_desde(posicion - self._filas_visibles // 2)
+
+    # --- Orden ---
+    def ordenar_por(self, columna, descendente=None):
+        campo = self.columnas_orden.get(columna)
+        if not campo:
+            return
+        if descendente is None: # Clic repetido en el mismo encabezado invierte el orden
+            descendente = bool(self._orden_actual and self._orden_actual[0] == columna and not self._orden_actual[1])
+        self._orden_actual = (columna, descendente)
+        for col, texto in self._textos_encabezado.items():
+            flecha = (' ▼' if descendente else ' ▲') if col == columna else ''
+            self.tree.heading(col, text=texto + flecha)
+        self.fuente.ordenar(campo, descendente)
+        if self._iid_seleccionado:
+            self._total = self.fuente.contar()
+            self.see_id(self._id_de_iid(self._iid_seleccionado))
+        else:
+            self._primera = 0
+            self.refrescar()
+
+    # --- Internos ---
+    def _iid(self, id_registro):
+        return f"{self.prefijo_iid}{id_registro}"
+
+    def _id_de_iid(self, iid):
+        valor = iid[len(self.prefijo_iid):] if self.prefijo_iid and iid.startswith(self.prefijo_iid) else iid
+        try:
+            return int(valor)
+        except ValueError:
+            return valor
+
+    def _mostrar_desde(self, primera):
+        """ Materializa [primera - overscan, primera + visibles + overscan) y deja 'primera' arriba. """
+        self._cancelar_reventana()
+        primera = max(0, min(primera, self._total - self._filas_visibles))
+        inicio = max(0, primera - self.overscan)
+        fin = min(self._total, primera + self._filas_visibles + self.overscan)
+        filas = self.fuente.obtener(inicio, fin - inicio) if fin > inicio else []
+
+        self._reposicionando = True
+        try:
+            # Al desplazar unas filas, o tras guardar una, solo se crean/borran/cambian las diferencias
+            modelo = [(self._iid(reg[self.clave]), self.formatear(reg)) for reg in filas]
+            self._sincronizador.sincronizar(modelo)
+            self._iids = [iid for iid, _ in modelo]
+            self._inicio, self._primera = inicio, primera
+            self._aplicar_seleccion()
+            if self._iids:
+                self.tree.yview_moveto((primera - inicio) / len(self._iids))
+        finally:
+            self._reposicionando = False
+        self._actualizar_scrollbar()
+
+    def _aplicar_seleccion(self):
+        iid = self._iid_seleccionado
+        en_ventana = iid is not None and self.tree.exists(iid)
+        if en_ventana:
+            if self.tree.selection() != (iid,):
+                self.tree.selection_set(iid)
+            self.tree.focus(iid)
+        elif self.tree.selection():
+            self.tree.selection_set(())
+
+    def _on_tree_select(self, event=None):
+        # <<TreeviewSelect>> de Tk llega encolado, también por selecciones que hace la propia
+        # lista al rearmar la ventana: solo se reenvía si cambió la fila elegida por el usuario.
+        if self._reposicionando:
+            return
+        seleccion = self.tree.selection()
+        if not seleccion:
+            # Vacía porque la fila salió de la ventana materializada: la selección lógica sigue
+            return
+        iid = seleccion[0]
+        if iid == self._iid_seleccionado:
+            return
+        self._iid_seleccionado = iid
+        self.event_generate('<<TreeviewSelect>>')
+
+    def _on_tree_yview(self, primero, ultimo):
+        primero, ultimo = float(primero), float(ultimo)
+        n = len(self._iids)
+        if n:
+            visibles = round((ultimo - primero) * n)
+            if ultimo - primero < 1 and visibles > 0:
+                self._filas_visibles = visibles
+            elif ultimo - primero >= 1 and n < self._total:
+                # Entran más filas de las materializadas (ventana agrandada): hay que pedir más
+                self._filas_visibles = max(self._filas_visibles, n)
+                self._programar_reventana()
+            local = round(primero * n)
+            self._primera = self._inicio + local
+            if not self._reposicionando:
+                margen = max(1, self.overscan // 2)
+                cerca_arriba = local < margen and self._inicio > 0
+                cerca_abajo = local + self._filas_visibles > n - margen and self._inicio + n < self._total
+                if cerca_arriba or cerca_abajo:
+                    self._programar_reventana()
+        self._actualizar_scrollbar()
+
+    def _actualizar_scrollbar(self):
+        if self._total <= 0:
+            self.scrollbar_y.set(0, 1)
+            return
+        self.scrollbar_y.set(self._primera / self._total, min(1.0, (self._primera + self._filas_visibles) / self._total))
+
+    def _on_scrollbar(self, accion, cantidad, unidad=None):
+        if accion == 'moveto':
+            primera = int(float(cantidad) * self._total)
+        elif unidad == 'pages':
+            primera = self._primera + int(cantidad) * max(1, self._filas_visibles - 1)
+        else:
+            primera = self._primera + int(cantidad)
+        self._mostrar_desde(primera)
+
+    def _ir_a_extremo(self, al_final):
+        if not self._total:
+            return 'break'
+        posicion = self._total - 1 if al_final else 0
+        self._mostrar_desde(posicion)
+        registro = self.fuente.obtener(posicion, 1)
+        if registro:
+            iid = self._iid(registro[0][self.clave])
+            self.tree.selection_set(iid)
+            self.tree.focus(iid)
+            self.tree.see(iid)
+        return 'break'
+
+    def _programar_reventana(self):
+        if self._reventana_pendiente is None:
+            self._reventana_pendiente = self.after_idle(self._reventana)
+
+    def _cancelar_reventana(self):
+        if self._reventana_pendiente is not None:
+            try:
+                self.after_cancel(self._reventana_pendiente)
+            except tk.TclError:
+                pass
+            self._reventana_pendiente = None
+
+    def _reventana(self):
+        self._reventana_pendiente = None
+        self._mostrar_desde(self._primera)